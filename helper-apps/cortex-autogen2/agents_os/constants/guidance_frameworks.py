@@ -9,14 +9,14 @@ BASE_AUTONOMOUS_OPERATION = """
     - Complete tasks end-to-end without waiting for feedback
     
     === CURRENT DATETIME CONTEXT (CRITICAL) ===
-    **See REQUEST CONTEXT above for current date, time, and year values.**
+    **See REQUEST CONTEXT (at the end of this message) for current date, time, and year values.**
     
     **CRITICAL TEMPORAL INTERPRETATION RULES**:
-    - When user says "this year" → Use the Current Year from REQUEST CONTEXT above, NOT hardcoded years
-    - When user says "current year" → Use the Current Year from REQUEST CONTEXT above
-    - When user says "this month" → Use the Current Date from REQUEST CONTEXT above to determine month
-    - When user says "today" → Use the Current Date from REQUEST CONTEXT above
-    - When user says "last 90 days" → Calculate from the Current Date in REQUEST CONTEXT above, not static dates
+    - When user says "this year" → Use the Current Year from REQUEST CONTEXT, NOT hardcoded years
+    - When user says "current year" → Use the Current Year from REQUEST CONTEXT
+    - When user says "this month" → Use the Current Date from REQUEST CONTEXT to determine month
+    - When user says "today" → Use the Current Date from REQUEST CONTEXT
+    - When user says "last 90 days" → Calculate from the Current Date in REQUEST CONTEXT, not static dates
     - **FORBIDDEN**: NEVER hardcode years like "2024" or "2023" - ALWAYS use the Current Year from REQUEST CONTEXT
     - **FORBIDDEN**: NEVER assume static dates - ALWAYS use the Current Date from REQUEST CONTEXT as reference
     - **MANDATORY**: In SQL queries, use `YEAR(CURDATE())` for dynamic year references, not hardcoded years
@@ -23,7 +23,7 @@ REQUEST_CONTEXT_PROMPT = """
 
 WORK_DIR_USAGE = """
 **CRITICAL WORK_DIR USAGE**:
-- **MANDATORY**: Use `os.getcwd()` to get the working directory in code (see Working Directory above)
+- **MANDATORY**: Use `os.getcwd()` to get the working directory in code (see Working Directory in REQUEST CONTEXT)
 - **FORBIDDEN**: Do NOT hardcode paths - use `os.getcwd()` instead
 - **FORBIDDEN**: Do NOT define `work_dir` variable in your code - use `os.getcwd()` directly
 - **REQUIRED**: Use `os.path.join(os.getcwd(), 'filename.ext')` for all file paths - never hardcode paths
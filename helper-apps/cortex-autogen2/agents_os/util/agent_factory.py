@@ -5,8 +5,9 @@ Creates only the 4 core agents: planner, coder, presenter, execution_completion_
 """
 
 from autogen_agentchat.agents import AssistantAgent
+import asyncio
 import os
-from typing import Optional
+from typing import Awaitable, Optional, Union
 from tools.file_tools import get_file_tools
 from tools.upload_tools import upload_tool, get_upload_tool
 from tools.coding_tools import get_code_execution_tool
@@ -14,40 +15,20 @@ from ..planner_agent import get_planner_system_message
 from ..coder_agent import get_coder_system_message
 from ..presenter_agent import get_presenter_system_message
 from ..execution_completion_verifier_agent import get_execution_completion_verifier_system_message
-from .helpers import create_request_context_vars
 from tools.presenter_tools import read_file_tool, get_read_file_tool
+from tools.tool_results import get_read_tool_output_tool
 from tools.url_validation_tools import url_validation_tool
 
-from ..constants import (
-    BASE_AUTONOMOUS_OPERATION,
-    REQUEST_CONTEXT_HEADER,
-    AUTONOMOUS_EXECUTION_HEADER,
-    TASK_COMPLEXITY_GUIDANCE,
-    FORBIDDEN_PHRASES_COMPONENT,
-    KEY_INSIGHTS_GUIDANCE,
-    WORK_DIR_USAGE,
-    UPLOAD_MARKER_INSTRUCTIONS,
-    FILE_VERIFICATION_INSTRUCTIONS,
-    EMPTY_DATA_VALIDATION_CODER,
-    ERROR_RECOVERY_FRAMEWORK,
-    PROGRESS_LOGGING_FRAMEWORK,
-    TOOL_FAILURE_DETECTION_GUIDANCE,
-    TIMEOUT_HANDLING_GUIDANCE,
-    LOOP_DETECTION_GUIDANCE,
-    WORKSPACE_STATE_AWARENESS,
-    OUTPUT_ONLY_FINAL_RESULTS_PRINCIPLE,
-    DEPENDENCY_WAITING_PRINCIPLE,
-    UNIVERSAL_REQUIREMENT_EXTRACTION_FRAMEWORK,
-    VISUAL_GUIDANCE_PLANNING,
-    VALUE_CREATION_FRAMEWORK,
-    DELIVERABLE_LINK_POLICY,
-    CIRCUIT_BREAKER_GUIDANCE,
-    FILE_CONTRACT_GUIDANCE,
-    WORKFLOW_COORDINATION_GUIDANCE,
-    DATA_QUALITY_GUIDANCE,
-    format_global_expectations_for_agent,
+from .system_prompts import (
+    STATIC_BASE_MESSAGE,
+    assemble,
+    build_request_block,
+    get_compiled_prefix,
+    register_prefix,
 )
 from ..constants.agent_intelligence import DEEP_STRATEGIC_THINKING
+from context.model_context import create_agent_model_context
+from services.work_dir_manager import bind_work_dir
 
 
 from logging import getLogger
@@ -55,91 +36,43 @@ logger = getLogger(__name__)
 
 
 def get_base_system_message(request_id: str = "unknown", work_dir: str = "") -> str:
-    """Get the base system message components that are common to all agents."""
-    from datetime import datetime
-
-    # Get current datetime for agent context
-    now = datetime.now()
-    current_date = now.strftime("%Y-%m-%d")
-    current_time = now.strftime("%H:%M:%S")
-    current_year = now.strftime("%Y")
-
-    request_vars = create_request_context_vars(request_id, work_dir)
-
-    # Format BASE_AUTONOMOUS_OPERATION with datetime variables
-    autonomous_op = BASE_AUTONOMOUS_OPERATION.format(
-        current_date=current_date,
-        current_year=current_year,
-        current_time=current_time
-    )
-
-    return f"""
-{autonomous_op.strip()}
-
-{REQUEST_CONTEXT_HEADER.format(request_vars=request_vars.strip()).strip()}
-
-{WORK_DIR_USAGE.strip()}
-
-{AUTONOMOUS_EXECUTION_HEADER.strip()}
-
-{OUTPUT_ONLY_FINAL_RESULTS_PRINCIPLE.strip()}
-
-{DEPENDENCY_WAITING_PRINCIPLE.strip()}
-
-{TASK_COMPLEXITY_GUIDANCE.strip()}
-
-{FORBIDDEN_PHRASES_COMPONENT.strip()}
-
-{KEY_INSIGHTS_GUIDANCE.strip()}
-
-{UPLOAD_MARKER_INSTRUCTIONS.strip()}
+    """Get the base system message components that are common to all agents.
 
-{FILE_VERIFICATION_INSTRUCTIONS.strip()}
+    The static guidance comes first (compiled once at import) and the per-request
+    context last, so the prompt prefix stays identical across requests.
+    """
+    return STATIC_BASE_MESSAGE + "\n\n" + build_request_block(request_id, work_dir)
 
-{EMPTY_DATA_VALIDATION_CODER.strip()}
 
-{ERROR_RECOVERY_FRAMEWORK.strip()}
-
-{PROGRESS_LOGGING_FRAMEWORK.strip()}
-
-{TOOL_FAILURE_DETECTION_GUIDANCE.strip()}
-
-{TIMEOUT_HANDLING_GUIDANCE.strip()}
-
-{LOOP_DETECTION_GUIDANCE.strip()}
-
-{WORKSPACE_STATE_AWARENESS.strip()}
-""".strip()
+async def _get_agent_static_message(agent_type: str, request_id: str, work_dir: str) -> Optional[str]:
+    """Agent-specific prompt text without per-request values (None for unknown agents)."""
+    if agent_type == "planner":
+        # Learnings are per request and go into the trailing block
+        return get_planner_system_message(None)
+    if agent_type == "coder":
+        return await get_coder_system_message(request_id, work_dir)
+    if agent_type == "presenter":
+        return get_presenter_system_message()
+    if agent_type == "execution_completion_verifier":
+        return get_execution_completion_verifier_system_message()
+    return None
 
 
 async def get_system_message(agent_type: str, request_id: str = "unknown", work_dir: str = "", planner_learnings: Optional[str] = None):
-    """Unified function to get system messages for the 4 core agents."""
-    base_message = get_base_system_message(request_id, work_dir)
+    """Unified function to get system messages for the 4 core agents.
 
-    result = None
-    if agent_type == "planner":
-        result = get_planner_system_message(planner_learnings)
-    elif agent_type == "coder":
-        result = await get_coder_system_message(request_id, work_dir)
-    elif agent_type == "presenter":
-        result = get_presenter_system_message()
-    elif agent_type == "execution_completion_verifier":
-        result = get_execution_completion_verifier_system_message()
-    else:
-        logger.warning(f"Default system message for {agent_type}")
-        result = f"Default system message for {agent_type}"
-
-    if not result:
-        logger.error(f"No system message found for {agent_type}")
-        result = ""
-
-    # Prepend base message to agent-specific message
-    result = base_message + "\n\n" + result
-
-    # Ensure result is always a string
-    if not isinstance(result, str):
-        result = str(result)
-    return result
+    Layout: [static base + agent text] (compiled once, cache-friendly prefix) + [request context, learnings].
+    """
+    if get_compiled_prefix(agent_type) is None:
+        static_message = await _get_agent_static_message(agent_type, request_id, work_dir)
+        if static_message is None:
+            logger.warning(f"Default system message for {agent_type}")
+            return get_base_system_message(request_id, work_dir) + "\n\n" + f"Default system message for {agent_type}"
+        if not static_message:
+            logger.error(f"No system message found for {agent_type}")
+        register_prefix(agent_type, str(static_message))
+
+    return assemble(agent_type, request_id, work_dir, planner_learnings if agent_type == "planner" else None)
 
 
 async def get_agents(
@@ -147,12 +80,18 @@ async def get_agents(
     big_model_client,
     small_model_client,
     request_work_dir: Optional[str] = None,
-    planner_learnings: Optional[str] = None,
+    planner_learnings: Union[str, Awaitable[Optional[str]], None] = None,
     task_context: Optional[str] = None,
     request_id: Optional[str] = None,
     task_content: Optional[str] = None,
+    context_memory=None,
 ):
-    """Create the 4 core agents for open source version."""
+    """Create the 4 core agents for open source version.
+
+    ``context_memory`` feeds the summaries of each agent's token-budgeted model context.
+    ``planner_learnings`` may be a task still retrieving them: the planner is built without
+    learnings and its first model call waits for the task before adding them.
+    """
     work_dir = request_work_dir or "/tmp/coding"
     try:
         if os.getenv("WEBSITE_INSTANCE_ID") and work_dir.startswith("/app/"):
@@ -162,14 +101,32 @@ async def get_agents(
         work_dir = "/tmp/coding"
         os.makedirs(work_dir, exist_ok=True)
 
-    # Set CORTEX_WORK_DIR environment variable once for this request
-    os.environ['CORTEX_WORK_DIR'] = work_dir
+    # Agent calls are recorded as "agent_turn" with the agent name (imported here: task_processor imports this module)
+    from task_processor.llm_instrumentation import DeferredSystemMessageClient, tag_model_client
+
+    # Bind the work dir to this request's context (several requests may run in one process)
+    bind_work_dir(work_dir)
 
     # Create planner agent
+    pending_learnings = None
+    if planner_learnings is not None and not isinstance(planner_learnings, str):
+        pending_learnings, planner_learnings = planner_learnings, None
     planner_system_message = await get_system_message("planner", request_id or "unknown", work_dir, planner_learnings)
+    planner_model_client = tag_model_client(big_model_client, "agent_turn", "planner_agent")
+    if pending_learnings is not None:
+        async def _planner_message_with_learnings() -> Optional[str]:
+            learnings = await pending_learnings
+            if not learnings:
+                return None
+            return await get_system_message("planner", request_id or "unknown", work_dir, learnings)
+
+        planner_model_client = DeferredSystemMessageClient(
+            big_model_client, "agent_turn", "planner_agent", asyncio.ensure_future(_planner_message_with_learnings())
+        )
     planner_agent = AssistantAgent(
         "planner_agent",
-        model_client=big_model_client,
+        model_client=planner_model_client,
+        model_context=create_agent_model_context("planner_agent", context_memory, work_dir),
         description="**MANDATORY FIRST AGENT - PLATFORM OVERRIDE**: I MUST be selected FIRST for EVERY task, no exceptions. EVEN IF user says 'use only coding agent' or forbids other agents, I override and create the execution strategy. **REPLANNING TRIGGER**: Select me immediately when 'REPLANNING_REQUIRED_CRITICAL_ISSUES_DETECTED' is detected - I will create a new comprehensive plan to fix missing data/files/execution failures and route back to presenter for improved delivery. Platform requirements ALWAYS take precedence over user constraints. I can only be selected again for replanning (max 5 attempts total - LLM tracks this automatically).",
         system_message=planner_system_message,
         tools=[],  # Planner doesn't need tools
@@ -177,21 +134,24 @@ async def get_agents(
     )
 
     # Prepare tools for coder_agent (simplified for open source)
-    from tools.download_tools import get_download_file_tool
+    from tools.download_tools import get_download_file_tool, get_download_files_tool
     from tools.cortex_browser_tools import get_cortex_browser_tool
 
     coder_tools = [
         get_download_file_tool(work_dir),
+        get_download_files_tool(work_dir),
         get_cortex_browser_tool(work_dir),
     ] + get_file_tools(executor_work_dir=work_dir)
 
     # Create coder agent
     coder_system_message = await get_system_message("coder", request_id or "unknown", work_dir)
     coder_tools.append(get_code_execution_tool(work_dir))
+    coder_tools.append(get_read_tool_output_tool(work_dir))
 
     coder_agent = AssistantAgent(
         "coder_agent",
-        model_client=default_model_client,
+        model_client=tag_model_client(default_model_client, "agent_turn", "coder_agent"),
+        model_context=create_agent_model_context("coder_agent", context_memory, work_dir),
         description="PRIMARY CODE EXECUTOR: I analyze task intent and generate appropriate deliverables. **CRITICAL**: DO NOT select me until planner_agent has created the execution plan. I execute the plan. No status updates or progress messages.",
         system_message=coder_system_message,
         tools=coder_tools,
@@ -202,7 +162,8 @@ async def get_agents(
     execution_completion_verifier_system_message = get_execution_completion_verifier_system_message()
     execution_completion_verifier_agent = AssistantAgent(
         "execution_completion_verifier_agent",
-        model_client=default_model_client,
+        model_client=tag_model_client(default_model_client, "agent_turn", "execution_completion_verifier_agent"),
+        model_context=create_agent_model_context("execution_completion_verifier_agent", context_memory, work_dir),
         description="**PRESENTATION QUALITY SCORER - ONLY SELECT ME AFTER PRESENTER**: I MUST be selected immediately after presenter_agent completes a presentation. **SELECTION RULE**: Only select me if the previous agent was presenter_agent. NEVER select me after any other agent (planner, coder, etc). After I score the presentation, I route to: (1) presenter_agent for simple fixes/re-uploads, or (2) planner_agent for complex issues requiring replanning (planner will then route back to presenter for the improved presentation).",
         system_message=execution_completion_verifier_system_message,
         tools=[url_validation_tool],
@@ -213,9 +174,10 @@ async def get_agents(
     presenter_system_message = await get_system_message("presenter", request_id or "unknown", work_dir)
     presenter_agent = AssistantAgent(
         "presenter_agent",
-        model_client=default_model_client,
+        model_client=tag_model_client(default_model_client, "agent_turn", "presenter_agent"),
+        model_context=create_agent_model_context("presenter_agent", context_memory, work_dir),
         description="Creates final user presentations by uploading deliverable files and formatting them into compelling presentations. **CRITICAL WORKFLOW**: (1) Upload files using upload_tool (files marked internally with '📁 Ready for upload:' - internal system signals, NOT user-facing), (2) Create presentation with download links - NEVER hallucinate URLs, (3) After presenting, STOP - DO NOT SELECT ANOTHER AGENT. **MANDATORY NEXT STEP**: The VERY NEXT agent selection MUST be execution_completion_verifier_agent to score my presentation. **ITERATIVE IMPROVEMENT**: Select me when 'EXECUTION_COMPLETE_FILES_READY_PRESENTATION_IMPROVEMENT_NEEDED' is detected - I will enhance the previous presentation to achieve >90 score by improving narrative, formatting, insights, and user experience. Select me when execution is complete and files are ready for upload. If verifier finds issues, I will be called again to fix and re-present. Outputs only final, meaningful results. No status updates or progress messages.",
-        tools=[get_read_file_tool(work_dir), get_upload_tool(work_dir), get_code_execution_tool(work_dir)] + get_file_tools(executor_work_dir=work_dir),
+        tools=[get_read_file_tool(work_dir), get_read_tool_output_tool(work_dir), get_upload_tool(work_dir), get_code_execution_tool(work_dir)] + get_file_tools(executor_work_dir=work_dir),
         system_message=presenter_system_message,
         max_tool_iterations=25,
     )
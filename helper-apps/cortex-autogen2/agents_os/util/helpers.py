@@ -4,6 +4,8 @@ from typing import Any, Optional
 import logging
 from typing import List, Dict, Union
 
+from services.work_dir_manager import bind_work_dir, current_work_dir
+
 # =========================================================================
 # Core utility helpers
 # =========================================================================
@@ -108,8 +110,9 @@ def get_work_dir(request_work_dir: Optional[str] = None) -> str:
     """
     Get the working directory for the current request.
     
-    This function ensures CORTEX_WORK_DIR env var is set to the request-specific
-    directory as a safety net, even if agents use os.environ.get('CORTEX_WORK_DIR').
+    A request-specific directory is bound to the current asyncio context, so tools
+    that fall back to the current work dir use it even when several requests
+    share the process (the process-wide CORTEX_WORK_DIR is left alone).
     
     Args:
         request_work_dir: Request-specific work directory (e.g., /tmp/coding/req_XXX)
@@ -117,15 +120,12 @@ def get_work_dir(request_work_dir: Optional[str] = None) -> str:
     Returns:
         The work directory path to use
     """
-    # If request-specific directory provided, use it and set env var as safety net
     if request_work_dir:
-        # Set CORTEX_WORK_DIR to request-specific directory to prevent path mismatches
-        os.environ['CORTEX_WORK_DIR'] = request_work_dir
+        bind_work_dir(request_work_dir)
         return request_work_dir
-    
-    # Fallback to env var or default
-    work_dir = os.getenv('CORTEX_WORK_DIR', '/tmp/coding')
-    return work_dir
+
+    # Fallback to the bound work dir, then env var or default
+    return current_work_dir()
 
 
 def create_request_context_vars(request_id: str, work_dir: str) -> str:
@@ -0,0 +1,128 @@
+"""
+System prompt assembly with a stable, cacheable prefix.
+
+Providers cache prompts by exact prefix, so anything that changes per request
+(time, request id, work dir, learnings) must come after the large static
+guidance. Prompts are assembled as:
+
+    [shared static base] + [agent-specific static text] + [per-request block]
+
+The static parts are compiled once (the shared base at import, each agent's
+text on first use) and reused for every request. Each compiled prefix is
+hashed; ``prompt.prefix_builds{agent,prefix}`` counts how often a prefix was
+served, so a single hash per agent across requests confirms the prefix is
+stable, and ``get_prefix_stats()`` reports size and reuse per agent.
+"""
+import hashlib
+import logging
+from typing import Dict, Optional
+
+from services import metrics
+from ..constants import (
+    BASE_AUTONOMOUS_OPERATION,
+    REQUEST_CONTEXT_HEADER,
+    AUTONOMOUS_EXECUTION_HEADER,
+    TASK_COMPLEXITY_GUIDANCE,
+    FORBIDDEN_PHRASES_COMPONENT,
+    KEY_INSIGHTS_GUIDANCE,
+    WORK_DIR_USAGE,
+    UPLOAD_MARKER_INSTRUCTIONS,
+    FILE_VERIFICATION_INSTRUCTIONS,
+    EMPTY_DATA_VALIDATION_CODER,
+    ERROR_RECOVERY_FRAMEWORK,
+    PROGRESS_LOGGING_FRAMEWORK,
+    TOOL_FAILURE_DETECTION_GUIDANCE,
+    TIMEOUT_HANDLING_GUIDANCE,
+    LOOP_DETECTION_GUIDANCE,
+    WORKSPACE_STATE_AWARENESS,
+    OUTPUT_ONLY_FINAL_RESULTS_PRINCIPLE,
+    DEPENDENCY_WAITING_PRINCIPLE,
+)
+from .helpers import create_request_context_vars
+
+logger = logging.getLogger(__name__)
+
+
+def _compile_static_base() -> str:
+    """Join the request-independent guidance shared by planner, coder and presenter."""
+    # BASE_AUTONOMOUS_OPERATION only contains escaped braces; format() unescapes them
+    autonomous_op = BASE_AUTONOMOUS_OPERATION.format(current_date="", current_year="", current_time="")
+    sections = [
+        autonomous_op,
+        WORK_DIR_USAGE,
+        AUTONOMOUS_EXECUTION_HEADER,
+        OUTPUT_ONLY_FINAL_RESULTS_PRINCIPLE,
+        DEPENDENCY_WAITING_PRINCIPLE,
+        TASK_COMPLEXITY_GUIDANCE,
+        FORBIDDEN_PHRASES_COMPONENT,
+        KEY_INSIGHTS_GUIDANCE,
+        UPLOAD_MARKER_INSTRUCTIONS,
+        FILE_VERIFICATION_INSTRUCTIONS,
+        EMPTY_DATA_VALIDATION_CODER,
+        ERROR_RECOVERY_FRAMEWORK,
+        PROGRESS_LOGGING_FRAMEWORK,
+        TOOL_FAILURE_DETECTION_GUIDANCE,
+        TIMEOUT_HANDLING_GUIDANCE,
+        LOOP_DETECTION_GUIDANCE,
+        WORKSPACE_STATE_AWARENESS,
+    ]
+    return "\n\n".join(section.strip() for section in sections)
+
+
+# Compiled once at import
+STATIC_BASE_MESSAGE = _compile_static_base()
+
+# agent_type -> compiled static prefix (base + agent-specific text)
+_compiled_prefixes: Dict[str, str] = {}
+# agent_type -> {"hash", "chars", "builds"}
+_prefix_stats: Dict[str, dict] = {}
+
+
+def prefix_hash(text: str) -> str:
+    """Short, stable hash of a prompt prefix."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:12]
+
+
+def get_compiled_prefix(agent_type: str) -> Optional[str]:
+    """Return the compiled static prefix for ``agent_type`` if it was registered."""
+    return _compiled_prefixes.get(agent_type)
+
+
+def register_prefix(agent_type: str, agent_static_message: str, include_base: bool = True) -> str:
+    """Compile and cache the static prefix of an agent's prompt."""
+    parts = [STATIC_BASE_MESSAGE] if include_base else []
+    if agent_static_message:
+        parts.append(agent_static_message.strip())
+    prefix = "\n\n".join(parts)
+    _compiled_prefixes[agent_type] = prefix
+    digest = prefix_hash(prefix)
+    _prefix_stats[agent_type] = {"hash": digest, "chars": len(prefix), "builds": 0}
+    metrics.set_gauge("prompt.prefix_chars", len(prefix), agent=agent_type)
+    logger.info(f"🧩 Compiled {agent_type} prompt prefix: {len(prefix)} chars, hash {digest}")
+    return prefix
+
+
+def build_request_block(request_id: str, work_dir: str, planner_learnings: Optional[str] = None) -> str:
+    """Small per-request trailer: request context and optional learnings."""
+    block = REQUEST_CONTEXT_HEADER.format(request_vars=create_request_context_vars(request_id, work_dir).strip()).strip()
+    if planner_learnings:
+        block += f"\n\nHistorical Learnings (internal):\n{planner_learnings}"
+    return block
+
+
+def assemble(agent_type: str, request_id: str, work_dir: str, planner_learnings: Optional[str] = None) -> str:
+    """Assemble ``compiled prefix + per-request block`` and record prefix metrics."""
+    prefix = _compiled_prefixes[agent_type]
+    stats = _prefix_stats[agent_type]
+    stats["builds"] += 1
+    metrics.increment("prompt.prefix_builds", agent=agent_type, prefix=stats["hash"])
+    return prefix + "\n\n" + build_request_block(request_id, work_dir, planner_learnings)
+
+
+def get_prefix_stats() -> Dict[str, dict]:
+    """Per-agent prefix hash, size (chars, ~tokens) and number of prompts served from it."""
+    return {
+        agent: {**stats, "approx_tokens": stats["chars"] // 4}
+        for agent, stats in _prefix_stats.items()
+    }
+
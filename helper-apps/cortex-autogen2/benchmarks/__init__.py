@@ -0,0 +1,8 @@
+"""
+Offline end-to-end benchmarks for the AutoGen worker.
+
+``run_benchmark`` drives ``TaskProcessor.process_task`` against a mock
+OpenAI-compatible server (``mock_llm_server``), the in-memory queue backend and
+a local Redis stand-in (``redis_stub``), so throughput and latency can be
+measured without real tokens, Azure Queue or Redis.
+"""
@@ -0,0 +1,274 @@
+"""
+Mock OpenAI-compatible chat-completions server for offline benchmarks.
+
+Responses come from a scenario (JSON) of ordered rules; the first rule whose
+``when`` clause matches the request answers it:
+
+    {
+      "latency": {"distribution": "lognormal", "median_ms": 800, "sigma": 0.5},
+      "ttft_fraction": 0.3,
+      "rules": [
+        {"name": "coder",
+         "when": {"tool": "execute_code_bound"},
+         "responses": [
+           {"tool_calls": [{"name": "execute_code_bound", "arguments": {"code": "print(1)"}}]},
+           {"content": "Done.\\n📁 Ready for upload: report.json"}
+         ]},
+        {"name": "default", "responses": [{"content": "OK"}]}
+      ]
+    }
+
+``when`` keys (all optional, all must match): ``tool`` (a tool offered in the
+request), ``system`` (regex over system messages), ``pattern`` (regex over all
+message text) and ``model``. The n-th entry of ``responses`` answers a request
+that already carries n tool results, so a rule can script "call a tool, then
+answer" without server-side state; the last entry repeats. Responses are either
+the compact form above or recorded OpenAI assistant messages (``tool_calls``
+with ``function.arguments`` strings); ``responses_file`` loads them from a JSONL
+file instead.
+
+Latency specs (scenario-wide or per rule): a number (fixed ms) or
+``{"distribution": "fixed" | "uniform" | "normal" | "lognormal", ...}``.
+Streaming requests get their first token after ``ttft_fraction`` of the sampled
+latency and the rest spread over the remainder.
+"""
+import asyncio
+import json
+import logging
+import math
+import os
+import random
+import re
+import time
+import uuid
+from typing import Dict, List, Optional
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+
+class LatencyModel:
+    """Samples response latency (seconds) from a configured distribution."""
+
+    def __init__(self, spec=None, rng: Optional[random.Random] = None):
+        if spec is None:
+            spec = {"distribution": "fixed", "ms": 0}
+        elif isinstance(spec, (int, float)):
+            spec = {"distribution": "fixed", "ms": spec}
+        self.spec = spec
+        self.rng = rng or random.Random()
+
+    def sample(self) -> float:
+        spec = self.spec
+        distribution = spec.get("distribution", "fixed")
+        if distribution == "fixed":
+            ms = spec.get("ms", 0)
+        elif distribution == "uniform":
+            ms = self.rng.uniform(spec.get("min_ms", 0), spec.get("max_ms", 0))
+        elif distribution == "normal":
+            ms = self.rng.gauss(spec.get("mean_ms", 0), spec.get("std_ms", 0))
+        elif distribution == "lognormal":
+            ms = self.rng.lognormvariate(math.log(max(1e-3, spec.get("median_ms", 1))), spec.get("sigma", 0.5))
+        else:
+            raise ValueError(f"Unknown latency distribution '{distribution}'")
+        return max(0.0, ms) / 1000
+
+
+def parse_latency_spec(text: str) -> dict:
+    """Parse a CLI latency spec: ``200``, ``fixed:200``, ``uniform:100:400``,
+    ``normal:500:100`` or ``lognormal:800:0.5`` (median ms, sigma)."""
+    parts = text.split(":")
+    if len(parts) == 1:
+        return {"distribution": "fixed", "ms": float(parts[0])}
+    distribution, values = parts[0], [float(value) for value in parts[1:]]
+    keys = {"fixed": ("ms",), "uniform": ("min_ms", "max_ms"), "normal": ("mean_ms", "std_ms"),
+            "lognormal": ("median_ms", "sigma")}.get(distribution)
+    if keys is None or len(values) != len(keys):
+        raise ValueError(f"Invalid latency spec '{text}'")
+    return {"distribution": distribution, **dict(zip(keys, values))}
+
+
+def _message_text(message: dict) -> str:
+    content = message.get("content")
+    if isinstance(content, list):
+        return "\n".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return content or ""
+
+
+def _normalize_response(response: dict) -> dict:
+    """Compact or recorded OpenAI form -> ``{"content", "tool_calls": [{"id", "name", "arguments"}]}``."""
+    tool_calls = []
+    for call in response.get("tool_calls") or []:
+        function = call.get("function", call)
+        arguments = function.get("arguments", {})
+        tool_calls.append({
+            "id": call.get("id") or f"call_{uuid.uuid4().hex[:24]}",
+            "name": function["name"],
+            "arguments": arguments if isinstance(arguments, str) else json.dumps(arguments),
+        })
+    return {"content": response.get("content"), "tool_calls": tool_calls,
+            "completion_tokens": response.get("completion_tokens")}
+
+
+class ResponseRule:
+    """One scenario rule: a ``when`` clause and the scripted responses."""
+
+    def __init__(self, spec: dict, base_dir: str = ".", rng: Optional[random.Random] = None):
+        self.name = spec.get("name", "rule")
+        when = spec.get("when", {})
+        self.tool = when.get("tool")
+        self.model = when.get("model")
+        self.system = re.compile(when["system"], re.IGNORECASE) if when.get("system") else None
+        self.pattern = re.compile(when["pattern"], re.IGNORECASE) if when.get("pattern") else None
+        self.latency = LatencyModel(spec["latency"], rng) if "latency" in spec else None
+        responses = spec.get("responses") or []
+        if spec.get("responses_file"):
+            with open(os.path.join(base_dir, spec["responses_file"]), encoding="utf-8") as f:
+                responses = [json.loads(line) for line in f if line.strip()]
+        if not responses:
+            raise ValueError(f"Rule '{self.name}' has no responses")
+        self.responses = responses
+
+    def matches(self, body: dict) -> bool:
+        messages = body.get("messages") or []
+        if self.model and body.get("model") != self.model:
+            return False
+        if self.tool:
+            offered = {tool.get("function", {}).get("name") for tool in body.get("tools") or []}
+            if self.tool not in offered:
+                return False
+        if self.system and not any(self.system.search(_message_text(m)) for m in messages if m.get("role") == "system"):
+            return False
+        if self.pattern and not any(self.pattern.search(_message_text(m)) for m in messages):
+            return False
+        return True
+
+    def pick(self, body: dict) -> dict:
+        tool_results = sum(1 for message in body.get("messages") or [] if message.get("role") == "tool")
+        return _normalize_response(self.responses[min(tool_results, len(self.responses) - 1)])
+
+
+class MockLLMServer:
+    """Serves ``/v1/chat/completions`` (plain and streaming) from a scenario."""
+
+    def __init__(self, scenario: dict, host: str = "127.0.0.1", port: int = 0,
+                 latency: Optional[dict] = None, seed: Optional[int] = None, base_dir: str = "."):
+        self.host = host
+        self.port = port
+        self.rng = random.Random(seed)
+        self.latency = LatencyModel(latency or scenario.get("latency"), self.rng)
+        self.ttft_fraction = float(scenario.get("ttft_fraction", 0.3))
+        self.rules = [ResponseRule(rule, base_dir, self.rng) for rule in scenario.get("rules", [])]
+        if not self.rules:
+            raise ValueError("Scenario has no rules")
+        self.requests_by_rule: Dict[str, int] = {}
+        self.streamed = 0
+        self._runner: Optional[web.AppRunner] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}/v1"
+
+    async def start(self) -> str:
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_post("/v1/chat/completions", self._handle_chat)
+        app.router.add_post("/chat/completions", self._handle_chat)
+        app.router.add_get("/v1/models", self._handle_models)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = self._runner.addresses[0][1]
+        logger.info(f"🧪 Mock LLM server listening on {self.base_url}")
+        return self.base_url
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def _match(self, body: dict) -> ResponseRule:
+        for rule in self.rules:
+            if rule.matches(body):
+                return rule
+        return self.rules[-1]
+
+    async def _handle_models(self, request: web.Request) -> web.Response:
+        return web.json_response({"object": "list", "data": []})
+
+    async def _handle_chat(self, request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        rule = self._match(body)
+        self.requests_by_rule[rule.name] = self.requests_by_rule.get(rule.name, 0) + 1
+        response = rule.pick(body)
+        latency = (rule.latency or self.latency).sample()
+
+        prompt_tokens = sum(len(_message_text(m)) for m in body.get("messages") or []) // 4
+        completion_tokens = response["completion_tokens"] or max(
+            1, (len(response["content"] or "") + sum(len(call["arguments"]) for call in response["tool_calls"])) // 4)
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                 "total_tokens": prompt_tokens + completion_tokens}
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        model = body.get("model", "mock")
+        finish_reason = "tool_calls" if response["tool_calls"] else "stop"
+
+        if body.get("stream"):
+            self.streamed += 1
+            include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+            return await self._stream(request, response, latency, completion_id, model, finish_reason,
+                                      usage if include_usage else None)
+
+        await asyncio.sleep(latency)
+        message = {"role": "assistant", "content": response["content"]}
+        if response["tool_calls"]:
+            message["tool_calls"] = [
+                {"id": call["id"], "type": "function", "function": {"name": call["name"], "arguments": call["arguments"]}}
+                for call in response["tool_calls"]
+            ]
+        return web.json_response({
+            "id": completion_id, "object": "chat.completion", "created": int(time.time()), "model": model,
+            "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+            "usage": usage,
+        })
+
+    async def _stream(self, request: web.Request, response: dict, latency: float, completion_id: str,
+                      model: str, finish_reason: str, usage: Optional[dict]) -> web.StreamResponse:
+        stream = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+        await stream.prepare(request)
+
+        async def send(choices: List[dict], extra: Optional[dict] = None) -> None:
+            chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                     "model": model, "choices": choices, **(extra or {})}
+            await stream.write(f"data: {json.dumps(chunk)}\n\n".encode())
+
+        await asyncio.sleep(latency * self.ttft_fraction)
+        await send([{"index": 0, "delta": {"role": "assistant", "content": ""}, "finish_reason": None}])
+
+        content = response["content"] or ""
+        pieces = [content[i:i + 40] for i in range(0, len(content), 40)]
+        gap = latency * (1 - self.ttft_fraction) / max(1, len(pieces) + len(response["tool_calls"]))
+        for piece in pieces:
+            await send([{"index": 0, "delta": {"content": piece}, "finish_reason": None}])
+            await asyncio.sleep(gap)
+        for index, call in enumerate(response["tool_calls"]):
+            delta = {"tool_calls": [{"index": index, "id": call["id"], "type": "function",
+                                     "function": {"name": call["name"], "arguments": call["arguments"]}}]}
+            await send([{"index": 0, "delta": delta, "finish_reason": None}])
+            await asyncio.sleep(gap)
+
+        await send([{"index": 0, "delta": {}, "finish_reason": finish_reason}])
+        if usage:
+            await send([], {"usage": usage})
+        await stream.write(b"data: [DONE]\n\n")
+        await stream.write_eof()
+        return stream
+
+    def stats(self) -> dict:
+        return {"requests": sum(self.requests_by_rule.values()), "streamed": self.streamed,
+                "requests_by_rule": dict(self.requests_by_rule)}
+
+
+def load_scenario(path: str) -> dict:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
@@ -0,0 +1,149 @@
+"""
+Minimal in-process Redis stand-in for offline benchmarks.
+
+Implements the commands the worker's progress publisher uses (``PING``,
+``PUBLISH``, ``SET``/``GET`` with expiry, ``DEL``, ``EXISTS``, ``EXPIRE``,
+``XADD`` with ``MAXLEN``) plus the connection handshake redis-py sends
+(``HELLO``, ``CLIENT SETINFO``). Publishes are counted per channel; nothing is
+delivered to subscribers. Stream entries are kept (capped) but never expire.
+"""
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class RedisStub:
+    """Serves a small subset of Redis over TCP from a dict."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self.host = host
+        self.port = port
+        self.published: Dict[str, int] = {}
+        self.commands: Dict[str, int] = {}
+        # key -> (value, expires_at or None)
+        self._data: Dict[bytes, Tuple[bytes, Optional[float]]] = {}
+        self._streams: Dict[bytes, List[List[bytes]]] = {}
+        self.stream_entries = 0
+        self._server: Optional[asyncio.base_events.Server] = None
+        self._connections: Set[asyncio.StreamWriter] = set()
+
+    @property
+    def url(self) -> str:
+        return f"redis://{self.host}:{self.port}/0"
+
+    async def start(self) -> str:
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info(f"🧪 Redis stand-in listening on {self.url}")
+        return self.url
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            for writer in list(self._connections):
+                writer.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _read_command(self, reader: asyncio.StreamReader) -> Optional[List[bytes]]:
+        line = await reader.readline()
+        if not line:
+            return None
+        if not line.startswith(b"*"):
+            return line.strip().split()  # Inline command (e.g. from redis-cli / telnet)
+        args = []
+        for _ in range(int(line[1:])):
+            length = int((await reader.readline())[1:])
+            args.append((await reader.readexactly(length + 2))[:-2])
+        return args
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self._connections.add(writer)
+        try:
+            while True:
+                args = await self._read_command(reader)
+                if args is None:
+                    break
+                if args:
+                    writer.write(self._execute(args))
+                    await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._connections.discard(writer)
+            writer.close()
+
+    def _get(self, key: bytes) -> Optional[bytes]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[key]
+            return None
+        return value
+
+    def _execute(self, args: List[bytes]) -> bytes:
+        command = args[0].upper().decode()
+        self.commands[command] = self.commands.get(command, 0) + 1
+        if command == "PING":
+            return b"+PONG\r\n"
+        if command in ("CLIENT", "SELECT", "AUTH"):
+            return b"+OK\r\n"
+        if command == "HELLO":
+            # Newer redis-py clients negotiate RESP3 on connect
+            protocol = int(args[1]) if len(args) > 1 else 2
+            fields = b"+server\r\n+redis\r\n+version\r\n+7.0.0\r\n+proto\r\n:%d\r\n" % protocol
+            return (b"%3\r\n" if protocol == 3 else b"*6\r\n") + fields
+        if command == "PUBLISH" and len(args) == 3:
+            channel = args[1].decode(errors="replace")
+            self.published[channel] = self.published.get(channel, 0) + 1
+            return b":0\r\n"
+        if command == "SET" and len(args) >= 3:
+            expires_at = None
+            options = [arg.upper() for arg in args[3:]]
+            for option in (b"EX", b"PX"):
+                if option in options:
+                    amount = float(args[3 + options.index(option) + 1])
+                    expires_at = time.monotonic() + (amount if option == b"EX" else amount / 1000)
+            self._data[args[1]] = (args[2], expires_at)
+            return b"+OK\r\n"
+        if command == "GET" and len(args) == 2:
+            value = self._get(args[1])
+            return b"$-1\r\n" if value is None else b"$%d\r\n%s\r\n" % (len(value), value)
+        if command in ("DEL", "EXISTS") and len(args) >= 2:
+            found = [key for key in args[1:] if self._get(key) is not None]
+            if command == "DEL":
+                for key in found:
+                    self._data.pop(key, None)
+            return b":%d\r\n" % len(found)
+        if command == "XADD" and len(args) >= 5:
+            rest, maxlen = args[2:], None
+            if rest[0].upper() == b"MAXLEN":
+                rest = rest[1:]
+                if rest[0] in (b"~", b"="):
+                    rest = rest[1:]
+                maxlen, rest = int(rest[0]), rest[1:]
+            entries = self._streams.setdefault(args[1], [])
+            entries.append(rest[1:])
+            if maxlen is not None and len(entries) > maxlen:
+                del entries[: len(entries) - maxlen]
+            self.stream_entries += 1
+            entry_id = b"%d-0" % self.stream_entries
+            return b"$%d\r\n%s\r\n" % (len(entry_id), entry_id)
+        if command == "EXPIRE" and len(args) == 3 and args[1] in self._streams:
+            return b":1\r\n"
+        if command == "EXPIRE" and len(args) == 3:
+            value = self._get(args[1])
+            if value is None:
+                return b":0\r\n"
+            self._data[args[1]] = (value, time.monotonic() + float(args[2]))
+            return b":1\r\n"
+        return b"-ERR unknown command '%s'\r\n" % args[0]
+
+    def stats(self) -> dict:
+        return {"published": dict(self.published), "commands": dict(self.commands), "keys": len(self._data),
+                "streams": len(self._streams), "stream_entries": self.stream_entries}
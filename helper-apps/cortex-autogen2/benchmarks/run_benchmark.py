@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+Offline end-to-end benchmark of the AutoGen worker.
+
+Starts a mock OpenAI-compatible server and a Redis stand-in, enqueues N
+synthetic tasks on the in-memory queue and processes them with C concurrent
+slots through ``main.handle_message`` -> ``TaskProcessor.process_task`` (the
+same path as the worker loop). No real tokens, Azure Queue or Redis are used.
+
+Usage (from helper-apps/cortex-autogen2)::
+
+    python -m benchmarks.run_benchmark --tasks 20 --concurrency 4
+    python -m benchmarks.run_benchmark --latency lognormal:1500:0.6 --output after.json --baseline before.json
+
+Reports throughput, p50/p95/p99 task latency (enqueue to done) and processing
+time, LLM calls per task (from each task's ``logs/llm_summary.json``) and peak
+RSS of the process (mock services included). ``--baseline`` prints the change
+against a previous ``--output`` file.
+"""
+import argparse
+import asyncio
+import base64
+import json
+import logging
+import math
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if APP_DIR not in sys.path:
+    sys.path.insert(0, APP_DIR)
+
+from benchmarks.mock_llm_server import MockLLMServer, load_scenario, parse_latency_spec
+from benchmarks.redis_stub import RedisStub
+from benchmarks.service_thread import ServiceThread
+
+logger = logging.getLogger("benchmark")
+
+DEFAULT_SCENARIO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scenarios", "default.json")
+DEFAULT_TASK = "Compute the squares of 0-99, save them as report.json and present a short summary."
+QUEUE_NAME = "benchmark"
+# Compared against --baseline (name -> True when higher is better)
+KEY_RESULTS = {
+    "throughput_tasks_per_min": True,
+    "latency_p50_s": False,
+    "latency_p95_s": False,
+    "latency_p99_s": False,
+    "llm_calls_per_task": False,
+    "mock_llm_requests_per_task": False,
+    "peak_rss_mb": False,
+}
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return round(ordered[rank - 1], 3)
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def configure_environment(llm_url: str, redis_url: str, work_root: str, tasks: int) -> None:
+    """Point the worker at the stand-ins and keep every task's work dir for the report."""
+    os.environ["CORTEX_API_BASE_URL"] = llm_url
+    os.environ["REDIS_CONNECTION_STRING"] = redis_url
+    os.environ["QUEUE_BACKEND"] = "memory"
+    os.environ["WORK_DIR_ROOT"] = work_root
+    os.environ.setdefault("CORTEX_API_KEY", "benchmark")
+    os.environ.setdefault("WORK_DIR_KEEP_RECENT", str(tasks + 10))
+    os.environ.setdefault("WORK_DIR_DELETE_AFTER_UPLOAD", "false")
+
+
+def read_task_outcome(work_dir: str) -> Dict:
+    outcome = {"status": "unknown", "llm": None}
+    try:
+        with open(os.path.join(work_dir, ".workdir_state.json"), encoding="utf-8") as f:
+            outcome["status"] = json.load(f).get("status", "unknown")
+    except (OSError, ValueError):
+        pass
+    try:
+        with open(os.path.join(work_dir, "logs", "llm_summary.json"), encoding="utf-8") as f:
+            outcome["llm"] = json.load(f)
+    except (OSError, ValueError):
+        pass
+    return outcome
+
+
+async def run_tasks(args) -> Dict:
+    # Imported after configure_environment: model clients and backends read env on first use
+    from main import handle_message
+    from services.memory_queue import get_memory_queue
+    from services.work_dir_manager import get_work_dir_manager
+    from task_processor import TaskProcessor
+
+    queue = get_memory_queue(QUEUE_NAME)
+    for index in range(args.tasks):
+        payload = json.dumps({"request_id": f"bench-{index}", "content": args.task})
+        await queue.send_task(base64.b64encode(payload.encode("utf-8")).decode("utf-8"))
+
+    processors = [TaskProcessor() for _ in range(args.concurrency)]
+    for processor in processors:
+        await processor.initialize()
+
+    task_results: List[Dict] = []
+
+    async def slot(processor) -> None:
+        while True:
+            message = await queue.get_task()
+            if not message:
+                return
+            started = time.time()
+            try:
+                await handle_message(message, queue, processor)
+                error = None
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+            finished = time.time()
+            outcome = read_task_outcome(get_work_dir_manager().path_for(message["id"]))
+            task_results.append({
+                "task_id": message["id"],
+                "latency_s": finished - (message.get("enqueued_at") or started),
+                "processing_s": finished - started,
+                "status": "error" if error else outcome["status"],
+                "error": error,
+                "llm": outcome["llm"],
+            })
+            logger.info(f"⏱️ Task {message['id']} {task_results[-1]['status']} in {finished - started:.2f}s "
+                        f"({len(task_results)}/{args.tasks})")
+
+    started = time.time()
+    try:
+        await asyncio.gather(*(slot(processor) for processor in processors))
+        wall_s = time.time() - started
+        await drain_background_tasks(processors, args.drain_seconds)
+    finally:
+        for processor in processors:
+            await processor.close()
+    return {"wall_s": wall_s, "tasks": task_results}
+
+
+async def drain_background_tasks(processors, timeout: float) -> None:
+    """Give the worker's known background work (post-task jobs, progress enrichment) time to finish.
+
+    Only those tasks are waited for and cancelled; autogen runtime tasks are left to
+    ``TaskProcessor.close``.
+    """
+    from services.post_task_queue import get_post_task_queue
+
+    deadline = time.monotonic() + timeout
+    await get_post_task_queue().drain(timeout=timeout)
+    enrichment = {task for processor in processors if processor.progress_handler
+                  for task in list(processor.progress_handler._enrichment_tasks.values())}
+    if enrichment:
+        _, pending = await asyncio.wait(enrichment, timeout=max(0.0, deadline - time.monotonic()))
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+
+def build_report(args, run: Dict, llm_server: MockLLMServer, redis_stub: RedisStub) -> Dict:
+    tasks = run["tasks"]
+    latencies = [task["latency_s"] for task in tasks]
+    processing = [task["processing_s"] for task in tasks]
+    summaries = [task["llm"] for task in tasks if task["llm"]]
+    by_purpose: Dict[str, int] = {}
+    for summary in summaries:
+        for purpose, entry in summary.get("by_purpose", {}).items():
+            by_purpose[purpose] = by_purpose.get(purpose, 0) + entry["calls"]
+    statuses: Dict[str, int] = {}
+    for task in tasks:
+        statuses[task["status"]] = statuses.get(task["status"], 0) + 1
+
+    return {
+        "config": {
+            "tasks": args.tasks,
+            "concurrency": args.concurrency,
+            "scenario": os.path.abspath(args.scenario),
+            "latency": args.latency,
+            "seed": args.seed,
+        },
+        "wall_s": round(run["wall_s"], 3),
+        "throughput_tasks_per_min": round(len(tasks) / run["wall_s"] * 60, 2) if run["wall_s"] else None,
+        "latency_p50_s": percentile(latencies, 50),
+        "latency_p95_s": percentile(latencies, 95),
+        "latency_p99_s": percentile(latencies, 99),
+        "processing_p50_s": percentile(processing, 50),
+        "processing_p95_s": percentile(processing, 95),
+        "processing_p99_s": percentile(processing, 99),
+        "llm_calls_per_task": round(sum(s["calls"] for s in summaries) / len(summaries), 2) if summaries else None,
+        "llm_calls_per_task_by_purpose": {purpose: round(calls / len(summaries), 2)
+                                          for purpose, calls in sorted(by_purpose.items())} if summaries else {},
+        # Higher than llm_calls_per_task when calls escape task accounting (e.g. work left running after a task)
+        "mock_llm_requests_per_task": round(llm_server.stats()["requests"] / len(tasks), 2) if tasks else None,
+        "peak_rss_mb": peak_rss_mb(),
+        "statuses": statuses,
+        "errors": [task["error"] for task in tasks if task["error"]][:10],
+        "mock_llm": llm_server.stats(),
+        "redis": redis_stub.stats(),
+    }
+
+
+def print_report(report: Dict, baseline: Optional[Dict]) -> None:
+    print(f"\n📈 Benchmark: {report['config']['tasks']} tasks, concurrency {report['config']['concurrency']}, "
+          f"wall {report['wall_s']}s, statuses {report['statuses']}")
+    for key in ("throughput_tasks_per_min", "latency_p50_s", "latency_p95_s", "latency_p99_s",
+                "processing_p50_s", "processing_p95_s", "processing_p99_s", "llm_calls_per_task",
+                "mock_llm_requests_per_task", "peak_rss_mb"):
+        line = f"  {key:<28} {report[key]}"
+        if baseline and key in KEY_RESULTS and report.get(key) is not None and baseline.get(key):
+            change = (report[key] - baseline[key]) / baseline[key] * 100
+            better = (change > 0) == KEY_RESULTS[key]
+            line += f"   (baseline {baseline[key]}, {change:+.1f}% {'✅' if better or change == 0 else '⚠️'})"
+        print(line)
+    if report["llm_calls_per_task_by_purpose"]:
+        print("  LLM calls per task by purpose: " + ", ".join(
+            f"{purpose}={calls}" for purpose, calls in report["llm_calls_per_task_by_purpose"].items()))
+    print(f"  Mock LLM requests: {report['mock_llm']['requests_by_rule']}")
+    for error in report["errors"]:
+        print(f"  ❌ {error}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark of the AutoGen worker.")
+    parser.add_argument("--tasks", type=int, default=10, help="Number of synthetic tasks (default 10)")
+    parser.add_argument("--concurrency", type=int, default=1,
+                        help="Concurrent task slots (default 1, matching WORKER_CONCURRENCY)")
+    parser.add_argument("--scenario", default=DEFAULT_SCENARIO, help="Mock LLM scenario JSON")
+    parser.add_argument("--latency", help="Override the scenario's default latency, e.g. lognormal:800:0.5")
+    parser.add_argument("--task", default=DEFAULT_TASK, help="Task text sent with every synthetic task")
+    parser.add_argument("--seed", type=int, default=42, help="Seed for latency sampling")
+    parser.add_argument("--output", help="Write the report as JSON")
+    parser.add_argument("--baseline", help="Previous --output file to compare against")
+    parser.add_argument("--drain-seconds", type=float, default=10.0,
+                        help="Time given to background work after the last task before shutdown (default 10)")
+    parser.add_argument("--keep-work-dirs", action="store_true", help="Keep the temporary work dirs")
+    parser.add_argument("--log-level", default="WARNING", help="Worker log level (default WARNING)")
+    args = parser.parse_args()
+
+    # Configured before the worker modules are imported (main.py calls basicConfig too)
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s - %(levelname)s - %(message)s")
+    logger.setLevel(logging.INFO)
+
+    scenario = load_scenario(args.scenario)
+    llm_server = MockLLMServer(
+        scenario,
+        latency=parse_latency_spec(args.latency) if args.latency else None,
+        seed=args.seed,
+        base_dir=os.path.dirname(os.path.abspath(args.scenario)),
+    )
+    redis_stub = RedisStub()
+    services = ServiceThread()
+    work_root = tempfile.mkdtemp(prefix="cortex_bench_")
+    try:
+        llm_url = services.run(llm_server.start())
+        redis_url = services.run(redis_stub.start())
+        configure_environment(llm_url, redis_url, work_root, args.tasks)
+        logger.info(f"🏁 Running {args.tasks} tasks at concurrency {args.concurrency} (work dirs in {work_root})")
+
+        run = asyncio.run(run_tasks(args))
+        report = build_report(args, run, llm_server, redis_stub)
+    finally:
+        services.run(llm_server.stop())
+        services.run(redis_stub.stop())
+        services.stop()
+        if not args.keep_work_dirs:
+            shutil.rmtree(work_root, ignore_errors=True)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n💾 Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
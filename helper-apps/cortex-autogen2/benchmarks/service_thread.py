@@ -0,0 +1,34 @@
+"""
+Runs benchmark stand-in services on their own event loop in a daemon thread.
+
+The Redis publisher uses the synchronous redis client and the mock LLM server
+should not compete with the worker for its event loop, so both stand-ins are
+served from a separate loop.
+"""
+import asyncio
+import threading
+from typing import Optional
+
+
+class ServiceThread:
+    """An event loop running in a daemon thread; coroutines are submitted with ``run``."""
+
+    def __init__(self, name: str = "benchmark-services"):
+        self.loop = asyncio.new_event_loop()
+        self._thread: Optional[threading.Thread] = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def run(self, coro, timeout: Optional[float] = 30.0):
+        """Run ``coro`` on the service loop and wait for its result."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout=5)
+        self._thread = None
@@ -84,6 +84,10 @@ class CognitiveJourneyMapper:
         self.active_journeys: Dict[str, CognitiveJourney] = {}
         self.journey_patterns: Dict[str, List[Dict]] = {}
 
+        # Journeys of failed/abandoned tasks are never completed; release them with the request
+        from services.request_state import get_request_state_registry
+        get_request_state_registry().track(self, "active_journeys")
+
     def start_journey(self, task_id: str, initial_agents: List[str]) -> CognitiveJourney:
         """Start tracking a new cognitive journey."""
         journey = CognitiveJourney(
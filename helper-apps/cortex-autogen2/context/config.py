@@ -16,6 +16,16 @@ AGENT_CONTEXT_LIMITS = {
     "default": 3000  # Default for other agents
 }
 
+# Token budgets for each agent's model context (conversation window sent to the LLM).
+# Older turns beyond the budget are folded into a summary; see context/model_context.py
+AGENT_CONTEXT_BUDGETS = {
+    "planner_agent": 30000,
+    "coder_agent": 60000,
+    "presenter_agent": 80000,  # Needs the most history to present results
+    "execution_completion_verifier_agent": 40000,
+    "default": 50000
+}
+
 # Agent role descriptions for context filtering
 AGENT_ROLE_DESCRIPTIONS = {
     "planner_agent": "Creates comprehensive execution strategies and identifies required data sources for complex tasks requiring multiple agents.",
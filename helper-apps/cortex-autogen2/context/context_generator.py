@@ -68,9 +68,11 @@ Be specific, accurate, and comprehensive. Base everything on actual events, not
         try:
             from autogen_core.models import UserMessage
             
+            from task_processor.llm_instrumentation import llm_call_tags
             messages = [UserMessage(content=prompt, source="context_generator")]
             
-            response = await self.model_client.create(messages=messages)
+            with llm_call_tags("context_summary"):
+                response = await self.model_client.create(messages=messages)
             
             # Handle response format - check for content attribute first (OpenAI-compatible)
             summary = None
@@ -213,9 +215,11 @@ CRITICAL: Always include "STEPS TAKEN SO FAR" section to help agent detect loops
         try:
             from autogen_core.models import UserMessage
             
+            from task_processor.llm_instrumentation import llm_call_tags
             messages = [UserMessage(content=prompt, source="context_generator")]
             
-            response = await self.model_client.create(messages=messages)
+            with llm_call_tags("context_summary"):
+                response = await self.model_client.create(messages=messages)
             
             # Handle response format - check for content attribute
             if response and hasattr(response, 'content'):
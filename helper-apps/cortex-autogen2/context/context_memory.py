@@ -83,6 +83,10 @@ class ContextMemory:
         """Record message (input/output/tool_call)."""
         self.event_recorder.record_message(agent_name, message_type, content, metadata)
     
+    def recent_file_names(self, limit: int = 3) -> list:
+        """Base names of the most recently created files (for progress messages)."""
+        return self.event_recorder.recent_file_names(limit)
+    
     # Delegate file summary methods to FileSummarizer
     def get_file_summaries(self) -> dict:
         """Extract and summarize all created files with content previews."""
@@ -88,6 +88,10 @@ class EventRecorder:
                     except Exception:
                         pass
     
+    def recent_file_names(self, limit: int = 3) -> list:
+        """Base names of the most recently recorded files, oldest first."""
+        return [os.path.basename(path) for path in list(self._logged_files)[-limit:]]
+    
     def _save_event(self, event: dict):
         """Append event to JSONL file."""
         try:
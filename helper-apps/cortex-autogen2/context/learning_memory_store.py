@@ -0,0 +1,354 @@
+"""
+Learning Memory Stores
+
+Durable backends for ``LearningMemory``. Patterns (success, failure, insight)
+are kept per task type with the same caps as before, and strategy
+effectiveness is aggregated incrementally on every record, so recommendation
+queries are indexed lookups instead of scans.
+
+- ``SQLiteLearningStore`` (default): a local database at ``LEARNING_MEMORY_DB``,
+  shared by the workers of one host.
+- ``RedisLearningStore`` (``LEARNING_MEMORY_BACKEND=redis``): keys under
+  ``LEARNING_MEMORY_REDIS_PREFIX`` on ``REDIS_CONNECTION_STRING``, shared by all
+  workers.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+PATTERN_KINDS = ("success", "failure", "insight")
+
+
+def _rank(score: float, timestamp: str) -> float:
+    """Sort key for (score, recency) as one number: score first, then seconds since the epoch."""
+    try:
+        seconds = datetime.fromisoformat(timestamp).timestamp()
+    except (TypeError, ValueError):
+        seconds = 0.0
+    return round(float(score), 3) * 1e10 + seconds
+
+
+def _stats(success_count: int, failure_count: int, avg_success_score: float,
+           last_used: Optional[str], task_types: Iterable[str]) -> Dict[str, Any]:
+    return {
+        "success_count": int(success_count),
+        "failure_count": int(failure_count),
+        "avg_success_score": float(avg_success_score),
+        "last_used": last_used,
+        "task_types": set(task_types),
+    }
+
+
+class SQLiteLearningStore:
+    """Learning memory in a local SQLite database (WAL mode, safe across processes on one host)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS patterns (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    kind TEXT NOT NULL,
+                    task_type TEXT NOT NULL,
+                    agent_name TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    score REAL NOT NULL,
+                    timestamp TEXT NOT NULL,
+                    reason TEXT,
+                    record TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS patterns_by_task ON patterns (kind, task_type, id);
+                CREATE INDEX IF NOT EXISTS patterns_by_agent ON patterns (kind, task_type, agent_name, score DESC, timestamp DESC);
+                CREATE TABLE IF NOT EXISTS strategy_stats (
+                    agent_name TEXT NOT NULL,
+                    strategy TEXT NOT NULL,
+                    success_count INTEGER NOT NULL DEFAULT 0,
+                    failure_count INTEGER NOT NULL DEFAULT 0,
+                    avg_success_score REAL NOT NULL DEFAULT 0,
+                    last_used TEXT,
+                    PRIMARY KEY (agent_name, strategy)
+                );
+                CREATE INDEX IF NOT EXISTS strategy_stats_by_score ON strategy_stats (agent_name, avg_success_score DESC);
+                CREATE TABLE IF NOT EXISTS strategy_task_types (
+                    agent_name TEXT NOT NULL,
+                    strategy TEXT NOT NULL,
+                    task_type TEXT NOT NULL,
+                    PRIMARY KEY (agent_name, strategy, task_type)
+                );
+                CREATE TABLE IF NOT EXISTS agent_profiles (
+                    agent_name TEXT PRIMARY KEY,
+                    profile TEXT NOT NULL
+                );
+            """)
+
+    def _query(self, sql: str, params: tuple = ()) -> List[tuple]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def add_pattern(self, kind: str, task_type: str, agent_name: str, key: str, score: float,
+                    timestamp: str, record: Dict[str, Any], keep: int, reason: Optional[str] = None) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO patterns (kind, task_type, agent_name, key, score, timestamp, reason, record) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (kind, task_type, agent_name, key, score, timestamp, reason, json.dumps(record, default=str)),
+            )
+            self._conn.execute(
+                "DELETE FROM patterns WHERE kind = ? AND task_type = ? AND id NOT IN "
+                "(SELECT id FROM patterns WHERE kind = ? AND task_type = ? ORDER BY id DESC LIMIT ?)",
+                (kind, task_type, kind, task_type, keep),
+            )
+
+    def patterns(self, kind: str, task_type: str) -> List[Dict[str, Any]]:
+        """All patterns of a task type, oldest first."""
+        rows = self._query("SELECT record FROM patterns WHERE kind = ? AND task_type = ? ORDER BY id", (kind, task_type))
+        return [json.loads(row[0]) for row in rows]
+
+    def pattern_agents(self, kind: str, task_type: str) -> List[str]:
+        rows = self._query("SELECT DISTINCT agent_name FROM patterns WHERE kind = ? AND task_type = ?", (kind, task_type))
+        return [row[0] for row in rows]
+
+    def top_patterns(self, kind: str, task_type: str, agent_names: List[str], limit: int) -> List[Dict[str, Any]]:
+        """Best patterns by (score, recency) for the given agents."""
+        if not agent_names:
+            return []
+        placeholders = ", ".join("?" * len(agent_names))
+        rows = self._query(
+            f"SELECT record FROM patterns WHERE kind = ? AND task_type = ? AND agent_name IN ({placeholders}) "
+            "ORDER BY score DESC, timestamp DESC LIMIT ?",
+            (kind, task_type, *agent_names, limit),
+        )
+        return [json.loads(row[0]) for row in rows]
+
+    def record_strategy(self, agent_name: str, strategy: str, task_type: str, success: bool,
+                        score: float, timestamp: str) -> None:
+        """Fold one outcome into the strategy's running counts and average success score."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO strategy_stats (agent_name, strategy, success_count, failure_count, avg_success_score, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (agent_name, strategy) DO UPDATE SET "
+                "success_count = success_count + excluded.success_count, "
+                "failure_count = failure_count + excluded.failure_count, "
+                "avg_success_score = CASE WHEN excluded.success_count > 0 "
+                "THEN avg_success_score + (excluded.avg_success_score - avg_success_score) / (success_count + 1) "
+                "ELSE avg_success_score END, "
+                "last_used = excluded.last_used",
+                (agent_name, strategy, int(success), int(not success), score if success else 0.0, timestamp),
+            )
+            self._conn.execute(
+                "INSERT OR IGNORE INTO strategy_task_types (agent_name, strategy, task_type) VALUES (?, ?, ?)",
+                (agent_name, strategy, task_type),
+            )
+
+    def _stats_rows(self, where: str, params: tuple, suffix: str = "") -> Dict[tuple, Dict[str, Any]]:
+        rows = self._query(
+            "SELECT agent_name, strategy, success_count, failure_count, avg_success_score, last_used "
+            f"FROM strategy_stats {where} {suffix}", params)
+        types: Dict[tuple, List[str]] = {}
+        for agent_name, strategy, task_type in self._query(
+                f"SELECT agent_name, strategy, task_type FROM strategy_task_types {where}", params):
+            types.setdefault((agent_name, strategy), []).append(task_type)
+        return {(row[0], row[1]): _stats(*row[2:], types.get((row[0], row[1]), [])) for row in rows}
+
+    def strategy_stats(self, agent_name: str) -> Dict[str, Dict[str, Any]]:
+        rows = self._stats_rows("WHERE agent_name = ?", (agent_name,), "ORDER BY strategy")
+        return {strategy: stats for (_, strategy), stats in rows.items()}
+
+    def top_strategies(self, agent_name: str, limit: int) -> List[tuple]:
+        """(strategy, stats) with at least one success, best average score first."""
+        rows = self._stats_rows("WHERE agent_name = ?", (agent_name,),
+                                f"AND success_count > 0 ORDER BY avg_success_score DESC LIMIT {int(limit)}")
+        return [(strategy, stats) for (_, strategy), stats in rows.items()]
+
+    def all_strategy_stats(self) -> Dict[str, Dict[str, Any]]:
+        return {f"{agent}:{strategy}": stats for (agent, strategy), stats in self._stats_rows("", ()).items()}
+
+    def get_profile(self, agent_name: str) -> Optional[Dict[str, Any]]:
+        rows = self._query("SELECT profile FROM agent_profiles WHERE agent_name = ?", (agent_name,))
+        return json.loads(rows[0][0]) if rows else None
+
+    def put_profile(self, agent_name: str, profile: Dict[str, Any]) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO agent_profiles (agent_name, profile) VALUES (?, ?)",
+                (agent_name, json.dumps(profile, default=str)),
+            )
+
+    def profile_count(self) -> int:
+        return self._query("SELECT COUNT(*) FROM agent_profiles")[0][0]
+
+    def pattern_counts(self) -> Dict[str, int]:
+        counts = dict.fromkeys(PATTERN_KINDS, 0)
+        counts.update(self._query("SELECT kind, COUNT(*) FROM patterns GROUP BY kind"))
+        return counts
+
+    def task_types(self) -> List[str]:
+        return [row[0] for row in self._query("SELECT DISTINCT task_type FROM patterns")]
+
+    def failure_reason_counts(self, limit: int) -> List[tuple]:
+        return self._query(
+            "SELECT reason, COUNT(*) AS n FROM patterns WHERE kind = 'failure' GROUP BY reason ORDER BY n DESC LIMIT ?",
+            (limit,))
+
+
+class RedisLearningStore:
+    """
+    Learning memory shared through Redis.
+
+    Patterns live in a capped list per (kind, task type) plus a sorted set per
+    (kind, task type, agent) ranked by (score, recency); strategy stats are
+    hashes updated with HINCRBY, and each agent has a sorted set of its
+    strategies ranked by average success score.
+    """
+
+    def __init__(self, client, prefix: str = "learning_memory:"):
+        self.client = client
+        self.prefix = prefix
+
+    def _key(self, *parts: str) -> str:
+        return self.prefix + ":".join(parts)
+
+    @staticmethod
+    def _decode(value) -> str:
+        return value.decode() if isinstance(value, bytes) else value
+
+    def add_pattern(self, kind: str, task_type: str, agent_name: str, key: str, score: float,
+                    timestamp: str, record: Dict[str, Any], keep: int, reason: Optional[str] = None) -> None:
+        member = json.dumps(record, default=str, sort_keys=True)
+        list_key = self._key("patterns", kind, task_type)
+        rank_key = self._key("rank", kind, task_type, agent_name)
+        pipe = self.client.pipeline()
+        pipe.rpush(list_key, member)
+        pipe.zadd(rank_key, {member: _rank(score, timestamp)})
+        pipe.zremrangebyrank(rank_key, 0, -(keep + 1))
+        pipe.sadd(self._key("task_types", kind), task_type)
+        pipe.sadd(self._key("agents", kind, task_type), agent_name)
+        length = pipe.execute()[0]
+        if length > keep:
+            # Drop the evicted patterns from their agents' rankings too
+            evicted = self.client.lrange(list_key, 0, length - keep - 1)
+            pipe = self.client.pipeline()
+            pipe.ltrim(list_key, length - keep, -1)
+            for old in evicted:
+                old_agent = json.loads(old).get("agent_name", "")
+                pipe.zrem(self._key("rank", kind, task_type, old_agent), old)
+            pipe.execute()
+
+    def patterns(self, kind: str, task_type: str) -> List[Dict[str, Any]]:
+        return [json.loads(m) for m in self.client.lrange(self._key("patterns", kind, task_type), 0, -1)]
+
+    def pattern_agents(self, kind: str, task_type: str) -> List[str]:
+        return [self._decode(a) for a in self.client.smembers(self._key("agents", kind, task_type))]
+
+    def top_patterns(self, kind: str, task_type: str, agent_names: List[str], limit: int) -> List[Dict[str, Any]]:
+        pipe = self.client.pipeline()
+        for agent_name in agent_names:
+            pipe.zrevrange(self._key("rank", kind, task_type, agent_name), 0, limit - 1, withscores=True)
+        ranked = [(score, member) for result in pipe.execute() for member, score in result]
+        ranked.sort(key=lambda item: item[0], reverse=True)
+        return [json.loads(member) for _, member in ranked[:limit]]
+
+    def record_strategy(self, agent_name: str, strategy: str, task_type: str, success: bool,
+                        score: float, timestamp: str) -> None:
+        stats_key = self._key("strategy", agent_name, strategy)
+        pipe = self.client.pipeline()
+        if success:
+            pipe.hincrby(stats_key, "success_count", 1)
+            pipe.hincrbyfloat(stats_key, "score_sum", score)
+        else:
+            pipe.hincrby(stats_key, "failure_count", 1)
+        pipe.hset(stats_key, "last_used", timestamp)
+        pipe.sadd(self._key("strategy_task_types", agent_name, strategy), task_type)
+        pipe.sadd(self._key("strategies", agent_name), strategy)
+        pipe.sadd(self._key("agents"), agent_name)
+        results = pipe.execute()
+        if success:
+            self.client.zadd(self._key("strategy_rank", agent_name), {strategy: float(results[1]) / results[0]})
+
+    def _read_stats(self, agent_name: str, strategies: List[str]) -> List[Dict[str, Any]]:
+        pipe = self.client.pipeline()
+        for strategy in strategies:
+            pipe.hgetall(self._key("strategy", agent_name, strategy))
+            pipe.smembers(self._key("strategy_task_types", agent_name, strategy))
+        results = pipe.execute()
+        stats = []
+        for fields, types in zip(results[0::2], results[1::2]):
+            fields = {self._decode(k): self._decode(v) for k, v in fields.items()}
+            successes = int(fields.get("success_count", 0))
+            stats.append(_stats(successes, int(fields.get("failure_count", 0)),
+                                float(fields.get("score_sum", 0)) / successes if successes else 0.0,
+                                fields.get("last_used"), (self._decode(t) for t in types)))
+        return stats
+
+    def strategy_stats(self, agent_name: str) -> Dict[str, Dict[str, Any]]:
+        strategies = sorted(self._decode(s) for s in self.client.smembers(self._key("strategies", agent_name)))
+        return dict(zip(strategies, self._read_stats(agent_name, strategies)))
+
+    def top_strategies(self, agent_name: str, limit: int) -> List[tuple]:
+        strategies = [self._decode(s) for s in self.client.zrevrange(self._key("strategy_rank", agent_name), 0, limit - 1)]
+        return list(zip(strategies, self._read_stats(agent_name, strategies)))
+
+    def all_strategy_stats(self) -> Dict[str, Dict[str, Any]]:
+        stats = {}
+        for agent_name in sorted(self._decode(a) for a in self.client.smembers(self._key("agents"))):
+            stats.update({f"{agent_name}:{strategy}": s for strategy, s in self.strategy_stats(agent_name).items()})
+        return stats
+
+    def get_profile(self, agent_name: str) -> Optional[Dict[str, Any]]:
+        raw = self.client.hget(self._key("profiles"), agent_name)
+        return json.loads(raw) if raw else None
+
+    def put_profile(self, agent_name: str, profile: Dict[str, Any]) -> None:
+        self.client.hset(self._key("profiles"), agent_name, json.dumps(profile, default=str))
+
+    def profile_count(self) -> int:
+        return self.client.hlen(self._key("profiles"))
+
+    def _task_types(self, kind: str) -> List[str]:
+        return [self._decode(t) for t in self.client.smembers(self._key("task_types", kind))]
+
+    def pattern_counts(self) -> Dict[str, int]:
+        counts = {}
+        for kind in PATTERN_KINDS:
+            pipe = self.client.pipeline()
+            for task_type in self._task_types(kind):
+                pipe.llen(self._key("patterns", kind, task_type))
+            counts[kind] = sum(pipe.execute())
+        return counts
+
+    def task_types(self) -> List[str]:
+        return list({task_type for kind in PATTERN_KINDS for task_type in self._task_types(kind)})
+
+    def failure_reason_counts(self, limit: int) -> List[tuple]:
+        counts: Dict[str, int] = {}
+        for task_type in self._task_types("failure"):
+            for pattern in self.patterns("failure", task_type):
+                reason = pattern.get("failure_reason")
+                counts[reason] = counts.get(reason, 0) + 1
+        return sorted(counts.items(), key=lambda item: item[1], reverse=True)[:limit]
+
+
+def create_learning_store():
+    """Store selected by LEARNING_MEMORY_BACKEND (``sqlite`` or ``redis``)."""
+    backend = os.getenv("LEARNING_MEMORY_BACKEND", "sqlite").lower()
+    if backend == "redis":
+        redis_url = os.getenv("REDIS_CONNECTION_STRING")
+        if redis_url:
+            import redis
+            return RedisLearningStore(redis.from_url(redis_url), os.getenv("LEARNING_MEMORY_REDIS_PREFIX", "learning_memory:"))
+        logger.warning("LEARNING_MEMORY_BACKEND=redis but REDIS_CONNECTION_STRING is not set; using SQLite")
+    path = os.getenv("LEARNING_MEMORY_DB") or os.path.join(
+        os.getenv("WORK_DIR_ROOT", "/tmp/coding"), ".learnings", "learning_memory.db")
+    return SQLiteLearningStore(path)
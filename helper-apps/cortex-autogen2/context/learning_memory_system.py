@@ -2,14 +2,16 @@
 Learning Memory System
 
 Stores successful strategies, failure patterns, and insights for continuous learning
-and improvement of agent behavior across tasks.
+and improvement of agent behavior across tasks. Everything is persisted in a
+learning store (see learning_memory_store), so accumulated learning survives
+restarts and can be shared between workers.
 """
 
 import logging
-from typing import Dict, List, Any, Optional, Tuple
-from datetime import datetime, timedelta
-from collections import defaultdict
-import json
+from typing import Dict, List, Any, Optional
+from datetime import datetime
+
+from .learning_memory_store import create_learning_store
 
 logger = logging.getLogger(__name__)
 
@@ -20,12 +22,13 @@ class LearningMemory:
     successful strategies, failure patterns, and cognitive insights.
     """
 
-    def __init__(self):
-        self.success_patterns: Dict[str, List[Dict]] = defaultdict(list)
-        self.failure_patterns: Dict[str, List[Dict]] = defaultdict(list)
-        self.task_insights: Dict[str, List[Dict]] = defaultdict(list)
-        self.agent_profiles: Dict[str, Dict] = {}
-        self.strategy_effectiveness: Dict[str, Dict] = defaultdict(dict)
+    # Patterns kept per task type
+    SUCCESS_PATTERNS_KEPT = 50
+    FAILURE_PATTERNS_KEPT = 30
+    INSIGHTS_KEPT = 40
+
+    def __init__(self, store=None):
+        self.store = store if store is not None else create_learning_store()
 
     def record_success_pattern(self, task_type: str, agent_name: str,
                              strategy: str, context: Dict[str, Any],
@@ -43,34 +46,15 @@ class LearningMemory:
             "lessons_learned": self._extract_lessons_from_success(context, outcome_metrics)
         }
 
-        self.success_patterns[task_type].append(pattern)
+        # Keep only recent patterns (last 50 per task type)
+        self.store.add_pattern("success", task_type, agent_name, strategy, pattern["success_score"],
+                               pattern["timestamp"], pattern, keep=self.SUCCESS_PATTERNS_KEPT)
 
-        # Update strategy effectiveness
-        strategy_key = f"{agent_name}:{strategy}"
-        if strategy_key not in self.strategy_effectiveness:
-            self.strategy_effectiveness[strategy_key] = {
-                "success_count": 0,
-                "failure_count": 0,
-                "avg_success_score": 0,
-                "last_used": None,
-                "task_types": set()
-            }
-
-        stats = self.strategy_effectiveness[strategy_key]
-        stats["success_count"] += 1
-        stats["task_types"].add(task_type)
-        stats["last_used"] = pattern["timestamp"]
-
-        # Recalculate average success score
-        total_score = stats["avg_success_score"] * (stats["success_count"] - 1) + pattern["success_score"]
-        stats["avg_success_score"] = total_score / stats["success_count"]
+        # Update strategy effectiveness (running counts and average success score)
+        self.store.record_strategy(agent_name, strategy, task_type, True, pattern["success_score"], pattern["timestamp"])
 
         logger.info(f"✅ Recorded success pattern: {strategy} for {task_type} (score: {pattern['success_score']:.1f})")
 
-        # Keep only recent patterns (last 50 per task type)
-        if len(self.success_patterns[task_type]) > 50:
-            self.success_patterns[task_type] = self.success_patterns[task_type][-50:]
-
     def record_failure_pattern(self, task_type: str, agent_name: str,
                              failed_strategy: str, context: Dict[str, Any],
                              failure_reason: str, recovery_strategy: Optional[str] = None) -> None:
@@ -88,30 +72,15 @@ class LearningMemory:
             "preventive_measures": self._suggest_preventive_measures(failed_strategy, failure_reason)
         }
 
-        self.failure_patterns[task_type].append(pattern)
+        # Keep only recent patterns (last 30 per task type to focus on recent issues)
+        self.store.add_pattern("failure", task_type, agent_name, failed_strategy, 0.0, pattern["timestamp"],
+                               pattern, keep=self.FAILURE_PATTERNS_KEPT, reason=failure_reason)
 
         # Update strategy effectiveness
-        strategy_key = f"{agent_name}:{failed_strategy}"
-        if strategy_key not in self.strategy_effectiveness:
-            self.strategy_effectiveness[strategy_key] = {
-                "success_count": 0,
-                "failure_count": 0,
-                "avg_success_score": 0,
-                "last_used": None,
-                "task_types": set()
-            }
-
-        stats = self.strategy_effectiveness[strategy_key]
-        stats["failure_count"] += 1
-        stats["task_types"].add(task_type)
-        stats["last_used"] = pattern["timestamp"]
+        self.store.record_strategy(agent_name, failed_strategy, task_type, False, 0.0, pattern["timestamp"])
 
         logger.info(f"❌ Recorded failure pattern: {failed_strategy} for {task_type} ({failure_reason})")
 
-        # Keep only recent patterns (last 30 per task type to focus on recent issues)
-        if len(self.failure_patterns[task_type]) > 30:
-            self.failure_patterns[task_type] = self.failure_patterns[task_type][-30:]
-
     def record_task_insight(self, task_type: str, insight_type: str,
                           insight_content: str, context: Dict[str, Any],
                           applicability_score: int = 5) -> None:
@@ -128,11 +97,9 @@ class LearningMemory:
             "last_applied": None
         }
 
-        self.task_insights[task_type].append(insight)
-
         # Keep only recent insights (last 40 per task type)
-        if len(self.task_insights[task_type]) > 40:
-            self.task_insights[task_type] = self.task_insights[task_type][-40:]
+        self.store.add_pattern("insight", task_type, "", insight_type, applicability_score,
+                               insight["timestamp"], insight, keep=self.INSIGHTS_KEPT)
 
     def get_recommended_strategies(self, task_type: str, agent_name: str,
                                  context: Dict[str, Any]) -> List[Dict[str, Any]]:
@@ -140,38 +107,24 @@ class LearningMemory:
 
         recommendations = []
 
-        # Get successful strategies for this task type
-        if task_type in self.success_patterns:
-            success_patterns = self.success_patterns[task_type]
-
-            # Filter by agent or similar agents
-            relevant_patterns = [
-                p for p in success_patterns
-                if p["agent_name"] == agent_name or self._are_agents_similar(p["agent_name"], agent_name)
-            ]
-
-            # Sort by success score and recency
-            relevant_patterns.sort(key=lambda x: (x["success_score"], x["timestamp"]), reverse=True)
-
-            for pattern in relevant_patterns[:5]:  # Top 5
-                recommendations.append({
-                    "type": "proven_strategy",
-                    "strategy": pattern["strategy"],
-                    "confidence": pattern["success_score"] / 10.0,
-                    "rationale": f"Successfully used by {pattern['agent_name']} with score {pattern['success_score']:.1f}",
-                    "context_match": self._calculate_context_similarity(pattern["context"], context)
-                })
-
-        # Check for strategies that work well for this agent across task types
-        agent_strategies = [
-            (strategy_key, stats) for strategy_key, stats in self.strategy_effectiveness.items()
-            if strategy_key.startswith(f"{agent_name}:") and stats["success_count"] > 0
+        # Get successful strategies for this task type from the agent or similar agents
+        relevant_agents = [
+            name for name in self.store.pattern_agents("success", task_type)
+            if name == agent_name or self._are_agents_similar(name, agent_name)
         ]
 
-        agent_strategies.sort(key=lambda x: x[1]["avg_success_score"], reverse=True)
+        # Top 5 by success score and recency
+        for pattern in self.store.top_patterns("success", task_type, relevant_agents, 5):
+            recommendations.append({
+                "type": "proven_strategy",
+                "strategy": pattern["strategy"],
+                "confidence": pattern["success_score"] / 10.0,
+                "rationale": f"Successfully used by {pattern['agent_name']} with score {pattern['success_score']:.1f}",
+                "context_match": self._calculate_context_similarity(pattern["context"], context)
+            })
 
-        for strategy_key, stats in agent_strategies[:3]:  # Top 3 agent strategies
-            strategy_name = strategy_key.split(":", 1)[1]
+        # Check for strategies that work well for this agent across task types (top 3)
+        for strategy_name, stats in self.store.top_strategies(agent_name, 3):
             recommendations.append({
                 "type": "agent_strength",
                 "strategy": strategy_name,
@@ -188,9 +141,8 @@ class LearningMemory:
 
         warnings = []
 
-        if task_type in self.failure_patterns:
-            failure_patterns = self.failure_patterns[task_type]
-
+        failure_patterns = self.store.patterns("failure", task_type)
+        if failure_patterns:
             # Look for similar failed strategies
             similar_failures = [
                 p for p in failure_patterns
@@ -211,54 +163,42 @@ class LearningMemory:
 
     def get_success_patterns(self, task_type: str) -> List[Dict[str, Any]]:
         """Get all success patterns for a task type."""
-        return self.success_patterns.get(task_type, [])
+        return self.store.patterns("success", task_type)
 
     def get_failure_patterns(self, task_type: str) -> List[Dict[str, Any]]:
         """Get all failure patterns for a task type."""
-        return self.failure_patterns.get(task_type, [])
+        return self.store.patterns("failure", task_type)
 
     def get_task_insights(self, task_type: str, context: Dict[str, Any] = None) -> List[Dict[str, Any]]:
         """Get relevant insights for a task type."""
 
         insights = []
 
-        if task_type in self.task_insights:
-            task_insights = self.task_insights[task_type]
-
-            # Sort by applicability and recency
-            sorted_insights = sorted(
-                task_insights,
-                key=lambda x: (x["applicability_score"], x["timestamp"]),
-                reverse=True
-            )
-
-            for insight in sorted_insights[:5]:  # Top 5
-                insights.append({
-                    "insight_type": insight["insight_type"],
-                    "content": insight["content"],
-                    "applicability": insight["applicability_score"] / 10.0,
-                    "context_relevance": self._calculate_context_similarity(insight["context"], context)
-                })
+        # Top 5 by applicability and recency
+        for insight in self.store.top_patterns("insight", task_type, [""], 5):
+            insights.append({
+                "insight_type": insight["insight_type"],
+                "content": insight["content"],
+                "applicability": insight["applicability_score"] / 10.0,
+                "context_relevance": self._calculate_context_similarity(insight["context"], context)
+            })
 
         return insights
 
     def update_agent_profile(self, agent_name: str, cognitive_profile: Dict[str, Any]) -> None:
         """Update an agent's cognitive profile based on learning history."""
 
-        profile = self.agent_profiles.get(agent_name, {
+        profile = self.store.get_profile(agent_name) or {
             "total_tasks": 0,
             "success_rate": 0,
             "strengths": [],
             "weaknesses": [],
             "preferred_strategies": [],
             "cognitive_traits": {}
-        })
+        }
 
         # Update profile based on learning history
-        agent_strategies = {
-            k: v for k, v in self.strategy_effectiveness.items()
-            if k.startswith(f"{agent_name}:")
-        }
+        agent_strategies = self.store.strategy_stats(agent_name)
 
         if agent_strategies:
             # Calculate success rate
@@ -270,8 +210,8 @@ class LearningMemory:
 
             # Identify strengths (high success strategies)
             strong_strategies = [
-                strategy_key.split(":", 1)[1]
-                for strategy_key, stats in agent_strategies.items()
+                strategy
+                for strategy, stats in agent_strategies.items()
                 if stats["avg_success_score"] > 7.0
             ]
             profile["strengths"] = strong_strategies
@@ -282,20 +222,20 @@ class LearningMemory:
                 key=lambda x: (x[1]["success_count"], x[1]["avg_success_score"]),
                 reverse=True
             )[:3]
-            profile["preferred_strategies"] = [s[0].split(":", 1)[1] for s, _ in preferred]
+            profile["preferred_strategies"] = [strategy for strategy, _ in preferred]
 
         # Update cognitive traits
         profile["cognitive_traits"] = cognitive_profile
 
-        self.agent_profiles[agent_name] = profile
+        self.store.put_profile(agent_name, profile)
 
         logger.info(f"📊 Updated agent profile for {agent_name}: {profile['success_rate']:.1%} success rate")
 
     def get_agent_profile(self, agent_name: str) -> Dict[str, Any]:
         """Get an agent's learning profile."""
-        return self.agent_profiles.get(agent_name, {
+        return self.store.get_profile(agent_name) or {
             "error": "No profile available for this agent"
-        })
+        }
 
     def _calculate_success_score(self, outcome_metrics: Dict[str, Any]) -> float:
         """Calculate a success score from outcome metrics."""
@@ -483,30 +423,25 @@ class LearningMemory:
     def get_learning_summary(self) -> Dict[str, Any]:
         """Get a comprehensive summary of the learning system."""
 
-        total_success_patterns = sum(len(patterns) for patterns in self.success_patterns.values())
-        total_failure_patterns = sum(len(patterns) for patterns in self.failure_patterns.values())
-        total_insights = sum(len(insights) for insights in self.task_insights.values())
+        counts = self.store.pattern_counts()
+        strategy_effectiveness = self.store.all_strategy_stats()
 
         return {
-            "total_success_patterns": total_success_patterns,
-            "total_failure_patterns": total_failure_patterns,
-            "total_insights": total_insights,
-            "task_types_covered": list(set(
-                list(self.success_patterns.keys()) +
-                list(self.failure_patterns.keys()) +
-                list(self.task_insights.keys())
-            )),
-            "agents_profiled": len(self.agent_profiles),
-            "strategies_tracked": len(self.strategy_effectiveness),
-            "most_successful_strategies": self._get_top_strategies(),
+            "total_success_patterns": counts["success"],
+            "total_failure_patterns": counts["failure"],
+            "total_insights": counts["insight"],
+            "task_types_covered": self.store.task_types(),
+            "agents_profiled": self.store.profile_count(),
+            "strategies_tracked": len(strategy_effectiveness),
+            "most_successful_strategies": self._get_top_strategies(strategy_effectiveness),
             "most_common_failures": self._get_common_failures()
         }
 
-    def _get_top_strategies(self) -> List[Dict[str, Any]]:
+    def _get_top_strategies(self, strategy_effectiveness: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
         """Get the most successful strategies across all learning."""
 
         strategy_scores = []
-        for strategy_key, stats in self.strategy_effectiveness.items():
+        for strategy_key, stats in strategy_effectiveness.items():
             if stats["success_count"] > 0:
                 success_rate = stats["success_count"] / (stats["success_count"] + stats["failure_count"])
                 strategy_scores.append({
@@ -525,20 +460,10 @@ class LearningMemory:
     def _get_common_failures(self) -> List[Dict[str, Any]]:
         """Get the most common failure patterns."""
 
-        failure_counts = defaultdict(int)
-
-        for task_patterns in self.failure_patterns.values():
-            for pattern in task_patterns:
-                failure_counts[pattern["failure_reason"]] += 1
-
-        # Convert to sorted list
-        common_failures = [
+        return [
             {"reason": reason, "count": count}
-            for reason, count in failure_counts.items()
+            for reason, count in self.store.failure_reason_counts(10)  # Top 10
         ]
-        common_failures.sort(key=lambda x: x["count"], reverse=True)
-
-        return common_failures[:10]  # Top 10
 
 
 # Global learning memory instance
@@ -1,24 +1,42 @@
 """
 Logging utilities for consistent phase logging across the system.
+
+Phase start/complete pairs are recorded as agent actions in ContextMemory and
+as ``phase:<name>`` spans in the task trace (``services.tracing``). Starts that
+never complete (failed phases) are dropped when the request is released.
 """
+import sys
+import time
+from typing import Dict
 
-# Helper functions for common logging patterns
-async def log_phase_start(context_memory, event_type: str, agent_name: str, details: dict, task_id: str, phase: str):
-    """Log the start of a phase with consistent formatting."""
+from services.request_state import get_request_state_registry
+from services.tracing import get_tracer
+
+# task_id -> {phase: start time} of phases that have not completed yet
+_phase_starts: Dict[str, Dict[str, float]] = {}
+get_request_state_registry().track(sys.modules[__name__], "_phase_starts")
+
+
+def _record(context_memory, event_type: str, agent_name: str, details: dict, task_id: str, phase: str):
     if context_memory:
-        context_memory.record_comprehensive_log(
-            event_type=event_type,
-            details=details,
-            agent_name=agent_name,
+        context_memory.record_agent_action(
+            agent_name, event_type, details,
             metadata={"task_id": task_id, "phase": phase}
         )
 
+
+# Helper functions for common logging patterns
+async def log_phase_start(context_memory, event_type: str, agent_name: str, details: dict, task_id: str, phase: str):
+    """Log the start of a phase with consistent formatting."""
+    _phase_starts.setdefault(task_id, {})[phase] = time.time()
+    _record(context_memory, event_type, agent_name, details, task_id, phase)
+
 async def log_phase_complete(context_memory, event_type: str, agent_name: str, details: dict, task_id: str, phase: str):
     """Log the completion of a phase with consistent formatting."""
-    if context_memory:
-        context_memory.record_comprehensive_log(
-            event_type=event_type,
-            details=details,
-            agent_name=agent_name,
-            metadata={"task_id": task_id, "phase": phase}
-        )
+    started = _phase_starts.get(task_id, {}).pop(phase, None)
+    if task_id in _phase_starts and not _phase_starts[task_id]:
+        del _phase_starts[task_id]
+    if started is not None:
+        get_tracer().add_span(f"phase:{phase}", started, time.time() - started, lane=agent_name,
+                              task_id=task_id, args={"event_type": event_type})
+    _record(context_memory, event_type, agent_name, details, task_id, phase)
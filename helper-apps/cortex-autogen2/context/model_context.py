@@ -0,0 +1,231 @@
+"""
+Token-budgeted model context for group chat agents.
+
+By default an AssistantAgent re-sends its whole conversation on every call. In
+long SelectorGroupChat runs (hundreds of turns, 100 tool iterations, 200k-char
+web pages) that makes late calls slow and expensive. ``BudgetedChatCompletionContext``
+keeps each agent's view bounded:
+
+- Large tool results are written to the work dir's spill dir and replaced in
+  the context by a short handle (``tools.tool_results.spill_text``, the same
+  handle the tools return for large outputs).
+- When the conversation exceeds the agent's token budget, the oldest turns are
+  folded into a compact digest built from ContextMemory events (files created,
+  accomplishments, decisions, errors). The first task message is always kept.
+- Folding uses hysteresis (fold down to ``keep_ratio`` of the budget) so the
+  folded prefix changes rarely and stays cacheable between calls.
+
+Budgets are per agent (``AGENT_CONTEXT_BUDGETS`` in ``context/config.py``,
+overridable with ``AGENT_CONTEXT_BUDGET_<AGENT_NAME>``).
+"""
+import logging
+import os
+from typing import List, Optional
+
+from autogen_core.model_context import ChatCompletionContext
+from autogen_core.models import (
+    AssistantMessage,
+    FunctionExecutionResult,
+    FunctionExecutionResultMessage,
+    LLMMessage,
+    UserMessage,
+)
+
+from services import metrics
+from tools.tool_results import spill_text
+from .config import AGENT_CONTEXT_BUDGETS
+
+logger = logging.getLogger(__name__)
+
+# Rough characters-per-token ratio used for budgeting (no tokenizer round-trip per call)
+CHARS_PER_TOKEN = 4
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except (TypeError, ValueError):
+        return default
+
+
+def get_agent_context_budget(agent_name: str) -> int:
+    """Token budget for an agent's model context (env override first)."""
+    default = AGENT_CONTEXT_BUDGETS.get(agent_name, AGENT_CONTEXT_BUDGETS["default"])
+    return max(1000, _env_int(f"AGENT_CONTEXT_BUDGET_{agent_name.upper()}", default))
+
+
+def _content_text(message: LLMMessage) -> str:
+    content = getattr(message, "content", "")
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        parts = []
+        for item in content:
+            if isinstance(item, str):
+                parts.append(item)
+            elif isinstance(item, FunctionExecutionResult):
+                parts.append(item.content)
+            else:
+                # FunctionCall (name + arguments) or an image
+                parts.append(f"{getattr(item, 'name', '')}{getattr(item, 'arguments', '')}" or "[image]")
+        return "\n".join(parts)
+    return str(content)
+
+
+def estimate_tokens(message: LLMMessage) -> int:
+    """Approximate token count of a message."""
+    return len(_content_text(message)) // CHARS_PER_TOKEN + 4
+
+
+class BudgetedChatCompletionContext(ChatCompletionContext):
+    """Chat context with a token budget, folded history and spilled tool results."""
+
+    def __init__(
+        self,
+        agent_name: str,
+        token_budget: Optional[int] = None,
+        context_memory=None,
+        work_dir: Optional[str] = None,
+        tool_result_max_chars: Optional[int] = None,
+        keep_ratio: float = 0.6,
+        summary_max_chars: int = 6000,
+        initial_messages: Optional[List[LLMMessage]] = None,
+    ) -> None:
+        super().__init__(initial_messages)
+        self.agent_name = agent_name
+        self.token_budget = token_budget or get_agent_context_budget(agent_name)
+        self.context_memory = context_memory
+        self.work_dir = work_dir or getattr(context_memory, "work_dir", None)
+        self.tool_result_max_chars = tool_result_max_chars or _env_int("TOOL_RESULT_CONTEXT_MAX_CHARS", 20000)
+        self.keep_ratio = keep_ratio
+        self.summary_max_chars = summary_max_chars
+        # Messages before this index are represented by the digest
+        self._fold_index = 0
+        self._digest: Optional[UserMessage] = None
+
+    async def add_message(self, message: LLMMessage) -> None:
+        if isinstance(message, FunctionExecutionResultMessage):
+            message = self._spill_large_results(message)
+        elif (isinstance(message, UserMessage) and isinstance(message.content, str)
+              and len(message.content) > self.tool_result_max_chars and self._messages):
+            # Tool-call summaries relayed from other agents (the first message is the task: never spilled)
+            message = self._spill_large_text(message)
+        await super().add_message(message)
+
+    async def clear(self) -> None:
+        await super().clear()
+        self._fold_index = 0
+        self._digest = None
+
+    # ------------------------------------------------------------------
+    # Large tool results -> file handles
+    # ------------------------------------------------------------------
+
+    def _spill_large_text(self, message: UserMessage) -> UserMessage:
+        if not self.work_dir:
+            return message
+        handle = spill_text(message.content, self.work_dir, message.source)
+        if handle is None:
+            return message
+        metrics.increment("context.tool_results_spilled", agent=self.agent_name)
+        return message.model_copy(update={"content": handle})
+
+    def _spill_large_results(self, message: FunctionExecutionResultMessage) -> FunctionExecutionResultMessage:
+        if not self.work_dir or not any(len(r.content) > self.tool_result_max_chars for r in message.content):
+            return message
+        results = []
+        for result in message.content:
+            if len(result.content) <= self.tool_result_max_chars:
+                results.append(result)
+                continue
+            handle = spill_text(result.content, self.work_dir, result.name)
+            if handle is None:
+                results.append(result)
+                continue
+            results.append(result.model_copy(update={"content": handle}))
+            metrics.increment("context.tool_results_spilled", agent=self.agent_name)
+            metrics.increment("context.tool_result_chars_spilled", len(result.content) - len(handle), agent=self.agent_name)
+        return message.model_copy(update={"content": results})
+
+    # ------------------------------------------------------------------
+    # Token-budgeted window
+    # ------------------------------------------------------------------
+
+    async def get_messages(self) -> List[LLMMessage]:
+        messages = self._messages
+        if not messages:
+            return []
+
+        # The first message is the task; it is always kept verbatim
+        head = messages[:1]
+        budget = self.token_budget - sum(estimate_tokens(m) for m in head)
+        start = max(self._fold_index, 1)
+        window_tokens = sum(estimate_tokens(m) for m in messages[start:])
+
+        if window_tokens > budget:
+            # Fold the oldest turns until the window fits in keep_ratio of the budget
+            target = int(budget * self.keep_ratio)
+            while start < len(messages) - 1 and window_tokens > target:
+                window_tokens -= estimate_tokens(messages[start])
+                start += 1
+            # Never start on an orphaned tool result (its call was folded away)
+            while start < len(messages) - 1 and isinstance(messages[start], FunctionExecutionResultMessage):
+                window_tokens -= estimate_tokens(messages[start])
+                start += 1
+            folded = start - max(self._fold_index, 1)
+            self._fold_index = start
+            self._digest = self._build_digest(start - 1)
+            metrics.increment("context.folds", agent=self.agent_name)
+            logger.info(f"🗜️ {self.agent_name}: folded {folded} older messages into a summary "
+                        f"(window ~{window_tokens} tokens, budget {self.token_budget})")
+
+        window = messages[self._fold_index:] if self._fold_index else messages[1:]
+        result = head + ([self._digest] if self._digest else []) + list(window)
+        metrics.observe("context.window_tokens", sum(estimate_tokens(m) for m in result), agent=self.agent_name)
+        return result
+
+    def _build_digest(self, folded_count: int) -> UserMessage:
+        """Summarize folded turns from ContextMemory events (no LLM call)."""
+        lines = [f"[CONTEXT SUMMARY: {folded_count} earlier messages were condensed to stay within the context budget.]"]
+        events = list(getattr(self.context_memory, "events", None) or [])
+
+        files = []
+        accomplishments = []
+        decisions = []
+        errors = []
+        for event in events:
+            event_type = event.get("event_type")
+            details = event.get("details") or {}
+            if event_type == "file_creation":
+                files.append(os.path.basename(str(details.get("file_path", ""))))
+            elif event_type == "accomplishment":
+                accomplishments.append(f"{event.get('agent_name')}: {details.get('accomplishment')}")
+            elif event_type == "decision":
+                decisions.append(f"{event.get('agent_name')}: {details.get('decision')}")
+            elif event_type == "error":
+                errors.append(f"{event.get('agent_name')}: {details.get('error_type')} - {str(details.get('error_message'))[:200]}")
+
+        if files:
+            lines.append("Files created so far: " + ", ".join(dict.fromkeys(f for f in files if f)))
+        for title, items in (("Accomplishments", accomplishments), ("Decisions", decisions), ("Errors", errors)):
+            if items:
+                lines.append(f"{title}:")
+                lines.extend(f"- {item}" for item in items[-10:])
+
+        if len(lines) == 1:
+            # No recorded events; keep the last words of the folded assistant turns instead
+            for message in self._messages[1:self._fold_index][-6:]:
+                if isinstance(message, AssistantMessage) and isinstance(message.content, str):
+                    lines.append(f"- {message.source}: {message.content[:300]}")
+
+        if self.work_dir:
+            lines.append(f"Full details remain on disk in {self.work_dir} (files and logs/).")
+        text = "\n".join(lines)[: self.summary_max_chars]
+        return UserMessage(content=text, source="context_summary")
+
+
+def create_agent_model_context(agent_name: str, context_memory=None, work_dir: Optional[str] = None):
+    """Model context for a group chat agent, or None when disabled (AGENT_CONTEXT_MANAGEMENT=false)."""
+    if os.getenv("AGENT_CONTEXT_MANAGEMENT", "true").lower() != "true":
+        return None
+    return BudgetedChatCompletionContext(agent_name, context_memory=context_memory, work_dir=work_dir)
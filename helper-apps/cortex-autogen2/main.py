@@ -4,7 +4,11 @@ import sys
 import json
 import base64
 import logging
-from services.azure_queue import get_queue_service
+import time
+from services.queue_backend import get_queue_backend
+from services.queue_lease import AdaptiveBackoff, MessageLease
+from services.tracing import get_tracer
+from services.loop_watchdog import start_loop_watchdog_if_enabled
 from task_processor import TaskProcessor
 
 # Add the parent directory of 'src' to sys.path to allow imports like 'from cortex_autogen2.tools import ...'
@@ -29,88 +33,165 @@ async def process_task(task_id: str, task_content: str, processor: TaskProcessor
     await processor.process_task(task_id, task_content)
 
 
+def parse_task_content(message: dict) -> str | None:
+    """Decode a queue message (Base64 JSON or raw JSON) and return its task text."""
+    raw_content = message.get("content") or message.get("message")
+    if not raw_content:
+        logger.error(f"❌ Message has no content: {message}")
+        return None
+
+    try:
+        decoded_content = base64.b64decode(raw_content).decode('utf-8')
+        task_data = json.loads(decoded_content)
+    except (json.JSONDecodeError, TypeError, ValueError) as e:
+        logger.debug(f"Base64 decode failed; falling back to raw JSON: {e}")
+        try:
+            task_data = json.loads(raw_content)
+        except json.JSONDecodeError as e2:
+            logger.error(f"❌ Failed to parse message content: {e2}")
+            return None
+
+    # Fix: Check message field first, then content field
+    task_content = task_data.get("message") or task_data.get("content")
+    if not task_content:
+        logger.error(f"❌ No task content found in: {task_data}")
+        return None
+    return task_content
+
+
+async def handle_message(message: dict, task_queue, processor: TaskProcessor) -> None:
+    """Validate a message, process it under a renewed lease, then delete it."""
+    task_id = message.get("id")
+    pop_receipt = message.get("pop_receipt")
+
+    if not task_id or not pop_receipt:
+        logger.error(f"❌ Invalid message format: {message}")
+        return
+
+    task_content = parse_task_content(message)
+    if not task_content:
+        await task_queue.delete_task(task_id, pop_receipt)
+        return
+
+    max_dequeue = int(task_queue.setting("MAX_DEQUEUE_COUNT", "5"))
+    if (message.get("dequeue_count") or 0) > max_dequeue:
+        logger.error(f"❌ Task {task_id} was dequeued {message.get('dequeue_count')} times; dropping poison message")
+        await task_queue.delete_task(task_id, pop_receipt)
+        return
+
+    logger.info(f"📩 Received task: {task_content}...")
+
+    # Time between enqueue and the start of processing (when the backend reports it)
+    enqueued_at = message.get("enqueued_at")
+    if enqueued_at and get_tracer().begin(task_id) is not None:
+        get_tracer().add_span("queue_wait", enqueued_at, max(0.0, time.time() - enqueued_at),
+                              lane="task", category="queue", task_id=task_id)
+
+    # Keep the message invisible for as long as the task runs
+    lease = MessageLease(task_queue, task_id, pop_receipt)
+    lease.start()
+    try:
+        await process_task(task_id, task_content, processor)
+    except BaseException:
+        # Hand the message back right away instead of waiting for the lease to expire
+        await lease.release()
+        raise
+
+    if await lease.complete():
+        logger.info(f"✅ Task {task_id} processed successfully.")
+    else:
+        logger.warning(f"⚠️ Task {task_id} processed, but its message could not be deleted; it may be delivered again.")
+
 
 async def main():
     """
-    Main function to continuously process tasks from the Azure queue.
+    Main function to continuously process tasks from the configured queue (QUEUE_BACKEND).
     """
     
     continuous_mode = os.getenv("CONTINUOUS_MODE", "true").lower() == "true"
-    logger.info(f"🚀 Starting AutoGen Worker, continuous_mode: {continuous_mode}")
+    concurrency = max(1, int(os.getenv("WORKER_CONCURRENCY", "1")))
+    logger.info(f"🚀 Starting AutoGen Worker, continuous_mode: {continuous_mode}, concurrency: {concurrency}")
 
     # Add a small initial delay in non-continuous mode to allow tasks to be enqueued
     if not continuous_mode:
         await asyncio.sleep(1)
 
+    watchdog = start_loop_watchdog_if_enabled()
+
     try:
-        azure_queue = await get_queue_service()
-        processor = TaskProcessor()
-        await processor.initialize()
+        task_queue = await get_queue_backend()
+        # One processor per slot: TaskProcessor keeps per-task state on the instance
+        processors = [TaskProcessor() for _ in range(concurrency)]
+        for processor in processors:
+            await processor.initialize()
+
+        idle_processors: asyncio.Queue = asyncio.Queue()
+        for processor in processors:
+            idle_processors.put_nowait(processor)
+        running: set[asyncio.Task] = set()
+        failures: list[BaseException] = []
+        backoff = AdaptiveBackoff()
+
+        async def run_slot(message: dict, processor: TaskProcessor) -> None:
+            try:
+                await handle_message(message, task_queue, processor)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Error processing task: {e}")
+                failures.append(e)
+                if continuous_mode:
+                    logger.info("📝 Continuing to next task...")
+                    await asyncio.sleep(5)  # Brief pause before reusing this slot
+            finally:
+                idle_processors.put_nowait(processor)
 
         try:
             while True:  # Continuous loop
+                if failures and not continuous_mode:
+                    raise failures[0]  # Re-raise in non-continuous mode
+
+                # Wait for a free slot, then fetch enough messages to fill every free slot
+                processor = await idle_processors.get()
                 try:
-                    message = await azure_queue.get_task()
-                    if message:
-                        task_id = message.get("id")
-                        pop_receipt = message.get("pop_receipt")
-                        
-                        if not task_id or not pop_receipt:
-                            logger.error(f"❌ Invalid message format: {message}")
-                            # Delete the invalid message to prevent infinite retry
-                            if task_id and pop_receipt:
-                                await azure_queue.delete_task(task_id, pop_receipt)
-                            continue
-                        
-                        raw_content = message.get("content") or message.get("message")
-                        if not raw_content:
-                            logger.error(f"❌ Message has no content: {message}")
-                            await azure_queue.delete_task(task_id, pop_receipt)
-                            continue
-                        
-                        try:
-                            decoded_content = base64.b64decode(raw_content).decode('utf-8')
-                            task_data = json.loads(decoded_content)
-                        except (json.JSONDecodeError, TypeError, ValueError) as e:
-                            logger.debug(f"Base64 decode failed; falling back to raw JSON: {e}")
-                            try:
-                                task_data = json.loads(raw_content)
-                            except json.JSONDecodeError as e2:
-                                logger.error(f"❌ Failed to parse message content: {e2}")
-                                await azure_queue.delete_task(task_id, pop_receipt)
-                                continue
-                        
-                        # Fix: Check message field first, then content field
-                        task_content = task_data.get("message") or task_data.get("content")
-                        if not task_content:
-                            logger.error(f"❌ No task content found in: {task_data}")
-                            await azure_queue.delete_task(task_id, pop_receipt)
-                            continue
-                        
-                        logger.info(f"📩 Received task: {task_content}...")
-                        
-                        await process_task(task_id, task_content, processor)
-
-                        await azure_queue.delete_task(task_id, pop_receipt)
-                        logger.info(f"✅ Task {task_id} processed successfully.")
-                    else:
-                        if continuous_mode:
-                            logger.info(f"⏳ No tasks in queue {azure_queue.queue_name}. Waiting 3 seconds...")
-                            await asyncio.sleep(3)  # Wait before checking again
-                        else:
-                            logger.info(f"📭 No tasks in queue {azure_queue.queue_name}. Exiting (non-continuous mode).")
-                            break
-                            
+                    message = await task_queue.get_task(max_messages=idle_processors.qsize() + 1)
                 except Exception as e:
-                    logger.error(f"❌ Error processing task: {e}")
-                    if continuous_mode:
-                        logger.info("📝 Continuing to next task...")
-                        await asyncio.sleep(5)  # Brief pause before retrying
-                    else:
-                        raise  # Re-raise in non-continuous mode
+                    idle_processors.put_nowait(processor)
+                    logger.error(f"❌ Error receiving task: {e}")
+                    if not continuous_mode:
+                        raise
+                    await asyncio.sleep(5)
+                    continue
+
+                if message:
+                    backoff.reset()
+                    slot = asyncio.create_task(run_slot(message, processor))
+                    running.add(slot)
+                    slot.add_done_callback(running.discard)
+                    continue
+
+                idle_processors.put_nowait(processor)
+                if continuous_mode:
+                    delay = backoff.next_delay()
+                    logger.info(f"⏳ No tasks in queue {task_queue.queue_name}. Waiting {delay:.1f} seconds...")
+                    await asyncio.sleep(delay)  # Wait before checking again
+                elif running:
+                    # Let in-flight tasks finish; they may be followed by newly enqueued work
+                    await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                else:
+                    logger.info(f"📭 No tasks in queue {task_queue.queue_name}. Exiting (non-continuous mode).")
+                    break
                         
         finally:
-            await processor.close()
+            for slot in list(running):
+                slot.cancel()
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
+            await task_queue.close()
+            for processor in processors:
+                await processor.close()
+            if watchdog:
+                await watchdog.stop()
             logger.info("🔌 Connections closed. Worker shutting down.")
 
     except Exception as e:
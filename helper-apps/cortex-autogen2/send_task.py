@@ -2,7 +2,8 @@
 """
 🚀 Cortex AutoGen Task Sender
 
-Send a task to the Azure Storage Queue for processing by the Cortex AutoGen worker.
+Send a task to the Azure Storage Queue (or the Redis Streams queue when
+QUEUE_BACKEND=redis) for processing by the Cortex AutoGen worker.
 
 CRITICAL: Clean worker state prevents conflicts
 ----------------------------------------------
@@ -27,6 +28,7 @@ Environment
 -----------
 - AZURE_STORAGE_CONNECTION_STRING (required if --connection not provided)
 - AZURE_QUEUE_NAME (default queue if --queue not provided)
+- QUEUE_BACKEND=redis + REDIS_CONNECTION_STRING to enqueue on the Redis stream instead
 - .env is loaded automatically
 
 Message format
@@ -74,13 +76,21 @@ def main():
         default=os.getenv("AZURE_STORAGE_CONNECTION_STRING"),
         help="Azure Storage connection string (overrides AZURE_STORAGE_CONNECTION_STRING)."
     )
+    parser.add_argument(
+        "--backend",
+        dest="backend",
+        type=str,
+        choices=["azure", "redis"],
+        default=os.getenv("QUEUE_BACKEND", "azure"),
+        help="Queue backend (overrides QUEUE_BACKEND)."
+    )
     args = parser.parse_args()
 
     connection_string = args.connection_string
     queue_name = args.queue_name
     print(f"Using queue: {queue_name}")
     
-    if not connection_string:
+    if args.backend != "redis" and not connection_string:
         print("Error: AZURE_STORAGE_CONNECTION_STRING is not set and --connection was not provided.")
         return
         
@@ -95,6 +105,17 @@ def main():
     # Encode message as Base64 to match Azure Functions MessageEncoding setting
     encoded_message = base64.b64encode(message.encode('utf-8')).decode('utf-8')
     
+    if args.backend == "redis":
+        import redis
+        redis_conn_string = os.getenv("REDIS_CONNECTION_STRING")
+        if not redis_conn_string:
+            print("Error: REDIS_CONNECTION_STRING is not set.")
+            return
+        stream_key = os.getenv("REDIS_QUEUE_STREAM", f"autogen:queue:{queue_name}")
+        entry_id = redis.from_url(redis_conn_string).xadd(stream_key, {"content": encoded_message})
+        print(f"Task sent to stream '{stream_key}' as {entry_id}: {task}")
+        return
+
     # Use synchronous client for instant execution
     queue_client = QueueClient.from_connection_string(connection_string, queue_name)
     queue_client.send_message(encoded_message, visibility_timeout=0)
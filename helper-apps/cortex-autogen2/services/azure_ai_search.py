@@ -33,6 +33,11 @@ def _get_headers() -> Optional[Dict[str, str]]:
     }
 
 
+def search_configured() -> bool:
+    """True when the search URL and write key are set (so a failed upsert is worth retrying)."""
+    return bool(_get_base_url() and _get_headers())
+
+
 def upsert_run_rest(doc: Dict[str, Any]) -> bool:
     """
     Best-effort upsert of a single run document into Azure Cognitive Search via REST.
@@ -113,3 +118,44 @@ def search_similar_rest(query_text: str, top: int = 3) -> List[Dict[str, Any]]:
         return []
 
 
+
+def list_learnings_rest(since: Optional[str] = None, top: int = 1000, skip: int = 0) -> List[Dict[str, Any]]:
+    """
+    Page through stored run documents, newest first, optionally only those dated after ``since``
+    (ISO timestamp). Used to sync the local learnings index; returns [] when search is not configured.
+    """
+    try:
+        base = _get_base_url()
+        headers = _get_headers()
+        index_name = _get_index_name()
+        if not base or not headers:
+            logger.debug("[Search] Missing base URL or API key; skipping listing.")
+            return []
+
+        url = f"{base}/indexes/{index_name}/docs/search"
+        params = {"api-version": API_VERSION}
+        body = {
+            "search": "*",
+            "top": int(top),
+            "skip": int(skip),
+            "orderby": "date desc",
+            "select": "id,task,content,date,requestId,owner",
+        }
+        if since:
+            body["filter"] = f"date gt {since}"
+        resp = requests.post(url, headers=headers, params=params, json=body, timeout=20)
+        try:
+            resp.raise_for_status()
+            vals = (resp.json() or {}).get("value") or []
+            docs: List[Dict[str, Any]] = []
+            for v in vals:
+                v = dict(v)
+                v.pop("@search.score", None)
+                docs.append(v)
+            return docs
+        except Exception as e:
+            logger.debug(f"[Search] Listing failed: {e} - status={resp.status_code} text={resp.text[:500]}")
+            return []
+    except Exception as e:
+        logger.debug(f"[Search] Listing error: {e}")
+        return []
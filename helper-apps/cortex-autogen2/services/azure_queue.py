@@ -4,16 +4,18 @@ from azure.core.exceptions import ResourceExistsError, AzureError
 import os
 import logging
 
+from services.queue_backend import QueueBackend
+
 logger = logging.getLogger(__name__)
 
-class AzureQueueService:
+class AzureQueueService(QueueBackend):
     """
     A service for interacting with Azure Queue Storage.
     """
 
     def __init__(self, connection_string: str, queue_name: str):
+        super().__init__(queue_name)
         self.connection_string = connection_string
-        self.queue_name = queue_name
         self.queue_client = QueueClient.from_connection_string(
             conn_str=self.connection_string, queue_name=self.queue_name
         )
@@ -30,33 +32,60 @@ class AzureQueueService:
             logger.error(f"💥 Failed to create or connect to queue '{self.queue_name}': {e}")
             raise
 
-    async def get_task(self) -> dict | None:
+    async def get_tasks(self, max_messages: int = 1) -> list:
         """
-        Receives a single message from the queue.
+        Receives up to ``max_messages`` messages in a single request.
         """
+        max_messages = max(1, min(32, max_messages))
         try:
             messages = self.queue_client.receive_messages(
-                messages_per_page=1,
-                visibility_timeout=1800,
+                messages_per_page=max_messages,
+                max_messages=max_messages,
+                visibility_timeout=self.visibility_timeout,
                 timeout=30
             )
 
+            result = []
             async for message in messages:
                 logger.info(f"📨 Azure Queue: Received message with ID: {message.id}")
                 logger.debug(f"📨 Raw message content: {message.content}")
-                return {
+                result.append({
                     "id": message.id,
                     "content": message.content,
                     "pop_receipt": message.pop_receipt,
-                }
-            return None
+                    "dequeue_count": message.dequeue_count,
+                    "enqueued_at": message.inserted_on.timestamp() if message.inserted_on else None,
+                })
+            return result
 
         except AzureError as e:
             logger.error(f"❌ Azure Queue: An Azure-specific error occurred: {e}")
-            return None
+            return []
         except Exception as e:
             logger.error(f"❌ Azure Queue: Unexpected error receiving message: {e}", exc_info=True)
-            return None
+            return []
+
+    async def extend_visibility(self, message_id: str, pop_receipt: str, visibility_timeout: int) -> str:
+        """
+        Extends the visibility timeout of a leased message. Returns the new pop receipt.
+        """
+        updated = await self.queue_client.update_message(
+            message_id, pop_receipt=pop_receipt, visibility_timeout=visibility_timeout
+        )
+        return updated.pop_receipt
+
+    async def release_task(self, message_id: str, pop_receipt: str):
+        """
+        Makes a leased message visible again immediately (e.g. after a processing failure).
+        """
+        await self.queue_client.update_message(message_id, pop_receipt=pop_receipt, visibility_timeout=0)
+
+    async def send_task(self, content: str) -> str:
+        """
+        Enqueues a message (content should already be Base64-encoded JSON).
+        """
+        sent = await self.queue_client.send_message(content, visibility_timeout=0)
+        return sent.id
 
     async def delete_task(self, message_id: str, pop_receipt: str):
         """
@@ -89,6 +118,7 @@ class AzureQueueService:
         """
         Closes the QueueClient.
         """
+        await self.return_buffered()
         await self.queue_client.close()
 
 async def get_queue_service() -> AzureQueueService:
@@ -0,0 +1,165 @@
+"""
+Shared scheduler for progress heartbeats.
+
+Every in-flight request repeats its last progress message every
+``PROGRESS_HEARTBEAT_INTERVAL`` seconds so clients can tell the task is alive.
+Instead of one sleeping asyncio task per request, all heartbeats live on one
+timer wheel: a single loop ticks every ``PROGRESS_HEARTBEAT_TICK`` seconds,
+collects the heartbeats that fell due in the elapsed slots and publishes them in
+one Redis pipeline (one thread hop and one round-trip per tick, whatever the
+number of requests). Each heartbeat is rescheduled with up to
+``PROGRESS_HEARTBEAT_JITTER`` seconds of jitter so requests started together do
+not keep firing on the same tick.
+"""
+import asyncio
+import logging
+import math
+import os
+import random
+import time
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from services import metrics
+
+logger = logging.getLogger(__name__)
+
+# Returns the heartbeat message ({"progress", "info"}) or None to stop the heartbeat
+PayloadSource = Callable[[], Optional[Dict[str, Any]]]
+
+
+class _Heartbeat:
+    __slots__ = ("key", "source", "publisher", "slot")
+
+    def __init__(self, key: str, source: PayloadSource, publisher):
+        self.key = key
+        self.source = source
+        self.publisher = publisher
+        self.slot = -1
+
+
+class HeartbeatScheduler:
+    """Timer wheel owning every active heartbeat; due heartbeats are published in one batch per tick."""
+
+    def __init__(self, interval_seconds: float = 5.0, tick_seconds: float = 0.5, jitter_seconds: float = 1.0):
+        self.interval = max(0.1, interval_seconds)
+        self.tick = max(0.01, min(tick_seconds, self.interval))
+        self.jitter = max(0.0, min(jitter_seconds, self.interval))
+        # One lap of the wheel covers the longest possible delay
+        self._slots: List[Set[str]] = [set() for _ in range(math.ceil((self.interval + self.jitter) / self.tick) + 2)]
+        self._cursor = 0
+        self._cursor_time = time.monotonic()
+        self._entries: Dict[str, _Heartbeat] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._rng = random.Random()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def schedule(self, key: str, source: PayloadSource, publisher) -> None:
+        """Start (or restart) the heartbeat ``key``; ``publisher`` must provide ``publish_heartbeats``."""
+        self.cancel(key)
+        entry = _Heartbeat(key, source, publisher)
+        self._entries[key] = entry
+        self._place(entry)
+        metrics.set_gauge("heartbeat.active", len(self._entries))
+        self._ensure_running()
+
+    def cancel(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._slots[entry.slot].discard(key)
+            metrics.set_gauge("heartbeat.active", len(self._entries))
+
+    def _delay(self) -> float:
+        return self.interval + self._rng.uniform(-self.jitter / 2, self.jitter / 2)
+
+    def _place(self, entry: _Heartbeat) -> None:
+        # Slots are relative to the cursor, which trails real time by less than one tick
+        ticks = max(1, round((self._delay() + time.monotonic() - self._cursor_time) / self.tick))
+        entry.slot = (self._cursor + min(ticks, len(self._slots) - 1)) % len(self._slots)
+        self._slots[entry.slot].add(entry.key)
+
+    def _ensure_running(self) -> None:
+        if self._task is not None and not self._task.done():
+            try:
+                if self._task.get_loop() is asyncio.get_running_loop():
+                    return
+            except RuntimeError:
+                return
+        self._cursor_time = time.monotonic()
+        self._task = asyncio.create_task(self._run())
+
+    def _advance(self) -> List[_Heartbeat]:
+        """Move the cursor up to now and return the heartbeats due in the passed slots."""
+        due = []
+        now = time.monotonic()
+        while self._cursor_time + self.tick <= now:
+            self._cursor = (self._cursor + 1) % len(self._slots)
+            self._cursor_time += self.tick
+            keys, self._slots[self._cursor] = self._slots[self._cursor], set()
+            due.extend(self._entries[key] for key in keys if key in self._entries)
+        return due
+
+    async def _run(self) -> None:
+        try:
+            while self._entries:
+                await asyncio.sleep(max(0.0, self._cursor_time + self.tick - time.monotonic()))
+                due = self._advance()
+                if due:
+                    await self._fire(due)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"Heartbeat scheduler failed: {e}")
+        finally:
+            if asyncio.current_task() is self._task:
+                self._task = None
+
+    async def _fire(self, due: List[_Heartbeat]) -> None:
+        batches: Dict[int, tuple] = {}
+        for entry in due:
+            try:
+                payload = entry.source()
+            except Exception as e:
+                logger.debug(f"Heartbeat source failed for {entry.key}: {e}")
+                payload = None
+            if payload is None:
+                self.cancel(entry.key)
+                continue
+            self._place(entry)
+            publisher, messages = batches.setdefault(id(entry.publisher), (entry.publisher, []))
+            messages.append({"requestId": entry.key, **payload})
+
+        for publisher, messages in batches.values():
+            started = time.monotonic()
+            try:
+                await publisher.publish_heartbeats(messages)
+            except Exception as e:
+                logger.debug(f"Heartbeat batch publish failed: {e}")
+            metrics.observe("heartbeat.batch_size", len(messages))
+            metrics.observe("heartbeat.publish_seconds", time.monotonic() - started)
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+
+# Global scheduler instance
+_scheduler: Optional[HeartbeatScheduler] = None
+
+
+def get_heartbeat_scheduler() -> HeartbeatScheduler:
+    """Get or create the global heartbeat scheduler (timing from PROGRESS_HEARTBEAT_* env vars)."""
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = HeartbeatScheduler(
+            interval_seconds=float(os.getenv("PROGRESS_HEARTBEAT_INTERVAL", "5.0")),
+            tick_seconds=float(os.getenv("PROGRESS_HEARTBEAT_TICK", "0.5")),
+            jitter_seconds=float(os.getenv("PROGRESS_HEARTBEAT_JITTER", "1.0")),
+        )
+    return _scheduler
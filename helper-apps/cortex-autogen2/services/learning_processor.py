@@ -5,7 +5,10 @@ LLM-powered learning extraction and saving logic.
 """
 
 import logging
-from typing import Optional
+import os
+from typing import Any, Dict, Optional
+
+from services.work_dir_manager import log_exists, open_log
 
 logger = logging.getLogger(__name__)
 
@@ -15,15 +18,19 @@ async def process_task_completion_learnings(
     task_id: Optional[str],
     task: str,
     final_result: Optional[str],
-    model_client_for_processing: Optional[object]
-) -> None:
+    model_client_for_processing: Optional[object],
+    journey_analytics: Optional[Dict[str, Any]] = None
+) -> Optional[bool]:
     """
     Process and save learnings after task completion.
     Uses LLM to determine if task was one-shot and should skip Azure.
+
+    Returns the Azure save result, or None when nothing needed saving.
     """
     if not context_memory or not task_id or not final_result:
-        return
+        return None
     
+    save_result = None
     try:
         from services.learning_service import extract_and_save_learnings, _extract_success_score_from_result
         from context.cognitive_journey_mapper import get_cognitive_journey_mapper
@@ -37,9 +44,9 @@ async def process_task_completion_learnings(
             import os
             import json
             messages_file = os.path.join(context_memory.work_dir, "logs", "messages.jsonl")
-            if os.path.exists(messages_file):
+            if log_exists(messages_file):
                 try:
-                    with open(messages_file, 'r', encoding='utf-8') as f:
+                    with open_log(messages_file) as f:
                         messages = []
                         for line in f:
                             line = line.strip()
@@ -103,9 +110,9 @@ async def process_task_completion_learnings(
             import os
             import json
             messages_file = os.path.join(context_memory.work_dir, "logs", "messages.jsonl")
-            if os.path.exists(messages_file):
+            if log_exists(messages_file):
                 try:
-                    with open(messages_file, 'r', encoding='utf-8') as f:
+                    with open_log(messages_file) as f:
                         all_msgs = [json.loads(line) for line in f if line.strip()]
                     # Search all messages for score patterns
                     for msg in reversed(all_msgs):
@@ -121,9 +128,10 @@ async def process_task_completion_learnings(
         
         logger.info(f"📊 Extracted success score: {success_score}/100")
         
-        # Get cognitive journey analytics
-        journey_mapper = get_cognitive_journey_mapper()
-        journey_analytics = journey_mapper.get_journey_analytics(task_id) if hasattr(journey_mapper, 'get_journey_analytics') else None
+        # Get cognitive journey analytics (background jobs pass the snapshot taken at delivery)
+        if journey_analytics is None:
+            journey_mapper = get_cognitive_journey_mapper()
+            journey_analytics = journey_mapper.get_journey_analytics(task_id) if hasattr(journey_mapper, 'get_journey_analytics') else None
         
         # LLM-powered one-shot detection
         is_one_shot = await detect_one_shot_task(
@@ -154,10 +162,96 @@ async def process_task_completion_learnings(
                     else:
                         logger.warning(f"⚠️  Learnings save to Azure returned False (check Azure connection/logs)")
                 except Exception as e:
+                    save_result = False
                     logger.error(f"❌ Failed to save learnings to Azure: {e}", exc_info=True)
     
     except Exception as e:
         logger.warning(f"Failed to process task completion learnings: {e}")
+    return save_result
+
+
+LEARNINGS_JOB = "learnings"
+
+
+def enqueue_task_completion_learnings(task_id: str, task: str, work_dir: str, final_result: str,
+                                      model_name: str = "gpt-4.1") -> None:
+    """
+    Queue learning processing to run after the result is delivered.
+
+    The work dir is held until the job finishes, and the journey analytics are
+    snapshotted now because the journey is released when the task ends.
+    """
+    from context.cognitive_journey_mapper import get_cognitive_journey_mapper
+    from services.post_task_queue import get_post_task_queue
+    from services.work_dir_manager import get_work_dir_manager
+
+    journey_mapper = get_cognitive_journey_mapper()
+    journey_analytics = journey_mapper.get_journey_analytics(task_id) if hasattr(journey_mapper, 'get_journey_analytics') else None
+    queue = get_post_task_queue()
+    register_learnings_job(queue)
+    get_work_dir_manager().hold(task_id)
+    queue.enqueue(LEARNINGS_JOB, task_id, {
+        "task_id": task_id, "task": task, "work_dir": work_dir, "final_result": final_result,
+        "journey_analytics": journey_analytics, "model": model_name,
+    })
+
+
+async def run_learnings_job(payload: Dict[str, Any]) -> None:
+    """Post-task job: rebuild the task's ContextMemory from its logs and process learnings."""
+    work_dir = payload["work_dir"]
+    if not os.path.isdir(work_dir):
+        logger.warning(f"⚠️  Work dir {work_dir} is gone, skipping learnings for {payload['task_id']}")
+        return
+
+    from context.context_memory import ContextMemory
+    from services.azure_ai_search import search_configured
+    from task_processor.llm_instrumentation import llm_call_tags, PRIORITY_BACKGROUND
+    from task_processor.model_config import ModelConfig
+
+    model_client = ModelConfig.get_model_client(payload["model"])
+    context_memory = ContextMemory(work_dir, model_client, payload["task_id"])
+    with llm_call_tags(task_id=payload["task_id"], priority=PRIORITY_BACKGROUND):
+        saved = await process_task_completion_learnings(
+            context_memory, payload["task_id"], payload["task"], payload["final_result"],
+            model_client, journey_analytics=payload.get("journey_analytics")
+        )
+    if saved is False and search_configured():
+        raise RuntimeError("learnings were not saved to Azure")
+
+
+async def _release_learnings_work_dir(payload: Dict[str, Any]) -> None:
+    from services.work_dir_manager import get_work_dir_manager
+    await get_work_dir_manager().release(payload["task_id"])
+
+
+def register_learnings_job(queue) -> None:
+    queue.register(LEARNINGS_JOB, run_learnings_job, on_finish=_release_learnings_work_dir)
+
+
+# Set once this process has resumed the learnings jobs of previous processes
+_learnings_resumed = False
+
+
+def resume_learnings_jobs() -> int:
+    """Re-hold the work dirs of learnings jobs left by a previous process and start running them.
+
+    Runs once per process: every TaskProcessor calls it from ``initialize``, but each
+    adopted job is released only once (when it finishes), so it must be held only once.
+    """
+    global _learnings_resumed
+    if _learnings_resumed:
+        return 0
+    _learnings_resumed = True
+
+    from services.post_task_queue import get_post_task_queue
+    from services.work_dir_manager import get_work_dir_manager
+
+    queue = get_post_task_queue()
+    register_learnings_job(queue)
+    work_dir_manager = get_work_dir_manager()
+    for payload in queue.pending_payloads(LEARNINGS_JOB):
+        work_dir_manager.hold(payload["task_id"])
+    return queue.resume()
 
 
 async def detect_one_shot_task(
@@ -297,7 +391,9 @@ Return JSON:
 """
         
         from autogen_core.models import UserMessage
-        response = await model_client.create([UserMessage(content=prompt, source="one_shot_detector")])
+        from task_processor.llm_instrumentation import llm_call_tags, PRIORITY_BACKGROUND
+        with llm_call_tags("one_shot_detection", priority=PRIORITY_BACKGROUND):
+            response = await model_client.create([UserMessage(content=prompt, source="one_shot_detector")])
         
         # Extract JSON using centralized utility
         from util.json_extractor import extract_json_from_model_response
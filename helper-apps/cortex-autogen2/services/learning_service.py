@@ -2,7 +2,10 @@
 Learning Service - Extract and retrieve learnings from Azure Cognitive Search.
 
 Leverages existing ContextMemory, cognitive journey, and file summaries.
+Retrieval goes through the worker's local learnings index and guidance cache
+(services/learnings_index.py); Azure is searched only on a local miss.
 """
+import asyncio
 import logging
 import json
 import re
@@ -10,6 +13,9 @@ from typing import Optional, Dict, Any, List
 from datetime import datetime
 
 from services.azure_ai_search import search_similar_rest, upsert_run_rest
+from services.learnings_index import get_guidance_cache, get_learnings_index
+from services import metrics
+from services.work_dir_manager import log_exists, open_log
 from autogen_core.models import UserMessage
 
 logger = logging.getLogger(__name__)
@@ -73,7 +79,8 @@ def _clean_data_source(source: str) -> str:
 
 async def get_learnings_for_task(task: str, task_id: str, model_client, context_memory=None) -> Optional[str]:
     """
-    Retrieve learnings from Azure Cognitive Search for similar tasks.
+    Retrieve learnings for similar tasks from the local index (Azure Cognitive Search on a miss).
+    Guidance already synthesized for the same task shape and documents is reused without an LLM call.
     Returns formatted learnings string for planner_agent or None if no similar tasks.
     
     Args:
@@ -83,7 +90,15 @@ async def get_learnings_for_task(task: str, task_id: str, model_client, context_
         context_memory: Optional ContextMemory instance to log retrieved learnings
     """
     try:
-        similar_docs = search_similar_rest(task, top=5)
+        index = get_learnings_index()
+        index.schedule_refresh()
+        similar_docs = index.search(task, top=5)
+        source = "local_index"
+        if not similar_docs:
+            similar_docs = await asyncio.to_thread(search_similar_rest, task, 5)
+            index.add(similar_docs)
+            source = "azure_search"
+        metrics.increment("learnings.lookups", source=source if similar_docs else "none")
         if not similar_docs:
             if context_memory:
                 context_memory.log_learning(
@@ -93,7 +108,26 @@ async def get_learnings_for_task(task: str, task_id: str, model_client, context_
                     metadata={"task": task, "similar_docs_count": 0}
                 )
             return None
-        
+
+        guidance_cache = get_guidance_cache()
+        doc_ids = [d.get("id") for d in similar_docs[:5]]
+        cached = guidance_cache.get(task, doc_ids)
+        if cached:
+            logger.info(f"📚 Reusing synthesized learnings for a recurring task shape ({len(doc_ids)} docs)")
+            if context_memory:
+                context_memory.log_learning(
+                    learning_type="retrieved_learnings",
+                    content=cached,
+                    source=source,
+                    metadata={
+                        "task": task,
+                        "similar_docs_count": len(similar_docs),
+                        "synthesized": True,
+                        "cached": True
+                    }
+                )
+            return f"**RECENT LEARNINGS**:\n{cached}"
+
         # Use LLM to synthesize learnings from similar tasks
         prompt = f"""**CRITICAL CONTEXT**: These are learnings from {len(similar_docs)} PREVIOUS similar tasks retrieved from Azure Cognitive Search. They worked in those contexts but may NOT apply directly to the current task. Use them as INTELLIGENT GUIDANCE, not rigid rules. The current task requirements are PRIMARY - adapt these learnings thoughtfully.
 
@@ -137,7 +171,9 @@ async def get_learnings_for_task(task: str, task_id: str, model_client, context_
 Format as concise bullets (≤18 words each) that can be intelligently applied to planning. Start with data source breakthroughs if available. Include warnings about source verification."""
         
         messages = [UserMessage(content=prompt, source="learning_service")]
-        response = await model_client.create(messages=messages)
+        from task_processor.llm_instrumentation import llm_call_tags
+        with llm_call_tags("learnings_retrieval"):
+            response = await model_client.create(messages=messages)
         # Extract text from response (handle different response formats)
         if hasattr(response, 'content') and response.content:
             learnings = response.content[0].text if hasattr(response.content[0], 'text') else str(response.content[0])
@@ -146,13 +182,15 @@ Format as concise bullets (≤18 words each) that can be intelligently applied t
         
         if learnings and len(learnings.strip()) > 50:
             formatted_learnings = f"**RECENT LEARNINGS**:\n{learnings}"
-            
+            guidance_cache.put(task, doc_ids, learnings)
+            await asyncio.to_thread(guidance_cache.save, guidance_cache.snapshot())
+
             # Log retrieved learnings to learnings.jsonl
             if context_memory:
                 context_memory.log_learning(
                     learning_type="retrieved_learnings",
                     content=learnings,
-                    source="azure_search",
+                    source=source,
                     metadata={
                         "task": task,
                         "similar_docs_count": len(similar_docs),
@@ -365,9 +403,9 @@ async def extract_and_save_learnings(
         if hasattr(context_memory, 'work_dir'):
             import os
             worklog_file = os.path.join(context_memory.work_dir, "logs", "worklog.jsonl")
-            if os.path.exists(worklog_file):
+            if log_exists(worklog_file):
                 try:
-                    with open(worklog_file, 'r', encoding='utf-8') as f:
+                    with open_log(worklog_file) as f:
                         for line in f:
                             line = line.strip()
                             if line:
@@ -443,9 +481,9 @@ async def extract_and_save_learnings(
         if hasattr(context_memory, 'work_dir'):
             import os
             learnings_file = os.path.join(context_memory.work_dir, "logs", "learnings.jsonl")
-            if os.path.exists(learnings_file):
+            if log_exists(learnings_file):
                 try:
-                    with open(learnings_file, 'r', encoding='utf-8') as f:
+                    with open_log(learnings_file) as f:
                         for line in f:
                             line = line.strip()
                             if line:
@@ -662,7 +700,9 @@ async def extract_and_save_learnings(
 Analyze the execution context above and extract the learning now:"""
         
         messages = [UserMessage(content=prompt, source="learning_service")]
-        response = await model_client.create(messages=messages)
+        from task_processor.llm_instrumentation import llm_call_tags, PRIORITY_BACKGROUND
+        with llm_call_tags("learning_extraction", priority=PRIORITY_BACKGROUND):
+            response = await model_client.create(messages=messages)
         
         # Extract text from response using the same robust logic as json_extractor
         # This ensures consistent extraction across all LLM calls
@@ -808,7 +848,10 @@ Analyze the execution context above and extract the learning now:"""
         }
         
         save_result = upsert_run_rest(doc)
-        
+        if save_result:
+            # Searchable by this worker right away, before the next index sync
+            get_learnings_index().add([doc])
+
         # Log to learnings.jsonl (always log, even if Azure save failed)
         if context_memory:
             try:
@@ -0,0 +1,294 @@
+"""
+Local retrieval tier for learnings.
+
+Every task used to search Azure Cognitive Search and then ask the LLM to
+synthesize guidance from the hits before any agent started. Each worker now
+keeps:
+
+- ``LearningsIndex``: a BM25 index over the learnings documents, persisted
+  under ``LEARNINGS_INDEX_DIR`` and synced from Azure in a background thread
+  every ``LEARNINGS_INDEX_REFRESH_SECONDS`` (incrementally, by document date).
+  Documents this worker saves are added right away.
+- ``GuidanceCache``: synthesized guidance keyed by the normalized task and the
+  ids of the documents it was built from, so a recurring task shape that
+  retrieves the same documents skips the LLM call.
+
+Azure search is only queried when the local index has no match (including
+before the first sync finishes). Documents deleted in Azure stay in the
+local index until its files are removed.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Dict, Iterable, List, Optional
+
+from services import metrics
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILE = "learnings_index.json"
+GUIDANCE_FILE = "guidance_cache.json"
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from how i in into is it me my of on or our please that the their this to "
+    "was we what when which with you your".split()
+)
+# BM25 parameters; task text counts twice as much as learning content
+_K1 = 1.5
+_B = 0.75
+_TASK_WEIGHT = 2
+
+
+def _tokens(text: str) -> List[str]:
+    return [t for t in _TOKEN_PATTERN.findall((text or "").lower()) if t not in _STOPWORDS and len(t) > 1]
+
+
+def normalize_task(task: str) -> str:
+    """Task text with case, numbers, punctuation and spacing normalized away."""
+    text = re.sub(r"\d+", "#", (task or "").lower())
+    text = re.sub(r"[^\w#]+", " ", text)
+    return " ".join(text.split())
+
+
+def _write_json_atomic(path: str, payload: Any) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(payload, f)
+    os.replace(tmp_path, path)
+
+
+class LearningsIndex:
+    """In-memory BM25 index of learnings documents, persisted to disk and refreshed from Azure."""
+
+    def __init__(self, directory: str, refresh_seconds: float = 900.0, max_docs: int = 5000):
+        self.path = os.path.join(directory, INDEX_FILE)
+        self.refresh_seconds = refresh_seconds
+        self.max_docs = max_docs
+        self._docs: Dict[str, Dict[str, Any]] = {}
+        self._term_freqs: Dict[str, Counter] = {}
+        self._lengths: Dict[str, int] = {}
+        self._doc_freqs: Counter = Counter()
+        self._total_length = 0
+        # Newest document date seen by a sync; later syncs only ask Azure for newer ones
+        self.synced_through: Optional[str] = None
+        self.synced_at = 0.0
+        self._lock = threading.Lock()
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def _load(self) -> None:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                payload = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning(f"[Learning] Ignoring unreadable learnings index {self.path}: {e}")
+            return
+        self.add(payload.get("docs") or [])
+        self.synced_at = float(payload.get("synced_at") or 0.0)
+        self.synced_through = payload.get("synced_through")
+        logger.info(f"📚 Loaded {len(self._docs)} learnings into the local index from {self.path}")
+
+    def save(self) -> None:
+        with self._lock:
+            payload = {"synced_at": self.synced_at, "synced_through": self.synced_through, "docs": list(self._docs.values())}
+        try:
+            _write_json_atomic(self.path, payload)
+        except OSError as e:
+            logger.warning(f"[Learning] Failed to save learnings index: {e}")
+
+    def _remove_locked(self, doc_id: str) -> None:
+        freqs = self._term_freqs.pop(doc_id, None)
+        self._docs.pop(doc_id, None)
+        if freqs is None:
+            return
+        self._total_length -= self._lengths.pop(doc_id)
+        for term in freqs:
+            self._doc_freqs[term] -= 1
+            if self._doc_freqs[term] <= 0:
+                del self._doc_freqs[term]
+
+    def add(self, docs: Iterable[Dict[str, Any]]) -> int:
+        """Add or replace documents (by ``id``); returns how many were indexed."""
+        added = 0
+        with self._lock:
+            for doc in docs:
+                doc_id = doc.get("id")
+                if not doc_id:
+                    continue
+                self._remove_locked(doc_id)
+                freqs = Counter(_tokens(doc.get("task", "")) * _TASK_WEIGHT + _tokens(doc.get("content", "")))
+                self._docs[doc_id] = {key: doc.get(key) for key in ("id", "task", "content", "date", "requestId", "owner")}
+                self._term_freqs[doc_id] = freqs
+                self._lengths[doc_id] = sum(freqs.values())
+                self._total_length += self._lengths[doc_id]
+                self._doc_freqs.update(freqs.keys())
+                added += 1
+            # Keep the newest documents when over capacity
+            if len(self._docs) > self.max_docs:
+                by_date = sorted(self._docs.values(), key=lambda d: str(d.get("date") or ""))
+                for doc in by_date[: len(self._docs) - self.max_docs]:
+                    self._remove_locked(doc["id"])
+            metrics.set_gauge("learnings.index_docs", len(self._docs))
+        return added
+
+    def search(self, query: str, top: int = 5) -> List[Dict[str, Any]]:
+        """Best BM25 matches for ``query`` (documents without scores, like ``search_similar_rest``)."""
+        terms = set(_tokens(query))
+        with self._lock:
+            if not terms or not self._docs:
+                return []
+            count = len(self._docs)
+            avg_length = self._total_length / count or 1.0
+            idf = {
+                term: math.log(1 + (count - self._doc_freqs[term] + 0.5) / (self._doc_freqs[term] + 0.5))
+                for term in terms if term in self._doc_freqs
+            }
+            if not idf:
+                return []
+            scored = []
+            for doc_id, freqs in self._term_freqs.items():
+                length = self._lengths[doc_id]
+                score = 0.0
+                for term, weight in idf.items():
+                    tf = freqs.get(term, 0)
+                    if tf:
+                        score += weight * tf * (_K1 + 1) / (tf + _K1 * (1 - _B + _B * length / avg_length))
+                if score > 0:
+                    scored.append((score, doc_id))
+            scored.sort(reverse=True)
+            return [dict(self._docs[doc_id]) for _, doc_id in scored[:top]]
+
+    @property
+    def stale(self) -> bool:
+        return time.time() - self.synced_at >= self.refresh_seconds
+
+    def refresh(self) -> int:
+        """Pull new documents from Azure (blocking); returns how many were added."""
+        from services.azure_ai_search import list_learnings_rest
+
+        started = time.monotonic()
+        since = self.synced_through
+        fetched: List[Dict[str, Any]] = []
+        page = 1000
+        while len(fetched) < self.max_docs:
+            docs = list_learnings_rest(since=since, top=page, skip=len(fetched))
+            fetched.extend(docs)
+            if len(docs) < page:
+                break
+        added = self.add(fetched)
+        dates = [str(doc["date"]) for doc in fetched if doc.get("date")]
+        if dates:
+            self.synced_through = max(dates + ([self.synced_through] if self.synced_through else []))
+        self.synced_at = time.time()
+        self.save()
+        metrics.observe("learnings.refresh_seconds", time.monotonic() - started)
+        logger.info(f"📚 Learnings index synced: {added} new docs, {len(self._docs)} total")
+        return added
+
+    def schedule_refresh(self) -> None:
+        """Start a background refresh if the index is stale and none is running."""
+        if not self.stale or (self._refresh_task is not None and not self._refresh_task.done()):
+            return
+        self._refresh_task = asyncio.create_task(self._refresh_in_background())
+
+    async def _refresh_in_background(self) -> None:
+        try:
+            await asyncio.to_thread(self.refresh)
+        except Exception as e:
+            logger.warning(f"[Learning] Learnings index refresh failed: {e}")
+            # Back off a full interval instead of retrying on every task
+            self.synced_at = time.time()
+
+
+class GuidanceCache:
+    """Synthesized learnings guidance keyed by (normalized task, retrieved doc ids), LRU with a TTL."""
+
+    def __init__(self, directory: str, ttl_seconds: float = 86400.0, max_entries: int = 500):
+        self.path = os.path.join(directory, GUIDANCE_FILE)
+        self.ttl = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                self._entries.update(json.load(f))
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            logger.warning(f"[Learning] Ignoring unreadable guidance cache {self.path}: {e}")
+
+    @staticmethod
+    def key(task: str, doc_ids: Iterable[str]) -> str:
+        raw = json.dumps([normalize_task(task), sorted(str(doc_id) for doc_id in doc_ids)])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, task: str, doc_ids: Iterable[str]) -> Optional[str]:
+        key = self.key(task, doc_ids)
+        entry = self._entries.get(key)
+        if entry is None or time.time() - entry["created_at"] > self.ttl:
+            self._entries.pop(key, None)
+            metrics.increment("learnings.guidance_cache", result="miss")
+            return None
+        self._entries.move_to_end(key)
+        metrics.increment("learnings.guidance_cache", result="hit")
+        return entry["learnings"]
+
+    def put(self, task: str, doc_ids: Iterable[str], learnings: str) -> None:
+        self._entries[self.key(task, doc_ids)] = {"learnings": learnings, "created_at": time.time()}
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        return dict(self._entries)
+
+    def save(self, snapshot: Optional[Dict[str, Dict[str, Any]]] = None) -> None:
+        """Write the cache; pass a ``snapshot()`` taken on the event loop when saving from a thread."""
+        try:
+            _write_json_atomic(self.path, snapshot if snapshot is not None else self.snapshot())
+        except OSError as e:
+            logger.warning(f"[Learning] Failed to save guidance cache: {e}")
+
+
+def _index_dir() -> str:
+    return os.getenv("LEARNINGS_INDEX_DIR") or os.path.join(os.getenv("WORK_DIR_ROOT", "/tmp/coding"), ".learnings")
+
+
+# Global instances
+_learnings_index: Optional[LearningsIndex] = None
+_guidance_cache: Optional[GuidanceCache] = None
+
+
+def get_learnings_index() -> LearningsIndex:
+    """Get or create the worker's local learnings index (loaded from disk)."""
+    global _learnings_index
+    if _learnings_index is None:
+        _learnings_index = LearningsIndex(
+            _index_dir(),
+            refresh_seconds=float(os.getenv("LEARNINGS_INDEX_REFRESH_SECONDS", "900")),
+            max_docs=int(os.getenv("LEARNINGS_INDEX_MAX_DOCS", "5000")),
+        )
+    return _learnings_index
+
+
+def get_guidance_cache() -> GuidanceCache:
+    """Get or create the worker's synthesized guidance cache (loaded from disk)."""
+    global _guidance_cache
+    if _guidance_cache is None:
+        _guidance_cache = GuidanceCache(
+            _index_dir(),
+            ttl_seconds=float(os.getenv("LEARNINGS_GUIDANCE_TTL_SECONDS", "86400")),
+        )
+    return _guidance_cache
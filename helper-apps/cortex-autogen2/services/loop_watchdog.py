@@ -0,0 +1,128 @@
+"""
+Event-loop blocking detector (opt-in with ``LOOP_WATCHDOG=true``).
+
+Blocking calls on the event loop (``requests.get``, ``time.sleep``, sync file
+or SDK I/O) stall every coroutine in the worker, including lease renewals and
+progress heartbeats. The watchdog has two parts:
+
+- a heartbeat coroutine that wakes every ``LOOP_WATCHDOG_INTERVAL_MS`` and
+  records how late it woke up (``loop.lag_seconds``)
+- a daemon thread that notices when the heartbeat is overdue by more than
+  ``LOOP_WATCHDOG_THRESHOLD_MS`` and captures the loop thread's stack while the
+  offending callback is still running
+
+When the loop resumes, the stall is logged with its stack, counted in
+``loop.blocked`` / ``loop.blocked_seconds`` and added as a ``loop_blocked``
+span (with the stack) to the trace of every task in flight.
+"""
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Optional
+
+from services import metrics
+from services.tracing import get_tracer
+
+logger = logging.getLogger(__name__)
+
+# Frames kept from the innermost end of a captured stack
+STACK_DEPTH = 12
+
+
+class LoopWatchdog:
+    """Measures event-loop lag and captures the stack of callbacks that block it."""
+
+    def __init__(self, threshold_seconds: float = 0.1, interval_seconds: float = 0.05):
+        self.threshold = threshold_seconds
+        self.interval = interval_seconds
+        self.stalls: deque = deque(maxlen=50)
+        self._beat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._captured_stack: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def start(self) -> None:
+        """Start watching the running event loop."""
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+        logger.info(f"🐶 Event loop watchdog started (threshold {self.threshold * 1000:.0f}ms)")
+
+    async def stop(self) -> None:
+        self._stop.set()
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def _heartbeat(self) -> None:
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._beat = now
+            lag = max(0.0, now - expected)
+            metrics.observe("loop.lag_seconds", lag)
+            if lag > self.threshold:
+                self._report(lag)
+
+    def _watch(self) -> None:
+        """Runs in a thread: grab the loop thread's stack while it is blocked."""
+        while not self._stop.wait(self.interval):
+            overdue = time.monotonic() - self._beat - self.interval
+            if overdue > self.threshold and self._captured_stack is None:
+                frame = sys._current_frames().get(self._loop_thread_id)
+                if frame is not None:
+                    self._captured_stack = "".join(traceback.format_stack(frame)[-STACK_DEPTH:])
+
+    def _report(self, lag: float) -> None:
+        stack, self._captured_stack = self._captured_stack, None
+        metrics.increment("loop.blocked")
+        metrics.observe("loop.blocked_seconds", lag)
+        stall = {"at": time.time(), "blocked_s": round(lag, 3), "stack": stack}
+        self.stalls.append(stall)
+        logger.warning(f"🐢 Event loop blocked for {lag * 1000:.0f}ms"
+                       + (f"; blocking stack:\n{stack}" if stack else " (stack not captured)"))
+        tracer = get_tracer()
+        for task_id in tracer.open_task_ids():
+            tracer.add_span("loop_blocked", stall["at"] - lag, lag, lane="event_loop", category="blocking",
+                            task_id=task_id, args={"stack": stack or ""})
+
+
+# Global watchdog instance
+_watchdog: Optional[LoopWatchdog] = None
+
+
+def get_loop_watchdog() -> LoopWatchdog:
+    """Get or create the global watchdog (thresholds from LOOP_WATCHDOG_* env vars)."""
+    global _watchdog
+    if _watchdog is None:
+        _watchdog = LoopWatchdog(
+            threshold_seconds=float(os.getenv("LOOP_WATCHDOG_THRESHOLD_MS", "100")) / 1000,
+            interval_seconds=float(os.getenv("LOOP_WATCHDOG_INTERVAL_MS", "50")) / 1000,
+        )
+    return _watchdog
+
+
+def start_loop_watchdog_if_enabled() -> Optional[LoopWatchdog]:
+    """Start the watchdog when ``LOOP_WATCHDOG=true``; returns it (or None)."""
+    if os.getenv("LOOP_WATCHDOG", "false").lower() != "true":
+        return None
+    watchdog = get_loop_watchdog()
+    watchdog.start()
+    return watchdog
@@ -0,0 +1,131 @@
+"""
+In-memory task queue backend for tests, benchmarks and local runs.
+
+Implements the same lease semantics as the Azure backend: received messages are
+invisible until their visibility timeout expires, every lease change issues a
+new pop receipt, and stale receipts are rejected. Named queues are shared within
+the process (``get_memory_queue``) so a producer and the worker loop can use the
+same instance.
+"""
+import asyncio
+import logging
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Dict
+
+from services import metrics
+from services.queue_backend import QueueBackend
+
+logger = logging.getLogger(__name__)
+
+
+class InMemoryQueueService(QueueBackend):
+    """Process-local queue with visibility timeouts and pop receipts."""
+
+    def __init__(self, queue_name: str = "memory", block_seconds: float = 0.0):
+        super().__init__(queue_name)
+        # How long get_tasks waits for a message when the queue is empty
+        self.block_seconds = block_seconds
+        self._ready: deque = deque()
+        # message id -> {"pop_receipt", "visible_at"} for leased messages
+        self._in_flight: "OrderedDict[str, dict]" = OrderedDict()
+        self._contents: Dict[str, str] = {}
+        self._dequeue_counts: Dict[str, int] = {}
+        self._enqueued_at: Dict[str, float] = {}
+        self._available = asyncio.Event()
+
+    def _requeue_expired(self) -> None:
+        now = time.monotonic()
+        for message_id, lease in list(self._in_flight.items()):
+            if lease["visible_at"] <= now:
+                self._in_flight.pop(message_id)
+                self._ready.appendleft(message_id)
+                metrics.increment("queue.reclaimed", backend="memory")
+
+    async def get_tasks(self, max_messages: int = 1) -> list:
+        self._requeue_expired()
+        if not self._ready and self.block_seconds > 0:
+            self._available.clear()
+            try:
+                await asyncio.wait_for(self._available.wait(), timeout=self.block_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._requeue_expired()
+
+        result = []
+        while self._ready and len(result) < max(1, max_messages):
+            message_id = self._ready.popleft()
+            if message_id not in self._contents:
+                continue  # Deleted while waiting
+            receipt = uuid.uuid4().hex
+            self._dequeue_counts[message_id] = self._dequeue_counts.get(message_id, 0) + 1
+            self._in_flight[message_id] = {
+                "pop_receipt": receipt,
+                "visible_at": time.monotonic() + self.visibility_timeout,
+            }
+            result.append({
+                "id": message_id,
+                "content": self._contents[message_id],
+                "pop_receipt": receipt,
+                "dequeue_count": self._dequeue_counts[message_id],
+                "enqueued_at": self._enqueued_at.get(message_id),
+            })
+        metrics.set_gauge("queue.pending", len(self._in_flight), backend="memory")
+        metrics.set_gauge("queue.stream_length", len(self._contents), backend="memory")
+        return result
+
+    async def send_task(self, content: str) -> str:
+        message_id = uuid.uuid4().hex
+        self._contents[message_id] = content
+        self._enqueued_at[message_id] = time.time()
+        self._ready.append(message_id)
+        self._available.set()
+        return message_id
+
+    def _check_receipt(self, message_id: str, pop_receipt: str) -> dict:
+        lease = self._in_flight.get(message_id)
+        if not lease or lease["pop_receipt"] != pop_receipt:
+            raise KeyError(f"Message {message_id} is not leased with this pop receipt")
+        return lease
+
+    async def delete_task(self, message_id: str, pop_receipt: str):
+        self._check_receipt(message_id, pop_receipt)
+        self._in_flight.pop(message_id, None)
+        self._contents.pop(message_id, None)
+        self._dequeue_counts.pop(message_id, None)
+        self._enqueued_at.pop(message_id, None)
+
+    async def extend_visibility(self, message_id: str, pop_receipt: str, visibility_timeout: int) -> str:
+        lease = self._check_receipt(message_id, pop_receipt)
+        lease["pop_receipt"] = uuid.uuid4().hex
+        lease["visible_at"] = time.monotonic() + visibility_timeout
+        return lease["pop_receipt"]
+
+    async def release_task(self, message_id: str, pop_receipt: str):
+        self._check_receipt(message_id, pop_receipt)
+        self._in_flight.pop(message_id, None)
+        self._ready.appendleft(message_id)
+        self._available.set()
+
+    async def peek_messages(self, max_messages: int = 1) -> list:
+        self._requeue_expired()
+        return [{"id": message_id, "content": self._contents[message_id]}
+                for message_id in list(self._ready)[:max_messages] if message_id in self._contents]
+
+    def qsize(self) -> int:
+        """Number of messages not yet deleted (waiting or leased)."""
+        return len(self._contents)
+
+
+# Named in-memory queues shared within the process
+_queues: Dict[str, InMemoryQueueService] = {}
+
+
+def get_memory_queue(queue_name: str = "memory") -> InMemoryQueueService:
+    """Get or create the in-memory queue with the given name."""
+    queue = _queues.get(queue_name)
+    if queue is None:
+        queue = InMemoryQueueService(queue_name)
+        _queues[queue_name] = queue
+    return queue
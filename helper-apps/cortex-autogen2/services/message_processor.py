@@ -190,7 +190,9 @@ If no files detected, return {{"files": [], "markers": []}}
 """
         
         from autogen_core.models import UserMessage
-        response = await model_client.create([UserMessage(content=prompt, source="file_detector")])
+        from task_processor.llm_instrumentation import llm_call_tags, PRIORITY_BOOKKEEPING
+        with llm_call_tags("file_detection", priority=PRIORITY_BOOKKEEPING):
+            response = await model_client.create([UserMessage(content=prompt, source="file_detector")])
         
         # Extract JSON using centralized utility
         from util.json_extractor import extract_json_from_model_response
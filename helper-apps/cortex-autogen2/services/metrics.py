@@ -0,0 +1,118 @@
+"""
+Lightweight in-process metrics.
+
+Counters, gauges and bounded latency samples kept in memory so the worker can
+expose operational numbers (live state, queue depth, call counts) without an
+external metrics dependency. Snapshots are plain dicts and can be logged or
+written next to the per-task logs.
+"""
+import logging
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of samples retained per observed series
+MAX_SAMPLES = 1024
+
+_lock = threading.Lock()
+_counters: Dict[str, float] = {}
+_gauges: Dict[str, float] = {}
+_samples: Dict[str, Deque[float]] = {}
+
+
+def _key(name: str, labels: Dict[str, Any]) -> str:
+    """Build a stable series key such as ``name{agent=coder,model=gpt-5.1}``."""
+    if not labels:
+        return name
+    parts = ",".join(f"{k}={labels[k]}" for k in sorted(labels))
+    return f"{name}{{{parts}}}"
+
+
+def increment(name: str, value: float = 1.0, **labels) -> None:
+    """Increment a monotonically increasing counter."""
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0.0) + value
+
+
+def set_gauge(name: str, value: float, **labels) -> None:
+    """Set a gauge to an absolute value."""
+    key = _key(name, labels)
+    with _lock:
+        _gauges[key] = float(value)
+
+
+def observe(name: str, value: float, **labels) -> None:
+    """Record a sample (e.g. a latency in seconds) for percentile summaries."""
+    key = _key(name, labels)
+    with _lock:
+        series = _samples.get(key)
+        if series is None:
+            series = deque(maxlen=MAX_SAMPLES)
+            _samples[key] = series
+        series.append(float(value))
+
+
+def _percentile(sorted_values: list, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(pct * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+
+def summarize(values) -> Dict[str, float]:
+    """Return count/mean/p50/p95/p99/max for a list of samples."""
+    ordered = sorted(values)
+    if not ordered:
+        return {"count": 0, "mean": 0.0, "p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+    return {
+        "count": len(ordered),
+        "mean": sum(ordered) / len(ordered),
+        "p50": _percentile(ordered, 0.50),
+        "p95": _percentile(ordered, 0.95),
+        "p99": _percentile(ordered, 0.99),
+        "max": ordered[-1],
+    }
+
+
+def get_counter(name: str, **labels) -> float:
+    """Read the current value of a counter."""
+    with _lock:
+        return _counters.get(_key(name, labels), 0.0)
+
+
+def get_gauge(name: str, **labels) -> float:
+    """Read the current value of a gauge."""
+    with _lock:
+        return _gauges.get(_key(name, labels), 0.0)
+
+
+def snapshot() -> Dict[str, Any]:
+    """Return a point-in-time copy of all counters, gauges and sample summaries."""
+    with _lock:
+        counters = dict(_counters)
+        gauges = dict(_gauges)
+        samples: Dict[str, Tuple[float, ...]] = {k: tuple(v) for k, v in _samples.items()}
+    return {
+        "counters": counters,
+        "gauges": gauges,
+        "summaries": {k: summarize(v) for k, v in samples.items()},
+    }
+
+
+def log_snapshot(level: int = logging.INFO) -> None:
+    """Log the current metrics snapshot on a single line."""
+    snap = snapshot()
+    if not (snap["counters"] or snap["gauges"] or snap["summaries"]):
+        return
+    logger.log(level, f"📈 Metrics: counters={snap['counters']} gauges={snap['gauges']}")
+
+
+def reset() -> None:
+    """Clear all metrics (used by benchmarks between runs)."""
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _samples.clear()
@@ -0,0 +1,361 @@
+"""
+Post-delivery job queue.
+
+Work that only matters after the user has the result (learning extraction,
+one-shot detection, journey analytics, search indexing) used to run before
+``process_task`` returned, holding the worker slot and the queue message. It is
+now enqueued here and run in the background by ``POST_TASK_WORKERS`` workers, so
+the worker acks the message and takes the next task as soon as the result is
+delivered.
+
+Jobs are JSON payloads dispatched to a handler registered for their ``kind``.
+A handler that raises is retried with exponential backoff (starting at
+``POST_TASK_RETRY_SECONDS``) up to ``POST_TASK_MAX_ATTEMPTS`` times. Every job is
+appended to a spill file together with its retries and completion, so jobs
+interrupted by a restart run again when the queue is next loaded. ``drain``
+waits for pending jobs on shutdown.
+
+Each process writes its own journal (``POST_TASK_QUEUE_DIR/jobs-<host>-<pid>.jsonl``)
+and holds an exclusive ``flock`` on ``<journal>.lock`` while it runs. On load,
+journals whose lock is free belong to processes that are gone: their unfinished
+jobs are adopted into this process's journal and the orphaned files removed.
+The journal is rewritten atomically (temp file + rename) with only the
+unfinished jobs after every ``POST_TASK_COMPACT_EVERY`` finished jobs.
+"""
+import asyncio
+import contextvars
+import glob
+import json
+import logging
+import os
+import socket
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Not on POSIX: journals are still per process, orphans are not adopted
+    fcntl = None
+
+from services import metrics
+
+logger = logging.getLogger(__name__)
+
+SPILL_PREFIX = "jobs"
+
+# Both receive the job payload
+JobHandler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+class PostTaskQueue:
+    """In-process background job queue with retries and a JSONL spill file."""
+
+    def __init__(self, directory: str, workers: int = 1, max_attempts: int = 3, retry_seconds: float = 30.0,
+                 compact_every: int = 200, journal_name: Optional[str] = None):
+        self.directory = directory
+        journal_name = journal_name or f"{SPILL_PREFIX}-{socket.gethostname()}-{os.getpid()}"
+        self.spill_path = os.path.join(directory, f"{journal_name}.jsonl")
+        self.compact_every = max(1, compact_every)
+        self.workers = max(1, workers)
+        self.max_attempts = max(1, max_attempts)
+        self.retry_seconds = retry_seconds
+        self._handlers: Dict[str, JobHandler] = {}
+        self._finishers: Dict[str, JobHandler] = {}
+        self._jobs: List[Dict[str, Any]] = []
+        self._running: Dict[str, Dict[str, Any]] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loaded = False
+        self._lock_fd: Optional[int] = None
+        # done/failed records appended since the journal was last rewritten
+        self._finished_since_compact = 0
+
+    def __len__(self) -> int:
+        return len(self._jobs) + len(self._running)
+
+    def register(self, kind: str, handler: JobHandler, on_finish: Optional[JobHandler] = None) -> None:
+        """Set the handler for ``kind``; ``on_finish`` runs once the job is done or has failed for good."""
+        self._handlers[kind] = handler
+        if on_finish is not None:
+            self._finishers[kind] = on_finish
+
+    def enqueue(self, kind: str, task_id: str, payload: Dict[str, Any]) -> str:
+        """Queue a job and make sure workers are running; returns the job id."""
+        self._load_spill()
+        job = {"id": uuid.uuid4().hex, "kind": kind, "task_id": task_id, "payload": payload,
+               "attempts": 0, "not_before": 0.0, "enqueued_at": time.time()}
+        self._append({"event": "enqueued", "job": job})
+        self._jobs.append(job)
+        metrics.increment("post_task.enqueued", kind=kind)
+        self._publish_gauge()
+        self._ensure_running()
+        return job["id"]
+
+    def pending_payloads(self, kind: str) -> List[Dict[str, Any]]:
+        """Payloads of queued (not running) jobs of ``kind``, including those loaded from the spill file."""
+        self._load_spill()
+        return [job["payload"] for job in self._jobs if job["kind"] == kind]
+
+    def resume(self) -> int:
+        """Load jobs left in the spill file by a previous process and start running them."""
+        self._load_spill()
+        if self._jobs:
+            self._ensure_running()
+        return len(self._jobs)
+
+    # ------------------------------------------------------------------
+    # Spill file
+    # ------------------------------------------------------------------
+
+    def _append(self, record: Dict[str, Any]) -> None:
+        try:
+            os.makedirs(os.path.dirname(self.spill_path), exist_ok=True)
+            with open(self.spill_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, default=str) + "\n")
+        except OSError as e:
+            logger.warning(f"Failed to spill post-task job record: {e}")
+
+    @staticmethod
+    def _read_pending(path: str) -> Optional[Dict[str, Dict[str, Any]]]:
+        """Unfinished jobs recorded in a journal (None if it cannot be read)."""
+        pending: Dict[str, Dict[str, Any]] = {}
+        try:
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    event = record.get("event")
+                    if event == "enqueued":
+                        pending[record["job"]["id"]] = record["job"]
+                    elif event == "retry" and record.get("id") in pending:
+                        pending[record["id"]].update(attempts=record["attempts"], not_before=record["not_before"])
+                    elif event in ("done", "failed"):
+                        pending.pop(record.get("id"), None)
+        except FileNotFoundError:
+            return {}
+        except OSError as e:
+            logger.warning(f"Failed to read post-task spill file {path}: {e}")
+            return None
+        return pending
+
+    @staticmethod
+    def _try_lock(lock_path: str) -> Optional[int]:
+        """Take an exclusive non-blocking flock on ``lock_path``; returns the fd, or None if held elsewhere."""
+        if fcntl is None:
+            return None
+        fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return None
+        return fd
+
+    def _adopt_orphans(self) -> Tuple[Dict[str, Dict[str, Any]], List[Tuple[str, int]]]:
+        """Collect unfinished jobs from journals of processes that no longer hold their lock.
+
+        Returns the jobs and the ``(journal path, lock fd)`` of each orphan; the caller
+        removes the orphans once the jobs are safely in this process's journal.
+        """
+        adopted: Dict[str, Dict[str, Any]] = {}
+        orphans: List[Tuple[str, int]] = []
+        if fcntl is None:
+            return adopted, orphans
+        for path in glob.glob(os.path.join(self.directory, f"{SPILL_PREFIX}*.jsonl")):
+            if os.path.abspath(path) == os.path.abspath(self.spill_path):
+                continue
+            try:
+                fd = self._try_lock(f"{path}.lock")
+            except OSError as e:
+                logger.debug(f"Could not check post-task journal {path}: {e}")
+                continue
+            if fd is None:
+                continue  # Owner is still running
+            jobs = self._read_pending(path)
+            if jobs is None:
+                os.close(fd)
+                continue
+            adopted.update(jobs)
+            orphans.append((path, fd))
+        return adopted, orphans
+
+    def _load_spill(self) -> None:
+        """Replay this process's journal and adopt orphaned ones once, then compact."""
+        if self._loaded:
+            return
+        self._loaded = True
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            self._lock_fd = self._try_lock(f"{self.spill_path}.lock")
+        except OSError as e:
+            logger.warning(f"Failed to lock post-task spill file: {e}")
+        pending = self._read_pending(self.spill_path)
+        if pending is None:
+            return
+        orphaned, orphans = self._adopt_orphans()
+        for job_id, job in orphaned.items():
+            pending.setdefault(job_id, job)
+        if pending:
+            logger.info(f"📮 Resuming {len(pending)} post-task job(s) in {self.spill_path}"
+                        + (f" ({len(orphaned)} adopted from {len(orphans)} stopped worker(s))" if orphaned else ""))
+            self._jobs.extend(pending.values())
+            self._publish_gauge()
+        compacted = self._compact()
+        for path, fd in orphans:
+            if compacted:
+                for stale in (path, f"{path}.lock"):
+                    try:
+                        os.remove(stale)
+                    except OSError:
+                        pass
+            os.close(fd)
+
+    def _compact(self) -> bool:
+        """Atomically rewrite the journal with only unfinished (queued and running) jobs."""
+        try:
+            tmp_path = f"{self.spill_path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for job in list(self._running.values()) + self._jobs:
+                    f.write(json.dumps({"event": "enqueued", "job": job}, default=str) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.spill_path)
+        except OSError as e:
+            logger.warning(f"Failed to compact post-task spill file: {e}")
+            return False
+        self._finished_since_compact = 0
+        metrics.increment("post_task.compactions")
+        return True
+
+    def _record_finished(self) -> None:
+        self._finished_since_compact += 1
+        if self._finished_since_compact >= self.compact_every:
+            self._compact()
+
+    # ------------------------------------------------------------------
+    # Workers
+    # ------------------------------------------------------------------
+
+    def _publish_gauge(self) -> None:
+        metrics.set_gauge("post_task.pending", len(self))
+
+    def _ensure_running(self) -> None:
+        loop = asyncio.get_running_loop()
+        self._tasks = [task for task in self._tasks if not task.done() and task.get_loop() is loop]
+        if self._wakeup is None or not self._tasks:
+            self._wakeup = asyncio.Event()
+        self._wakeup.set()
+        while len(self._tasks) < self.workers:
+            # Fresh context: jobs must not inherit the enqueuing task's LLM tags or trace lane
+            self._tasks.append(asyncio.create_task(self._worker(), context=contextvars.Context()))
+
+    def _next_job(self) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        for index, job in enumerate(self._jobs):
+            if job["not_before"] <= now:
+                return self._jobs.pop(index)
+        return None
+
+    async def _worker(self) -> None:
+        try:
+            while self._jobs or self._running:
+                job = self._next_job()
+                if job is None:
+                    if not self._jobs:
+                        break
+                    self._wakeup.clear()
+                    delay = min(j["not_before"] for j in self._jobs) - time.time()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=max(0.05, delay))
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                await self._run_job(job)
+        except asyncio.CancelledError:
+            pass
+
+    async def _run_job(self, job: Dict[str, Any]) -> None:
+        handler = self._handlers.get(job["kind"])
+        self._running[job["id"]] = job
+        started = time.monotonic()
+        finished = True
+        try:
+            if handler is None:
+                raise RuntimeError(f"no handler registered for {job['kind']!r}")
+            await handler(job["payload"])
+        except asyncio.CancelledError:
+            # Shutdown: the job stays in the spill file and runs again on the next start
+            self._running.pop(job["id"], None)
+            raise
+        except Exception as e:
+            job["attempts"] += 1
+            if handler is not None and job["attempts"] < self.max_attempts:
+                job["not_before"] = time.time() + self.retry_seconds * 2 ** (job["attempts"] - 1)
+                self._append({"event": "retry", "id": job["id"], "attempts": job["attempts"], "not_before": job["not_before"]})
+                self._jobs.append(job)
+                finished = False
+                metrics.increment("post_task.retries", kind=job["kind"])
+                logger.warning(f"📮 Post-task job {job['kind']} for {job['task_id']} failed (attempt {job['attempts']}), retrying: {e}")
+            else:
+                self._append({"event": "failed", "id": job["id"], "error": str(e)[:500]})
+                metrics.increment("post_task.jobs", kind=job["kind"], status="failed")
+                logger.error(f"📮 Post-task job {job['kind']} for {job['task_id']} failed permanently: {e}")
+        else:
+            self._append({"event": "done", "id": job["id"]})
+            metrics.increment("post_task.jobs", kind=job["kind"], status="done")
+            metrics.observe("post_task.job_seconds", time.monotonic() - started, kind=job["kind"])
+        if finished:
+            await self._finish(job)
+        self._running.pop(job["id"], None)
+        if finished:
+            self._record_finished()
+        self._publish_gauge()
+
+    async def _finish(self, job: Dict[str, Any]) -> None:
+        finisher = self._finishers.get(job["kind"])
+        if finisher is None:
+            return
+        try:
+            await finisher(job["payload"])
+        except Exception as e:
+            logger.warning(f"📮 Post-task cleanup for {job['kind']} job of {job['task_id']} failed: {e}")
+
+    async def drain(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every job has finished; jobs left after ``timeout`` stay in the spill file."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self:
+            if self._jobs:
+                self._ensure_running()
+            if deadline is not None and time.monotonic() >= deadline:
+                logger.warning(f"📮 {len(self)} post-task job(s) still pending after {timeout:.0f}s; they stay in {self.spill_path}")
+                return False
+            await asyncio.sleep(0.1)
+        return True
+
+    async def stop(self) -> None:
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+
+# Global queue instance
+_post_task_queue: Optional[PostTaskQueue] = None
+
+
+def get_post_task_queue() -> PostTaskQueue:
+    """Get or create the global post-task queue (settings from POST_TASK_* env vars)."""
+    global _post_task_queue
+    if _post_task_queue is None:
+        _post_task_queue = PostTaskQueue(
+            os.getenv("POST_TASK_QUEUE_DIR") or os.path.join(os.getenv("WORK_DIR_ROOT", "/tmp/coding"), ".post_task"),
+            workers=int(os.getenv("POST_TASK_WORKERS", "1")),
+            max_attempts=int(os.getenv("POST_TASK_MAX_ATTEMPTS", "3")),
+            retry_seconds=float(os.getenv("POST_TASK_RETRY_SECONDS", "30")),
+            compact_every=int(os.getenv("POST_TASK_COMPACT_EVERY", "200")),
+        )
+    return _post_task_queue
@@ -0,0 +1,162 @@
+"""
+Per-request progress streams.
+
+With ``PROGRESS_TRANSPORT=streams`` progress is not published on the shared
+``REDIS_CHANNEL``; each request gets its own capped Redis Stream
+(``progress:stream:<requestId>``, ``MAXLEN ~ PROGRESS_STREAM_MAXLEN``, expiring
+``PROGRESS_STREAM_TTL`` seconds after the last entry). Clients read only the
+requests they care about, and a client that connects late replays the stream
+from ``0`` instead of missing what was already sent.
+
+Updates are coalesced: the latest update per request is held for
+``PROGRESS_COALESCE_MS`` and everything pending is written in one pipeline.
+Terminal updates (``progress >= 1.0``, with or without data) are written right
+away, and an update still held when its request is released is written then
+rather than dropped.
+
+Entries are deltas against the previous entry of the same stream:
+
+- ``progress`` is always present
+- ``info`` only when it changed
+- ``data`` and ``final=1`` only on the final entry
+
+``apply_progress_delta`` rebuilds the full ``{requestId, progress, info, data}``
+message on the reading side.
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from services import metrics
+from services.request_state import get_request_state_registry
+
+logger = logging.getLogger(__name__)
+
+STREAM_KEY_PREFIX = "progress:stream:"
+
+# (stream key, entry fields)
+StreamEntry = Tuple[str, Dict[str, str]]
+
+
+def progress_stream_key(request_id: str) -> str:
+    return f"{STREAM_KEY_PREFIX}{request_id}"
+
+
+def encode_progress_delta(previous: Optional[Dict[str, Any]], message: Dict[str, Any]) -> Dict[str, str]:
+    """Stream entry fields for ``message`` given the last message written to the same stream."""
+    fields = {"progress": f"{float(message.get('progress', 0.0)):.4f}"}
+    info = str(message.get("info") or "")
+    if previous is None or previous.get("info") != info:
+        fields["info"] = info
+    if message.get("data") is not None:
+        fields["data"] = str(message["data"])
+        fields["final"] = "1"
+    return fields
+
+
+def apply_progress_delta(state: Dict[str, Any], fields: Dict[Any, Any]) -> Dict[str, Any]:
+    """Fold one stream entry into ``state`` (updated in place) and return the full message."""
+    decoded = {
+        (k.decode() if isinstance(k, bytes) else k): (v.decode() if isinstance(v, bytes) else v)
+        for k, v in fields.items()
+    }
+    state["progress"] = float(decoded.get("progress", state.get("progress", 0.0)))
+    if "info" in decoded:
+        state["info"] = decoded["info"]
+    state["data"] = decoded.get("data")
+    return {
+        "requestId": state.get("requestId"),
+        "progress": state["progress"],
+        "info": state.get("info", ""),
+        "data": state["data"],
+    }
+
+
+def read_progress_stream(client, request_id: str, last_id: str = "0", block_ms: Optional[int] = None,
+                         state: Optional[Dict[str, Any]] = None) -> Tuple[str, List[Dict[str, Any]]]:
+    """Read entries after ``last_id`` as full messages; returns ``(last_id, messages)``.
+
+    Pass the same ``state`` dict across calls so deltas resolve against earlier entries.
+    """
+    state = state if state is not None else {}
+    state.setdefault("requestId", request_id)
+    key = progress_stream_key(request_id)
+    response = client.xread({key: last_id}, block=block_ms) or []
+    messages = []
+    for _stream, entries in response:
+        for entry_id, fields in entries:
+            last_id = entry_id.decode() if isinstance(entry_id, bytes) else entry_id
+            messages.append(apply_progress_delta(state, fields))
+    return last_id, messages
+
+
+class ProgressStreamWriter:
+    """Coalesces progress per request and writes the deltas to per-request streams in batches."""
+
+    def __init__(self, write_batch: Callable[[List[StreamEntry]], bool], window_seconds: float = 0.25):
+        self._write_batch = write_batch
+        self.window = max(0.0, window_seconds)
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._last_written: Dict[str, Dict[str, Any]] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self._evicted_writes: Set[asyncio.Task] = set()
+        self._lock = asyncio.Lock()
+        registry = get_request_state_registry()
+        registry.track(self, "_pending", on_evict=self._write_evicted)
+        registry.track(self, "_last_written")
+
+    async def submit(self, message: Dict[str, Any]) -> None:
+        """Queue ``message`` for its request (latest wins); terminal messages flush immediately."""
+        request_id = message["requestId"]
+        if self._pending.get(request_id, {}).get("data") is not None or self._last_written.get(request_id, {}).get("final"):
+            # Nothing follows the final entry
+            return
+        if request_id in self._pending:
+            metrics.increment("progress.coalesced")
+        self._pending[request_id] = message
+        if message.get("data") is not None or float(message.get("progress") or 0.0) >= 1.0 or self.window == 0:
+            await self.flush()
+        elif self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        try:
+            await asyncio.sleep(self.window)
+            await self.flush()
+        except asyncio.CancelledError:
+            pass
+
+    def _write_evicted(self, request_id: str, message: Dict[str, Any]) -> None:
+        """Request released while an update was still coalescing: write it instead of dropping it."""
+        entry = (progress_stream_key(request_id), encode_progress_delta(self._last_written.get(request_id), message))
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._write_batch([entry])
+            return
+        task = loop.create_task(asyncio.to_thread(self._write_batch, [entry]))
+        self._evicted_writes.add(task)
+        task.add_done_callback(self._evicted_writes.discard)
+
+    async def flush(self) -> None:
+        async with self._lock:
+            pending, self._pending = self._pending, {}
+            if not pending:
+                return
+            entries: List[StreamEntry] = []
+            for request_id, message in pending.items():
+                entries.append((progress_stream_key(request_id),
+                                encode_progress_delta(self._last_written.get(request_id), message)))
+                self._last_written[request_id] = {
+                    "progress": message.get("progress"),
+                    "info": str(message.get("info") or ""),
+                    "final": message.get("data") is not None,
+                }
+            started = time.monotonic()
+            try:
+                await asyncio.to_thread(self._write_batch, entries)
+            except Exception as e:
+                logger.debug(f"Progress stream write failed for {len(entries)} entries: {e}")
+            metrics.observe("progress.stream_batch_size", len(entries))
+            metrics.observe("progress.stream_write_seconds", time.monotonic() - started)
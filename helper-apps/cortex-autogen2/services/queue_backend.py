@@ -0,0 +1,140 @@
+"""
+Queue backend interface and factory.
+
+The worker loop (``main.py``) and ``MessageLease`` only depend on the methods
+below, so task delivery can come from Azure Storage Queues (production),
+Redis Streams (consumer groups, millisecond dispatch, reusing the progress
+Redis) or an in-memory queue (tests and benchmarks).
+
+Messages are plain dicts: ``{"id", "content", "pop_receipt", "dequeue_count"}``.
+``pop_receipt`` is an opaque ownership token that must be passed back to
+``delete_task``/``extend_visibility``/``release_task``.
+
+Select the backend with ``QUEUE_BACKEND`` (``azure`` | ``redis`` | ``memory``).
+Lease and batching settings are read from ``<env_prefix>_*`` variables
+(``AZURE_QUEUE_*`` by default, ``REDIS_QUEUE_*`` for the Redis backend).
+"""
+import abc
+import logging
+import os
+from collections import deque
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class LeaseLostError(RuntimeError):
+    """The message is no longer leased by this consumer (deleted, expired or reclaimed elsewhere)."""
+
+
+class QueueBackend(abc.ABC):
+    """Base class for task queue backends."""
+
+    # Prefix of the backend's settings (``<prefix>_VISIBILITY_TIMEOUT``, ``_PREFETCH``, ...)
+    env_prefix = "AZURE_QUEUE"
+
+    def __init__(self, queue_name: str):
+        self.queue_name = queue_name
+        # Lease length per receive/renewal; MessageLease keeps extending it while a task runs
+        self.visibility_timeout = int(self.setting("VISIBILITY_TIMEOUT", "600"))
+        # Default number of messages fetched per receive call
+        self.prefetch = max(1, min(32, int(self.setting("PREFETCH", "1"))))
+        # Messages received but not yet handed out by get_task()
+        self._buffer: deque = deque()
+
+    def setting(self, name: str, default: Optional[str] = None) -> Optional[str]:
+        """Read ``<env_prefix>_<name>`` from the environment."""
+        return os.getenv(f"{self.env_prefix}_{name}", default)
+
+    async def initialize(self):
+        """Create the queue (or consumer group) if needed."""
+
+    async def get_task(self, max_messages: Optional[int] = None) -> Optional[dict]:
+        """
+        Returns the next message, receiving a batch of up to ``max_messages``
+        (default ``<env_prefix>_PREFETCH``) when the local buffer is empty.
+        """
+        if not self._buffer:
+            self._buffer.extend(await self.get_tasks(max_messages or self.prefetch))
+        return self._buffer.popleft() if self._buffer else None
+
+    @abc.abstractmethod
+    async def get_tasks(self, max_messages: int = 1) -> list:
+        """Receive up to ``max_messages`` messages and lease them for ``visibility_timeout``.
+
+        Messages are dicts with ``id``, ``content``, ``pop_receipt``, ``dequeue_count``
+        and, when the backend knows it, ``enqueued_at`` (epoch seconds).
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def send_task(self, content: str) -> str:
+        """Enqueue a message and return its id."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def delete_task(self, message_id: str, pop_receipt: str):
+        """Remove a processed message."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def extend_visibility(self, message_id: str, pop_receipt: str, visibility_timeout: int) -> str:
+        """Extend the lease of a message. Returns the (possibly new) pop receipt.
+
+        Raises ``LeaseLostError`` (or the backend's not-found error) when the lease is gone.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def release_task(self, message_id: str, pop_receipt: str):
+        """Make a leased message available to other consumers immediately."""
+        raise NotImplementedError
+
+    async def peek_messages(self, max_messages: int = 1) -> list:
+        """Look at waiting messages without leasing them."""
+        return []
+
+    async def return_buffered(self):
+        """Release prefetched messages that were never handed out (used on shutdown)."""
+        while self._buffer:
+            message = self._buffer.popleft()
+            try:
+                await self.release_task(message["id"], message["pop_receipt"])
+            except Exception as e:
+                logger.warning(f"⚠️ Failed to release buffered message {message['id']}: {e}")
+
+    async def close(self):
+        """Release buffered messages and close connections."""
+        await self.return_buffered()
+
+
+async def get_queue_backend(backend: Optional[str] = None, queue_name: Optional[str] = None) -> QueueBackend:
+    """
+    Create and initialize the configured queue backend.
+
+    Args:
+        backend: "azure", "redis" or "memory" (default ``QUEUE_BACKEND`` env, then "azure").
+        queue_name: Queue/stream name (default ``AZURE_QUEUE_NAME``).
+    """
+    backend = (backend or os.getenv("QUEUE_BACKEND", "azure")).strip().lower()
+
+    if backend == "azure":
+        from services.azure_queue import get_queue_service
+        return await get_queue_service()
+
+    queue_name = queue_name or os.getenv("AZURE_QUEUE_NAME") or "autogen-message-queue"
+    if backend == "redis":
+        from services.redis_queue import RedisStreamQueueService
+        connection_string = os.getenv("REDIS_CONNECTION_STRING")
+        if not connection_string:
+            raise ValueError("REDIS_CONNECTION_STRING environment variable is required for QUEUE_BACKEND=redis")
+        service = RedisStreamQueueService(connection_string, queue_name)
+    elif backend == "memory":
+        from services.memory_queue import get_memory_queue
+        service = get_memory_queue(queue_name)
+    else:
+        raise ValueError(f"Unknown QUEUE_BACKEND '{backend}' (expected azure, redis or memory)")
+
+    await service.initialize()
+    logger.info(f"📬 Using {backend} queue backend for '{queue_name}'")
+    return service
@@ -0,0 +1,163 @@
+"""
+Queue message leases and empty-queue polling backoff.
+
+A received queue message is invisible to other workers only for its visibility
+timeout. Tasks can run far longer than that (``GROUP_PHASE_TIMEOUT_SECONDS``
+defaults to 9000), so ``MessageLease`` keeps extending the visibility while the
+task runs, tracks the latest pop receipt (it changes on every update), and can
+release the message immediately when processing fails so another worker can
+pick it up without waiting for the lease to expire.
+
+``AdaptiveBackoff`` replaces a fixed sleep between empty polls: it starts short,
+grows exponentially with jitter while the queue stays empty, and resets as soon
+as a message arrives.
+"""
+import asyncio
+import logging
+import os
+import random
+from typing import Optional
+
+from services import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        value = float(os.getenv(name, str(default)))
+        return value if value > 0 else default
+    except (TypeError, ValueError):
+        return default
+
+
+class MessageLease:
+    """Keeps a received message invisible while its task runs.
+
+    The queue service must provide ``extend_visibility(message_id, pop_receipt, timeout)``
+    returning the new pop receipt, and ``release_task(message_id, pop_receipt)``.
+    """
+
+    def __init__(self, queue_service, message_id: str, pop_receipt: str,
+                 visibility_timeout: Optional[float] = None, renew_interval: Optional[float] = None):
+        self.queue_service = queue_service
+        self.message_id = message_id
+        self.pop_receipt = pop_receipt
+        self.visibility_timeout = int(visibility_timeout or getattr(queue_service, "visibility_timeout", 600))
+        prefix = getattr(queue_service, "env_prefix", "AZURE_QUEUE")
+        self.renew_interval = renew_interval or _env_float(
+            f"{prefix}_LEASE_RENEW_SECONDS", max(5.0, self.visibility_timeout / 3)
+        )
+        self.renewals = 0
+        self.lost = False
+        self._task: Optional[asyncio.Task] = None
+
+    async def __aenter__(self) -> "MessageLease":
+        self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.stop()
+
+    def start(self) -> None:
+        """Start renewing the lease in the background (idempotent)."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._renew_loop())
+
+    async def stop(self) -> None:
+        """Stop renewing; the current pop receipt stays valid until the lease expires."""
+        task = self._task
+        self._task = None
+        if task and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def _renew_loop(self) -> None:
+        try:
+            while True:
+                await asyncio.sleep(self.renew_interval)
+                await self.renew()
+                if self.lost:
+                    return
+        except asyncio.CancelledError:
+            pass
+
+    async def renew(self) -> bool:
+        """Extend the visibility timeout once. Returns False if the lease was lost."""
+        try:
+            new_receipt = await self.queue_service.extend_visibility(
+                self.message_id, self.pop_receipt, self.visibility_timeout
+            )
+        except Exception as e:
+            # The receipt is no longer valid (message deleted or re-leased elsewhere)
+            self.lost = True
+            metrics.increment("queue.lease_lost")
+            logger.warning(f"⚠️ Lost lease on message {self.message_id}: {e}")
+            return False
+        if new_receipt:
+            self.pop_receipt = new_receipt
+        self.renewals += 1
+        metrics.increment("queue.lease_renewals")
+        logger.debug(f"🔒 Extended lease on message {self.message_id} by {self.visibility_timeout}s")
+        return True
+
+    async def complete(self) -> bool:
+        """Stop renewing and delete the message. Returns False if the lease was lost before the delete.
+
+        A lost lease means another worker may hold the message now; deleting with the stale pop
+        receipt fails (not found / precondition failed), so that is logged instead of raised.
+        """
+        await self.stop()
+        if self.lost:
+            logger.warning(f"⚠️ Not deleting message {self.message_id}: lease was lost while the task ran")
+            return False
+        try:
+            await self.queue_service.delete_task(self.message_id, self.pop_receipt)
+        except Exception as e:
+            self.lost = True
+            metrics.increment("queue.lease_lost")
+            logger.warning(f"⚠️ Could not delete message {self.message_id} (lease no longer held): {e}")
+            return False
+        return True
+
+    async def release(self) -> None:
+        """Stop renewing and make the message visible again right away (processing failed)."""
+        await self.stop()
+        if self.lost:
+            return
+        try:
+            await self.queue_service.release_task(self.message_id, self.pop_receipt)
+            metrics.increment("queue.lease_released")
+        except Exception as e:
+            logger.warning(f"⚠️ Failed to release message {self.message_id}: {e}")
+
+
+class AdaptiveBackoff:
+    """Exponential, jittered delay between polls of an empty queue."""
+
+    def __init__(self, min_delay: Optional[float] = None, max_delay: Optional[float] = None, factor: float = 2.0):
+        self.min_delay = min_delay or _env_float("QUEUE_POLL_MIN_SECONDS", 1.0)
+        self.max_delay = max(self.min_delay, max_delay or _env_float("QUEUE_POLL_MAX_SECONDS", 30.0))
+        self.factor = factor
+        self._current = self.min_delay
+
+    def reset(self) -> None:
+        """Call when a message was received."""
+        self._current = self.min_delay
+
+    def next_delay(self) -> float:
+        """Return the next delay and grow the backoff for the following empty poll."""
+        # "Equal jitter": half fixed, half random, so idle workers don't poll in lockstep
+        delay = max(self.min_delay, self._current / 2 + random.uniform(0, self._current / 2))
+        self._current = min(self.max_delay, self._current * self.factor)
+        metrics.observe("queue.empty_poll_delay_seconds", delay)
+        return delay
+
+    async def wait(self) -> float:
+        """Sleep for the next delay and return it."""
+        delay = self.next_delay()
+        await asyncio.sleep(delay)
+        return delay
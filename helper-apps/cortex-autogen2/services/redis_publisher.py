@@ -2,11 +2,15 @@ import redis
 import json
 import logging
 import asyncio
+import sys
 import time
 from typing import Dict, Any, Optional, List
 
 import os
 
+from services.progress_stream import ProgressStreamWriter
+from services.request_state import get_request_state_registry
+
 logger = logging.getLogger(__name__)
 
 # Global Redis client - persistent connection like the working version
@@ -60,6 +64,8 @@ def connect_redis() -> bool:
         return False
 
 _last_logged_progress: Dict[str, Any] = {}
+# Per-request log dedup state is released together with the request
+get_request_state_registry().track(sys.modules[__name__], "_last_logged_progress")
 
 def publish_request_progress(data: Dict[str, Any]) -> bool:
     """Publish progress data to Redis channel with minimal logging (only when message changes)."""
@@ -92,6 +98,65 @@ def publish_request_progress(data: Dict[str, Any]) -> bool:
         logger.error(f"Redis not connected, failed to publish progress update for request {data.get('requestId')}")
         return False
 
+def publish_request_progress_batch(messages: List[Dict[str, Any]]) -> bool:
+    """Publish several progress messages in one pipeline (one round-trip)."""
+    if not messages:
+        return True
+    if not connect_redis():
+        logger.debug(f"Redis not connected, dropped {len(messages)} batched progress updates")
+        return False
+    try:
+        channel = os.getenv("REDIS_CHANNEL", "requestProgress")
+        pipe = redis_client.pipeline(transaction=False)
+        for data in messages:
+            pipe.publish(channel, json.dumps(data))
+        pipe.execute()
+        return True
+    except Exception as e:
+        logger.error(f"Error publishing {len(messages)} batched progress updates to Redis: {e}")
+        return False
+
+def write_progress_stream_batch(entries: List[tuple]) -> bool:
+    """XADD ``(stream key, fields)`` entries in one pipeline, capping and expiring each stream."""
+    if not entries:
+        return True
+    if not connect_redis():
+        logger.debug(f"Redis not connected, dropped {len(entries)} progress stream entries")
+        return False
+    try:
+        maxlen = int(os.getenv("PROGRESS_STREAM_MAXLEN", "200"))
+        ttl = int(os.getenv("PROGRESS_STREAM_TTL", "3600"))
+        pipe = redis_client.pipeline(transaction=False)
+        for key, fields in entries:
+            pipe.xadd(key, fields, maxlen=maxlen, approximate=True)
+        for key in {key for key, _ in entries}:
+            pipe.expire(key, ttl)
+        pipe.execute()
+        return True
+    except Exception as e:
+        logger.error(f"Error writing {len(entries)} progress stream entries to Redis: {e}")
+        return False
+
+# Final results are stored once under result:<id>; these prefixes hold a pointer to it
+FINAL_RESULT_KEY_PREFIX = "result:"
+FINAL_RESULT_ALIAS_PREFIXES = ("final:", "progress:")
+
+def load_final_result(request_id: str) -> Optional[Dict[str, Any]]:
+    """Read a stored final result, following an alias pointer if one is stored instead."""
+    if not connect_redis():
+        return None
+    for prefix in (FINAL_RESULT_KEY_PREFIX,) + FINAL_RESULT_ALIAS_PREFIXES:
+        raw = redis_client.get(f"{prefix}{request_id}")
+        if raw is None:
+            continue
+        value = json.loads(raw)
+        if isinstance(value, dict) and set(value) == {"ref"}:
+            raw = redis_client.get(value["ref"])
+            value = json.loads(raw) if raw is not None else None
+        if value is not None:
+            return value
+    return None
+
 class RedisPublisher:
     """Wrapper class for compatibility with existing code"""
     
@@ -114,6 +179,15 @@ class RedisPublisher:
         self._transient_all: Dict[str, List[Dict[str, Any]]] = {}
         self._finalized: Dict[str, bool] = {}
         self._lock = asyncio.Lock()
+        get_request_state_registry().track(self, "_transient_latest", "_transient_all", "_finalized")
+        # "pubsub" (shared REDIS_CHANNEL) or "streams" (coalesced per-request streams)
+        self.transport = os.getenv("PROGRESS_TRANSPORT", "pubsub").lower()
+        self._stream_writer: Optional[ProgressStreamWriter] = None
+        if self.transport == "streams":
+            self._stream_writer = ProgressStreamWriter(
+                write_progress_stream_batch,
+                window_seconds=float(os.getenv("PROGRESS_COALESCE_MS", "250")) / 1000.0,
+            )
         
     async def connect(self):
         """Initialize Redis connection"""
@@ -150,8 +224,8 @@ class RedisPublisher:
         CRITICAL: Also immediately publish the update to ensure it's received even if heartbeat fails."""
         try:
             async with self._lock:
-                # Skip if already finalized
-                if self._finalized.get(request_id):
+                # Skip if already finalized (or finalized and released)
+                if self._finalized.get(request_id) or get_request_state_registry().is_released(request_id):
                     return
                 self._transient_latest[request_id] = {"progress": progress, "info": info, "data": data, "ts": time.time()}
                 lst = self._transient_all.get(request_id)
@@ -173,12 +247,33 @@ class RedisPublisher:
                     "info": str(info),
                     "data": data
                 }
-                await asyncio.to_thread(self.publish_request_progress, message_data)
+                if self._stream_writer is not None:
+                    await self._stream_writer.submit(message_data)
+                else:
+                    await asyncio.to_thread(self.publish_request_progress, message_data)
             except Exception as pub_err:
                 logger.debug(f"Immediate publish error for {request_id}: {pub_err}")
         except Exception as e:
             logger.warning(f"set_transient_update error for {request_id}: {e}")
 
+    async def publish_heartbeats(self, messages: List[Dict[str, Any]]) -> None:
+        """Re-publish heartbeat messages in one pipeline, skipping finalized or released requests.
+        Heartbeats repeat the latest update, so they are not added to the transient history."""
+        registry = get_request_state_registry()
+        live = [
+            {"requestId": m["requestId"], "progress": float(m.get("progress", 0.0)), "info": str(m.get("info", "")), "data": None}
+            for m in messages
+            if not self._finalized.get(m["requestId"]) and not registry.is_released(m["requestId"])
+        ]
+        if not live:
+            return
+        if self._stream_writer is not None:
+            # Coalesced with any pending update; an unchanged heartbeat costs one progress field
+            for message in live:
+                await self._stream_writer.submit(message)
+        else:
+            await asyncio.to_thread(publish_request_progress_batch, live)
+
     async def mark_final(self, request_id: str) -> None:
         """Mark a request as finalized to stop transient heartbeat for it."""
         try:
@@ -225,19 +320,23 @@ class RedisPublisher:
         """Store final result in Redis key for retrieval"""
         if connect_redis():
             try:
-                # Store in multiple keys for compatibility
-                keys_to_store = [
-                    f"result:{request_id}",
-                    f"final:{request_id}",
-                    f"progress:{request_id}"  # Also store in progress key for consistency
-                ]
-                
+                result_key = f"{FINAL_RESULT_KEY_PREFIX}{request_id}"
+                alias_keys = [f"{prefix}{request_id}" for prefix in FINAL_RESULT_ALIAS_PREFIXES]
                 message = json.dumps(result_data)
-                
-                for key in keys_to_store:
-                    redis_client.set(key, message, ex=expiry_seconds)
-                
-                logger.info(f"Stored final result for request {request_id} in {len(keys_to_store)} Redis keys")
+
+                pipe = redis_client.pipeline(transaction=False)
+                pipe.set(result_key, message, ex=expiry_seconds)
+                if self.transport == "streams":
+                    # One copy of the payload; the compatibility keys point at it (see load_final_result)
+                    alias_value = json.dumps({"ref": result_key})
+                else:
+                    # Store in multiple keys for compatibility
+                    alias_value = message
+                for key in alias_keys:
+                    pipe.set(key, alias_value, ex=expiry_seconds)
+                pipe.execute()
+
+                logger.info(f"Stored final result for request {request_id} under {result_key} with {len(alias_keys)} aliases")
                 return True
                 
             except Exception as e:
@@ -250,6 +349,8 @@ class RedisPublisher:
     async def close(self):
         """Close Redis connection gracefully"""
         global redis_client
+        if self._stream_writer is not None:
+            await self._stream_writer.flush()
         # Note: Heartbeat loop removed - set_transient_update publishes immediately
         # No cleanup needed for heartbeat task
         if redis_client:
@@ -0,0 +1,246 @@
+"""
+Redis Streams task queue backend.
+
+Tasks are stream entries (``XADD <stream> * content <payload>``) consumed through
+a consumer group, so every entry is delivered to exactly one worker and stays in
+the group's pending entries list (PEL) until acknowledged.
+
+- Lease: an entry is owned by the consumer that read it. ``extend_visibility``
+  re-claims it (``XCLAIM ... JUSTID``), which resets its idle time. The owner
+  check and the claim run in one Lua script, so an entry another worker has
+  taken over raises ``LeaseLostError`` and is left alone.
+- Recovery: entries idle longer than the visibility timeout (worker crashed or
+  stalled) are taken over with ``XAUTOCLAIM`` before new entries are read, oldest
+  first, so stuck tasks are redistributed deterministically.
+- Release: a failed task's entry is marked as long idle so the next
+  ``XAUTOCLAIM`` by any worker picks it up immediately.
+- Delete: ``XACK`` + ``XDEL``, only while this consumer owns the entry (also
+  checked inside the script).
+
+Settings use the ``REDIS_QUEUE_*`` prefix (``REDIS_QUEUE_VISIBILITY_TIMEOUT``,
+``REDIS_QUEUE_PREFETCH``, ``REDIS_QUEUE_LEASE_RENEW_SECONDS``, ...).
+
+Pending-entry counts, stream length and oldest pending idle time are exported
+through ``services.metrics`` at most every ``REDIS_QUEUE_METRICS_SECONDS``.
+"""
+import logging
+import os
+import socket
+import time
+from typing import Optional
+
+import redis.asyncio as aioredis
+from redis.exceptions import ResponseError
+
+from services import metrics
+from services.queue_backend import LeaseLostError, QueueBackend
+
+logger = logging.getLogger(__name__)
+
+
+# Both scripts return 1 on success, 0 if the entry is no longer pending, -1 if another consumer owns it.
+# KEYS: stream. ARGV: group, consumer, entry id[, idle ms]
+_CLAIM_IF_OWNER = """
+local entry = redis.call('XPENDING', KEYS[1], ARGV[1], ARGV[3], ARGV[3], 1)[1]
+if not entry then return 0 end
+if entry[2] ~= ARGV[2] then return -1 end
+redis.call('XCLAIM', KEYS[1], ARGV[1], ARGV[2], 0, ARGV[3], 'IDLE', ARGV[4], 'JUSTID')
+return 1
+"""
+_ACK_IF_OWNER = """
+local entry = redis.call('XPENDING', KEYS[1], ARGV[1], ARGV[3], ARGV[3], 1)[1]
+if not entry then return 0 end
+if entry[2] ~= ARGV[2] then return -1 end
+redis.call('XACK', KEYS[1], ARGV[1], ARGV[3])
+redis.call('XDEL', KEYS[1], ARGV[3])
+return 1
+"""
+
+
+def _decode(value):
+    return value.decode("utf-8") if isinstance(value, bytes) else value
+
+
+class RedisStreamQueueService(QueueBackend):
+    """Task queue on a Redis Stream with a consumer group."""
+
+    env_prefix = "REDIS_QUEUE"
+
+    def __init__(self, connection_string: str, queue_name: str, consumer_name: Optional[str] = None):
+        super().__init__(queue_name)
+        self.stream_key = self.setting("STREAM", f"autogen:queue:{queue_name}")
+        self.group = self.setting("GROUP", "autogen-workers")
+        self.consumer = consumer_name or self.setting("CONSUMER") or f"{socket.gethostname()}-{os.getpid()}"
+        # How long XREADGROUP waits for new entries when the stream is empty
+        self.block_ms = int(self.setting("BLOCK_MS", "2000"))
+        self.maxlen = int(self.setting("MAXLEN", "10000"))
+        self.metrics_interval = float(self.setting("METRICS_SECONDS", "30"))
+        self._metrics_published_at: Optional[float] = None
+        self.client = aioredis.from_url(connection_string)
+
+    async def initialize(self):
+        """
+        Creates the stream and consumer group if they don't exist.
+        """
+        try:
+            await self.client.xgroup_create(self.stream_key, self.group, id="0", mkstream=True)
+            logger.info(f"📬 Created consumer group '{self.group}' on stream '{self.stream_key}'")
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                logger.error(f"💥 Failed to create consumer group on '{self.stream_key}': {e}")
+                raise
+
+    def _to_message(self, entry_id, fields, dequeue_count: int) -> dict:
+        fields = {_decode(k): _decode(v) for k, v in (fields or {}).items()}
+        message_id = _decode(entry_id)
+        return {
+            "id": message_id,
+            "content": fields.get("content") or fields.get("message"),
+            # Ownership is per consumer; the entry id doubles as the receipt
+            "pop_receipt": message_id,
+            "dequeue_count": dequeue_count,
+            # Stream ids start with the insertion time in milliseconds
+            "enqueued_at": int(message_id.split("-")[0]) / 1000 if message_id.split("-")[0].isdigit() else None,
+        }
+
+    async def _pending_entry(self, entry_id) -> Optional[dict]:
+        """The PEL record of one entry (``consumer``, ``times_delivered``, ...), or None if not pending."""
+        pending = await self.client.xpending_range(self.stream_key, self.group, min=entry_id, max=entry_id, count=1)
+        return pending[0] if pending else None
+
+    async def _run_if_owner(self, source: str, message_id: str, *args) -> None:
+        """Run an owner-checked script on one entry; raise LeaseLostError if this consumer lost it."""
+        script = self.client.register_script(source)
+        result = int(await script(keys=[self.stream_key], args=[self.group, self.consumer, message_id, *args]))
+        if result == 0:
+            raise LeaseLostError(f"Message {message_id} is no longer pending")
+        if result < 0:
+            raise LeaseLostError(f"Message {message_id} was reclaimed by another consumer")
+
+    async def _delivery_count(self, entry_id) -> int:
+        try:
+            entry = await self._pending_entry(entry_id)
+            if entry:
+                return int(entry.get("times_delivered", 1))
+        except Exception as e:
+            logger.debug(f"XPENDING lookup failed for {entry_id}: {e}")
+        return 1
+
+    async def get_tasks(self, max_messages: int = 1) -> list:
+        """
+        Reclaims stalled entries first, then reads new ones, up to ``max_messages``.
+        """
+        max_messages = max(1, max_messages)
+        result = []
+        try:
+            # 1) Take over entries whose owner stopped renewing the lease
+            claimed = await self.client.xautoclaim(
+                self.stream_key, self.group, self.consumer,
+                min_idle_time=self.visibility_timeout * 1000, start_id="0-0", count=max_messages,
+            )
+            for entry_id, fields in (claimed[1] if claimed else []):
+                if fields is None:
+                    continue  # Entry was deleted while pending
+                message = self._to_message(entry_id, fields, await self._delivery_count(entry_id))
+                logger.info(f"♻️ Redis Queue: Reclaimed stalled message {message['id']} (delivery {message['dequeue_count']})")
+                metrics.increment("queue.reclaimed", backend="redis")
+                result.append(message)
+
+            # 2) New entries
+            remaining = max_messages - len(result)
+            if remaining > 0:
+                response = await self.client.xreadgroup(
+                    self.group, self.consumer, {self.stream_key: ">"},
+                    count=remaining, block=None if result else self.block_ms,
+                )
+                for _, entries in response or []:
+                    for entry_id, fields in entries:
+                        message = self._to_message(entry_id, fields, 1)
+                        logger.info(f"📨 Redis Queue: Received message with ID: {message['id']}")
+                        result.append(message)
+        except Exception as e:
+            logger.error(f"❌ Redis Queue: Error receiving messages: {e}")
+        now = time.monotonic()
+        if self._metrics_published_at is None or now - self._metrics_published_at >= self.metrics_interval:
+            self._metrics_published_at = now
+            await self.publish_metrics()
+        return result
+
+    async def send_task(self, content: str) -> str:
+        """
+        Appends a task to the stream (trimmed approximately to ``REDIS_QUEUE_MAXLEN``).
+        """
+        entry_id = await self.client.xadd(self.stream_key, {"content": content}, maxlen=self.maxlen, approximate=True)
+        return _decode(entry_id)
+
+    async def delete_task(self, message_id: str, pop_receipt: str):
+        """
+        Acknowledges and removes a processed entry.
+
+        Raises LeaseLostError if another consumer has reclaimed the entry meanwhile.
+        """
+        try:
+            await self._run_if_owner(_ACK_IF_OWNER, message_id)
+        except LeaseLostError:
+            raise
+        except Exception as e:
+            logger.error(f"💥 Failed to delete message {message_id}: {e}")
+            raise
+
+    async def extend_visibility(self, message_id: str, pop_receipt: str, visibility_timeout: int) -> str:
+        """
+        Re-claims the entry for this consumer, resetting its idle time.
+
+        XCLAIM with ``min_idle_time=0`` would take the entry from whichever consumer
+        holds it, so the script checks ownership in the same step; losing it raises
+        LeaseLostError.
+        """
+        await self._run_if_owner(_CLAIM_IF_OWNER, message_id, 0)
+        return pop_receipt
+
+    async def release_task(self, message_id: str, pop_receipt: str):
+        """
+        Marks the entry as idle past the visibility timeout so the next XAUTOCLAIM takes it.
+        """
+        await self._run_if_owner(_CLAIM_IF_OWNER, message_id, (self.visibility_timeout + 1) * 1000)
+
+    async def peek_messages(self, max_messages: int = 1) -> list:
+        """
+        Returns the oldest entries in the stream without claiming them.
+        """
+        try:
+            entries = await self.client.xrange(self.stream_key, count=max_messages)
+            return [{"id": _decode(entry_id), "content": self._to_message(entry_id, fields, 0)["content"]}
+                    for entry_id, fields in entries]
+        except Exception as e:
+            logger.error(f"❌ Error peeking messages: {e}")
+            return []
+
+    async def publish_metrics(self) -> dict:
+        """
+        Exports pending-entry counts, stream length and the oldest pending idle time.
+        """
+        try:
+            summary = await self.client.xpending(self.stream_key, self.group)
+            length = await self.client.xlen(self.stream_key)
+            oldest = await self.client.xpending_range(self.stream_key, self.group, min="-", max="+", count=1)
+        except Exception as e:
+            logger.debug(f"Redis queue metrics unavailable: {e}")
+            return {}
+        stats = {
+            "pending": int(summary.get("pending", 0)) if summary else 0,
+            "stream_length": int(length or 0),
+            "oldest_pending_idle_seconds": (oldest[0].get("time_since_delivered", 0) / 1000.0) if oldest else 0.0,
+            "consumers": len(summary.get("consumers") or []) if summary else 0,
+        }
+        for name, value in stats.items():
+            metrics.set_gauge(f"queue.{name}", value, backend="redis")
+        return stats
+
+    async def close(self):
+        """
+        Releases buffered entries and closes the connection pool.
+        """
+        await self.return_buffered()
+        close = getattr(self.client, "aclose", None) or self.client.close
+        await close()
@@ -0,0 +1,205 @@
+"""
+Per-request state registry.
+
+Long-running workers keep several dictionaries keyed by request/task id
+(progress clamps, heartbeat state, publish caches, journey tracking). This
+registry knows about all of them so a request's entries can be released in one
+call when the task finishes, with a TTL/LRU sweeper as a backstop for requests
+that never reach an explicit release (crashes, cancelled tasks, late callbacks).
+
+Owners register with ``track(owner, *attribute_names)``. Owners are held by weak
+reference, so per-task objects (e.g. SimplifiedWorkflow) are not kept alive by
+the registry.
+"""
+import asyncio
+import logging
+import os
+import time
+import weakref
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from services import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        value = float(os.getenv(name, str(default)))
+        return value if value > 0 else default
+    except (TypeError, ValueError):
+        return default
+
+
+class RequestStateRegistry:
+    """Tracks per-request dictionaries and evicts their entries on release, TTL or LRU."""
+
+    def __init__(self, ttl_seconds: float = None, max_requests: int = None, sweep_interval: float = None):
+        # Longer than the longest task (group phase timeout plus finalization), so a quiet
+        # running task is never evicted; running tasks are also touched by their heartbeat
+        default_ttl = _env_float("GROUP_PHASE_TIMEOUT_SECONDS", 9000.0) + 900.0
+        self.ttl_seconds = ttl_seconds or _env_float("REQUEST_STATE_TTL_SECONDS", default_ttl)
+        self.max_requests = int(max_requests or _env_float("REQUEST_STATE_MAX_REQUESTS", 256))
+        self.sweep_interval = sweep_interval or _env_float("REQUEST_STATE_SWEEP_SECONDS", 60.0)
+        # (weak owner ref, label, attribute names, eviction callback)
+        self._owners: List[Tuple[weakref.ref, str, Tuple[str, ...], Optional[Callable[[str, Any], None]]]] = []
+        # request_id -> last activity timestamp, least recently used first
+        self._last_seen: "OrderedDict[str, float]" = OrderedDict()
+        # Released request ids; late callbacks for these must not recreate state
+        self._released: "OrderedDict[str, float]" = OrderedDict()
+        self._sweeper_task: Optional[asyncio.Task] = None
+
+    def track(self, owner: Any, *attrs: str, on_evict: Optional[Callable[[str, Any], None]] = None) -> None:
+        """Register request-keyed dict attributes of ``owner``.
+
+        Args:
+            owner: Object (or module) holding the dictionaries.
+            attrs: Attribute names of dicts keyed by request id.
+            on_evict: Optional callback ``(request_id, value)`` run for each evicted value,
+                e.g. to cancel a background task stored in the entry.
+        """
+        label = getattr(owner, "__name__", None) or type(owner).__name__
+        self._owners.append((weakref.ref(owner), label, tuple(attrs), on_evict))
+
+    def _mappings(self):
+        """Yield (label, attr, mapping, on_evict) for live owners, pruning dead ones."""
+        alive = []
+        for ref, label, attrs, on_evict in self._owners:
+            owner = ref()
+            if owner is None:
+                continue
+            alive.append((ref, label, attrs, on_evict))
+            for attr in attrs:
+                mapping = getattr(owner, attr, None)
+                if isinstance(mapping, dict):
+                    yield label, attr, mapping, on_evict
+        self._owners = alive
+
+    def begin(self, request_id: str) -> None:
+        """Mark the start of a request (clears a previous release, e.g. on queue redelivery)."""
+        self._released.pop(request_id, None)
+        self.touch(request_id)
+
+    def touch(self, request_id: Optional[str]) -> None:
+        """Record activity for a request."""
+        if not request_id or request_id in self._released:
+            return
+        self._last_seen[request_id] = time.time()
+        self._last_seen.move_to_end(request_id)
+
+    def is_released(self, request_id: Optional[str]) -> bool:
+        """True if the request was released and late updates should be dropped."""
+        return bool(request_id) and request_id in self._released
+
+    def release(self, request_id: str, reason: str = "completed") -> int:
+        """Drop every tracked entry for ``request_id``. Returns the number of entries removed."""
+        if not request_id:
+            return 0
+        removed = 0
+        for label, attr, mapping, on_evict in list(self._mappings()):
+            if request_id not in mapping:
+                continue
+            value = mapping.pop(request_id, None)
+            removed += 1
+            if on_evict:
+                try:
+                    on_evict(request_id, value)
+                except Exception as e:
+                    logger.debug(f"Eviction callback failed for {label}.{attr}[{request_id}]: {e}")
+        self._last_seen.pop(request_id, None)
+        self._released[request_id] = time.time()
+        while len(self._released) > max(self.max_requests * 4, 1024):
+            self._released.popitem(last=False)
+        metrics.increment("request_state.released", reason=reason)
+        self.publish_gauges()
+        if removed:
+            logger.debug(f"🧹 Released {removed} state entries for request {request_id} ({reason})")
+        return removed
+
+    def sweep(self, now: Optional[float] = None) -> List[str]:
+        """Evict idle (TTL) and least-recently-used (over capacity) requests. Returns evicted ids."""
+        now = now or time.time()
+
+        # Adopt request ids created without an explicit touch so they age out too
+        for _, _, mapping, _ in list(self._mappings()):
+            for request_id in list(mapping.keys()):
+                if request_id not in self._last_seen and request_id not in self._released:
+                    self._last_seen[request_id] = now
+
+        expired = [rid for rid, seen in self._last_seen.items() if now - seen > self.ttl_seconds]
+        overflow = max(0, len(self._last_seen) - len(expired) - self.max_requests)
+        if overflow:
+            lru = [rid for rid in self._last_seen if rid not in expired][:overflow]
+            expired.extend(lru)
+
+        for request_id in expired:
+            self.release(request_id, reason="evicted")
+
+        # Forget old tombstones
+        for request_id, released_at in list(self._released.items()):
+            if now - released_at <= self.ttl_seconds:
+                break
+            self._released.pop(request_id, None)
+
+        if expired:
+            logger.info(f"🧹 Evicted state for {len(expired)} stale request(s)")
+        self.publish_gauges()
+        return expired
+
+    def live_entries(self) -> Dict[str, int]:
+        """Return live entry counts per tracked mapping (``Owner.attr`` -> count)."""
+        counts: Dict[str, int] = {}
+        for label, attr, mapping, _ in list(self._mappings()):
+            name = f"{label}.{attr}"
+            counts[name] = counts.get(name, 0) + len(mapping)
+        return counts
+
+    def publish_gauges(self) -> None:
+        """Export live entry counts as gauges."""
+        counts = self.live_entries()
+        for name, count in counts.items():
+            metrics.set_gauge("request_state.live_entries", count, mapping=name)
+        metrics.set_gauge("request_state.live_entries_total", sum(counts.values()))
+        metrics.set_gauge("request_state.active_requests", len(self._last_seen))
+
+    async def _sweeper_loop(self) -> None:
+        try:
+            while True:
+                await asyncio.sleep(self.sweep_interval)
+                try:
+                    self.sweep()
+                except Exception as e:
+                    logger.warning(f"Request state sweep failed: {e}")
+        except asyncio.CancelledError:
+            logger.debug("Request state sweeper cancelled")
+
+    def start_sweeper(self) -> None:
+        """Start the background sweeper on the running event loop (idempotent)."""
+        if self._sweeper_task and not self._sweeper_task.done():
+            return
+        self._sweeper_task = asyncio.create_task(self._sweeper_loop())
+        logger.info(f"🧹 Request state sweeper started (ttl={self.ttl_seconds:.0f}s, max_requests={self.max_requests})")
+
+    async def stop_sweeper(self) -> None:
+        """Stop the background sweeper."""
+        task = self._sweeper_task
+        self._sweeper_task = None
+        if task and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+
+# Global registry instance
+_registry: Optional[RequestStateRegistry] = None
+
+
+def get_request_state_registry() -> RequestStateRegistry:
+    """Get or create the global request state registry."""
+    global _registry
+    if _registry is None:
+        _registry = RequestStateRegistry()
+    return _registry
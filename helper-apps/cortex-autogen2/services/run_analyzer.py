@@ -190,7 +190,9 @@ ANTIPATTERNS:
 - ...
 """
         msgs = [UserMessage(content=prompt, source="run_analyzer_summarize")]
-        resp = await model_client.create(messages=msgs)
+        from task_processor.llm_instrumentation import llm_call_tags, PRIORITY_BACKGROUND
+        with llm_call_tags("run_analysis", priority=PRIORITY_BACKGROUND):
+            resp = await model_client.create(messages=msgs)
         text = (resp.content or "").strip()
         best = []
         anti = []
@@ -302,7 +304,9 @@ IMPROVEMENT SCORE: <0-100>
 ACTIONABLES: <integer count of distinct concrete actions>
 """
         msgs = [UserMessage(content=prompt, source="run_analyzer_improvements")]
-        resp = await model_client.create(messages=msgs)
+        from task_processor.llm_instrumentation import llm_call_tags, PRIORITY_BACKGROUND
+        with llm_call_tags("run_analysis", priority=PRIORITY_BACKGROUND):
+            resp = await model_client.create(messages=msgs)
         text = (resp.content or "").strip()
 
         # Parse score and actionables
@@ -515,7 +519,9 @@ Output bullets only (no headings):
 - ...
 """
             msgs = [UserMessage(content=prompt, source="run_analyzer_prior")]
-            resp = await model_client.create(messages=msgs)
+            from task_processor.llm_instrumentation import llm_call_tags, PRIORITY_BACKGROUND
+            with llm_call_tags("run_analysis", priority=PRIORITY_BACKGROUND):
+                resp = await model_client.create(messages=msgs)
             text = (resp.content or "").strip()
             # Keep only bullet lines
             out_lines = [ln for ln in text.splitlines() if ln.strip().startswith("-")]
@@ -51,7 +51,9 @@ If task is complete with score > 90, return complete: true.
 """
         
         from autogen_core.models import UserMessage
-        response = await model_client.create([UserMessage(content=prompt, source="termination_detector")])
+        from task_processor.llm_instrumentation import llm_call_tags, PRIORITY_BOOKKEEPING
+        with llm_call_tags("termination_detection", priority=PRIORITY_BOOKKEEPING):
+            response = await model_client.create([UserMessage(content=prompt, source="termination_detector")])
         
         # Extract JSON using centralized utility
         from util.json_extractor import extract_json_from_model_response
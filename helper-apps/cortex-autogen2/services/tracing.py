@@ -0,0 +1,241 @@
+"""
+Per-task timeline tracing with Chrome trace-event export.
+
+Spans are collected per task and written at task end to
+``<work_dir>/logs/trace.json`` in the Chrome trace-event format, which opens in
+``chrome://tracing`` and https://ui.perfetto.dev. Each span sits on a lane (a
+trace "thread"): ``task`` for the phases (queue wait, learnings retrieval,
+agent construction, workflow, learning extraction), one lane per agent for its
+turns and tool calls, ``stream`` for per-message bookkeeping and ``llm`` lanes
+for model calls.
+
+Usage::
+
+    tracer = get_tracer()
+    with tracer.span("learnings_retrieval"):
+        ...
+
+Spans use the task bound to the current asyncio context (``begin`` binds it),
+so helpers deep in the call stack do not need the task id. Timestamps are
+wall-clock (epoch seconds), so spans reconstructed after the fact (e.g. from
+message ``created_at``) line up with live ones.
+"""
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_current_task: ContextVar[Optional[str]] = ContextVar("trace_task_id", default=None)
+_current_lane: ContextVar[str] = ContextVar("trace_lane", default="task")
+
+# Spans per task are bounded so a runaway workflow cannot grow the trace without limit
+MAX_EVENTS_PER_TASK = 20000
+
+
+class TaskTrace:
+    """Trace events of one task."""
+
+    def __init__(self, task_id: str):
+        self.task_id = task_id
+        self.started_at = time.time()
+        self.events: List[dict] = []
+        self._lanes: Dict[str, int] = {}
+        self.dropped = 0
+
+    def _tid(self, lane: str) -> int:
+        tid = self._lanes.get(lane)
+        if tid is None:
+            tid = len(self._lanes) + 1
+            self._lanes[lane] = tid
+        return tid
+
+    def add_span(self, name: str, start: float, duration: float, lane: str = "task",
+                 category: str = "phase", args: Optional[dict] = None) -> None:
+        """Add a complete span; ``start`` is epoch seconds, ``duration`` seconds."""
+        if len(self.events) >= MAX_EVENTS_PER_TASK:
+            self.dropped += 1
+            return
+        event = {
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": int(start * 1e6),
+            "dur": max(1, int(duration * 1e6)),
+            "pid": 1,
+            "tid": self._tid(lane),
+        }
+        if args:
+            event["args"] = args
+        self.events.append(event)
+
+    def add_instant(self, name: str, lane: str = "task", category: str = "mark", args: Optional[dict] = None) -> None:
+        if len(self.events) >= MAX_EVENTS_PER_TASK:
+            self.dropped += 1
+            return
+        event = {"name": name, "cat": category, "ph": "i", "s": "t",
+                 "ts": int(time.time() * 1e6), "pid": 1, "tid": self._tid(lane)}
+        if args:
+            event["args"] = args
+        self.events.append(event)
+
+    def to_chrome_trace(self) -> dict:
+        metadata = [{"name": "process_name", "ph": "M", "pid": 1, "tid": 0, "args": {"name": f"task {self.task_id}"}}]
+        for lane, tid in self._lanes.items():
+            metadata.append({"name": "thread_name", "ph": "M", "pid": 1, "tid": tid, "args": {"name": lane}})
+            metadata.append({"name": "thread_sort_index", "ph": "M", "pid": 1, "tid": tid, "args": {"sort_index": tid}})
+        return {
+            "traceEvents": metadata + sorted(self.events, key=lambda event: event["ts"]),
+            "displayTimeUnit": "ms",
+            "otherData": {"task_id": self.task_id, "dropped_events": self.dropped},
+        }
+
+
+class Tracer:
+    """Keeps the open traces of in-flight tasks."""
+
+    def __init__(self):
+        self.enabled = os.getenv("TASK_TRACING", "true").lower() == "true"
+        self._traces: Dict[str, TaskTrace] = {}
+
+    def begin(self, task_id: str) -> Optional[TaskTrace]:
+        """Open (or reuse) the trace of ``task_id`` and bind it to the current context."""
+        if not self.enabled:
+            return None
+        _current_task.set(task_id)
+        trace = self._traces.get(task_id)
+        if trace is None:
+            trace = TaskTrace(task_id)
+            self._traces[task_id] = trace
+        return trace
+
+    def get(self, task_id: Optional[str] = None) -> Optional[TaskTrace]:
+        task_id = task_id or _current_task.get()
+        return self._traces.get(task_id) if task_id else None
+
+    def open_task_ids(self) -> List[str]:
+        """Ids of tasks whose trace has not been flushed yet."""
+        return list(self._traces)
+
+    def add_span(self, name: str, start: float, duration: float, lane: Optional[str] = None,
+                 category: str = "phase", task_id: Optional[str] = None, args: Optional[dict] = None) -> None:
+        trace = self.get(task_id)
+        if trace is not None:
+            trace.add_span(name, start, duration, lane or _current_lane.get(), category, args)
+
+    @contextmanager
+    def span(self, name: str, category: str = "phase", lane: Optional[str] = None,
+             task_id: Optional[str] = None, **args):
+        """Time the enclosed block as a span; nested spans default to the same lane."""
+        trace = self.get(task_id)
+        if trace is None:
+            yield
+            return
+        lane = lane or _current_lane.get()
+        lane_token = _current_lane.set(lane)
+        started = time.time()
+        try:
+            yield
+        except BaseException as e:
+            args["error"] = type(e).__name__
+            raise
+        finally:
+            _current_lane.reset(lane_token)
+            trace.add_span(name, started, time.time() - started, lane, category, args or None)
+
+    def flush(self, task_id: str, work_dir: Optional[str]) -> Optional[str]:
+        """Write ``logs/trace.json`` for the task and drop its trace; returns the path."""
+        trace = self._traces.pop(task_id, None)
+        if trace is None or not work_dir:
+            return None
+        try:
+            logs_dir = os.path.join(work_dir, "logs")
+            os.makedirs(logs_dir, exist_ok=True)
+            path = os.path.join(logs_dir, "trace.json")
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(trace.to_chrome_trace(), f)
+            logger.info(f"🧵 Trace for {task_id} written to {path} ({len(trace.events)} events)")
+            return path
+        except Exception as e:
+            logger.warning(f"Failed to write trace for {task_id}: {e}")
+            return None
+
+    def discard(self, task_id: str) -> None:
+        self._traces.pop(task_id, None)
+
+
+class AgentTimeline:
+    """Derives agent-turn and tool-call spans from a group chat message stream.
+
+    A turn runs from the previous speaker's last message to the agent's own last
+    message; a tool call runs from its ToolCallRequestEvent to the matching
+    ToolCallExecutionEvent. Message ``created_at`` is used when present.
+    """
+
+    def __init__(self, tracer: "Tracer", task_id: Optional[str] = None):
+        self.tracer = tracer
+        self.task_id = task_id
+        self._speaker: Optional[str] = None
+        self._turn_start = time.time()
+        self._last_ts = self._turn_start
+        self._turn_messages = 0
+        self._pending_tools: Dict[str, tuple] = {}
+
+    @staticmethod
+    def _timestamp(message) -> float:
+        created_at = getattr(message, "created_at", None)
+        try:
+            return created_at.timestamp() if created_at else time.time()
+        except Exception:
+            return time.time()
+
+    def _close_turn(self) -> None:
+        if self._speaker:
+            self.tracer.add_span(f"turn:{self._speaker}", self._turn_start, self._last_ts - self._turn_start,
+                                 lane=self._speaker, category="agent_turn", task_id=self.task_id,
+                                 args={"messages": self._turn_messages})
+
+    def observe(self, message) -> None:
+        ts = self._timestamp(message)
+        source = getattr(message, "source", None)
+        if source in (None, "user"):
+            self._turn_start = self._last_ts = ts
+            return
+        if source != self._speaker:
+            self._close_turn()
+            self._speaker = source
+            self._turn_start = self._last_ts
+            self._turn_messages = 0
+        self._turn_messages += 1
+
+        message_type = type(message).__name__
+        content = getattr(message, "content", None)
+        if message_type == "ToolCallRequestEvent" and isinstance(content, list):
+            for call in content:
+                self._pending_tools[getattr(call, "id", "")] = (ts, getattr(call, "name", "tool"))
+        elif message_type == "ToolCallExecutionEvent" and isinstance(content, list):
+            for result in content:
+                started, name = self._pending_tools.pop(getattr(result, "call_id", ""), (self._last_ts, getattr(result, "name", "tool")))
+                self.tracer.add_span(f"tool:{name}", started, ts - started, lane=source, category="tool",
+                                     task_id=self.task_id, args={"is_error": bool(getattr(result, "is_error", False))})
+        self._last_ts = ts
+
+    def close(self) -> None:
+        self._close_turn()
+        self._speaker = None
+
+
+# Global tracer instance
+_tracer: Optional[Tracer] = None
+
+
+def get_tracer() -> Tracer:
+    """Get or create the global tracer."""
+    global _tracer
+    if _tracer is None:
+        _tracer = Tracer()
+    return _tracer
@@ -0,0 +1,454 @@
+"""
+Work directory lifecycle manager.
+
+Every task gets ``/tmp/coding/req_<task_id>``. Downloaded pages, datasets,
+generated decks and JSONL logs accumulate there, so long-lived workers need
+retention and a disk quota. This manager:
+
+- creates request work dirs (optionally on tmpfs, symlinked into the root so
+  the ``/tmp/coding/req_<task_id>`` path used across the code keeps working)
+- records the outcome of each task in a small marker file
+- applies retention: delete after delivery, keep the N most recent successes,
+  keep failures for X hours
+- enforces a global disk quota by evicting the least recently used inactive dirs
+- gzips JSONL/log files of finished tasks in a background compactor (read them
+  back with ``open_log``, which falls back to the ``.gz`` copy)
+
+Active (in-use) directories are never deleted or compacted. Several workers may
+share the root, so a dir also counts as active while its on-disk marker says it
+is active or held and the owning worker keeps refreshing the marker's heartbeat; a marker whose
+heartbeat (and dir mtime) is older than ``WORK_DIR_ACTIVE_STALE_MINUTES`` is
+treated as abandoned by a crashed worker.
+"""
+import asyncio
+import gzip
+import json
+import logging
+import os
+import shutil
+import time
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+from services import metrics
+
+logger = logging.getLogger(__name__)
+
+MARKER_FILE = ".workdir_state.json"
+REQUEST_DIR_PREFIX = "req_"
+# Large tool outputs live next to the work dirs, not inside them, so file scans
+# (summaries, deliverable listings, uploads) never pick them up
+SPILL_DIR_NAME = ".tool_spill"
+COMPACTABLE_SUFFIXES = (".jsonl", ".log")
+# Task wording that usually means large downloads or generated binaries (not tmpfs material)
+HEAVY_TASK_HINTS = (
+    "pptx", "powerpoint", "presentation", "slides", "deck", "pdf", "report", "excel", "xlsx",
+    "csv", "dataset", "download", "video", "image", "images", "chart", "charts", "archive", "zip",
+)
+
+# Work dir of the task running in the current asyncio context (several tasks share one process)
+_current_work_dir: ContextVar[Optional[str]] = ContextVar("current_work_dir", default=None)
+
+
+def bind_work_dir(path: str) -> None:
+    """Make ``path`` the work dir of the current asyncio task (and tasks it spawns)."""
+    _current_work_dir.set(path)
+
+
+def current_work_dir() -> str:
+    """Work dir bound to the running task, else ``CORTEX_WORK_DIR`` (single-task tools and scripts)."""
+    return _current_work_dir.get() or os.getenv("CORTEX_WORK_DIR", "/tmp/coding")
+
+
+def spill_dir_for(work_dir: str) -> str:
+    """Directory for spilled tool outputs of ``work_dir`` (``<root>/.tool_spill/<work dir name>``)."""
+    work_dir = os.path.normpath(work_dir)
+    return os.path.join(os.path.dirname(work_dir), SPILL_DIR_NAME, os.path.basename(work_dir))
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    return os.getenv(name, str(default)).strip().lower() in ("1", "true", "yes", "on")
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except (TypeError, ValueError):
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, str(default)))
+    except (TypeError, ValueError):
+        return default
+
+
+def task_id_for_path(path: Optional[str]) -> Optional[str]:
+    """Task id encoded in a request work dir path (``.../req_<task_id>``), or None for other paths."""
+    if not path:
+        return None
+    name = os.path.basename(os.path.normpath(path))
+    if name.startswith(REQUEST_DIR_PREFIX) and len(name) > len(REQUEST_DIR_PREFIX):
+        return name[len(REQUEST_DIR_PREFIX):]
+    return None
+
+
+def log_exists(path: str) -> bool:
+    """True if the log at ``path`` exists, plain or gzipped by the compactor."""
+    return os.path.exists(path) or os.path.exists(path + ".gz")
+
+
+def open_log(path: str, encoding: str = "utf-8"):
+    """Open a work dir log for reading as text, falling back to its compacted ``.gz`` copy."""
+    if not os.path.exists(path) and os.path.exists(path + ".gz"):
+        return gzip.open(path + ".gz", "rt", encoding=encoding)
+    return open(path, "r", encoding=encoding)
+
+
+def _dir_size(path: str) -> int:
+    """Total size in bytes of regular files under ``path`` (symlinks not followed)."""
+    total = 0
+    stack = [path]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False):
+                            total += entry.stat(follow_symlinks=False).st_size
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+    return total
+
+
+class WorkDirManager:
+    """Creates, tracks, compacts and evicts per-request work directories."""
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = root or os.getenv("WORK_DIR_ROOT", "/tmp/coding")
+        # Retention policy
+        self.delete_after_upload = _env_bool("WORK_DIR_DELETE_AFTER_UPLOAD", False)
+        self.keep_recent = max(0, _env_int("WORK_DIR_KEEP_RECENT", 20))
+        self.keep_failed_hours = max(0.0, _env_float("WORK_DIR_KEEP_FAILED_HOURS", 24.0))
+        self.quota_bytes = max(0, _env_int("WORK_DIR_QUOTA_MB", 10240)) * 1024 * 1024
+        # Optional tmpfs placement for small tasks
+        self.tmpfs_root = os.getenv("WORK_DIR_TMPFS_ROOT") or None
+        self.tmpfs_quota_bytes = max(0, _env_int("WORK_DIR_TMPFS_QUOTA_MB", 1024)) * 1024 * 1024
+        self.tmpfs_task_reserve_bytes = max(0, _env_int("WORK_DIR_TMPFS_TASK_RESERVE_MB", 256)) * 1024 * 1024
+        # Background log compaction
+        self.compact_after_seconds = max(0.0, _env_float("WORK_DIR_COMPACT_AFTER_MINUTES", 10.0)) * 60
+        self.maintenance_interval = max(5.0, _env_float("WORK_DIR_MAINTENANCE_SECONDS", 300.0))
+        # Active markers not refreshed for this long belong to a dead worker
+        self.active_stale_seconds = max(
+            _env_float("WORK_DIR_ACTIVE_STALE_MINUTES", 30.0) * 60, self.maintenance_interval * 3
+        )
+
+        # task_id -> number of holders (processing, background jobs, ...)
+        self._active: Dict[str, int] = {}
+        self._maintenance_task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    def path_for(self, task_id: str) -> str:
+        """Canonical work dir path for a task (always under ``root``)."""
+        return os.path.join(self.root, f"{REQUEST_DIR_PREFIX}{task_id}")
+
+    def acquire(self, task_id: str, prefer_tmpfs: bool = False) -> str:
+        """Create (or reuse) the work dir for ``task_id`` and mark it active."""
+        path = self.path_for(task_id)
+        os.makedirs(self.root, exist_ok=True)
+        if not os.path.exists(path):
+            if prefer_tmpfs and self._tmpfs_has_room():
+                real_path = os.path.join(self.tmpfs_root, f"{REQUEST_DIR_PREFIX}{task_id}")
+                try:
+                    os.makedirs(real_path, exist_ok=True)
+                    os.symlink(real_path, path)
+                    metrics.increment("work_dir.tmpfs_placements")
+                    logger.info(f"🗂️ Work dir for {task_id} placed on tmpfs: {real_path}")
+                except OSError as e:
+                    logger.warning(f"tmpfs placement failed for {task_id}, using disk: {e}")
+                    shutil.rmtree(real_path, ignore_errors=True)
+            os.makedirs(path, exist_ok=True)
+        self._active[task_id] = self._active.get(task_id, 0) + 1
+        now = time.time()
+        self._write_marker(path, {"status": "active", "started_at": now, "heartbeat_at": now})
+        metrics.set_gauge("work_dir.active", len(self._active))
+        return path
+
+    def traceback_path(self, task_id: str) -> str:
+        """Where a failed task's traceback is saved (removed together with its work dir)."""
+        return os.path.join(self.root, f"traceback_{task_id}.txt")
+
+    def _heartbeat_active(self) -> None:
+        """Refresh the markers of this worker's held dirs so other workers do not evict them."""
+        now = time.time()
+        for task_id in list(self._active):
+            path = self.path_for(task_id)
+            self._write_marker(path, {**self._read_marker(path), "held": True, "heartbeat_at": now})
+
+    def prefer_tmpfs_for(self, task_text: str) -> bool:
+        """Heuristic: short tasks without file-heavy wording are placed on tmpfs when configured."""
+        if not self.tmpfs_root or not task_text:
+            return False
+        text = task_text.lower()
+        if len(text) > _env_int("WORK_DIR_TMPFS_MAX_TASK_CHARS", 500):
+            return False
+        return not any(hint in text for hint in HEAVY_TASK_HINTS)
+
+    def hold(self, task_id: str) -> None:
+        """Keep an acquired work dir alive for an additional holder (e.g. a background job).
+
+        Holders are counted: every ``hold`` must be matched by exactly one ``release``.
+        """
+        self._active[task_id] = self._active.get(task_id, 0) + 1
+
+    async def release(self, task_id: str, status: Optional[str] = None, delivered: bool = False) -> None:
+        """Drop one holder; when the last holder releases, record the outcome and apply retention.
+
+        Args:
+            task_id: Task whose work dir is being released.
+            status: "completed" or "failed". Only the first non-empty status is recorded.
+            delivered: True once deliverables were uploaded and the final result published.
+        """
+        path = self.path_for(task_id)
+        remaining = self._active.get(task_id, 0) - 1
+        marker = self._read_marker(path)
+        # ``held`` tells other workers sharing the root that a background holder still uses the dir
+        update = {"held": remaining > 0, "heartbeat_at": time.time()}
+        if status and marker.get("status") in (None, "active"):
+            update.update(status=status, delivered=bool(delivered), completed_at=time.time())
+        marker = {**marker, **update}
+        self._write_marker(path, marker)
+
+        if remaining > 0:
+            self._active[task_id] = remaining
+            return
+        self._active.pop(task_id, None)
+        metrics.set_gauge("work_dir.active", len(self._active))
+
+        if self.delete_after_upload and marker.get("status") == "completed" and marker.get("delivered"):
+            await asyncio.to_thread(self._delete, task_id, "delivered")
+        try:
+            await self.enforce()
+        except Exception as e:
+            logger.warning(f"Work dir retention failed: {e}")
+
+    # ------------------------------------------------------------------
+    # Retention / quota
+    # ------------------------------------------------------------------
+
+    async def enforce(self) -> List[str]:
+        """Apply retention and quota rules. Returns the task ids whose dirs were deleted."""
+        async with self._lock:
+            return await asyncio.to_thread(self._enforce_sync)
+
+    def _inactive_dirs(self) -> List[Dict]:
+        """Describe finished request dirs under root: task_id, path, status, completed_at, last_used.
+
+        Dirs in use by this worker, or marked active by another worker that is still alive, are skipped.
+        """
+        now = time.time()
+        result = []
+        try:
+            entries = list(os.scandir(self.root))
+        except OSError:
+            return result
+        for entry in entries:
+            if not entry.name.startswith(REQUEST_DIR_PREFIX):
+                continue
+            task_id = entry.name[len(REQUEST_DIR_PREFIX):]
+            if task_id in self._active:
+                continue
+            try:
+                last_used = entry.stat(follow_symlinks=True).st_mtime
+            except OSError:
+                continue
+            marker = self._read_marker(entry.path)
+            if marker.get("status") == "active" or marker.get("held"):
+                heartbeat = marker.get("heartbeat_at") or marker.get("started_at") or 0
+                if now - max(heartbeat, last_used) < self.active_stale_seconds:
+                    continue
+            result.append({
+                "task_id": task_id,
+                "path": entry.path,
+                "status": marker.get("status") or "unknown",
+                "completed_at": marker.get("completed_at") or last_used,
+                "last_used": max(last_used, marker.get("completed_at") or 0),
+            })
+        return result
+
+    def _enforce_sync(self) -> List[str]:
+        self._heartbeat_active()
+        now = time.time()
+        deleted: List[str] = []
+        dirs = self._inactive_dirs()
+
+        # Failures (and dirs abandoned mid-run by a crashed worker) are kept for a limited time
+        failed = [d for d in dirs if d["status"] != "completed"]
+        for d in failed:
+            if now - d["completed_at"] > self.keep_failed_hours * 3600:
+                self._delete(d["task_id"], "failure retention expired")
+                deleted.append(d["task_id"])
+
+        # Keep only the N most recent successful dirs
+        completed = sorted((d for d in dirs if d["status"] == "completed"), key=lambda d: d["completed_at"], reverse=True)
+        for d in completed[self.keep_recent:]:
+            self._delete(d["task_id"], "keep_recent exceeded")
+            deleted.append(d["task_id"])
+
+        # Global quota: evict least recently used inactive dirs until under the limit
+        if self.quota_bytes:
+            remaining = [d for d in dirs if d["task_id"] not in deleted]
+            sizes = {d["task_id"]: _dir_size(os.path.realpath(d["path"])) for d in remaining}
+            total = sum(sizes.values()) + sum(
+                _dir_size(os.path.realpath(self.path_for(t))) for t in list(self._active)
+            )
+            metrics.set_gauge("work_dir.disk_bytes", total)
+            for d in sorted(remaining, key=lambda d: d["last_used"]):
+                if total <= self.quota_bytes:
+                    break
+                self._delete(d["task_id"], "disk quota")
+                total -= sizes.get(d["task_id"], 0)
+                deleted.append(d["task_id"])
+            metrics.set_gauge("work_dir.disk_bytes", max(total, 0))
+            if total > self.quota_bytes:
+                logger.warning(f"⚠️ Work dirs still over quota ({total / 1e6:.0f} MB) - remaining usage is from active tasks")
+
+        metrics.set_gauge("work_dir.retained", len(dirs) - len(deleted))
+        return deleted
+
+    def _delete(self, task_id: str, reason: str) -> None:
+        """Delete a request dir (and its tmpfs target, spilled tool outputs and traceback file)."""
+        if task_id in self._active:
+            return
+        path = self.path_for(task_id)
+        try:
+            if os.path.islink(path):
+                target = os.path.realpath(path)
+                os.unlink(path)
+                shutil.rmtree(target, ignore_errors=True)
+            else:
+                shutil.rmtree(path, ignore_errors=True)
+            shutil.rmtree(spill_dir_for(path), ignore_errors=True)
+            traceback_file = self.traceback_path(task_id)
+            if os.path.exists(traceback_file):
+                os.remove(traceback_file)
+            metrics.increment("work_dir.deleted", reason=reason)
+            logger.info(f"🧹 Deleted work dir for {task_id} ({reason})")
+        except OSError as e:
+            logger.warning(f"Failed to delete work dir {path}: {e}")
+
+    def _tmpfs_has_room(self) -> bool:
+        if not self.tmpfs_root:
+            return False
+        try:
+            os.makedirs(self.tmpfs_root, exist_ok=True)
+            # O(1) statvfs of the mount (called on the event loop for every task start)
+            usage = shutil.disk_usage(self.tmpfs_root)
+        except OSError:
+            return False
+        reserve = self.tmpfs_task_reserve_bytes
+        return usage.free >= reserve and usage.used + reserve <= self.tmpfs_quota_bytes
+
+    # ------------------------------------------------------------------
+    # Compaction
+    # ------------------------------------------------------------------
+
+    def _compact_sync(self) -> int:
+        """Gzip JSONL/log files of finished dirs. Returns the number of files compacted."""
+        now = time.time()
+        compacted = 0
+        for d in self._inactive_dirs():
+            if now - d["completed_at"] < self.compact_after_seconds:
+                continue
+            for dirpath, _, filenames in os.walk(d["path"], followlinks=True):
+                for name in filenames:
+                    if not name.endswith(COMPACTABLE_SUFFIXES):
+                        continue
+                    src = os.path.join(dirpath, name)
+                    try:
+                        with open(src, "rb") as f_in, gzip.open(src + ".gz", "wb") as f_out:
+                            shutil.copyfileobj(f_in, f_out)
+                        os.remove(src)
+                        compacted += 1
+                    except OSError as e:
+                        logger.debug(f"Failed to compact {src}: {e}")
+        if compacted:
+            metrics.increment("work_dir.files_compacted", compacted)
+            logger.info(f"🗜️ Compacted {compacted} log file(s) in finished work dirs")
+        return compacted
+
+    async def _maintenance_loop(self) -> None:
+        try:
+            while True:
+                await asyncio.sleep(self.maintenance_interval)
+                try:
+                    await self.enforce()
+                    async with self._lock:
+                        await asyncio.to_thread(self._compact_sync)
+                except Exception as e:
+                    logger.warning(f"Work dir maintenance failed: {e}")
+        except asyncio.CancelledError:
+            logger.debug("Work dir maintenance loop cancelled")
+
+    def start_maintenance(self) -> None:
+        """Start background retention + compaction (idempotent)."""
+        if self._maintenance_task and not self._maintenance_task.done():
+            return
+        self._maintenance_task = asyncio.create_task(self._maintenance_loop())
+        logger.info(
+            f"🗂️ Work dir maintenance started (root={self.root}, keep_recent={self.keep_recent}, "
+            f"keep_failed_hours={self.keep_failed_hours}, quota={self.quota_bytes // (1024 * 1024)}MB)"
+        )
+
+    async def stop_maintenance(self) -> None:
+        """Stop background maintenance."""
+        task = self._maintenance_task
+        self._maintenance_task = None
+        if task and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    # ------------------------------------------------------------------
+    # Marker helpers
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _read_marker(path: str) -> Dict:
+        try:
+            with open(os.path.join(path, MARKER_FILE), "r", encoding="utf-8") as f:
+                return json.load(f) or {}
+        except (OSError, ValueError):
+            return {}
+
+    @staticmethod
+    def _write_marker(path: str, data: Dict) -> None:
+        try:
+            with open(os.path.join(path, MARKER_FILE), "w", encoding="utf-8") as f:
+                json.dump(data, f)
+        except OSError as e:
+            logger.debug(f"Failed to write work dir marker in {path}: {e}")
+
+
+# Global manager instance
+_work_dir_manager: Optional[WorkDirManager] = None
+
+
+def get_work_dir_manager() -> WorkDirManager:
+    """Get or create the global work dir manager."""
+    global _work_dir_manager
+    if _work_dir_manager is None:
+        _work_dir_manager = WorkDirManager()
+    return _work_dir_manager
@@ -119,9 +119,11 @@ async def extract_worklog_and_learnings(
 **NOW EXTRACT FROM THE MESSAGE CONTENT ABOVE - BE SPECIFIC AND CONCRETE**:"""
 
         # Call LLM
-        response = await model_client.create(
-            messages=[UserMessage(content=prompt, source="worklog_extractor")]
-        )
+        from task_processor.llm_instrumentation import llm_call_tags, PRIORITY_BACKGROUND
+        with llm_call_tags("worklog_extraction", priority=PRIORITY_BACKGROUND):
+            response = await model_client.create(
+                messages=[UserMessage(content=prompt, source="worklog_extractor")]
+            )
         
         # Extract JSON from response using centralized utility
         from util.json_extractor import extract_json_from_model_response
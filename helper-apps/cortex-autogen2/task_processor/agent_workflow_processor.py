@@ -23,6 +23,10 @@ from autogen_agentchat.conditions import TextMentionTermination
 from services.azure_queue import get_queue_service
 from services.redis_publisher import get_redis_publisher
 from services.azure_ai_search import search_similar_rest, upsert_run_rest
+from services.request_state import get_request_state_registry
+from services.work_dir_manager import bind_work_dir, get_work_dir_manager
+from services.tracing import get_tracer
+from services import metrics
 
 from .simple_workflow import SimplifiedWorkflow
 
@@ -40,6 +44,9 @@ from context.context_memory import ContextMemory
 # Import from refactored modules
 from .message_utils import _stringify_content
 from .model_config import ModelConfig
+from .model_registry import get_model_registry
+from .llm_instrumentation import bind_llm_task, get_llm_call_recorder
+from .llm_replay import get_llm_traffic_recorder
 
 
 # Custom exception for workflow coordination failures
@@ -94,15 +101,7 @@ class TaskProcessor:
         self.logger = logger or logging.getLogger(__name__)  # Use provided logger or default
         self.debug_progress_msgs = debug_progress_msgs  # Control detailed agent progress messages
 
-        # Initialize model clients using centralized configuration
-        self.gpt41_model_client = ModelConfig.create_model_client("gpt-4.1")
-        self.o3_model_client = ModelConfig.create_model_client("o3")
-
-        self.gpt5_mini_model_client = ModelConfig.create_model_client("gpt-5-mini")
-        self.gpt5_model_client = ModelConfig.create_model_client("gpt-5")
-
-        self.gpt51_model_client = ModelConfig.create_model_client("gpt-5.1")
-        self.gpt51_chat_model_client = ModelConfig.create_model_client("gpt-5.1-chat")
+        # Model clients are created lazily by the shared registry (see properties below)
 
         # Initialize progress handler and message generator after model clients
         self.progress_handler = None
@@ -115,6 +114,31 @@ class TaskProcessor:
         self.heartbeat_emojis = ["🔄", "🔁"]
         self.heartbeat_emoji_index = 0
 
+    # Model clients: shared across processors, built on first use, one HTTP pool
+    @property
+    def gpt41_model_client(self):
+        return ModelConfig.get_model_client("gpt-4.1")
+
+    @property
+    def o3_model_client(self):
+        return ModelConfig.get_model_client("o3")
+
+    @property
+    def gpt5_mini_model_client(self):
+        return ModelConfig.get_model_client("gpt-5-mini")
+
+    @property
+    def gpt5_model_client(self):
+        return ModelConfig.get_model_client("gpt-5")
+
+    @property
+    def gpt51_model_client(self):
+        return ModelConfig.get_model_client("gpt-5.1")
+
+    @property
+    def gpt51_chat_model_client(self):
+        return ModelConfig.get_model_client("gpt-5.1-chat")
+
     async def initialize(self):
         """Initialize async services."""
         # Pre-initialize redis publisher and progress handler
@@ -128,10 +152,34 @@ class TaskProcessor:
                 # self.gpt5_mini_model_client
                 # self.gpt5_model_client
             )
+        # Cached-token counts for the LLM call records (after logging is configured)
+        from .llm_instrumentation import install_usage_handler
+        install_usage_handler()
+        # Backstop eviction of per-request state for tasks that never release it
+        get_request_state_registry().start_sweeper()
+        # Retention, disk quota and log compaction for $WORK_DIR_ROOT/req_* dirs
+        get_work_dir_manager().start_maintenance()
+        # Load the local learnings index and start its first sync before tasks arrive
+        from services.learnings_index import get_learnings_index
+        (await asyncio.to_thread(get_learnings_index)).schedule_refresh()
+        # Learning extraction jobs a previous process did not finish
+        from services.learning_processor import resume_learnings_jobs
+        resume_learnings_jobs()
         self.logger.info("✅ TaskProcessor initialized successfully")
 
     async def close(self):
         """Clean up async services."""
+        # Let post-task jobs finish while the model clients are still open
+        await drain_post_task_queue()
+        await get_request_state_registry().stop_sweeper()
+        await get_work_dir_manager().stop_maintenance()
+        await get_model_registry().close()
+        from tools.web_fetcher import close_web_fetcher
+        from tools.browser_manager import close_browser_manager
+        from tools.download_manager import close_download_manager
+        await close_web_fetcher()
+        await close_browser_manager()
+        await close_download_manager()
         if self.redis_publisher:
             await self.redis_publisher.close()
         self.logger.info("🔌 TaskProcessor connections closed")
@@ -241,6 +289,15 @@ class TaskProcessor:
         Returns:
             Final result string
         """
+        get_request_state_registry().begin(task_id)
+        bind_llm_task(task_id)
+        tracer = get_tracer()
+        tracer.begin(task_id)
+        work_dir_manager = get_work_dir_manager()
+        work_dir_acquired = False
+        request_work_dir = None
+        outcome = "failed"
+        startup_tasks = []
         try:
 
             # Initialize progress handler
@@ -252,44 +309,53 @@ class TaskProcessor:
             # Extract and normalize the task content
             task = self._extract_task_content(task_content)
             self.logger.info(f"🎯 Processing task {task_id}: {task}")
+            get_llm_traffic_recorder().begin(task_id, task)
 
             # Initialize progress - continue with planning at 5%
 
             # Build dynamic context from files
-            request_work_dir = f"/tmp/coding/req_{task_id}"
-            os.makedirs(request_work_dir, exist_ok=True)
+            request_work_dir = work_dir_manager.acquire(task_id, prefer_tmpfs=work_dir_manager.prefer_tmpfs_for(task))
+            work_dir_acquired = True
+            # Tools that are not handed a work dir resolve it from here, not from the process environment
+            bind_work_dir(request_work_dir)
 
             # Initialize context memory
             self.context_memory = ContextMemory(request_work_dir, self.gpt41_model_client, task_id)
+            progress_handler.bind_context_memory(task_id, self.context_memory)
             
+            # Start-up steps overlap: only the planner needs the learnings, and its first
+            # model call waits for them (time-boxed), so retrieval runs alongside the file
+            # context scan, agent construction and the start of the workflow
+            learnings_task = asyncio.create_task(self._retrieve_learnings(task, task_id))
+            context_task = asyncio.create_task(self._build_file_context(request_work_dir, task))
+            startup_tasks = [learnings_task, context_task]
+
             # Initialize cognitive journey tracking
             from context.cognitive_journey_mapper import get_cognitive_journey_mapper
             journey_mapper = get_cognitive_journey_mapper()
             journey_mapper.start_journey(task_id, ["planner_agent", "coder_agent", "web_search_agent", "presenter_agent"])
 
-            context_files = helpers.build_dynamic_context_from_files(request_work_dir, task)
-            task_with_context = f"{task}\n\nContext from previous work:\n{context_files}"
-
-            # Retrieve learnings from Azure Cognitive Search
-            from services.learning_service import get_learnings_for_task
-            learnings = await get_learnings_for_task(task, task_id, self.gpt41_model_client, self.context_memory)
-
             # Get agents for this task
-            planner_agent, execution_agents, presenter_agent = await get_agents(
-                #self.gpt41_model_client,
-                self.gpt51_model_client,
-                # self.gpt5_mini_model_client,
-                # self.gpt5_model_client,
-                self.o3_model_client,
-                #self.gpt41_model_client,
-                self.gpt51_model_client,
-                # self.gpt5_mini_model_client,
-                # self.gpt5_model_client,
-                request_work_dir=request_work_dir,
-                request_id=task_id,
-                task_content=task,
-                planner_learnings=learnings,
-            )
+            with tracer.span("agent_construction"):
+                planner_agent, execution_agents, presenter_agent = await get_agents(
+                    #self.gpt41_model_client,
+                    self.gpt51_model_client,
+                    # self.gpt5_mini_model_client,
+                    # self.gpt5_model_client,
+                    self.o3_model_client,
+                    #self.gpt41_model_client,
+                    self.gpt51_model_client,
+                    # self.gpt5_mini_model_client,
+                    # self.gpt5_model_client,
+                    request_work_dir=request_work_dir,
+                    request_id=task_id,
+                    task_content=task,
+                    planner_learnings=learnings_task,
+                    context_memory=self.context_memory,
+                )
+
+            context_files = await context_task
+            task_with_context = f"{task}\n\nContext from previous work:\n{context_files}"
 
             # Extract execution completion verifier agent from execution_agents
             execution_completion_verifier_agent = None
@@ -300,14 +366,17 @@ class TaskProcessor:
                 else:
                     filtered_execution_agents.append(agent)
 
-            result = await self._run_agent_workflow(
-                task_id, task_with_context, request_work_dir,
-                planner_agent, filtered_execution_agents, presenter_agent,
-                execution_completion_verifier_agent, 
-                self.gpt41_model_client
-                # self.gpt5_model_client
-            )
+            with tracer.span("workflow"):
+                result = await self._run_agent_workflow(
+                    task_id, task_with_context, request_work_dir,
+                    planner_agent, filtered_execution_agents, presenter_agent,
+                    execution_completion_verifier_agent, 
+                    self.gpt41_model_client
+                    # self.gpt5_model_client
+                )
 
+            if result and not str(result).startswith(("Workflow failed", "Task completed with errors")):
+                outcome = "completed"
             return result
 
         except Exception as e:
@@ -318,7 +387,7 @@ class TaskProcessor:
             
             # Save traceback to file for debugging
             try:
-                tb_path = f"/tmp/coding/traceback_{task_id}.txt"
+                tb_path = get_work_dir_manager().traceback_path(task_id)
                 with open(tb_path, "w") as f:
                     f.write(traceback_str)
                 self.logger.error(f"🔥 Traceback saved to {tb_path}")
@@ -338,6 +407,37 @@ class TaskProcessor:
             self.logger.error(f"❌ Task processing failed for {task_id}: {e}", exc_info=True)
             return f"Task failed: {str(e)}"
 
+        finally:
+            # A planner that never ran leaves learnings retrieval pending
+            for startup_task in startup_tasks:
+                startup_task.cancel()
+            # Free per-request progress/publisher/journey state now that the task is done
+            get_request_state_registry().release(task_id)
+            get_llm_call_recorder().flush(task_id, request_work_dir)
+            get_llm_traffic_recorder().flush(task_id, request_work_dir)
+            tracer.flush(task_id, request_work_dir)
+            if work_dir_acquired:
+                await work_dir_manager.release(task_id, status=outcome, delivered=outcome == "completed")
+
+    async def _retrieve_learnings(self, task: str, task_id: str) -> Optional[str]:
+        """Learnings for the planner, or None if retrieval takes longer than LEARNINGS_TIMEOUT_SECONDS."""
+        from services.learning_service import get_learnings_for_task
+        timeout = float(os.getenv("LEARNINGS_TIMEOUT_SECONDS", "10"))
+        with get_tracer().span("learnings_retrieval", lane="learnings"):
+            try:
+                return await asyncio.wait_for(
+                    get_learnings_for_task(task, task_id, self.gpt41_model_client, self.context_memory),
+                    timeout=timeout,
+                )
+            except asyncio.TimeoutError:
+                metrics.increment("learnings.timeouts")
+                self.logger.warning(f"⏱️ Learnings retrieval for {task_id} exceeded {timeout:.0f}s; planning without them")
+                return None
+
+    async def _build_file_context(self, work_dir: str, task: str) -> str:
+        with get_tracer().span("context_setup", lane="startup"):
+            return await asyncio.to_thread(helpers.build_dynamic_context_from_files, work_dir, task)
+
     def _extract_task_content(self, task_content: str) -> str:
         """Extract the actual task content from various input formats."""
         try:
@@ -1062,6 +1162,14 @@ async def get_task_processor(debug_progress_msgs: bool = None) -> TaskProcessor:
     return _processor_instance
 
 
+async def drain_post_task_queue() -> None:
+    """Wait up to POST_TASK_DRAIN_SECONDS for post-task jobs, then stop the queue workers."""
+    from services.post_task_queue import get_post_task_queue
+    queue = get_post_task_queue()
+    await queue.drain(timeout=float(os.getenv("POST_TASK_DRAIN_SECONDS", "120")))
+    await queue.stop()
+
+
 async def process_queue_message(message_data: Dict[str, Any], logger=None) -> Optional[str]:
     """
     Main entry point for processing queue messages.
@@ -1092,6 +1200,8 @@ async def process_queue_message(message_data: Dict[str, Any], logger=None) -> Op
 
         # Process the task
         result = await processor.process_task(task_id, task_content, runner_info=runner_info)
+        # Each message runs in its own event loop, so background jobs must finish before returning
+        await drain_post_task_queue()
 
         processor.logger.info(f"✅ Task {task_id} completed successfully")
         return result
@@ -1109,7 +1219,7 @@ def _log_message_to_request_file(task_id: str, message) -> None:
         import os
         from datetime import datetime
 
-        work_dir = f"/tmp/coding/req_{task_id}"
+        work_dir = get_work_dir_manager().path_for(task_id)
         os.makedirs(work_dir, exist_ok=True)
 
         messages_log_path = os.path.join(work_dir, "messages.log")
@@ -1133,7 +1243,7 @@ def _log_context_to_request_file(task_id: str, context_type: str, context_data:
         import os
         from datetime import datetime
 
-        work_dir = f"/tmp/coding/req_{task_id}"
+        work_dir = get_work_dir_manager().path_for(task_id)
         logs_dir = os.path.join(work_dir, "logs")
         os.makedirs(logs_dir, exist_ok=True)
 
@@ -0,0 +1,284 @@
+"""
+Process-wide LLM rate governor.
+
+Every model client (see ``model_registry.PooledModelClient``) goes through one
+governor per model before calling ``CORTEX_API_BASE_URL``:
+
+- token buckets for requests/second and tokens/minute
+  (``LLM_RPS_<MODEL>`` / ``LLM_TPM_<MODEL>``, ``0`` = unlimited)
+- priority classes: agent turns go first; background and bookkeeping calls wait
+  while agent calls are queued and leave ``LLM_BOOKKEEPING_RESERVE`` of the token
+  budget to agent turns. The per-model concurrency slots (``PrioritySlots``)
+  are handed out in the same order, so priorities hold even without rate limits
+- 429s put the model in a cooldown (``Retry-After`` or jittered exponential
+  backoff) and the call is retried; 5xx and connection errors are retried the
+  same way
+- under pressure, bookkeeping calls (progress messages, termination and file
+  detection) are shed with ``LLMLoadShedError`` instead of queueing; their
+  callers already fall back to heuristics
+
+Callers mark non-agent work with ``llm_priority`` (or with
+``llm_instrumentation.llm_call_tags(purpose, priority=...)``)::
+
+    with llm_priority(PRIORITY_BOOKKEEPING):
+        response = await model_client.create(messages)
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from services import metrics
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_AGENT = "agent"
+# Deferred behind agent turns, never shed (learning extraction, analysis)
+PRIORITY_BACKGROUND = "background"
+# Deferred behind agent turns and shed under pressure (progress, detection)
+PRIORITY_BOOKKEEPING = "bookkeeping"
+
+_PRIORITY_RANK = {PRIORITY_AGENT: 0, PRIORITY_BACKGROUND: 1, PRIORITY_BOOKKEEPING: 2}
+
+_current_priority: ContextVar[str] = ContextVar("llm_priority", default=PRIORITY_AGENT)
+
+
+class LLMLoadShedError(RuntimeError):
+    """Raised instead of queueing a low-priority call while the model is under pressure."""
+
+
+@contextmanager
+def llm_priority(priority: str):
+    """Run the enclosed model calls with the given priority class."""
+    token = _current_priority.set(priority)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+
+def current_priority() -> str:
+    return _current_priority.get()
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+class TokenBucket:
+    """Refilling bucket; ``take`` may overdraw so actual usage can be settled after a call."""
+
+    def __init__(self, rate_per_second: float, capacity: float):
+        self.rate = rate_per_second
+        self.capacity = capacity
+        self.tokens = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def time_until(self, amount: float) -> float:
+        """Seconds until ``amount`` (capped at capacity) is available."""
+        self._refill()
+        missing = min(amount, self.capacity) - self.tokens
+        return max(0.0, missing / self.rate)
+
+    def take(self, amount: float) -> None:
+        self._refill()
+        self.tokens -= amount
+
+
+class PrioritySlots:
+    """Counting semaphore that wakes waiters by priority class (FIFO within a class)."""
+
+    def __init__(self, capacity: int):
+        self.capacity = max(1, int(capacity))
+        self._in_use = 0
+        self._waiters: list = []  # heap of (rank, seq, future)
+        self._seq = itertools.count()
+
+    def locked(self) -> bool:
+        """True when an acquire would wait."""
+        return self._in_use >= self.capacity or bool(self._waiters)
+
+    async def acquire(self, priority: str = PRIORITY_AGENT) -> None:
+        if not self.locked():
+            self._in_use += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        entry = (_PRIORITY_RANK.get(priority, len(_PRIORITY_RANK)), next(self._seq), future)
+        heapq.heappush(self._waiters, entry)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as the waiter was cancelled: pass it on
+                self.release()
+            elif entry in self._waiters:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+            raise
+
+    def release(self) -> None:
+        # Hand the slot straight to the highest-priority waiter (the in-use count stays the same)
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self._in_use -= 1
+
+
+class ModelGovernor:
+    """Rate limits, priorities and 429 cooldown for one model."""
+
+    def __init__(self, model_name: str, requests_per_second: float, tokens_per_minute: float):
+        self.model_name = model_name
+        self.requests = TokenBucket(requests_per_second, max(1.0, requests_per_second)) if requests_per_second > 0 else None
+        self.tokens = TokenBucket(tokens_per_minute / 60.0, tokens_per_minute) if tokens_per_minute > 0 else None
+        self.reserve = _env_float("LLM_BOOKKEEPING_RESERVE", 0.2)
+        self.shed_max_wait = _env_float("LLM_SHED_MAX_WAIT_SECONDS", 10.0)
+        self._agent_waiters = 0
+        self._cooldown_until = 0.0
+        self._consecutive_429 = 0
+
+    def under_pressure(self) -> bool:
+        return self._agent_waiters > 0 or time.monotonic() < self._cooldown_until
+
+    def has_spare_capacity(self, estimated_tokens: int) -> bool:
+        """True when a bookkeeping call of this size could be sent right now without waiting."""
+        return not self.under_pressure() and self._wait_time(estimated_tokens, PRIORITY_BOOKKEEPING) <= 0
+
+    def _wait_time(self, estimated_tokens: int, priority: str) -> float:
+        wait = max(0.0, self._cooldown_until - time.monotonic())
+        if self.requests:
+            wait = max(wait, self.requests.time_until(1))
+        if self.tokens:
+            needed = estimated_tokens
+            if priority != PRIORITY_AGENT:
+                needed += self.tokens.capacity * self.reserve
+            wait = max(wait, self.tokens.time_until(needed))
+        return wait
+
+    async def acquire(self, estimated_tokens: int, priority: str) -> float:
+        """Wait until the call may be sent (or raise LLMLoadShedError for sheddable calls).
+
+        Returns the seconds spent waiting.
+        """
+        started = time.monotonic()
+        is_agent = priority == PRIORITY_AGENT
+        if is_agent:
+            self._agent_waiters += 1
+        try:
+            while True:
+                wait = self._wait_time(estimated_tokens, priority)
+                if not is_agent and self._agent_waiters > 0:
+                    wait = max(wait, 0.05)
+                if wait <= 0:
+                    break
+                if priority == PRIORITY_BOOKKEEPING and time.monotonic() - started + wait > self.shed_max_wait:
+                    metrics.increment("llm.shed", model=self.model_name)
+                    raise LLMLoadShedError(f"{self.model_name} under pressure; {priority} call shed")
+                await asyncio.sleep(min(wait, 1.0))
+        finally:
+            if is_agent:
+                self._agent_waiters -= 1
+
+        if self.requests:
+            self.requests.take(1)
+        if self.tokens:
+            self.tokens.take(estimated_tokens)
+        waited = time.monotonic() - started
+        if waited > 0.01:
+            metrics.observe("llm.governor_wait_seconds", waited, model=self.model_name, priority=priority)
+        return waited
+
+    def settle(self, estimated_tokens: int, actual_tokens: Optional[int]) -> None:
+        """Correct the token bucket with the usage reported by the API."""
+        self._consecutive_429 = 0
+        if self.tokens and actual_tokens:
+            self.tokens.take(actual_tokens - estimated_tokens)
+
+    def on_rate_limited(self, retry_after: Optional[float]) -> float:
+        """Start (or extend) a cooldown after a 429; returns the delay before retrying."""
+        self._consecutive_429 += 1
+        delay = retry_after if retry_after is not None else backoff_delay(self._consecutive_429 - 1)
+        self._cooldown_until = max(self._cooldown_until, time.monotonic() + delay)
+        metrics.increment("llm.rate_limited", model=self.model_name)
+        logger.warning(f"🚦 {self.model_name} rate limited; cooling down {delay:.1f}s")
+        return delay
+
+
+def backoff_delay(attempt: int) -> float:
+    """Exponential backoff with equal jitter."""
+    base = _env_float("LLM_RETRY_BASE_SECONDS", 1.0)
+    cap = _env_float("LLM_RETRY_MAX_SECONDS", 30.0)
+    delay = min(cap, base * (2 ** attempt))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def classify_error(error: Exception):
+    """Return ``("rate_limited", retry_after)``, ``("transient", None)`` or ``(None, None)``."""
+    try:
+        import openai
+    except ImportError:
+        return None, None
+    if isinstance(error, openai.RateLimitError):
+        retry_after = None
+        response = getattr(error, "response", None)
+        header = response.headers.get("retry-after") if response is not None else None
+        try:
+            retry_after = min(float(header), _env_float("LLM_RETRY_MAX_SECONDS", 30.0)) if header else None
+        except ValueError:
+            pass
+        return "rate_limited", retry_after
+    if isinstance(error, (openai.APIConnectionError, openai.InternalServerError)):
+        return "transient", None
+    return None, None
+
+
+def estimate_request_tokens(messages) -> int:
+    """Rough prompt + expected completion size (4 chars per token)."""
+    chars = sum(len(str(getattr(message, "content", message))) for message in messages or [])
+    return chars // 4 + int(os.getenv("LLM_EXPECTED_COMPLETION_TOKENS", "1000"))
+
+
+class LLMGovernor:
+    """Holds one ModelGovernor per model."""
+
+    def __init__(self):
+        self._models: Dict[str, ModelGovernor] = {}
+        self.enabled = os.getenv("LLM_GOVERNOR", "true").lower() == "true"
+        self.max_retries = int(os.getenv("LLM_RETRY_MAX", "4"))
+
+    def for_model(self, model_name: str) -> ModelGovernor:
+        governor = self._models.get(model_name)
+        if governor is None:
+            from .model_config import ModelConfig
+            rps, tpm = ModelConfig.get_rate_limits(model_name)
+            governor = ModelGovernor(model_name, rps, tpm)
+            self._models[model_name] = governor
+        return governor
+
+
+# Global governor instance
+_governor: Optional[LLMGovernor] = None
+
+
+def get_llm_governor() -> LLMGovernor:
+    """Get or create the global LLM governor."""
+    global _governor
+    if _governor is None:
+        _governor = LLMGovernor()
+    return _governor
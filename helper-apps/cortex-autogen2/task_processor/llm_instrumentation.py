@@ -0,0 +1,415 @@
+"""
+Per-call LLM instrumentation.
+
+Every call made through ``PooledModelClient`` produces a record with its tags
+(task id, purpose, agent, priority) and timings:
+
+- ``queue_wait_s``: time spent in the rate governor and the per-model slot
+- ``ttft_s``: time to first token (streaming), otherwise equal to latency
+- ``latency_s``: total wall time including retries
+- ``prompt_tokens`` / ``completion_tokens`` / ``cached_tokens``
+
+Tags come from ``llm_call_tags`` (a context manager around bookkeeping calls)
+and from ``TaggedModelClient``, which agents and the speaker selector use so
+their calls are attributed without touching autogen internals::
+
+    with llm_call_tags("termination_detection", priority=PRIORITY_BOOKKEEPING):
+        response = await model_client.create(messages)
+
+Records are kept per task and written by ``flush`` to the work dir's ``logs/``:
+``llm_calls.jsonl`` (one record per call), ``llm_spans.jsonl`` (OpenTelemetry
+span JSON, one per line) and ``llm_summary.json`` (totals per purpose). When the
+``opentelemetry`` API is installed, each call is also emitted as a span.
+"""
+import hashlib
+import json
+import logging
+import os
+import time
+import uuid
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import Awaitable, Dict, List, Optional
+
+from autogen_core.models import ChatCompletionClient, SystemMessage
+
+from services import metrics
+from services.tracing import get_tracer
+from .llm_governor import PRIORITY_AGENT, PRIORITY_BACKGROUND, PRIORITY_BOOKKEEPING, llm_priority  # noqa: F401
+
+logger = logging.getLogger(__name__)
+
+_call_tags: ContextVar[dict] = ContextVar("llm_call_tags", default={})
+# Record of the call currently inside the OpenAI client (for usage details from autogen events)
+_active_call: ContextVar[Optional[dict]] = ContextVar("llm_active_call", default=None)
+
+try:
+    from opentelemetry import trace as _otel_trace
+except ImportError:
+    _otel_trace = None
+
+
+@contextmanager
+def llm_call_tags(purpose: Optional[str] = None, agent: Optional[str] = None,
+                  task_id: Optional[str] = None, priority: Optional[str] = None):
+    """Tag the enclosed model calls (and optionally set their priority class)."""
+    tags = dict(_call_tags.get())
+    tags.update({key: value for key, value in (("purpose", purpose), ("agent", agent), ("task_id", task_id))
+                 if value is not None})
+    token = _call_tags.set(tags)
+    try:
+        with llm_priority(priority) if priority else nullcontext():
+            yield
+    finally:
+        _call_tags.reset(token)
+
+
+def bind_llm_task(task_id: str) -> None:
+    """Attribute all model calls of the current asyncio task (and tasks it spawns) to ``task_id``."""
+    _call_tags.set({**_call_tags.get(), "task_id": task_id})
+    get_llm_call_recorder().begin(task_id)
+
+
+class LLMCall:
+    """Timing and usage of one logical model call (including its retries)."""
+
+    def __init__(self, model: str, priority: str, streaming: bool = False):
+        tags = _call_tags.get()
+        self.record = {
+            "task_id": tags.get("task_id"),
+            "purpose": tags.get("purpose") or "untagged",
+            "agent": tags.get("agent"),
+            "model": model,
+            "priority": priority,
+            "streaming": streaming,
+            "started_at": time.time(),
+            "queue_wait_s": 0.0,
+            "ttft_s": None,
+            "latency_s": None,
+            "prompt_tokens": None,
+            "completion_tokens": None,
+            "cached_tokens": None,
+            "attempts": 0,
+            "status": "ok",
+        }
+        self._started = time.monotonic()
+        self._token = _active_call.set(self.record)
+
+    def add_queue_wait(self, seconds: float) -> None:
+        self.record["queue_wait_s"] += seconds
+
+    def attempt(self) -> None:
+        self.record["attempts"] += 1
+
+    def first_token(self) -> None:
+        if self.record["ttft_s"] is None:
+            self.record["ttft_s"] = time.monotonic() - self._started
+
+    def finish(self, result=None, error: Optional[BaseException] = None) -> None:
+        record = self.record
+        record["latency_s"] = time.monotonic() - self._started
+        if record["ttft_s"] is None and error is None:
+            record["ttft_s"] = record["latency_s"]
+        usage = getattr(result, "usage", None)
+        if usage is not None:
+            record["prompt_tokens"] = usage.prompt_tokens
+            record["completion_tokens"] = usage.completion_tokens
+        if error is not None:
+            record["status"] = "shed" if type(error).__name__ == "LLMLoadShedError" else "error"
+            record["error"] = f"{type(error).__name__}: {str(error)[:200]}"
+        try:
+            _active_call.reset(self._token)
+        except ValueError:
+            # Finished from another context (e.g. a stream consumed by a different task)
+            _active_call.set(None)
+        get_llm_call_recorder().record(record)
+
+
+class _UsageDetailsHandler(logging.Handler):
+    """Reads cached-token counts from autogen's LLMCallEvent (not exposed on CreateResult)."""
+
+    def emit(self, record: logging.LogRecord) -> None:
+        event = record.msg
+        if type(event).__name__ != "LLMCallEvent":
+            return
+        active = _active_call.get()
+        if active is None:
+            return
+        try:
+            usage = (getattr(event, "kwargs", {}).get("response") or {}).get("usage") or {}
+            details = usage.get("prompt_tokens_details") or {}
+            active["cached_tokens"] = details.get("cached_tokens")
+        except Exception:
+            pass
+
+
+def install_usage_handler() -> None:
+    """Attach the cached-token reader to autogen's event logger (idempotent).
+
+    The logger's level and propagation are left as configured: cached tokens are
+    recorded while autogen events are enabled at INFO (the worker logs at DEBUG).
+    """
+    try:
+        from autogen_core import EVENT_LOGGER_NAME
+    except ImportError:
+        EVENT_LOGGER_NAME = "autogen_core.events"
+    event_logger = logging.getLogger(EVENT_LOGGER_NAME)
+    if any(isinstance(handler, _UsageDetailsHandler) for handler in event_logger.handlers):
+        return
+    event_logger.addHandler(_UsageDetailsHandler())
+
+
+def _otel_attributes(record: dict) -> List[dict]:
+    mapping = {
+        "gen_ai.system": "openai",
+        "gen_ai.request.model": record["model"],
+        "gen_ai.usage.input_tokens": record["prompt_tokens"],
+        "gen_ai.usage.output_tokens": record["completion_tokens"],
+        "cortex.task_id": record["task_id"],
+        "cortex.purpose": record["purpose"],
+        "cortex.agent": record["agent"],
+        "cortex.priority": record["priority"],
+        "cortex.queue_wait_s": record["queue_wait_s"],
+        "cortex.ttft_s": record["ttft_s"],
+        "cortex.cached_tokens": record["cached_tokens"],
+        "cortex.attempts": record["attempts"],
+    }
+    attributes = []
+    for key, value in mapping.items():
+        if value is None:
+            continue
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            attributes.append({"key": key, "value": {"stringValue": str(value)}})
+        elif isinstance(value, int):
+            attributes.append({"key": key, "value": {"intValue": str(value)}})
+        else:
+            attributes.append({"key": key, "value": {"doubleValue": value}})
+    return attributes
+
+
+def to_otel_span(record: dict) -> dict:
+    """OTLP/JSON representation of a call record (trace id derived from the task id)."""
+    start_ns = int(record["started_at"] * 1e9)
+    end_ns = start_ns + int((record["latency_s"] or 0) * 1e9)
+    return {
+        "traceId": hashlib.sha256(str(record["task_id"]).encode()).hexdigest()[:32],
+        "spanId": uuid.uuid4().hex[:16],
+        "name": f"llm.{record['purpose']}",
+        "kind": "SPAN_KIND_CLIENT",
+        "startTimeUnixNano": str(start_ns),
+        "endTimeUnixNano": str(end_ns),
+        "attributes": _otel_attributes(record),
+        "status": {"code": "STATUS_CODE_OK" if record["status"] == "ok" else "STATUS_CODE_ERROR"},
+    }
+
+
+def _emit_otel_span(record: dict) -> None:
+    tracer = _otel_trace.get_tracer(__name__)
+    start_ns = int(record["started_at"] * 1e9)
+    span = tracer.start_span(f"llm.{record['purpose']}", start_time=start_ns)
+    for attribute in _otel_attributes(record):
+        span.set_attribute(attribute["key"], next(iter(attribute["value"].values())))
+    span.end(end_time=start_ns + int((record["latency_s"] or 0) * 1e9))
+
+
+class LLMCallRecorder:
+    """Collects call records per task and writes them to the task's logs."""
+
+    def __init__(self, max_records_per_task: int = 5000):
+        self.max_records_per_task = max_records_per_task
+        self._records: Dict[str, List[dict]] = {}
+
+    def record(self, record: dict) -> None:
+        labels = {"purpose": record["purpose"], "model": record["model"]}
+        metrics.increment("llm.calls", status=record["status"], **labels)
+        if record["latency_s"] is not None:
+            metrics.observe("llm.latency_seconds", record["latency_s"], **labels)
+        metrics.observe("llm.queue_wait_seconds", record["queue_wait_s"], **labels)
+        for kind in ("prompt", "completion", "cached"):
+            if record[f"{kind}_tokens"]:
+                metrics.increment("llm.tokens", record[f"{kind}_tokens"], kind=kind, **labels)
+        if _otel_trace is not None:
+            try:
+                _emit_otel_span(record)
+            except Exception as e:
+                logger.debug(f"OpenTelemetry span export failed: {e}")
+
+        if record["task_id"] and record["latency_s"] is not None:
+            get_tracer().add_span(
+                f"llm:{record['purpose']}", record["started_at"], record["latency_s"],
+                lane=f"llm:{record['agent'] or record['purpose']}", category="llm", task_id=record["task_id"],
+                args={"model": record["model"], "queue_wait_s": round(record["queue_wait_s"], 3),
+                      "prompt_tokens": record["prompt_tokens"], "completion_tokens": record["completion_tokens"]},
+            )
+
+        # Calls finishing after the task was flushed (e.g. a late progress message) only count in metrics
+        records = self._records.get(record["task_id"])
+        if records is not None and len(records) < self.max_records_per_task:
+            records.append(record)
+
+    def begin(self, task_id: str) -> None:
+        self._records.setdefault(task_id, [])
+
+    def records(self, task_id: str) -> List[dict]:
+        return list(self._records.get(task_id, []))
+
+    def summarize(self, task_id: str) -> dict:
+        """Totals per purpose and per priority class for a task."""
+        records = self._records.get(task_id, [])
+        by_purpose: Dict[str, dict] = {}
+        by_priority: Dict[str, float] = {}
+        for record in records:
+            entry = by_purpose.setdefault(record["purpose"], {
+                "calls": 0, "errors": 0, "latency_s": 0.0, "queue_wait_s": 0.0,
+                "prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0,
+            })
+            entry["calls"] += 1
+            entry["errors"] += record["status"] != "ok"
+            entry["latency_s"] += record["latency_s"] or 0.0
+            entry["queue_wait_s"] += record["queue_wait_s"]
+            for key in ("prompt_tokens", "completion_tokens", "cached_tokens"):
+                entry[key] += record[key] or 0
+            by_priority[record["priority"]] = by_priority.get(record["priority"], 0.0) + (record["latency_s"] or 0.0)
+        for entry in by_purpose.values():
+            entry["avg_latency_s"] = round(entry["latency_s"] / entry["calls"], 3)
+            entry["latency_s"] = round(entry["latency_s"], 3)
+            entry["queue_wait_s"] = round(entry["queue_wait_s"], 3)
+        return {
+            "task_id": task_id,
+            "calls": len(records),
+            "latency_s": round(sum(r["latency_s"] or 0.0 for r in records), 3),
+            "prompt_tokens": sum(r["prompt_tokens"] or 0 for r in records),
+            "completion_tokens": sum(r["completion_tokens"] or 0 for r in records),
+            "cached_tokens": sum(r["cached_tokens"] or 0 for r in records),
+            "latency_by_priority_s": {key: round(value, 3) for key, value in by_priority.items()},
+            "by_purpose": dict(sorted(by_purpose.items(), key=lambda item: -item[1]["latency_s"])),
+        }
+
+    def flush(self, task_id: str, work_dir: Optional[str]) -> Optional[dict]:
+        """Write the task's records, spans and summary to ``<work_dir>/logs/`` and forget them."""
+        if task_id not in self._records:
+            return None
+        summary = self.summarize(task_id)
+        records = self._records.pop(task_id)
+        if work_dir:
+            try:
+                logs_dir = os.path.join(work_dir, "logs")
+                os.makedirs(logs_dir, exist_ok=True)
+                with open(os.path.join(logs_dir, "llm_calls.jsonl"), "w", encoding="utf-8") as f:
+                    f.writelines(json.dumps(record, default=str) + "\n" for record in records)
+                with open(os.path.join(logs_dir, "llm_spans.jsonl"), "w", encoding="utf-8") as f:
+                    f.writelines(json.dumps(to_otel_span(record)) + "\n" for record in records)
+                with open(os.path.join(logs_dir, "llm_summary.json"), "w", encoding="utf-8") as f:
+                    json.dump(summary, f, indent=2)
+            except Exception as e:
+                logger.warning(f"Failed to write LLM call logs for {task_id}: {e}")
+        top = ", ".join(f"{purpose}={entry['calls']}/{entry['latency_s']}s"
+                        for purpose, entry in list(summary["by_purpose"].items())[:5])
+        logger.info(f"📊 LLM calls for {task_id}: {summary['calls']} calls, {summary['latency_s']}s, "
+                    f"{summary['prompt_tokens']}+{summary['completion_tokens']} tokens ({top})")
+        return summary
+
+    def discard(self, task_id: str) -> None:
+        self._records.pop(task_id, None)
+
+
+# Global recorder instance
+_recorder: Optional[LLMCallRecorder] = None
+
+
+def get_llm_call_recorder() -> LLMCallRecorder:
+    """Get or create the global LLM call recorder."""
+    global _recorder
+    if _recorder is None:
+        _recorder = LLMCallRecorder()
+    return _recorder
+
+
+class TaggedModelClient(ChatCompletionClient):
+    """Delegates to a shared model client, tagging its calls with a purpose and agent."""
+
+    def __init__(self, client: ChatCompletionClient, purpose: str, agent: Optional[str] = None):
+        self._client = client
+        self.purpose = purpose
+        self.agent = agent
+
+    async def create(self, *args, **kwargs):
+        with llm_call_tags(purpose=self.purpose, agent=self.agent):
+            return await self._client.create(*args, **kwargs)
+
+    async def create_stream(self, *args, **kwargs):
+        with llm_call_tags(purpose=self.purpose, agent=self.agent):
+            async for item in self._client.create_stream(*args, **kwargs):
+                yield item
+
+    async def close(self) -> None:
+        # The wrapped client is shared; it is closed by the model registry
+        return None
+
+    def actual_usage(self):
+        return self._client.actual_usage()
+
+    def total_usage(self):
+        return self._client.total_usage()
+
+    def count_tokens(self, *args, **kwargs) -> int:
+        return self._client.count_tokens(*args, **kwargs)
+
+    def remaining_tokens(self, *args, **kwargs) -> int:
+        return self._client.remaining_tokens(*args, **kwargs)
+
+    @property
+    def capabilities(self):
+        return self._client.capabilities
+
+    @property
+    def model_info(self):
+        return self._client.model_info
+
+    def __getattr__(self, name):
+        if name == "_client":
+            raise AttributeError(name)
+        return getattr(self._client, name)
+
+
+class DeferredSystemMessageClient(TaggedModelClient):
+    """Tagged client whose system message may be replaced once ``system_message`` resolves.
+
+    Lets an agent be built (and its group chat started) while part of its system message, e.g.
+    the planner's learnings, is still being retrieved: the first call waits for the awaitable and
+    every call then uses the resolved message in place of the leading ``SystemMessage``. A result
+    of None (or a failure) keeps the message the agent was built with.
+    """
+
+    def __init__(self, client: ChatCompletionClient, purpose: str, agent: Optional[str],
+                 system_message: Awaitable[Optional[str]]):
+        super().__init__(client, purpose, agent)
+        self._pending_system_message = system_message
+        self._system_message: Optional[str] = None
+
+    async def _resolve(self, messages):
+        if self._pending_system_message is not None:
+            pending, started = self._pending_system_message, time.monotonic()
+            try:
+                self._system_message = await pending
+            except Exception as e:
+                logger.warning(f"Deferred system message for {self.agent} failed: {e}")
+            self._pending_system_message = None
+            metrics.observe("llm.deferred_system_message_wait_seconds", time.monotonic() - started, agent=self.agent)
+        if self._system_message and messages and isinstance(messages[0], SystemMessage):
+            return [SystemMessage(content=self._system_message), *messages[1:]]
+        return messages
+
+    async def create(self, messages, *args, **kwargs):
+        return await super().create(await self._resolve(messages), *args, **kwargs)
+
+    async def create_stream(self, messages, *args, **kwargs):
+        async for item in super().create_stream(await self._resolve(messages), *args, **kwargs):
+            yield item
+
+
+def tag_model_client(client, purpose: str, agent: Optional[str] = None):
+    """Wrap ``client`` so its calls are recorded under ``purpose``/``agent`` (None passes through)."""
+    if client is None:
+        return None
+    return TaggedModelClient(client, purpose, agent)
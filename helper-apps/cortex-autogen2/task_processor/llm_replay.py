@@ -0,0 +1,263 @@
+"""
+Record and replay of LLM traffic for deterministic regression runs.
+
+``logs/messages.jsonl`` only holds agent messages, not what each model call was
+sent, so it cannot drive a replay. With ``LLM_RECORD=true`` every call made
+through ``PooledModelClient`` is captured as a request/response pair keyed by a
+hash of the normalized prompt (model, messages, offered tool names) and written
+to ``<work_dir>/logs/llm_recording.jsonl``: a header line with the task text,
+its duration and the time spent waiting on the model, then one line per call.
+
+With ``LLM_REPLAY_FILE=<recording>`` the model clients serve those results back
+instead of calling the API. Results for the same key are served in recorded
+order (the last one repeats). Prompts that differ from the recording (e.g. code
+output with timings in it) fall back to the next unused result recorded for the
+same model, purpose and agent; ``LLM_REPLAY_STRICT=true`` raises
+``LLMReplayMissError`` instead.
+
+Normalization removes what changes between runs of the same task: the task id,
+uuids, long hex ids, tool call ids, timestamps and per-request work dir paths.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from autogen_core.models import CreateResult
+
+from services import metrics
+from services.work_dir_manager import open_log
+
+logger = logging.getLogger(__name__)
+
+RECORDING_FILE = "llm_recording.jsonl"
+
+_VOLATILE_PATTERNS = [
+    (re.compile(r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}", re.IGNORECASE), "<uuid>"),
+    (re.compile(r"\bcall_[A-Za-z0-9_-]+"), "<call_id>"),
+    (re.compile(r"(/[\w.-]+)*/req_[\w.<>-]+"), "<work_dir>"),
+    (re.compile(r"\d{4}-\d{2}-\d{2}([T ]\d{2}:\d{2}(:\d{2}(\.\d+)?)?(Z|[+-]\d{2}:?\d{2})?)?"), "<timestamp>"),
+    (re.compile(r"\b\d{1,2}:\d{2}:\d{2}(\.\d+)?\b"), "<timestamp>"),
+    (re.compile(r"\b[0-9a-f]{16,}\b", re.IGNORECASE), "<hex>"),
+]
+
+
+class LLMReplayMissError(RuntimeError):
+    """Raised in strict replay when a prompt has no recorded response."""
+
+
+def _normalize_text(text: str, task_id: Optional[str]) -> str:
+    if task_id:
+        text = text.replace(task_id, "<task_id>")
+    for pattern, replacement in _VOLATILE_PATTERNS:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+def _normalize_value(value, task_id: Optional[str]):
+    if isinstance(value, str):
+        return _normalize_text(value, task_id)
+    if isinstance(value, dict):
+        return {key: _normalize_value(item, task_id) for key, item in value.items() if key != "id"}
+    if isinstance(value, list):
+        return [_normalize_value(item, task_id) for item in value]
+    return value
+
+
+def _dump_message(message) -> dict:
+    if hasattr(message, "model_dump"):
+        return message.model_dump(mode="json")
+    return dict(message) if isinstance(message, dict) else {"content": str(message)}
+
+
+def _tool_names(tools) -> List[str]:
+    names = []
+    for tool in tools or []:
+        name = tool.get("name") if isinstance(tool, dict) else getattr(tool, "name", None)
+        if name:
+            names.append(name)
+    return sorted(names)
+
+
+def prompt_key(model: str, messages, tools=None, task_id: Optional[str] = None) -> str:
+    """Stable hash of a model request with run-specific values normalized away."""
+    normalized = {
+        "model": model,
+        "messages": [_normalize_value(_dump_message(message), task_id) for message in messages],
+        "tools": _tool_names(tools),
+    }
+    return hashlib.sha256(json.dumps(normalized, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def llm_busy_seconds(records: List[dict]) -> float:
+    """Wall time during which at least one model call was in flight (union of call intervals)."""
+    intervals = sorted((r["started_at"], r["started_at"] + (r.get("latency_s") or 0.0)) for r in records)
+    busy, current_start, current_end = 0.0, None, None
+    for start, end in intervals:
+        if current_end is None or start > current_end:
+            if current_end is not None:
+                busy += current_end - current_start
+            current_start, current_end = start, end
+        else:
+            current_end = max(current_end, end)
+    if current_end is not None:
+        busy += current_end - current_start
+    return busy
+
+
+class LLMTrafficRecorder:
+    """Collects request/response pairs per task and writes them to ``logs/llm_recording.jsonl``."""
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self._calls: Dict[str, List[dict]] = {}
+        self._tasks: Dict[str, dict] = {}
+
+    def begin(self, task_id: str, task: str) -> None:
+        if self.enabled:
+            self._tasks[task_id] = {"task": task, "started_at": time.time()}
+            self._calls.setdefault(task_id, [])
+
+    def capture(self, record: dict, messages, tools, result) -> None:
+        """Store one successful call (``record`` is the ``LLMCall`` record)."""
+        calls = self._calls.get(record.get("task_id"))
+        if calls is None or result is None:
+            return
+        try:
+            calls.append({
+                "key": prompt_key(record["model"], messages, tools, record["task_id"]),
+                "model": record["model"],
+                "purpose": record["purpose"],
+                "agent": record["agent"],
+                "started_at": record["started_at"],
+                "latency_s": record["latency_s"],
+                "result": result.model_dump(mode="json"),
+            })
+        except Exception as e:
+            logger.debug(f"Failed to record LLM call: {e}")
+
+    def flush(self, task_id: str, work_dir: Optional[str]) -> Optional[str]:
+        """Write the task's recording and forget it; returns the file path."""
+        task = self._tasks.pop(task_id, None)
+        calls = self._calls.pop(task_id, None)
+        if task is None or calls is None or not work_dir:
+            return None
+        duration = time.time() - task["started_at"]
+        busy = llm_busy_seconds(calls)
+        header = {
+            "type": "header",
+            "task_id": task_id,
+            "task": task["task"],
+            "recorded_at": task["started_at"],
+            "duration_s": round(duration, 3),
+            "llm_calls": len(calls),
+            "llm_busy_s": round(busy, 3),
+            "non_llm_s": round(max(0.0, duration - busy), 3),
+        }
+        path = os.path.join(work_dir, "logs", RECORDING_FILE)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(json.dumps(header) + "\n")
+                f.writelines(json.dumps({"type": "call", **call}, default=str) + "\n" for call in calls)
+        except Exception as e:
+            logger.warning(f"Failed to write LLM recording for {task_id}: {e}")
+            return None
+        logger.info(f"📼 Recorded {len(calls)} LLM calls for {task_id} to {path}")
+        return path
+
+
+def load_recording(path: str) -> Tuple[dict, List[dict]]:
+    """Read a recording file (plain or compacted); returns ``(header, calls)``."""
+    header, calls = {}, []
+    with open_log(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if entry.get("type") == "header":
+                header = entry
+            else:
+                calls.append(entry)
+    return header, calls
+
+
+class LLMReplayer:
+    """Serves recorded results for model requests, in recorded order per prompt key."""
+
+    def __init__(self, path: str, strict: bool = False):
+        self.path = path
+        self.strict = strict
+        self.header, calls = load_recording(path)
+        self._by_key: Dict[str, Deque[dict]] = {}
+        self._last_by_key: Dict[str, dict] = {}
+        self._by_slot: Dict[tuple, Deque[dict]] = {}
+        for call in calls:
+            self._by_key.setdefault(call["key"], deque()).append(call)
+            self._by_slot.setdefault((call["model"], call["purpose"], call["agent"]), deque()).append(call)
+        self._used = set()
+        self.served = 0
+        self.fallbacks = 0
+        logger.info(f"📼 Replaying {len(calls)} recorded LLM calls from {path}")
+
+    def _take(self, queue: Deque[dict]) -> Optional[dict]:
+        while queue:
+            call = queue.popleft()
+            if id(call) not in self._used:
+                self._used.add(id(call))
+                return call
+        return None
+
+    def lookup(self, model: str, messages, tools, tags: dict) -> CreateResult:
+        key = prompt_key(model, messages, tools, tags.get("task_id"))
+        call = self._take(self._by_key.get(key, deque()))
+        if call is not None:
+            self._last_by_key[key] = call
+        elif key in self._last_by_key:
+            call = self._last_by_key[key]
+        else:
+            slot = (model, tags.get("purpose") or "untagged", tags.get("agent"))
+            if self.strict:
+                raise LLMReplayMissError(f"No recorded response for {slot} (key {key[:12]})")
+            call = self._take(self._by_slot.get(slot, deque()))
+            if call is None:
+                raise LLMReplayMissError(f"No recorded response left for {slot} (key {key[:12]})")
+            self.fallbacks += 1
+            metrics.increment("llm.replay_fallbacks", purpose=slot[1])
+            logger.debug(f"📼 Replay fallback for {slot}: prompt differs from the recording")
+        self.served += 1
+        return CreateResult.model_validate(call["result"])
+
+
+# Global instances
+_traffic_recorder: Optional[LLMTrafficRecorder] = None
+_replayer: Optional[LLMReplayer] = None
+_replay_path: Optional[str] = None
+
+
+def get_llm_traffic_recorder() -> LLMTrafficRecorder:
+    """Get or create the global traffic recorder (enabled with ``LLM_RECORD``)."""
+    global _traffic_recorder
+    if _traffic_recorder is None:
+        _traffic_recorder = LLMTrafficRecorder(enabled=os.getenv("LLM_RECORD", "false").lower() == "true")
+    return _traffic_recorder
+
+
+def get_llm_replayer() -> Optional[LLMReplayer]:
+    """The replayer for ``LLM_REPLAY_FILE``, or None when replay is off."""
+    global _replayer, _replay_path
+    path = os.getenv("LLM_REPLAY_FILE") or None
+    if path != _replay_path:
+        _replay_path = path
+        _replayer = LLMReplayer(path, strict=os.getenv("LLM_REPLAY_STRICT", "false").lower() == "true") if path else None
+    return _replayer
+
+
+def reset_llm_replayer() -> None:
+    """Forget the loaded recording so the next replay starts from its first call again."""
+    global _replayer, _replay_path
+    _replayer, _replay_path = None, None
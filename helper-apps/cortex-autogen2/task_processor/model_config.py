@@ -105,6 +105,55 @@ class ModelConfig:
         )
     }
 
+    # Max in-flight calls per model (shared by all tasks in the worker process).
+    # Override per model with LLM_MAX_CONCURRENCY_<MODEL>, e.g. LLM_MAX_CONCURRENCY_GPT_5_1=4
+    MODEL_CONCURRENCY = {
+        "o3": 4,
+        "o4-mini": 8,
+        "gpt-4.1": 16,
+        "gpt-5": 4,
+        "gpt-5-mini": 8,
+        "gpt-5.1": 8,
+        "gpt-5.1-chat": 8,
+        "claude-4-sonnet": 4,
+    }
+    DEFAULT_CONCURRENCY = 8
+
+    @staticmethod
+    def _model_env_name(prefix: str, model_name: str) -> str:
+        """Per-model env var name, e.g. ("LLM_RPS", "gpt-5.1") -> LLM_RPS_GPT_5_1."""
+        return f"{prefix}_" + model_name.upper().replace("-", "_").replace(".", "_")
+
+    @classmethod
+    def get_max_concurrency(cls, model_name: str) -> int:
+        """Get the per-model concurrency limit (env override first)."""
+        env_name = cls._model_env_name("LLM_MAX_CONCURRENCY", model_name)
+        try:
+            return max(1, int(os.getenv(env_name, cls.MODEL_CONCURRENCY.get(model_name, cls.DEFAULT_CONCURRENCY))))
+        except ValueError:
+            return cls.MODEL_CONCURRENCY.get(model_name, cls.DEFAULT_CONCURRENCY)
+
+    @classmethod
+    def get_rate_limits(cls, model_name: str):
+        """Get (requests/second, tokens/minute) for a model; 0 means unlimited.
+
+        LLM_RPS_<MODEL> / LLM_TPM_<MODEL> override LLM_DEFAULT_RPS / LLM_DEFAULT_TPM.
+        """
+        limits = []
+        for prefix in ("LLM_RPS", "LLM_TPM"):
+            value = os.getenv(cls._model_env_name(prefix, model_name)) or os.getenv(prefix.replace("LLM_", "LLM_DEFAULT_"), "0")
+            try:
+                limits.append(max(0.0, float(value)))
+            except ValueError:
+                limits.append(0.0)
+        return tuple(limits)
+
+    @classmethod
+    def get_model_client(cls, model_name: str):
+        """Get the shared, lazily created client for a model (preferred over create_model_client)."""
+        from .model_registry import get_model_registry
+        return get_model_registry().get(model_name)
+
     @classmethod
     def get_api_config(cls):
         """Get API configuration from environment."""
@@ -114,8 +163,14 @@ class ModelConfig:
         }
 
     @classmethod
-    def create_model_client(cls, model_name: str, timeout: int = 900):
-        """Create a wrapped model client for the specified model."""
+    def create_model_client(cls, model_name: str, timeout: int = 900, http_client=None,
+                            client_class=OpenAIChatCompletionClient, **client_kwargs):
+        """Create a wrapped model client for the specified model.
+
+        Args:
+            http_client: Optional shared ``httpx.AsyncClient`` (connection pool reuse).
+            client_class: Client class to instantiate (e.g. a concurrency-limited subclass).
+        """
         config = cls.get_api_config()
 
         if not config["api_key"]:
@@ -126,13 +181,17 @@ class ModelConfig:
 
         model_info = cls.MODEL_INFOS[model_name]
 
+        if http_client is not None:
+            client_kwargs["http_client"] = http_client
+
         # Create base client
-        base_client = OpenAIChatCompletionClient(
+        base_client = client_class(
             model=model_name,
             api_key=config["api_key"],
             base_url=config["api_base_url"],
             model_info=model_info,
-            timeout=timeout
+            timeout=timeout,
+            **client_kwargs
         )
 
         return base_client
@@ -0,0 +1,285 @@
+"""
+Shared model client registry.
+
+All models are served from the same ``CORTEX_API_BASE_URL``, so one keep-alive
+HTTP connection pool (HTTP/2 when ``h2`` is installed) is shared by every model
+client instead of each client opening its own. Clients are built lazily on
+first use and cached per model, and each model gets a concurrency limit from
+``ModelConfig.MODEL_CONCURRENCY`` (overridable with
+``LLM_MAX_CONCURRENCY_<MODEL>``, e.g. ``LLM_MAX_CONCURRENCY_GPT_5_1=4``).
+Slots are handed out by priority (agent turns before background and
+bookkeeping calls). Calls are also paced by the process-wide governor in
+``llm_governor`` (rate limits, priorities, 429 backoff), which replaces the
+OpenAI SDK's own retries (for streams, until the first token arrives),
+and recorded by ``llm_instrumentation`` (latency, tokens, purpose). ``llm_replay``
+can capture request/response pairs or serve them back instead of the API.
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, Optional
+
+import httpx
+from autogen_ext.models.openai import OpenAIChatCompletionClient
+
+from services import metrics
+from .llm_governor import (
+    PRIORITY_BOOKKEEPING,
+    LLMLoadShedError,
+    PrioritySlots,
+    backoff_delay,
+    classify_error,
+    current_priority,
+    estimate_request_tokens,
+    get_llm_governor,
+)
+from .llm_instrumentation import LLMCall
+from .llm_replay import get_llm_replayer, get_llm_traffic_recorder
+from .model_config import ModelConfig
+
+logger = logging.getLogger(__name__)
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class PooledModelClient(OpenAIChatCompletionClient):
+    """OpenAI chat client that bounds in-flight calls per model and goes through the LLM governor."""
+
+    def __init__(self, *, max_concurrency: int, **kwargs):
+        super().__init__(**kwargs)
+        self.model_name = kwargs.get("model")
+        self.max_concurrency = max(1, int(max_concurrency))
+        self._limiter: Optional[PrioritySlots] = None
+
+    def _slots(self) -> PrioritySlots:
+        if self._limiter is None:
+            self._limiter = PrioritySlots(self.max_concurrency)
+        return self._limiter
+
+    async def _acquire_slot(self, priority: str) -> float:
+        started = time.monotonic()
+        await self._slots().acquire(priority)
+        waited = time.monotonic() - started
+        metrics.observe("llm.slot_wait_seconds", waited, model=self.model_name, priority=priority)
+        return waited
+
+    def _release_slot(self) -> None:
+        self._slots().release()
+
+    def has_spare_capacity(self, messages=None) -> bool:
+        """True when an optional call would neither wait for a slot nor for the governor."""
+        if self._slots().locked():
+            return False
+        governor = get_llm_governor()
+        if not governor.enabled:
+            return True
+        return governor.for_model(self.model_name).has_spare_capacity(estimate_request_tokens(messages or []))
+
+    async def create(self, messages, *args, **kwargs):
+        governor = get_llm_governor()
+        priority = current_priority()
+        call = LLMCall(self.model_name, priority)
+        replayer = get_llm_replayer()
+        try:
+            if replayer is not None:
+                call.attempt()
+                result = replayer.lookup(self.model_name, messages, kwargs.get("tools"), call.record)
+            else:
+                result = await self._governed_create(governor, call, priority, messages, *args, **kwargs)
+        except BaseException as e:
+            call.finish(error=e)
+            raise
+        call.finish(result=result)
+        get_llm_traffic_recorder().capture(call.record, messages, kwargs.get("tools"), result)
+        return result
+
+    async def _governed_create(self, governor, call: LLMCall, priority: str, messages, *args, **kwargs):
+        if not governor.enabled:
+            call.attempt()
+            call.add_queue_wait(await self._acquire_slot(priority))
+            try:
+                return await super().create(messages, *args, **kwargs)
+            finally:
+                self._release_slot()
+
+        model_governor = governor.for_model(self.model_name)
+        estimate = estimate_request_tokens(messages)
+        attempt = 0
+        while True:
+            call.attempt()
+            call.add_queue_wait(await model_governor.acquire(estimate, priority))
+            call.add_queue_wait(await self._acquire_slot(priority))
+            try:
+                result = await super().create(messages, *args, **kwargs)
+            except Exception as e:
+                delay = self._retry_delay(model_governor, e, attempt, governor.max_retries, priority)
+                if delay is None:
+                    raise
+            else:
+                usage = getattr(result, "usage", None)
+                model_governor.settle(estimate, (usage.prompt_tokens + usage.completion_tokens) if usage else None)
+                return result
+            finally:
+                self._release_slot()
+            attempt += 1
+            metrics.increment("llm.retries", model=self.model_name)
+            await asyncio.sleep(delay)
+
+    def _retry_delay(self, model_governor, error: Exception, attempt: int, max_retries: int, priority: str) -> Optional[float]:
+        """Delay before retrying ``error``, or None if it should propagate."""
+        kind, retry_after = classify_error(error)
+        if kind is None or attempt >= max_retries:
+            return None
+        if kind == "rate_limited":
+            delay = model_governor.on_rate_limited(retry_after)
+            if priority == PRIORITY_BOOKKEEPING and delay > model_governor.shed_max_wait:
+                metrics.increment("llm.shed", model=self.model_name)
+                raise LLMLoadShedError(f"{self.model_name} rate limited; {priority} call shed") from error
+            return delay
+        logger.warning(f"⚠️ {self.model_name} call failed ({type(error).__name__}), retrying")
+        return backoff_delay(attempt)
+
+    async def create_stream(self, messages, *args, **kwargs):
+        if get_llm_replayer() is not None:
+            async for item in self._replay_stream(messages, kwargs.get("tools")):
+                yield item
+            return
+        governor = get_llm_governor()
+        model_governor = governor.for_model(self.model_name) if governor.enabled else None
+        priority = current_priority()
+        call = LLMCall(self.model_name, priority, streaming=True)
+        estimate = estimate_request_tokens(messages)
+        result = None
+        attempt = 0
+        try:
+            while True:
+                call.attempt()
+                if model_governor:
+                    call.add_queue_wait(await model_governor.acquire(estimate, priority))
+                call.add_queue_wait(await self._acquire_slot(priority))
+                streamed = False
+                delay = None
+                try:
+                    async for item in super().create_stream(messages, *args, **kwargs):
+                        streamed = True
+                        call.first_token()
+                        # The final item is the CreateResult
+                        result = item
+                        yield item
+                except Exception as e:
+                    # Once tokens went out the caller has partial output, so only retry before that
+                    if streamed or model_governor is None:
+                        raise
+                    delay = self._retry_delay(model_governor, e, attempt, governor.max_retries, priority)
+                    if delay is None:
+                        raise
+                finally:
+                    self._release_slot()
+                if delay is None:
+                    break
+                attempt += 1
+                metrics.increment("llm.retries", model=self.model_name)
+                await asyncio.sleep(delay)
+        except BaseException as e:
+            kind, retry_after = classify_error(e) if isinstance(e, Exception) else (None, None)
+            if model_governor and kind == "rate_limited":
+                model_governor.on_rate_limited(retry_after)
+            call.finish(error=e)
+            raise
+        if model_governor:
+            usage = getattr(result, "usage", None)
+            model_governor.settle(estimate, (usage.prompt_tokens + usage.completion_tokens) if usage else None)
+        call.finish(result=result)
+        get_llm_traffic_recorder().capture(call.record, messages, kwargs.get("tools"), result)
+
+    async def _replay_stream(self, messages, tools):
+        call = LLMCall(self.model_name, current_priority(), streaming=True)
+        call.attempt()
+        try:
+            result = get_llm_replayer().lookup(self.model_name, messages, tools, call.record)
+        except BaseException as e:
+            call.finish(error=e)
+            raise
+        call.first_token()
+        call.finish(result=result)
+        if isinstance(result.content, str) and result.content:
+            yield result.content
+        yield result
+
+
+class ModelClientRegistry:
+    """Lazily builds and caches one model client per model on a shared HTTP transport."""
+
+    def __init__(self):
+        self._clients: Dict[tuple, PooledModelClient] = {}
+        self._http_client: Optional[httpx.AsyncClient] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _build_http_client(self) -> httpx.AsyncClient:
+        http2 = os.getenv("LLM_HTTP2", "true").lower() == "true" and _http2_available()
+        limits = httpx.Limits(
+            max_connections=int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "100")),
+            max_keepalive_connections=int(os.getenv("LLM_HTTP_MAX_KEEPALIVE", "20")),
+            keepalive_expiry=float(os.getenv("LLM_HTTP_KEEPALIVE_SECONDS", "120")),
+        )
+        logger.info(f"🔌 Shared LLM HTTP transport created (http2={http2})")
+        return httpx.AsyncClient(http2=http2, limits=limits, timeout=httpx.Timeout(900.0, connect=10.0))
+
+    def _check_loop(self) -> None:
+        """Drop clients bound to a previous event loop (e.g. successive asyncio.run calls)."""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        if self._loop is not None and self._loop is not loop:
+            self._clients.clear()
+            self._http_client = None
+        self._loop = loop
+
+    def get(self, model_name: str, timeout: int = 900) -> PooledModelClient:
+        """Return the shared client for ``model_name``, creating it on first use."""
+        self._check_loop()
+        key = (model_name, timeout)
+        client = self._clients.get(key)
+        if client is None:
+            if self._http_client is None or self._http_client.is_closed:
+                self._http_client = self._build_http_client()
+            client = ModelConfig.create_model_client(
+                model_name,
+                timeout=timeout,
+                http_client=self._http_client,
+                client_class=PooledModelClient,
+                max_concurrency=ModelConfig.get_max_concurrency(model_name),
+                # The governor retries with backoff and keeps the model's 429 state
+                **({"max_retries": 0} if get_llm_governor().enabled else {}),
+            )
+            self._clients[key] = client
+            metrics.set_gauge("llm.clients", len(self._clients))
+            logger.debug(f"🤖 Created model client for {model_name} (max_concurrency={client.max_concurrency})")
+        return client
+
+    async def close(self) -> None:
+        """Close the shared transport; clients are rebuilt on next use."""
+        self._clients.clear()
+        http_client, self._http_client = self._http_client, None
+        if http_client is not None and not http_client.is_closed:
+            await http_client.aclose()
+
+
+# Global registry instance
+_registry: Optional[ModelClientRegistry] = None
+
+
+def get_model_registry() -> ModelClientRegistry:
+    """Get or create the global model client registry."""
+    global _registry
+    if _registry is None:
+        _registry = ModelClientRegistry()
+    return _registry
@@ -73,6 +73,11 @@ class PresenterPhase:
             return presentation_result
         except Exception as e:
             self.logger.error(f"❌ Presenter processing failed: {e}")
+            if self.context_memory:
+                await log_phase_complete(
+                    self.context_memory, "presenter_failed", "presenter_agent",
+                    {"error": str(e)[:500]}, task_id, "presentation"
+                )
             raise
 
 
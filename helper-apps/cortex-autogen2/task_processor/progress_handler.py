@@ -1,10 +1,17 @@
 """
 Progress handling and summarization for task processing.
+
+User-facing progress lines are rendered instantly from templates
+(``progress_messages``); the LLM only rewords them in the background when the
+model has spare capacity, and rewordings are cached by normalized content.
 """
 import asyncio
+import os
 import time
 import logging
+from collections import OrderedDict
 from typing import Dict, List, Optional, Any
+from services import metrics
 from services.azure_ai_search import search_similar_rest, upsert_run_rest
 from services.run_analyzer import (
     collect_run_metrics,
@@ -13,6 +20,9 @@ from services.run_analyzer import (
     summarize_learnings,
     build_run_document,
 )
+from services.request_state import get_request_state_registry
+from services.heartbeat_scheduler import get_heartbeat_scheduler
+from .progress_messages import progress_cache_key, render_progress_message
 
 logger = logging.getLogger(__name__)
 
@@ -29,7 +39,6 @@ class ProgressHandler:
         self._max_progress_by_request: Dict[str, float] = {}
         self._last_summary_by_request: Dict[str, str] = {}
         self._last_progress_time_by_request: Dict[str, float] = {}
-        self._heartbeat_tasks: Dict[str, asyncio.Task] = {}
         self._heartbeat_lock = asyncio.Lock()
         self._message_count_by_request: Dict[str, int] = {}  # Track message count for auto-increment
         self._last_sent_by_request: Dict[str, str] = {}  # Track last sent content per request
@@ -43,14 +52,18 @@ class ProgressHandler:
         #    'last_message': str,
         #    'last_percentage': float,
         #    'last_update_time': float,
-        #    'heartbeat_task': asyncio.Task,
-        #    'llm_counter': int  # Counts up to for LLM updates
         # }}
+        # The repeats themselves are sent by the shared heartbeat scheduler
 
-        # LLM call throttling (5+ second intervals to reduce costs)
+        # Background LLM enrichment of template messages (only when the model has spare capacity)
+        self._enrichment_enabled = os.getenv("PROGRESS_LLM_ENRICHMENT", "true").lower() == "true"
+        self._enrichment_interval = float(os.getenv("PROGRESS_LLM_MIN_INTERVAL", "10"))
         self._last_llm_call_time_by_request: Dict[str, float] = {}
-        self._cached_llm_message_by_request: Dict[str, str] = {}
-        self._has_cached_message_by_request: Dict[str, bool] = {}  # Track if we've cached a message for this request
+        self._enrichment_tasks: Dict[str, asyncio.Task] = {}
+        # Normalized content -> enriched message ("" when the LLM said SKIP)
+        self._enriched_messages: "OrderedDict[str, str]" = OrderedDict()
+        self._max_enriched_messages = 512
+        self._context_memory_by_request: Dict[str, Any] = {}
 
         # Emoji tracking
         self.used_emojis = set()
@@ -59,12 +72,45 @@ class ProgressHandler:
         # Track published messages to prevent published duplicates
         self._last_published_messages = set()
 
+        # Register per-request dicts so they are released when the task completes
+        registry = get_request_state_registry()
+        registry.track(
+            self,
+            "_max_progress_by_request",
+            "_last_summary_by_request",
+            "_last_progress_time_by_request",
+            "_message_count_by_request",
+            "_last_sent_by_request",
+            "_last_sent_time_by_request",
+            "_last_message_content",
+            "_last_message_percentage",
+            "_last_llm_call_time_by_request",
+            "_context_memory_by_request",
+            "used_emojis_by_request",
+        )
+        registry.track(self, "_enrichment_tasks", on_evict=lambda task_id, task: task.cancel())
+        registry.track(self, "_heartbeat_state", on_evict=self._cancel_evicted_heartbeat)
+
+    @staticmethod
+    def _cancel_evicted_heartbeat(task_id: str, state: Any) -> None:
+        """Cancel the scheduled heartbeat of a task whose state was evicted from the registry."""
+        get_heartbeat_scheduler().cancel(task_id)
+        logger.info(f"💓 Cancelled heartbeat for released task {task_id}")
+
+    def bind_context_memory(self, task_id: str, context_memory) -> None:
+        """Use the task's ContextMemory (recorded files) when rendering its progress messages."""
+        self._context_memory_by_request[task_id] = context_memory
+
     def log_internal_progress(self, task_id: str, message: str, source: str = None):
         """Log detailed internal progress for debugging/audit."""
         logger.info(f"🔍 INTERNAL PROGRESS [{task_id}] ({source}): {message}")
 
     async def report_user_progress(self, task_id: str, message: str, percentage: float = None, source: str = None):
         """Report clean, user-facing progress update."""
+        # Late fire-and-forget updates for finished tasks must not restart the heartbeat
+        if get_request_state_registry().is_released(task_id):
+            return 0.0
+
         # Auto-start heartbeat for new tasks
         if task_id not in self._heartbeat_state:
             await self.start_heartbeat(task_id, "🚀 Starting your task...")
@@ -143,8 +189,8 @@ class ProgressHandler:
         # Clean content for summarization
         cleaned = self._clean_content_for_progress(content, message_type, source)
 
-        # Use LLM to generate dynamic progress message
-        return await self._get_dynamic_progress_message(source or "", cleaned, request_id=task_id)
+        # Instant template message (or a cached LLM rewording of similar content)
+        return await self._get_dynamic_progress_message(source or "", cleaned, request_id=task_id, raw_content=content)
 
     def _should_skip_progress_update(self, content: str, message_type: str = None, source: str = None) -> bool:
         """Determine if a progress update should be skipped (minimal filtering)."""
@@ -202,23 +248,65 @@ class ProgressHandler:
 
         return content
 
-    async def _get_dynamic_progress_message(self, source: str, content: str, task_context: str = "", request_id: str = None) -> str:
-        """Use LLM to generate dynamic, contextual progress messages."""
+    async def _get_dynamic_progress_message(self, source: str, content: str, task_context: str = "", request_id: str = None, raw_content: str = None) -> str:
+        """Return an instant progress message; the LLM only rewords it in the background when idle."""
         if not content or not content.strip():
             return content
 
-        # LLM call throttling: reuse cached message if called recently (< X seconds ago)
-        import time
-        current_time = time.time()
-        last_llm_time = self._last_llm_call_time_by_request.get(request_id, 0)
-
-        if current_time - last_llm_time < 10.0:
-            # Return cached message if available and recent
-            cached_msg = self._cached_llm_message_by_request.get(request_id)
-            if cached_msg:
-                logger.debug(f"🤖 Using cached LLM message (throttled): '{cached_msg[:50]}...'")
-                return cached_msg
+        key = progress_cache_key(source, content)
+        enriched = self._enriched_messages.get(key)
+        if enriched is not None:
+            self._enriched_messages.move_to_end(key)
+            metrics.increment("progress.messages", kind="cached")
+            return enriched
+
+        message = render_progress_message(source, raw_content or content, self._recent_files(request_id))
+        metrics.increment("progress.messages", kind="template")
+        if self._should_enrich(request_id):
+            self._last_llm_call_time_by_request[request_id] = time.time()
+            task = asyncio.create_task(self._enrich_progress_message(request_id, key, source, content, task_context, message))
+            self._enrichment_tasks[request_id] = task
+            task.add_done_callback(lambda _: self._enrichment_tasks.pop(request_id, None))
+        return message
+
+    def _recent_files(self, request_id: Optional[str]) -> List[str]:
+        context_memory = self._context_memory_by_request.get(request_id)
+        if context_memory is None:
+            return []
+        try:
+            return context_memory.recent_file_names()
+        except Exception:
+            return []
 
+    def _should_enrich(self, request_id: Optional[str]) -> bool:
+        """Enrich at most one message at a time per request, and only when the model is idle."""
+        if not self._enrichment_enabled or not request_id or self.model_client is None:
+            return False
+        if request_id in self._enrichment_tasks:
+            return False
+        if time.time() - self._last_llm_call_time_by_request.get(request_id, 0) < self._enrichment_interval:
+            return False
+        has_spare_capacity = getattr(self.model_client, "has_spare_capacity", None)
+        if callable(has_spare_capacity) and not has_spare_capacity():
+            metrics.increment("progress.enrichments", status="busy")
+            return False
+        return True
+
+    async def _enrich_progress_message(self, request_id: str, key: str, source: str, content: str, task_context: str, template: str) -> None:
+        """Reword a template message with the LLM, cache it and let the heartbeat repeat it."""
+        enriched = await self._generate_llm_progress_message(source, content, task_context, request_id)
+        metrics.increment("progress.enrichments", status="ok" if enriched is not None else "failed")
+        if enriched is None:
+            return
+        self._enriched_messages[key] = enriched
+        while len(self._enriched_messages) > self._max_enriched_messages:
+            self._enriched_messages.popitem(last=False)
+        state = self._heartbeat_state.get(request_id)
+        if enriched and state and state['last_message'] == template:
+            state['last_message'] = enriched
+
+    async def _generate_llm_progress_message(self, source: str, content: str, task_context: str = "", request_id: str = None) -> Optional[str]:
+        """Use LLM to generate a dynamic, contextual progress message ("" for SKIP, None on failure)."""
         # Build list of recently used emojis to avoid - last 3 emojis per request
         avoid_emojis = ""
         if request_id:
@@ -295,25 +383,15 @@ Return ONLY the progress message (5-7 words) OR the word SKIP:"""
                     if len(self.used_emojis_by_request[request_id]) > 3:
                         self.used_emojis_by_request[request_id] = self.used_emojis_by_request[request_id][-3:]
 
-                # Cache the successful LLM response for throttling
-                if request_id:
-                    # Don't cache the first message for each request (static starting message)
-                    if not self._has_cached_message_by_request.get(request_id, False):
-                        self._has_cached_message_by_request[request_id] = True
-                        logger.debug(f"🤖 Skipped caching first message for request {request_id}")
-                    else:
-                        self._last_llm_call_time_by_request[request_id] = current_time
-                        self._cached_llm_message_by_request[request_id] = dynamic_message
-
                 logger.info(f"🤖 Dynamic progress SUCCESS: '{content[:50]}...' -> '{dynamic_message}'")
                 return dynamic_message
             else:
-                # Fallback
+                # The template message stays in place
                 logger.warning(f"🤖 Dynamic progress FAILED validation: '{dynamic_message}'")
-                return "⚡ Processing your request..."
+                return None
         except Exception as e:
             logger.error(f"🤖 Failed to generate dynamic progress message: {e}")
-            return "⚡ Processing your request..."
+            return None
 
     def _is_valid_progress_message(self, message: str, word_count: int) -> bool:
         """Validate that the progress message meets requirements."""
@@ -338,7 +416,9 @@ Return ONLY the progress message (5-7 words) OR the word SKIP:"""
             from autogen_core.models import UserMessage
 
             messages = [UserMessage(content=prompt, source="progress_handler")]
-            response = await self.model_client.create(messages=messages)
+            from .llm_instrumentation import llm_call_tags, PRIORITY_BOOKKEEPING
+            with llm_call_tags("progress_message", priority=PRIORITY_BOOKKEEPING):
+                response = await self.model_client.create(messages=messages)
 
             if response and hasattr(response, 'content'):
                 return response.content
@@ -372,12 +452,14 @@ Return ONLY the progress message (5-7 words) OR the word SKIP:"""
     
     async def start_heartbeat(self, task_id: str, initial_message: str = "🚀 Starting your task..."):
         """
-        Start heartbeat for a task - sends instant 5% message and begins background loop.
+        Start heartbeat for a task - sends instant 5% message and schedules the repeats.
         
         This is the main entry point for starting progress updates:
         - Sends immediate 5% progress message 
-        - Starts background heartbeat loop (1s repeats)
+        - Registers the task with the shared heartbeat scheduler (repeats every ~5s)
         """
+        get_request_state_registry().touch(task_id)
+
         # Send instant 5% message
         await self.redis_publisher.set_transient_update(task_id, 0.05, initial_message)
         self._max_progress_by_request[task_id] = 0.05
@@ -389,20 +471,17 @@ Return ONLY the progress message (5-7 words) OR the word SKIP:"""
             'last_message': initial_message,
             'last_percentage': 0.05,
             'last_update_time': time.time(),
-            'heartbeat_task': None
         }
         
-        # Start heartbeat loop
-        task = asyncio.create_task(self._heartbeat_loop(task_id))
-        self._heartbeat_state[task_id]['heartbeat_task'] = task
-        logger.info(f"💓 Started heartbeat loop for task {task_id}")
+        get_heartbeat_scheduler().schedule(task_id, lambda: self._heartbeat_payload(task_id), self.redis_publisher)
+        logger.info(f"💓 Started heartbeat for task {task_id}")
     
     async def update_heartbeat_message(self, task_id: str, percentage: float, message: str):
         """
         Update the message that the heartbeat will repeat.
         
         Called by agents when they send progress updates. This becomes the new
-        message that gets repeated every second.
+        message that the heartbeat repeats.
         """
         if task_id in self._heartbeat_state:
             self._heartbeat_state[task_id]['last_message'] = message
@@ -412,51 +491,30 @@ Return ONLY the progress message (5-7 words) OR the word SKIP:"""
     
     async def stop_heartbeat(self, task_id: str):
         """Stop the heartbeat for a task (called when task reaches 100%)."""
+        get_heartbeat_scheduler().cancel(task_id)
         if task_id in self._heartbeat_state:
-            task = self._heartbeat_state[task_id].get('heartbeat_task')
-            if task and not task.done():
-                task.cancel()
-                try:
-                    await task
-                except asyncio.CancelledError:
-                    pass
             del self._heartbeat_state[task_id]
             logger.info(f"💓 Stopped heartbeat for task {task_id}")
     
-    async def _heartbeat_loop(self, task_id: str):
+    def _heartbeat_payload(self, task_id: str) -> Optional[Dict[str, Any]]:
         """
-        Main heartbeat loop - runs in background for each task.
+        Message the scheduler repeats for a task, or None to end its heartbeat.
         
-        Mechanism:
-        - Every 1 second: Repeat last message (simple repeat, no LLM)
-        - Stops when task reaches 100%
+        Called by the shared heartbeat scheduler when the task's heartbeat is due:
+        - Repeats the last message (simple repeat, no LLM)
+        - Stops when the task reaches 100%
         """
-        try:
-            while True:
-                await asyncio.sleep(5)  # X-second heartbeat
-                
-                if task_id not in self._heartbeat_state:
-                    break
-                
-                state = self._heartbeat_state[task_id]
-                
-                # Check if task is complete
-                if state['last_percentage'] >= 1.0:
-                    await self.stop_heartbeat(task_id)
-                    break
-                
-                # Every 1 second: Simple repeat of last message
-                await self.redis_publisher.set_transient_update(
-                    task_id,
-                    state['last_percentage'],
-                    state['last_message']
-                )
-                logger.debug(f"💓 Heartbeat repeat: {state['last_percentage']:.0%} - {state['last_message'][:30]}...")
-        
-        except asyncio.CancelledError:
-            logger.debug(f"Heartbeat loop cancelled for task {task_id}")
-        except Exception as e:
-            logger.error(f"Heartbeat loop failed for task {task_id}: {e}")
+        state = self._heartbeat_state.get(task_id)
+        if state is None:
+            return None
+        if state['last_percentage'] >= 1.0:
+            del self._heartbeat_state[task_id]
+            logger.info(f"💓 Stopped heartbeat for task {task_id}")
+            return None
+        # The task is still running: keep its per-request state from ageing out
+        get_request_state_registry().touch(task_id)
+        logger.debug(f"💓 Heartbeat repeat: {state['last_percentage']:.0%} - {state['last_message'][:30]}...")
+        return {"progress": state['last_percentage'], "info": state['last_message']}
 
     async def handle_progress_update(self, task_id: str, percentage: float, content: str, message_type: str = None, source: str = None, data: str = None, is_heartbeat: bool = False) -> float:
         """Handle progress updates - auto-increment progress for dynamic messages.
@@ -465,6 +523,11 @@ Return ONLY the progress message (5-7 words) OR the word SKIP:"""
             The actual percentage sent to Redis after clamping and auto-increment.
         """
         try:
+            registry = get_request_state_registry()
+            if registry.is_released(task_id):
+                return self._max_progress_by_request.get(task_id, 0.0)
+            registry.touch(task_id)
+
             # Check for duplicates (same content as last time)
             last_content = self._last_message_content.get(task_id)
             if content == last_content and not is_heartbeat and not data:
@@ -544,6 +607,6 @@ Return ONLY the progress message (5-7 words) OR the word SKIP:"""
         await self.stop_heartbeat(task_id)
 
     async def _run_continuous_heartbeat(self, task_id: str, percentage: float, content: str):
-        """DEPRECATED: Use _heartbeat_loop() instead."""
+        """DEPRECATED: Heartbeats are sent by the shared heartbeat scheduler."""
         # No-op - should not be called in new architecture
         pass
@@ -0,0 +1,116 @@
+"""
+Deterministic progress messages.
+
+Renders the user-facing status line (one emoji + a few words) for an agent
+message without calling a model: the event type is read from the message
+(tool call, tool result, files ready, plain message), the activity from the
+agent and tool names, and file names from the message or from the files the
+task's ``ContextMemory`` has recorded. ``ProgressHandler`` publishes these
+instantly and only asks the LLM for a livelier wording in the background when
+the model has spare capacity.
+
+Messages follow the same rules as the LLM prompt: no agent names, no paths, no
+error wording.
+"""
+import re
+from typing import Iterable, List, Optional
+
+# Agent -> message for a plain agent turn
+AGENT_MESSAGES = {
+    "planner_agent": "🧭 Mapping out the game plan",
+    "coder_agent": "💻 Crafting the analysis code",
+    "presenter_agent": "🎨 Polishing your final presentation",
+    "execution_completion_verifier_agent": "🔍 Double-checking every deliverable",
+    "web_search_agent": "🔎 Researching trusted sources",
+    "aj_sql_agent": "🗄️ Mining the data archives",
+    "cognitive_search_agent": "📚 Searching the knowledge base",
+    "file_cloud_uploader_agent": "📤 Uploading your files securely",
+}
+DEFAULT_AGENT_MESSAGE = "⚙️ Making steady progress on your task"
+
+# (tool name fragment, message for the call, message for its result); first match wins
+TOOL_MESSAGES = [
+    ("execute_code", "💻 Running the analysis code", "📊 Reviewing the code results"),
+    ("validate_url", "🔗 Checking your result links", "🔗 Result links verified"),
+    ("upload", "📤 Uploading your files securely", "☁️ Files safely in the cloud"),
+    ("sql", "🗄️ Querying the data sources", "📊 Sifting through query results"),
+    ("search", "🔎 Searching for the best sources", "📰 Reading through the findings"),
+    ("download", "🌐 Gathering content from the web", "📥 Collected the source material"),
+    ("fetch", "🌐 Gathering content from the web", "📥 Collected the source material"),
+    ("browser", "🌐 Browsing for the details", "📥 Collected the source material"),
+    ("read_", "📂 Reviewing the working files", "📂 Reviewed the working files"),
+    ("list_files", "📂 Reviewing the working files", "📂 Reviewed the working files"),
+]
+DEFAULT_TOOL_MESSAGES = ("🛠️ Putting the right tools to work", "📊 Reviewing the latest results")
+
+FILE_NAME_PATTERN = re.compile(
+    r"\b[\w][\w\-.]{0,60}?\.(?:csv|json|xlsx|xls|pptx|docx|pdf|png|jpg|jpeg|gif|svg|html|md|txt|zip|mp4|wav|mp3)\b",
+    re.IGNORECASE,
+)
+_TOOL_NAME_PATTERN = re.compile(r"name='([\w.-]+)'")
+
+
+def _tool_names(content: str) -> List[str]:
+    return _TOOL_NAME_PATTERN.findall(content)
+
+
+def _tool_message(names: Iterable[str], is_result: bool) -> str:
+    for name in names:
+        lowered = name.lower()
+        for fragment, call_message, result_message in TOOL_MESSAGES:
+            if fragment in lowered:
+                return result_message if is_result else call_message
+    return DEFAULT_TOOL_MESSAGES[1 if is_result else 0]
+
+
+def file_names(content: str, limit: int = 3) -> List[str]:
+    """Distinct file base names mentioned in ``content`` (paths stripped)."""
+    names: List[str] = []
+    for match in FILE_NAME_PATTERN.finditer(content or ""):
+        name = match.group(0).strip().rsplit("/", 1)[-1]
+        if name not in names:
+            names.append(name)
+        if len(names) >= limit:
+            break
+    return names
+
+
+def _files_message(names: List[str]) -> str:
+    if len(names) == 1:
+        return f"📁 Prepared {names[0]} for you"
+    return f"📁 Prepared {names[0]} and {len(names) - 1} more"
+
+
+def classify_progress_event(content: str) -> str:
+    """``tool_call``, ``tool_result``, ``files_ready`` or ``message``."""
+    if "FunctionCall(" in content:
+        return "tool_call"
+    if "FunctionExecutionResult(" in content:
+        return "tool_result"
+    if "ready for upload" in content.lower() or "📁" in content:
+        return "files_ready"
+    return "message"
+
+
+def render_progress_message(source: str, content: str, recent_files: Optional[List[str]] = None) -> str:
+    """Instant status line for an agent message; ``recent_files`` come from the task's ContextMemory."""
+    content = content or ""
+    event = classify_progress_event(content)
+    if event in ("tool_call", "tool_result"):
+        return _tool_message(_tool_names(content), is_result=event == "tool_result")
+    if event == "files_ready":
+        names = file_names(content) or list(recent_files or [])[-3:]
+        if names:
+            return _files_message(names)
+    if source == "presenter_agent" and recent_files:
+        return f"🎨 Presenting {recent_files[-1]} and insights"
+    return AGENT_MESSAGES.get(source, DEFAULT_AGENT_MESSAGE)
+
+
+_VOLATILE = re.compile(r"[0-9a-f]{8,}|\d+|call_\w+", re.IGNORECASE)
+
+
+def progress_cache_key(source: str, content: str) -> str:
+    """Normalized content used to reuse LLM-enriched messages across similar updates."""
+    text = _VOLATILE.sub("#", (content or "").lower())
+    return f"{source}|{' '.join(text.split())[:200]}"
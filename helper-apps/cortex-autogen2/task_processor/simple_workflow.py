@@ -15,6 +15,10 @@ from typing import List, Optional, Dict
 from autogen_agentchat.agents import AssistantAgent
 from autogen_agentchat.teams import SelectorGroupChat
 from .score_termination import create_score_based_termination
+from .speaker_selector import RuleBasedSpeakerSelector
+from .llm_instrumentation import tag_model_client
+from services.request_state import get_request_state_registry
+from services.tracing import AgentTimeline, get_tracer
 
 logger = logging.getLogger(__name__)
 
@@ -30,6 +34,7 @@ class SimplifiedWorkflow:
         self._last_report_time: Dict[str, float] = {}  # Track last report time per task
         self._task_progress: Dict[str, float] = {}  # Track current progress per task
         self.last_presenter_msg = None  # Track last presenter_agent TextMessage
+        get_request_state_registry().track(self, "_last_report_time", "_task_progress")
 
     async def run_workflow(
         self,
@@ -76,12 +81,23 @@ class SimplifiedWorkflow:
         all_messages = []  # Mutable list for tracking messages
         score_based_termination = create_score_based_termination(all_messages, threshold=90)
 
+        # Fixed transitions (planner first, verifier after presenter, ...) are resolved
+        # locally; only open choices go to the LLM selector
+        speaker_selector = None
+        if os.getenv("RULE_BASED_SPEAKER_SELECTION", "true").lower() == "true":
+            speaker_selector = RuleBasedSpeakerSelector(
+                planner_agent.name, presenter_agent.name, execution_completion_verifier_agent.name,
+                [agent.name for agent in all_agents], coder_name="coder_agent"
+            )
+
         # Create SelectorGroupChat team with score-based termination
         team = SelectorGroupChat(
             participants=all_agents,
-            model_client=self.model_client,
+            model_client=tag_model_client(self.model_client, "speaker_selection"),
             termination_condition=score_based_termination,
-            max_turns=500  # Allow enough turns for complex workflows
+            max_turns=500,  # Allow enough turns for complex workflows
+            selector_func=speaker_selector.select if speaker_selector else None,
+            candidate_func=speaker_selector.candidates if speaker_selector else None,
         )
 
         # Send initial progress update (auto-starts heartbeat and sets 5%)
@@ -97,9 +113,12 @@ class SimplifiedWorkflow:
         # Run the workflow with streaming to log messages as they come in
         # planner_agent description says "Select FIRST" so it will be picked automatically
         stream = team.run_stream(task=task)
+        tracer = get_tracer()
+        timeline = AgentTimeline(tracer, task_id)
 
         async for message in stream:
             all_messages.append(message)
+            timeline.observe(message)
 
             # Extract message metadata
             message_source = getattr(message, "source", "unknown")
@@ -116,19 +135,21 @@ class SimplifiedWorkflow:
             # LLM-powered early termination detection
             if model_client_for_processing:
                 from services.termination_detector import should_terminate_early
-                should_terminate, score = await should_terminate_early(
-                    message_source, message_type, content_str, model_client_for_processing
-                )
+                with tracer.span("termination_detection", category="bookkeeping", lane="stream"):
+                    should_terminate, score = await should_terminate_early(
+                        message_source, message_type, content_str, model_client_for_processing
+                    )
                 if should_terminate:
                     logger.info(f"✅ Early stop: verifier score {score} > 90. Ending workflow stream.")
                     break
             
             # Process message through service (LLM-powered worklog/learnings/file detection)
             from services.message_processor import process_message
-            await process_message(
-                message, context_memory, model_client_for_processing,
-                task_id, work_dir, messages_file_path
-            )
+            with tracer.span("message_processing", category="bookkeeping", lane="stream", message_type=message_type):
+                await process_message(
+                    message, context_memory, model_client_for_processing,
+                    task_id, work_dir, messages_file_path
+                )
             
             # Progress tracking
             if progress_handler and task_id:
@@ -148,6 +169,7 @@ class SimplifiedWorkflow:
                 except Exception as e:
                     logger.debug(f"Failed to send progress update: {e}")
 
+        timeline.close()
         result = all_messages[-1] if len(all_messages) > 0 else None
 
         # Get final result from presenter_agent
@@ -168,6 +190,8 @@ class SimplifiedWorkflow:
         # Print agent flow like [planner_agent, presenter_agent, execution_completion_verifier_agent]
         agent_flow = [msg.source for msg in all_messages if hasattr(msg, 'source')]
         logger.info(f"🤝 AGENT FLOW: {agent_flow}")
+        if speaker_selector:
+            logger.info(f"🧭 SPEAKER SELECTION: {speaker_selector.summary()}")
 
         
         stop_reason = getattr(result, "stop_reason", None) if result else None
@@ -177,19 +201,21 @@ class SimplifiedWorkflow:
         # This ensures test runner can capture the final result
         if progress_handler and task_id and final_result:
             try:
-                await progress_handler.handle_progress_update(
-                    task_id, 1.0, "🎉 Your task is complete!", data=final_result
-                )
+                with tracer.span("final_result_delivery"):
+                    await progress_handler.handle_progress_update(
+                        task_id, 1.0, "🎉 Your task is complete!", data=final_result
+                    )
                 logger.info(f"✅ Final result sent as progress update (100%) with data field")
             except Exception as e:
                 logger.error(f"❌ Failed to send final result as progress update: {e}")
         
-        # Process learnings via service (LLM-powered)
-        if context_memory and task_id and final_result:
-            from services.learning_processor import process_task_completion_learnings
-            await process_task_completion_learnings(
-                context_memory, task_id, task, final_result, model_client_for_processing
-            )
+        # Process learnings via service (LLM-powered) in the background once the result is delivered
+        if context_memory and task_id and final_result and model_client_for_processing:
+            from services.learning_processor import enqueue_task_completion_learnings
+            try:
+                enqueue_task_completion_learnings(task_id, task, context_memory.work_dir, final_result)
+            except Exception as e:
+                logger.warning(f"Failed to queue task completion learnings: {e}")
         
         # Log task completion to worklog
         if context_memory and task_id:
@@ -198,7 +224,8 @@ class SimplifiedWorkflow:
                     "system", "task_completion",
                     f"Task completed successfully with {len(all_messages)} messages processed",
                     status="completed",
-                    metadata={"task_id": task_id, "message_count": len(all_messages), "agent_flow": agent_flow}
+                    metadata={"task_id": task_id, "message_count": len(all_messages), "agent_flow": agent_flow,
+                              "speaker_selection": dict(speaker_selector.counts) if speaker_selector else None}
                 )
             except Exception as e:
                 logger.warning(f"Failed to log task completion: {e}")
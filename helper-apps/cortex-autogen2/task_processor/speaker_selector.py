@@ -0,0 +1,114 @@
+"""
+Rule-based speaker selection for SelectorGroupChat.
+
+SelectorGroupChat normally spends one LLM call per turn to pick the next
+speaker. Most transitions are fixed by the workflow rules already written into
+the agent descriptions, so they are resolved locally here:
+
+- planner speaks first
+- verifier speaks right after the presenter's presentation (and only then)
+- presenter speaks after the coder's tool output (code execution results)
+  marks files "📁 Ready for upload"; the marker in plain agent text (a plan
+  quoting it, a model claiming success) does not count
+- planner speaks on REPLANNING_REQUIRED_CRITICAL_ISSUES_DETECTED
+- presenter speaks on EXECUTION_COMPLETE_FILES_READY_PRESENTATION_IMPROVEMENT_NEEDED
+
+Anything else falls back to the LLM selector (with the verifier removed from the
+candidates unless the presenter just spoke). Decisions are counted per path in
+``self.counts`` and in ``selector.decisions{path=...}`` metrics.
+"""
+import logging
+from typing import Dict, List, Optional, Sequence
+
+from autogen_agentchat.messages import (
+    BaseChatMessage,
+    TextMessage,
+    ToolCallExecutionEvent,
+    ToolCallSummaryMessage,
+)
+
+from services import metrics
+
+logger = logging.getLogger(__name__)
+
+READY_FOR_UPLOAD_MARKER = "📁 Ready for upload"
+REPLANNING_MARKER = "REPLANNING_REQUIRED_CRITICAL_ISSUES_DETECTED"
+PRESENTATION_IMPROVEMENT_MARKER = "EXECUTION_COMPLETE_FILES_READY_PRESENTATION_IMPROVEMENT_NEEDED"
+
+
+class RuleBasedSpeakerSelector:
+    """Resolves fixed workflow transitions locally; returns None for open choices."""
+
+    def __init__(self, planner_name: str, presenter_name: str, verifier_name: str, participant_names: List[str],
+                 coder_name: str = "coder_agent"):
+        self.planner_name = planner_name
+        self.presenter_name = presenter_name
+        self.verifier_name = verifier_name
+        self.coder_name = coder_name
+        self.participant_names = list(participant_names)
+        self.counts: Dict[str, int] = {}
+
+    def _record(self, path: str) -> None:
+        self.counts[path] = self.counts.get(path, 0) + 1
+        metrics.increment("selector.decisions", path=path)
+
+    def _last_agent_message(self, thread: Sequence) -> Optional[BaseChatMessage]:
+        for message in reversed(thread):
+            if isinstance(message, BaseChatMessage) and message.source in self.participant_names:
+                return message
+        return None
+
+    def _coder_tool_output(self, thread: Sequence) -> str:
+        """Tool execution results of the coder's latest turn (empty if the coder did not speak last)."""
+        outputs = []
+        for message in reversed(thread):
+            if isinstance(message, ToolCallExecutionEvent) and message.source == self.coder_name:
+                outputs.extend(result.content for result in message.content)
+            elif isinstance(message, ToolCallSummaryMessage) and message.source == self.coder_name:
+                outputs.extend(result.content for result in message.results)
+            elif isinstance(message, BaseChatMessage) and message.source != self.coder_name:
+                break
+        return "\n".join(outputs)
+
+    def select(self, thread: Sequence) -> Optional[str]:
+        """``selector_func`` for SelectorGroupChat."""
+        last = self._last_agent_message(thread)
+        if last is None:
+            return self._decide("rule:planner_first", self.planner_name)
+
+        text = last.to_text() if hasattr(last, "to_text") else str(getattr(last, "content", ""))
+
+        if last.source == self.verifier_name:
+            if REPLANNING_MARKER in text:
+                return self._decide("rule:replanning", self.planner_name)
+            if PRESENTATION_IMPROVEMENT_MARKER in text:
+                return self._decide("rule:presentation_improvement", self.presenter_name)
+        elif last.source == self.presenter_name and isinstance(last, TextMessage):
+            return self._decide("rule:verify_presentation", self.verifier_name)
+        elif last.source == self.coder_name and READY_FOR_UPLOAD_MARKER in self._coder_tool_output(thread):
+            return self._decide("rule:ready_for_upload", self.presenter_name)
+
+        return None
+
+    def _decide(self, path: str, speaker: str) -> str:
+        self._record(path)
+        logger.debug(f"🧭 Speaker {speaker} selected by {path}")
+        return speaker
+
+    def candidates(self, thread: Sequence) -> List[str]:
+        """``candidate_func``: the verifier is only a candidate right after the presenter.
+
+        Like the default selector, the previous speaker is not repeated.
+        """
+        last = self._last_agent_message(thread)
+        previous = last.source if last is not None else None
+        names = [name for name in self.participant_names
+                 if name != previous and (name != self.verifier_name or previous == self.presenter_name)]
+        if not names:
+            names = [name for name in self.participant_names if name != self.verifier_name]
+        self._record("llm" if len(names) > 1 else "single_candidate")
+        return names
+
+    def summary(self) -> str:
+        """One-line breakdown such as ``rule:planner_first=1, llm=4``."""
+        return ", ".join(f"{path}={count}" for path, count in sorted(self.counts.items())) or "no selections"
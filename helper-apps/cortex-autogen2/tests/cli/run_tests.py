@@ -7,6 +7,7 @@ Usage:
     python tests/cli/run_tests.py --test tc001_pokemon_pptx  # Run specific test
     python tests/cli/run_tests.py --history                # View recent results
     python tests/cli/run_tests.py --trend tc001_pokemon_pptx # View score trend
+    python tests/cli/run_tests.py --replay /tmp/coding/req_<id>/logs/llm_recording.jsonl  # Replay recorded LLM traffic
 """
 
 import os
@@ -26,6 +27,7 @@ from tests.orchestrator import TestOrchestrator
 from task_processor.agent_workflow_processor import set_current_runner_logger
 from tests.database.repository import TestRepository
 from tests.analysis.trend_analyzer import TrendAnalyzer
+from tests.replay.replay_runner import ReplayRunner
 
 # Load environment variables
 load_dotenv()
@@ -486,6 +488,41 @@ async def run_single_test(test_case_id: str):
     print_test_result(result)
 
 
+async def run_replays(recordings: list, tolerance: float, update_baseline: bool) -> bool:
+    """Replay recorded LLM traffic and report regressions. Returns True when none were found."""
+    print_header()
+    print(f"📼 Replaying {len(recordings)} recording(s) (tolerance {tolerance:.0%})\n")
+
+    runner = ReplayRunner(tolerance=tolerance)
+    all_passed = True
+    for recording in recordings:
+        try:
+            result = await runner.replay(recording, update_baseline=update_baseline)
+        except Exception as e:
+            print(f"❌ {recording}: replay failed: {e}")
+            all_passed = False
+            continue
+
+        baseline = result['baseline'] or {}
+        baseline_duration = f", baseline {baseline['duration_s']}s" if baseline else ""
+        baseline_calls = f", baseline {baseline['llm_calls']}" if baseline else ""
+        print(f"{'─' * 80}")
+        print(f"📋 Recording: {recording}")
+        print(f"Status: {result['status']}")
+        print(f"Replay duration: {result['duration_s']:.2f}s (recorded {result['recorded_duration_s']}s, "
+              f"non-LLM {result['recorded_non_llm_s']}s{baseline_duration})")
+        print(f"LLM calls: {result['llm_calls']} (recorded {result['recorded_llm_calls']}{baseline_calls})")
+        for warning in result['warnings']:
+            print(f"  ⚠️  {warning}")
+        for regression in result['regressions']:
+            print(f"  📉 {regression}")
+        if result['regressions']:
+            all_passed = False
+        print(f"Result: {'❌ Regression detected' if result['regressions'] else '✅ No regressions'}\n")
+
+    return all_passed
+
+
 def main():
     """Main CLI entry point."""
     parser = argparse.ArgumentParser(
@@ -535,10 +572,36 @@ def main():
         help='Limit number of results (default: 10)'
     )
 
+    parser.add_argument(
+        '--replay',
+        type=str,
+        action='append',
+        metavar='RECORDING',
+        help='Replay a recorded run (logs/llm_recording.jsonl, written with LLM_RECORD=true). Can be used multiple times.'
+    )
+
+    parser.add_argument(
+        '--replay-tolerance',
+        type=float,
+        default=0.25,
+        metavar='FRACTION',
+        help='Allowed replay slowdown before flagging a timing regression (default: 0.25)'
+    )
+
+    parser.add_argument(
+        '--replay-update-baseline',
+        action='store_true',
+        help='Store this replay as the new baseline next to each recording'
+    )
+
     args = parser.parse_args()
 
     # Handle commands
-    if args.all:
+    if args.replay:
+        passed = asyncio.run(run_replays(args.replay, args.replay_tolerance, args.replay_update_baseline))
+        sys.exit(0 if passed else 1)
+
+    elif args.all:
         asyncio.run(run_all_tests_parallel(args.parallel))
 
     elif args.test:
@@ -584,6 +647,7 @@ def main():
         print("  python tests/cli/run_tests.py --test tc001_pokemon_pptx")
         print("  python tests/cli/run_tests.py --history --limit 20")
         print("  python tests/cli/run_tests.py --trend tc001_pokemon_pptx")
+        print("  python tests/cli/run_tests.py --replay /tmp/coding/req_<id>/logs/llm_recording.jsonl")
 
 
 if __name__ == "__main__":
@@ -1,14 +1,16 @@
 """
 Progress update collector for test orchestration.
 
-Subscribes to Redis pub/sub channel and collects progress updates
-during test execution.
+Subscribes to Redis pub/sub channel (or, with PROGRESS_TRANSPORT=streams,
+reads the request's progress stream) and collects progress updates during
+test execution.
 """
 
 import redis
 import json
 import asyncio
 import logging
+import os
 from datetime import datetime
 from typing import List, Dict, Optional
 from collections import defaultdict
@@ -19,7 +21,7 @@ logger = logging.getLogger(__name__)
 class ProgressCollector:
     """Collects progress updates from Redis pub/sub channel."""
 
-    def __init__(self, redis_url: str, channel: str, logger=None):
+    def __init__(self, redis_url: str, channel: str, logger=None, transport: Optional[str] = None):
         """
         Initialize the progress collector.
 
@@ -27,9 +29,11 @@ class ProgressCollector:
             redis_url: Redis connection string (e.g., "redis://localhost:6379")
             channel: Redis channel name to subscribe to
             logger: Logger instance to use for logging (optional)
+            transport: "pubsub" or "streams" (defaults to PROGRESS_TRANSPORT)
         """
         self.redis_url = redis_url
         self.channel = channel
+        self.transport = (transport or os.getenv("PROGRESS_TRANSPORT", "pubsub")).lower()
         self.logger = logger or logging.getLogger(__name__)
         self.updates: List[Dict] = []
         self.is_collecting = False
@@ -56,6 +60,9 @@ class ProgressCollector:
         self.is_collecting = True
         self.final_result = None
 
+        if self.transport == "streams":
+            return await self._collect_from_stream(request_id, timeout, stop_on_final)
+
         try:
             # Create Redis client in executor to avoid blocking
             redis_client = redis.from_url(self.redis_url)
@@ -141,6 +148,55 @@ class ProgressCollector:
 
         return self.updates
 
+    async def _collect_from_stream(self, request_id: str, timeout: int, stop_on_final: bool) -> List[Dict]:
+        """Read the request's progress stream from the start, so nothing sent before we connected is missed."""
+        from services.progress_stream import progress_stream_key, read_progress_stream
+
+        try:
+            redis_client = redis.from_url(self.redis_url)
+            self.logger.info(f"📡 Progress collector started for request {request_id}")
+            self.logger.info(f"   Reading stream: {progress_stream_key(request_id)}")
+            self.logger.info(f"   Timeout: {timeout}s")
+
+            start_time = datetime.now()
+            last_id, state = "0", {}
+            while self.is_collecting and (datetime.now() - start_time).total_seconds() <= timeout:
+                last_id, messages = await asyncio.to_thread(
+                    read_progress_stream, redis_client, request_id, last_id, 1000, state
+                )
+                finished = False
+                for data in messages:
+                    update = {
+                        'timestamp': datetime.now().isoformat(),
+                        'progress': round(data.get('progress', 0.0), 4),
+                        'info': data.get('info', ''),
+                        'data': data.get('data')
+                    }
+                    self.updates.append(update)
+                    self.logger.info(f"📊 Progress: {int(update['progress'] * 100)}% - {update['info']}")
+                    if stop_on_final and update['data'] is not None:
+                        self.final_result = update['data']
+                        self.logger.info(f"✅ Final result received with data")
+                        finished = True
+                        break
+                if finished:
+                    break
+            else:
+                if self.is_collecting:
+                    self.logger.warning(f"⏱️  Progress collection timeout after {timeout}s")
+
+            redis_client.close()
+            self.logger.info(f"📊 Progress collection completed: {len(self.updates)} updates collected")
+
+        except redis.ConnectionError as e:
+            self.logger.error(f"❌ Redis connection error: {e}")
+        except Exception as e:
+            self.logger.error(f"❌ Progress collection error: {e}", exc_info=True)
+        finally:
+            self.is_collecting = False
+
+        return self.updates
+
     def stop_collecting(self):
         """Stop collecting progress updates."""
         self.is_collecting = False
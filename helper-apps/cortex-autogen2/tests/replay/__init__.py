@@ -0,0 +1 @@
+"""Deterministic replay of recorded LLM traffic for regression runs."""
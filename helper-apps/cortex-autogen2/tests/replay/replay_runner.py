@@ -0,0 +1,131 @@
+"""
+Replay runner for recorded LLM traffic.
+
+Runs a task recorded with ``LLM_RECORD=true`` through ``TaskProcessor`` in this
+process with ``LLM_REPLAY_FILE`` pointing at its ``llm_recording.jsonl``, so
+every model call is answered from the recording and the run takes only the
+time spent in our own code (agents, tools, code execution, uploads).
+
+Regressions flagged:
+- more LLM calls than the recording (or the baseline replay)
+- replay wall time above the baseline replay, or above the recording's
+  non-LLM time when there is no baseline, by more than the tolerance
+- prompts that no longer match the recording (fallbacks), as a warning
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Absolute slack added to timing comparisons so sub-second runs do not flap
+MIN_TIMING_SLACK_SECONDS = 1.0
+
+
+class ReplayRunner:
+    """Replays recordings and compares them against the recording and a baseline replay."""
+
+    def __init__(self, tolerance: float = 0.25, logger: Optional[logging.Logger] = None):
+        self.tolerance = tolerance
+        self.logger = logger or logging.getLogger(__name__)
+
+    @staticmethod
+    def baseline_path(recording_path: str) -> str:
+        return f"{recording_path}.baseline.json"
+
+    async def replay(self, recording_path: str, update_baseline: bool = False) -> Dict:
+        """Replay one recording and return its result with any regressions found."""
+        from task_processor.llm_replay import get_llm_replayer, load_recording, reset_llm_replayer
+
+        header, calls = load_recording(recording_path)
+        if not header.get("task"):
+            raise ValueError(f"{recording_path} has no header with the task text")
+
+        previous = os.environ.get("LLM_REPLAY_FILE")
+        os.environ["LLM_REPLAY_FILE"] = os.path.abspath(recording_path)
+        reset_llm_replayer()
+        try:
+            replayer = get_llm_replayer()
+            from task_processor import TaskProcessor
+
+            processor = TaskProcessor()
+            await processor.initialize()
+            task_id = f"replay-{uuid.uuid4().hex[:8]}"
+            self.logger.info(f"📼 Replaying {recording_path} ({len(calls)} recorded calls) as {task_id}")
+            started = time.monotonic()
+            try:
+                final_result = await processor.process_task(task_id, header["task"])
+            finally:
+                duration = time.monotonic() - started
+                await processor.close()
+                # Work left running after the task must not reach the real API once replay is off
+                await self._cancel_background_tasks()
+        finally:
+            if previous is None:
+                os.environ.pop("LLM_REPLAY_FILE", None)
+            else:
+                os.environ["LLM_REPLAY_FILE"] = previous
+            reset_llm_replayer()
+
+        result = {
+            "recording": recording_path,
+            "task_id": task_id,
+            "status": "failed" if str(final_result).startswith(("Task failed", "Workflow failed")) else "completed",
+            "duration_s": round(duration, 3),
+            "llm_calls": replayer.served,
+            "fallbacks": replayer.fallbacks,
+            "recorded_llm_calls": header.get("llm_calls", len(calls)),
+            "recorded_duration_s": header.get("duration_s"),
+            "recorded_non_llm_s": header.get("non_llm_s"),
+        }
+        baseline = self._load_baseline(recording_path)
+        result["baseline"] = baseline
+        result["regressions"], result["warnings"] = self.compare(result, baseline)
+
+        if update_baseline or (baseline is None and not result["regressions"]):
+            with open(self.baseline_path(recording_path), "w", encoding="utf-8") as f:
+                json.dump({key: result[key] for key in ("duration_s", "llm_calls", "fallbacks")}, f, indent=2)
+        return result
+
+    def compare(self, result: Dict, baseline: Optional[Dict]) -> tuple:
+        regressions, warnings = [], []
+        if result["status"] != "completed":
+            regressions.append("task did not complete under replay")
+
+        expected_calls = baseline["llm_calls"] if baseline else result["recorded_llm_calls"]
+        if result["llm_calls"] > expected_calls:
+            regressions.append(f"LLM calls {result['llm_calls']} > {expected_calls}")
+        elif result["llm_calls"] < expected_calls:
+            warnings.append(f"LLM calls {result['llm_calls']} < {expected_calls}")
+
+        if baseline:
+            reference, label = baseline["duration_s"], "baseline replay"
+        else:
+            reference, label = result["recorded_non_llm_s"], "recorded non-LLM time"
+        if reference is not None:
+            limit = reference * (1 + self.tolerance) + MIN_TIMING_SLACK_SECONDS
+            if result["duration_s"] > limit:
+                regressions.append(f"replay took {result['duration_s']:.2f}s > {limit:.2f}s ({label} {reference:.2f}s)")
+
+        if result["fallbacks"]:
+            warnings.append(f"{result['fallbacks']} prompts differ from the recording")
+        return regressions, warnings
+
+    def _load_baseline(self, recording_path: str) -> Optional[Dict]:
+        try:
+            with open(self.baseline_path(recording_path), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    async def _cancel_background_tasks() -> None:
+        pending = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
@@ -0,0 +1,31 @@
+import asyncio
+import os
+
+from services import learning_processor, post_task_queue, work_dir_manager
+from services.learning_processor import LEARNINGS_JOB, resume_learnings_jobs
+from services.post_task_queue import PostTaskQueue
+from services.work_dir_manager import WorkDirManager
+
+
+def test_resume_holds_each_adopted_job_once(tmp_path, monkeypatch):
+    monkeypatch.setattr(learning_processor, "_learnings_resumed", False)
+    manager = WorkDirManager(root=str(tmp_path / "work"))
+    monkeypatch.setattr(work_dir_manager, "_work_dir_manager", manager)
+
+    async def scenario():
+        previous = PostTaskQueue(str(tmp_path / "jobs"), journal_name="jobs-old")
+        previous.register(LEARNINGS_JOB, lambda payload: asyncio.sleep(3600))
+        previous.enqueue(LEARNINGS_JOB, "t1", {"task_id": "t1", "work_dir": str(tmp_path / "gone")})
+        await previous.stop()
+        # The previous process is gone: its journal lock is free
+        os.close(previous._lock_fd)
+
+        queue = PostTaskQueue(str(tmp_path / "jobs"), journal_name="jobs-new")
+        monkeypatch.setattr(post_task_queue, "_post_task_queue", queue)
+        # One call per TaskProcessor.initialize()
+        assert [resume_learnings_jobs() for _ in range(3)] == [1, 0, 0]
+        assert manager._active == {"t1": 1}
+        assert await queue.drain(timeout=5)
+        assert manager._active == {}
+
+    asyncio.run(scenario())
@@ -0,0 +1,123 @@
+import asyncio
+import json
+import os
+
+from services.post_task_queue import PostTaskQueue
+
+
+def _journal(queue):
+    with open(queue.spill_path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def _crash(queue):
+    """Simulate the owning process dying: its lock goes away, its journal stays."""
+    os.close(queue._lock_fd)
+    queue._lock_fd = None
+
+
+def test_unfinished_jobs_of_stopped_worker_are_adopted(tmp_path):
+    done = []
+
+    async def scenario():
+        first = PostTaskQueue(str(tmp_path), journal_name="jobs-a")
+        first.register("learn", lambda payload: asyncio.sleep(3600))
+        first.enqueue("learn", "t1", {"n": 1})
+        first.enqueue("learn", "t2", {"n": 2})
+        await asyncio.sleep(0.01)
+        await first.stop()
+        _crash(first)
+
+        second = PostTaskQueue(str(tmp_path), journal_name="jobs-b")
+
+        async def handler(payload):
+            done.append(payload["n"])
+
+        second.register("learn", handler)
+        assert sorted(p["n"] for p in second.pending_payloads("learn")) == [1, 2]
+        assert not os.path.exists(first.spill_path)
+        assert second.resume() == 2
+        assert await second.drain(timeout=5)
+        return second
+
+    second = asyncio.run(scenario())
+    assert sorted(done) == [1, 2]
+    assert PostTaskQueue._read_pending(second.spill_path) == {}
+
+
+def test_journal_of_running_worker_is_left_alone(tmp_path):
+    async def scenario():
+        first = PostTaskQueue(str(tmp_path), journal_name="jobs-a")
+        first.register("learn", lambda payload: asyncio.sleep(3600))
+        first.enqueue("learn", "t1", {"n": 1})
+        await asyncio.sleep(0.01)
+        await first.stop()
+
+        second = PostTaskQueue(str(tmp_path), journal_name="jobs-b")
+        assert second.pending_payloads("learn") == []
+        assert len(PostTaskQueue._read_pending(first.spill_path)) == 1
+
+    asyncio.run(scenario())
+
+
+def test_failed_job_is_retried_then_finished_once(tmp_path):
+    attempts = []
+    finished = []
+
+    async def flaky(payload):
+        attempts.append(payload["n"])
+        if len(attempts) < 2:
+            raise RuntimeError("transient")
+
+    async def on_finish(payload):
+        finished.append(payload["n"])
+
+    async def scenario():
+        queue = PostTaskQueue(str(tmp_path), max_attempts=3, retry_seconds=0.01, journal_name="jobs-a")
+        queue.register("learn", flaky, on_finish=on_finish)
+        queue.enqueue("learn", "t1", {"n": 1})
+        assert await queue.drain(timeout=5)
+        return queue
+
+    queue = asyncio.run(scenario())
+    assert attempts == [1, 1]
+    assert finished == [1]
+    assert [record["event"] for record in _journal(queue)] == ["enqueued", "retry", "done"]
+
+
+def test_job_failing_every_attempt_is_dropped(tmp_path):
+    finished = []
+
+    async def broken(payload):
+        raise RuntimeError("permanent")
+
+    async def on_finish(payload):
+        finished.append(payload["n"])
+
+    async def scenario():
+        queue = PostTaskQueue(str(tmp_path), max_attempts=2, retry_seconds=0.01, journal_name="jobs-a")
+        queue.register("learn", broken, on_finish=on_finish)
+        queue.enqueue("learn", "t1", {"n": 1})
+        assert await queue.drain(timeout=5)
+        return queue
+
+    queue = asyncio.run(scenario())
+    assert finished == [1]
+    assert _journal(queue)[-1]["event"] == "failed"
+    assert PostTaskQueue._read_pending(queue.spill_path) == {}
+
+
+def test_journal_is_compacted_while_running(tmp_path):
+    async def scenario():
+        queue = PostTaskQueue(str(tmp_path), compact_every=2, journal_name="jobs-a")
+        queue.register("learn", lambda payload: asyncio.sleep(0))
+        for n in range(5):
+            queue.enqueue("learn", f"t{n}", {"n": n})
+        assert await queue.drain(timeout=5)
+        return queue
+
+    queue = asyncio.run(scenario())
+    records = _journal(queue)
+    # Rewritten after jobs 2 and 4, so only job 5's records remain
+    assert [record["event"] for record in records] == ["enqueued", "done"]
+    assert not os.path.exists(f"{queue.spill_path}.tmp")
@@ -0,0 +1,186 @@
+import asyncio
+import json
+
+from services import redis_publisher
+from services.request_state import get_request_state_registry
+from services.progress_stream import (
+    ProgressStreamWriter,
+    apply_progress_delta,
+    encode_progress_delta,
+    progress_stream_key,
+    read_progress_stream,
+)
+
+
+class FakeRedis:
+    """In-memory stand-in for the sync redis client (keys and streams only)."""
+
+    def __init__(self):
+        self.values = {}
+        self.streams = {}
+
+    def ping(self):
+        return True
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def set(self, key, value, ex=None):
+        self.values[key] = value.encode() if isinstance(value, str) else value
+
+    def xadd(self, key, fields, maxlen=None, approximate=True):
+        entries = self.streams.setdefault(key, [])
+        entry_id = f"{len(entries) + 1}-0"
+        entries.append((entry_id.encode(), {k.encode(): str(v).encode() for k, v in fields.items()}))
+        return entry_id
+
+    def expire(self, key, ttl):
+        return True
+
+    def xread(self, streams, block=None):
+        response = []
+        for key, last_id in streams.items():
+            after = int(str(last_id).split("-")[0])
+            entries = [e for e in self.streams.get(key, []) if int(e[0].decode().split("-")[0]) > after]
+            if entries:
+                response.append((key.encode(), entries))
+        return response
+
+    def pipeline(self, transaction=False):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.calls = []
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.calls.append((name, args, kwargs))
+
+    def execute(self):
+        return [getattr(self.client, name)(*args, **kwargs) for name, args, kwargs in self.calls]
+
+
+def test_deltas_rebuild_full_messages():
+    messages = [
+        {"requestId": "r1", "progress": 0.1, "info": "Planning"},
+        {"requestId": "r1", "progress": 0.2, "info": "Planning"},
+        {"requestId": "r1", "progress": 0.5, "info": "Running code"},
+        {"requestId": "r1", "progress": 1.0, "info": "Running code", "data": "done"},
+    ]
+    previous, state, rebuilt = None, {"requestId": "r1"}, []
+    deltas = []
+    for message in messages:
+        fields = encode_progress_delta(previous, message)
+        deltas.append(fields)
+        previous = {"info": str(message.get("info") or "")}
+        rebuilt.append(apply_progress_delta(state, fields))
+
+    assert "info" not in deltas[1] and "info" not in deltas[3]
+    assert "data" not in deltas[2] and deltas[3]["final"] == "1"
+    assert [m["info"] for m in rebuilt] == ["Planning", "Planning", "Running code", "Running code"]
+    assert [m["data"] for m in rebuilt] == [None, None, None, "done"]
+    assert rebuilt[2]["progress"] == 0.5
+
+
+def test_writer_coalesces_per_request_and_flushes_final_immediately():
+    batches = []
+
+    async def scenario():
+        writer = ProgressStreamWriter(lambda entries: batches.append(entries) or True, window_seconds=0.05)
+        for progress in (0.1, 0.2, 0.3):
+            await writer.submit({"requestId": "r1", "progress": progress, "info": "working"})
+        await writer.submit({"requestId": "r2", "progress": 0.4, "info": "other"})
+        await asyncio.sleep(0.1)
+        assert len(batches) == 1
+        assert {key: fields["progress"] for key, fields in batches[0]} == {
+            progress_stream_key("r1"): "0.3000",
+            progress_stream_key("r2"): "0.4000",
+        }
+
+        await writer.submit({"requestId": "r1", "progress": 1.0, "info": "working", "data": "result"})
+        assert len(batches) == 2
+        assert batches[1] == [(progress_stream_key("r1"), {"progress": "1.0000", "data": "result", "final": "1"})]
+
+        # Nothing is written after the final entry
+        await writer.submit({"requestId": "r1", "progress": 0.9, "info": "late"})
+        await asyncio.sleep(0.1)
+        assert len(batches) == 2
+
+    asyncio.run(scenario())
+
+
+def test_streams_transport_round_trip_and_final_result_ref(monkeypatch):
+    fake = FakeRedis()
+    monkeypatch.setenv("PROGRESS_TRANSPORT", "streams")
+    monkeypatch.setenv("PROGRESS_COALESCE_MS", "10")
+    monkeypatch.setattr(redis_publisher, "redis_client", fake)
+    monkeypatch.setattr(redis_publisher, "connect_redis", lambda: True)
+
+    async def scenario():
+        publisher = redis_publisher.RedisPublisher()
+        await publisher.set_transient_update("r1", 0.2, "Planning")
+        await publisher.set_transient_update("r1", 0.6, "Running code")
+        await asyncio.sleep(0.05)
+        await publisher.set_transient_update("r1", 1.0, "Running code", data="final answer")
+        return publisher
+
+    publisher = asyncio.run(scenario())
+    last_id, messages = read_progress_stream(fake, "r1")
+    assert last_id == "2-0"
+    assert messages == [
+        {"requestId": "r1", "progress": 0.6, "info": "Running code", "data": None},
+        {"requestId": "r1", "progress": 1.0, "info": "Running code", "data": "final answer"},
+    ]
+
+    result = {"requestId": "r1", "data": "final answer"}
+    assert publisher.store_final_result("r1", result)
+    assert json.loads(fake.values["progress:r1"]) == {"ref": "result:r1"}
+    assert json.loads(fake.values["final:r1"]) == {"ref": "result:r1"}
+    assert redis_publisher.load_final_result("r1") == result
+
+    # An alias still resolves when only the pointer is found under the looked-up prefixes
+    fake.values["archive:r1"] = fake.values.pop("result:r1")
+    fake.values["final:r1"] = json.dumps({"ref": "archive:r1"}).encode()
+    fake.values.pop("progress:r1")
+    assert redis_publisher.load_final_result("r1") == result
+
+
+def test_terminal_and_released_updates_are_written():
+    batches = []
+
+    async def scenario():
+        writer = ProgressStreamWriter(lambda entries: batches.append(entries) or True, window_seconds=30)
+        await writer.submit({"requestId": "failed", "progress": 0.3, "info": "working"})
+        # A failure update has no data but still ends the stream: written without waiting for the window
+        await writer.submit({"requestId": "failed", "progress": 1.0, "info": "❌ Task failed"})
+        assert batches == [[(progress_stream_key("failed"), {"progress": "1.0000", "info": "❌ Task failed"})]]
+
+        # Released while an update is coalescing: the update is written, not dropped
+        await writer.submit({"requestId": "released", "progress": 0.5, "info": "almost"})
+        get_request_state_registry().release("released")
+        await asyncio.gather(*writer._evicted_writes)
+        assert batches[1] == [(progress_stream_key("released"), {"progress": "0.5000", "info": "almost"})]
+        assert "released" not in writer._pending and "released" not in writer._last_written
+
+    asyncio.run(scenario())
+
+
+def test_failure_update_reaches_the_stream_after_release(monkeypatch):
+    fake = FakeRedis()
+    monkeypatch.setenv("PROGRESS_TRANSPORT", "streams")
+    monkeypatch.setenv("PROGRESS_COALESCE_MS", "250")
+    monkeypatch.setattr(redis_publisher, "redis_client", fake)
+    monkeypatch.setattr(redis_publisher, "connect_redis", lambda: True)
+
+    async def scenario():
+        publisher = redis_publisher.RedisPublisher()
+        await publisher.set_transient_update("r-fail", 0.3, "working")
+        await publisher.set_transient_update("r-fail", 1.0, "❌ Task failed: boom")
+        get_request_state_registry().release("r-fail")
+        await asyncio.sleep(0.05)
+
+    asyncio.run(scenario())
+    _, messages = read_progress_stream(fake, "r-fail")
+    assert messages[-1] == {"requestId": "r-fail", "progress": 1.0, "info": "❌ Task failed: boom", "data": None}
@@ -0,0 +1,176 @@
+import asyncio
+
+import pytest
+
+from services.queue_backend import LeaseLostError
+from services.queue_lease import MessageLease
+from services.redis_queue import RedisStreamQueueService
+
+
+class FakeStreamRedis:
+    """The subset of Redis stream commands the queue uses, with a manual clock (ms)."""
+
+    def __init__(self):
+        self.now_ms = 1_000_000
+        self.entries = {}
+        self.pending = {}  # entry id -> {"consumer", "delivered_at", "times"}
+        self._seq = 0
+        self.xpending_calls = 0
+
+    async def xgroup_create(self, *args, **kwargs):
+        return True
+
+    async def xadd(self, stream, fields, maxlen=None, approximate=True):
+        self._seq += 1
+        entry_id = f"{self.now_ms}-{self._seq}"
+        self.entries[entry_id] = {k.encode(): v.encode() for k, v in fields.items()}
+        return entry_id.encode()
+
+    def _deliver(self, entry_id, consumer):
+        record = self.pending.setdefault(entry_id, {"times": 0})
+        record.update(consumer=consumer, delivered_at=self.now_ms, times=record["times"] + 1)
+
+    async def xreadgroup(self, group, consumer, streams, count=None, block=None):
+        new = [i for i in self.entries if i not in self.pending][:count]
+        for entry_id in new:
+            self._deliver(entry_id, consumer)
+        return [[b"stream", [(i.encode(), self.entries[i]) for i in new]]] if new else []
+
+    async def xautoclaim(self, stream, group, consumer, min_idle_time, start_id="0-0", count=None):
+        stale = [i for i, r in self.pending.items() if self.now_ms - r["delivered_at"] >= min_idle_time][:count]
+        for entry_id in stale:
+            self._deliver(entry_id, consumer)
+        return [b"0-0", [(i.encode(), self.entries.get(i)) for i in stale], []]
+
+    async def xpending_range(self, stream, group, min, max, count):
+        min = min.decode() if isinstance(min, bytes) else min
+        ids = sorted(self.pending) if min == "-" else [i for i in (min,) if i in self.pending]
+        return [{
+            "message_id": i.encode(),
+            "consumer": self.pending[i]["consumer"].encode(),
+            "time_since_delivered": self.now_ms - self.pending[i]["delivered_at"],
+            "times_delivered": self.pending[i]["times"],
+        } for i in ids[:count]]
+
+    async def xpending(self, stream, group):
+        self.xpending_calls += 1
+        return {"pending": len(self.pending), "consumers": sorted({r["consumer"] for r in self.pending.values()})}
+
+    async def xlen(self, stream):
+        return len(self.entries)
+
+    def register_script(self, source):
+        """Emulates the owner-checked claim / ack scripts."""
+
+        async def run(keys, args):
+            group, consumer, entry_id, *rest = args
+            record = self.pending.get(entry_id)
+            if record is None:
+                return 0
+            if record["consumer"] != consumer:
+                return -1
+            if "XACK" in source:
+                await self.xack(keys[0], group, entry_id)
+                await self.xdel(keys[0], entry_id)
+            else:
+                record["delivered_at"] = self.now_ms - int(rest[0])
+            return 1
+
+        return run
+
+    async def xack(self, stream, group, entry_id):
+        return 1 if self.pending.pop(entry_id, None) else 0
+
+    async def xdel(self, stream, entry_id):
+        return 1 if self.entries.pop(entry_id, None) else 0
+
+
+def _workers(monkeypatch, redis):
+    monkeypatch.setenv("REDIS_QUEUE_VISIBILITY_TIMEOUT", "60")
+    workers = []
+    for name in ("worker-a", "worker-b"):
+        service = RedisStreamQueueService("redis://localhost:6379", "tests", consumer_name=name)
+        service.client = redis
+        workers.append(service)
+    return workers
+
+
+def test_reads_its_own_env_settings(monkeypatch):
+    monkeypatch.setenv("AZURE_QUEUE_VISIBILITY_TIMEOUT", "999")
+    monkeypatch.setenv("REDIS_QUEUE_PREFETCH", "3")
+    a, _ = _workers(monkeypatch, FakeStreamRedis())
+    assert a.visibility_timeout == 60
+    assert a.prefetch == 3
+    assert MessageLease(a, "1-1", "1-1").renew_interval == 20
+
+
+def test_extend_keeps_lease_and_blocks_reclaim(monkeypatch):
+    redis = FakeStreamRedis()
+    a, b = _workers(monkeypatch, redis)
+
+    async def scenario():
+        await a.send_task("task")
+        [message] = await a.get_tasks()
+        redis.now_ms += 50_000
+        await a.extend_visibility(message["id"], message["pop_receipt"], a.visibility_timeout)
+        redis.now_ms += 50_000
+        # Renewed 50s ago, so not idle past the 60s visibility timeout yet
+        assert await b.get_tasks() == []
+        await a.delete_task(message["id"], message["pop_receipt"])
+        assert redis.pending == {} and redis.entries == {}
+
+    asyncio.run(scenario())
+
+
+def test_extend_after_reclaim_does_not_steal_entry(monkeypatch):
+    redis = FakeStreamRedis()
+    a, b = _workers(monkeypatch, redis)
+
+    async def scenario():
+        await a.send_task("task")
+        [message] = await a.get_tasks()
+        redis.now_ms += 61_000
+        [reclaimed] = await b.get_tasks()
+        assert reclaimed["id"] == message["id"]
+        assert reclaimed["dequeue_count"] == 2
+
+        with pytest.raises(LeaseLostError):
+            await a.extend_visibility(message["id"], message["pop_receipt"], a.visibility_timeout)
+        with pytest.raises(LeaseLostError):
+            await a.delete_task(message["id"], message["pop_receipt"])
+        assert redis.pending[message["id"]]["consumer"] == "worker-b"
+
+        lease = MessageLease(a, message["id"], message["pop_receipt"])
+        assert await lease.renew() is False
+        assert await lease.complete() is False
+        assert message["id"] in redis.entries
+
+    asyncio.run(scenario())
+
+
+def test_release_hands_entry_to_next_reclaim(monkeypatch):
+    redis = FakeStreamRedis()
+    a, b = _workers(monkeypatch, redis)
+
+    async def scenario():
+        await a.send_task("task")
+        [message] = await a.get_tasks()
+        await a.release_task(message["id"], message["pop_receipt"])
+        [reclaimed] = await b.get_tasks()
+        assert reclaimed["id"] == message["id"]
+        assert redis.pending[message["id"]]["consumer"] == "worker-b"
+
+    asyncio.run(scenario())
+
+
+def test_metrics_are_throttled(monkeypatch):
+    redis = FakeStreamRedis()
+    monkeypatch.setenv("REDIS_QUEUE_METRICS_SECONDS", "3600")
+    a, _ = _workers(monkeypatch, redis)
+
+    async def scenario():
+        for _ in range(3):
+            await a.get_tasks()
+        assert redis.xpending_calls == 1
+
+    asyncio.run(scenario())
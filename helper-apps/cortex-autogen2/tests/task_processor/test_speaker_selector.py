@@ -0,0 +1,61 @@
+from autogen_agentchat.messages import (
+    TextMessage,
+    ToolCallExecutionEvent,
+    ToolCallRequestEvent,
+    ToolCallSummaryMessage,
+)
+from autogen_core import FunctionCall
+from autogen_core.models import FunctionExecutionResult
+
+from task_processor.speaker_selector import READY_FOR_UPLOAD_MARKER, RuleBasedSpeakerSelector
+
+PARTICIPANTS = ["planner_agent", "coder_agent", "presenter_agent", "execution_completion_verifier_agent"]
+
+
+def _selector():
+    return RuleBasedSpeakerSelector(
+        "planner_agent", "presenter_agent", "execution_completion_verifier_agent", PARTICIPANTS,
+        coder_name="coder_agent",
+    )
+
+
+def _tool_turn(output: str):
+    call = FunctionCall(id="call-1", name="execute_code", arguments="{}")
+    result = FunctionExecutionResult(content=output, name="execute_code", call_id="call-1", is_error=False)
+    return [
+        ToolCallRequestEvent(source="coder_agent", content=[call]),
+        ToolCallExecutionEvent(source="coder_agent", content=[result]),
+        ToolCallSummaryMessage(source="coder_agent", content=output, tool_calls=[call], results=[result]),
+    ]
+
+
+def test_planner_quoting_marker_does_not_route_to_presenter():
+    thread = [
+        TextMessage(source="user", content="make a chart"),
+        TextMessage(source="planner_agent", content=f"Plan: save chart.png, then print '{READY_FOR_UPLOAD_MARKER}: chart.png'"),
+    ]
+    assert _selector().select(thread) is None
+
+
+def test_coder_text_claiming_marker_does_not_route_to_presenter():
+    thread = [
+        TextMessage(source="planner_agent", content="Plan: make chart.png"),
+        TextMessage(source="coder_agent", content=f"{READY_FOR_UPLOAD_MARKER}: chart.png"),
+    ]
+    assert _selector().select(thread) is None
+
+
+def test_coder_tool_output_with_marker_routes_to_presenter():
+    selector = _selector()
+    thread = [TextMessage(source="planner_agent", content="Plan: make chart.png")]
+    thread += _tool_turn(f"{READY_FOR_UPLOAD_MARKER}: /tmp/coding/req/chart.png")
+    assert selector.select(thread) == "presenter_agent"
+    assert selector.counts == {"rule:ready_for_upload": 1}
+
+
+def test_marker_from_earlier_coder_turn_is_not_reused():
+    thread = [TextMessage(source="planner_agent", content="Plan")]
+    thread += _tool_turn(f"{READY_FOR_UPLOAD_MARKER}: chart.png")
+    thread += [TextMessage(source="planner_agent", content="Next step")]
+    thread += _tool_turn("done, nothing saved")
+    assert _selector().select(thread) is None
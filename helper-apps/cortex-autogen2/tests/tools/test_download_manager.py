@@ -0,0 +1,222 @@
+import asyncio
+import os
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from tools.download_manager import DownloadCache, DownloadError, DownloadManager
+
+BODY = bytes(range(256)) * 1200
+HTML = b"<!DOCTYPE html><html>Please sign in</html>"
+
+
+def _serve(routes, scenario):
+    """Run ``scenario(base_url)`` against a local server with ``routes`` (path -> handler)."""
+
+    async def run():
+        app = web.Application()
+        for path, handler in routes.items():
+            app.router.add_get(path, handler)
+        server = TestServer(app)
+        await server.start_server()
+        try:
+            return await scenario(str(server.make_url("")).rstrip("/"))
+        finally:
+            await server.close()
+
+    return asyncio.run(run())
+
+
+def _manager(tmp_path, **cache_kwargs):
+    return DownloadManager(DownloadCache(str(tmp_path / "cache"), **cache_kwargs))
+
+
+def test_interrupted_download_resumes_with_range(tmp_path):
+    ranges = []
+
+    async def big(request):
+        if request.headers.get("Range"):
+            assert request.headers.get("If-Range") == '"v1"'
+            start = int(request.headers["Range"].split("=")[1].rstrip("-"))
+            ranges.append(start)
+            return web.Response(body=BODY[start:], status=206, headers={
+                "ETag": '"v1"', "Content-Range": f"bytes {start}-{len(BODY) - 1}/{len(BODY)}"})
+        response = web.StreamResponse(headers={"ETag": '"v1"', "Content-Length": str(len(BODY))})
+        await response.prepare(request)
+        await response.write(BODY[:100_000])
+        await asyncio.sleep(0.05)
+        request.transport.close()
+        return response
+
+    manager = _manager(tmp_path)
+
+    async def scenario(base):
+        try:
+            return await manager.download(f"{base}/big.bin", work_dir=str(tmp_path / "work"))
+        finally:
+            await manager.close()
+
+    result = _serve({"/big.bin": big}, scenario)
+    assert ranges and ranges[0] > 0
+    with open(result.path, "rb") as f:
+        assert f.read() == BODY
+    assert os.listdir(manager.cache.partial_dir) == []
+
+
+def test_stale_entry_is_revalidated(tmp_path):
+    served = []
+
+    async def data(request):
+        if request.headers.get("If-None-Match") == '"v1"':
+            return web.Response(status=304)
+        served.append(request.path)
+        return web.Response(body=b"a,b\n1,2\n", headers={"ETag": '"v1"'})
+
+    manager = _manager(tmp_path, ttl_seconds=0)
+
+    async def scenario(base):
+        try:
+            first = await manager.download(f"{base}/data.csv", work_dir=str(tmp_path / "one"))
+            second = await manager.download(f"{base}/data.csv", work_dir=str(tmp_path / "two"))
+            return first, second
+        finally:
+            await manager.close()
+
+    first, second = _serve({"/data.csv": data}, scenario)
+    assert served == ["/data.csv"]
+    assert not first.from_cache and second.from_cache
+    with open(second.path, "rb") as f:
+        assert f.read() == b"a,b\n1,2\n"
+
+
+def test_same_content_from_two_urls_is_stored_once(tmp_path):
+    async def data(request):
+        return web.Response(body=BODY)
+
+    manager = _manager(tmp_path)
+
+    async def scenario(base):
+        try:
+            return await manager.download_many([f"{base}/a/data.bin", f"{base}/b/data.bin"],
+                                               work_dir=str(tmp_path / "work"))
+        finally:
+            await manager.close()
+
+    results = _serve({"/a/data.bin": data, "/b/data.bin": data}, scenario)
+    # Distinct names within the batch, one blob in the cache
+    assert sorted(r.filename for r in results) == ["data-1.bin", "data.bin"]
+    assert len(os.listdir(manager.cache.blob_dir)) == 1
+
+
+def test_cache_is_trimmed_to_its_cap(tmp_path):
+    async def data(request):
+        return web.Response(body=request.path.encode() * 1000)
+
+    manager = _manager(tmp_path, max_bytes=7_000)
+
+    async def scenario(base):
+        try:
+            for name in ("f1", "f2", "f3"):
+                await manager.download(f"{base}/{name}", work_dir=str(tmp_path / "work"))
+        finally:
+            await manager.close()
+
+    _serve({"/{name}": data}, scenario)
+    sizes = [entry.stat().st_size for entry in os.scandir(manager.cache.blob_dir)]
+    assert len(sizes) == 2 and sum(sizes) <= 7_000 * 0.9
+    # Work dir copies are unaffected
+    assert sorted(os.listdir(tmp_path / "work")) == ["f1", "f2", "f3"]
+
+
+def test_same_url_with_different_extensions_shares_one_transfer(tmp_path):
+    hits = []
+
+    async def page(request):
+        hits.append(request.path)
+        await asyncio.sleep(0.1)
+        return web.Response(body=HTML, content_type="text/html")
+
+    manager = _manager(tmp_path)
+
+    async def scenario(base):
+        url = f"{base}/export"
+        try:
+            return await asyncio.gather(
+                manager.download(url, "export.csv", work_dir=str(tmp_path / "csv")),
+                manager.download(url, "export.html", work_dir=str(tmp_path / "html")),
+                return_exceptions=True,
+            )
+        finally:
+            await manager.close()
+
+    as_csv, as_html = _serve({"/export": page}, scenario)
+    assert hits == ["/export"]
+    assert isinstance(as_csv, DownloadError) and "export.csv" in str(as_csv)
+    with open(as_html.path, "rb") as f:
+        assert f.read() == HTML
+
+
+def test_html_for_csv_callers_is_rejected_on_first_chunk(tmp_path):
+    async def page(request):
+        await asyncio.sleep(0.1)
+        return web.Response(body=HTML, content_type="text/html")
+
+    manager = _manager(tmp_path)
+
+    async def scenario(base):
+        url = f"{base}/export"
+        try:
+            return await asyncio.gather(
+                manager.download(url, "a.csv", work_dir=str(tmp_path / "work")),
+                manager.download(url, "b.csv", work_dir=str(tmp_path / "work")),
+                return_exceptions=True,
+            )
+        finally:
+            await manager.close()
+
+    first, second = _serve({"/export": page}, scenario)
+    assert "'a.csv'" in str(first) and "'b.csv'" in str(second)
+    # Nothing was stored for the rejected body
+    assert not os.path.exists(manager.cache.blob_dir) or os.listdir(manager.cache.blob_dir) == []
+
+
+def test_only_one_writer_claims_a_shared_partial(tmp_path):
+    cache = DownloadCache(str(tmp_path))
+    url = "https://example.com/big.bin"
+    shared_part, shared_meta = cache.partial_paths(url)
+    os.makedirs(cache.partial_dir)
+    with open(shared_part, "wb") as f:
+        f.write(b"prefix")
+    with open(shared_meta, "w") as f:
+        f.write('{"etag": "\\"v1\\""}')
+
+    first, second = cache.claim_partial(url), cache.claim_partial(url)
+    assert first != second
+    assert os.path.exists(first[0]) and os.path.exists(first[1])
+    assert not os.path.exists(second[0])
+
+    # An unfinished partial goes back under the shared name for the next call
+    cache.release_partial(url, *first)
+    cache.release_partial(url, *second)
+    assert sorted(os.listdir(cache.partial_dir)) == sorted(os.path.basename(p) for p in (shared_part, shared_meta))
+    with open(shared_part, "rb") as f:
+        assert f.read() == b"prefix"
+
+
+@pytest.mark.parametrize("filename", [None, "renamed.bin"])
+def test_download_is_copied_not_linked(tmp_path, filename):
+    async def data(request):
+        return web.Response(body=BODY)
+
+    manager = _manager(tmp_path)
+
+    async def scenario(base):
+        try:
+            return await manager.download(f"{base}/data.bin", filename, work_dir=str(tmp_path / "work"))
+        finally:
+            await manager.close()
+
+    result = _serve({"/data.bin": data}, scenario)
+    assert result.filename == (filename or "data.bin")
+    assert os.stat(result.path).st_nlink == 1
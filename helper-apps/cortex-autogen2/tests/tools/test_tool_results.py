@@ -0,0 +1,35 @@
+import os
+
+from services.work_dir_manager import WorkDirManager
+from tools.tool_results import read_tool_output, spill_if_large
+
+
+def _handle_path(handle):
+    return next(line.split(": ", 1)[1] for line in handle.splitlines() if line.startswith("path: "))
+
+
+def test_spilled_output_stays_out_of_the_work_dir(tmp_path):
+    manager = WorkDirManager(root=str(tmp_path))
+    work_dir = manager.path_for("t1")
+    os.makedirs(work_dir)
+    text = "row\n" * 5000
+
+    handle = spill_if_large(text, work_dir, "execute_code", threshold=1000)
+    path = _handle_path(handle)
+
+    assert not os.path.realpath(path).startswith(os.path.realpath(work_dir) + os.sep)
+    assert [name for _, _, files in os.walk(work_dir) for name in files] == []
+    assert read_tool_output(path, 0, 8, work_dir=work_dir).endswith("row\nrow\n")
+
+    manager._delete("t1", "test")
+    assert not os.path.exists(path)
+
+
+def test_read_tool_output_rejects_other_work_dirs(tmp_path):
+    manager = WorkDirManager(root=str(tmp_path))
+    mine, other = manager.path_for("mine"), manager.path_for("other")
+    os.makedirs(mine)
+    os.makedirs(other)
+    path = _handle_path(spill_if_large("x" * 5000, other, "execute_code", threshold=1000))
+
+    assert read_tool_output(path, work_dir=mine).startswith("ERROR")
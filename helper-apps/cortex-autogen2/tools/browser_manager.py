@@ -0,0 +1,296 @@
+"""
+Worker-wide headless browser.
+
+Playwright tools and rendered fetches used to start Playwright and launch
+Chromium for every call. They now share one browser per worker process:
+
+- Chromium is launched lazily on first use and relaunched (``browser.restarts``
+  metric) when it crashes or disconnects.
+- Each request gets its own browser context (cookies, storage, downloads), kept
+  for the life of the request and closed when the request's state is released.
+  Calls without a request get a throwaway context.
+- At most ``BROWSER_MAX_PAGES`` pages are in use (borrowed) at once across the
+  worker. Besides those, each request context keeps up to
+  ``IDLE_PAGES_PER_CONTEXT`` finished pages open for reuse by its next call; they
+  are closed with the context. A page is only reused if its call finished
+  without an exception, the caller did not ``discard`` it, and it could be
+  reset to ``about:blank`` (which also drops any page state left by scripts).
+- ``settle`` waits for the network to go idle for at most ``BROWSER_SETTLE_MS``
+  instead of sleeping a fixed time.
+"""
+import asyncio
+import logging
+import os
+import signal
+import weakref
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional, Set
+
+from services import metrics
+from services.request_state import get_request_state_registry
+
+logger = logging.getLogger(__name__)
+
+# Finished pages kept per request context for reuse
+IDLE_PAGES_PER_CONTEXT = 2
+
+
+class BrowserManager:
+    """One lazily launched Chromium with per-request contexts and a capped page pool."""
+
+    def __init__(self, max_pages: int = 4, settle_ms: int = 800, user_agent: Optional[str] = None):
+        self.max_pages = max(1, max_pages)
+        self.settle_ms = settle_ms
+        self.user_agent = user_agent
+        self._playwright = None
+        self._browser = None
+        self._launches = 0
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._launch_lock: Optional[asyncio.Lock] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # request id -> {"browser", "context", "idle": [pages]}
+        self._contexts: Dict[str, Dict[str, Any]] = {}
+        self._closing: Set[asyncio.Task] = set()
+        # Pages whose caller saw a failure or ran page scripts; closed instead of reused
+        self._discarded: "weakref.WeakSet" = weakref.WeakSet()
+        get_request_state_registry().track(self, "_contexts", on_evict=self._close_evicted_context)
+
+    def _check_loop(self) -> None:
+        """Shut down the browser bound to a previous event loop (e.g. successive asyncio.run calls)."""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._shutdown_stale(self._loop)
+            self._playwright = None
+            self._browser = None
+            self._contexts.clear()
+            self._semaphore = asyncio.Semaphore(self.max_pages)
+            self._launch_lock = asyncio.Lock()
+            self._loop = loop
+
+    def _shutdown_stale(self, old_loop: Optional[asyncio.AbstractEventLoop]) -> None:
+        """Close a browser whose event loop is no longer the current one.
+
+        Its objects can only be awaited on their own loop, so the public
+        ``browser.close()`` / ``playwright.stop()`` are scheduled there while it
+        still runs (another thread). A loop that has stopped (e.g. the end of
+        ``asyncio.run``) cannot run them any more: then the Playwright driver
+        process is terminated, which closes the browsers it launched.
+        """
+        browser, playwright = self._browser, self._playwright
+        if browser is None and playwright is None:
+            return
+        metrics.increment("browser.stale_shutdowns")
+        if old_loop is not None and old_loop.is_running():
+            asyncio.run_coroutine_threadsafe(self._close_browser(browser, playwright), old_loop)
+            return
+        pid = self._driver_pid(playwright)
+        if pid is None:
+            logger.warning("🌐 Cannot reach the Playwright driver of a previous event loop; its browser may linger")
+            return
+        try:
+            os.kill(pid, signal.SIGTERM)
+            logger.info("🌐 Stopped the browser left by a previous event loop")
+        except OSError as e:
+            logger.warning(f"🌐 Could not stop the browser left by a previous event loop: {e}")
+
+    @staticmethod
+    def _driver_pid(playwright) -> Optional[int]:
+        """PID of the driver subprocess behind ``playwright``, or None.
+
+        Playwright has no public accessor for it, so this walks its private
+        connection objects; any step missing (other Playwright version) gives None.
+        """
+        node = getattr(playwright, "_impl_obj", None)
+        for attr in ("_connection", "_transport", "_proc"):
+            node = getattr(node, attr, None)
+            if node is None:
+                logger.debug(f"Playwright driver process not found (no {attr})")
+                return None
+        pid = getattr(node, "pid", None)
+        return pid if isinstance(pid, int) else None
+
+    async def _close_browser(self, browser, playwright) -> None:
+        if browser is not None:
+            await self._close_quietly(browser)
+        if playwright is not None:
+            try:
+                await playwright.stop()
+            except Exception as e:
+                logger.debug(f"Playwright stop failed: {e}")
+
+    async def _launch(self):
+        from playwright.async_api import async_playwright
+        if self._playwright is None:
+            self._playwright = await async_playwright().start()
+        try:
+            return await self._playwright.chromium.launch(headless=True)
+        except Exception:
+            # The driver may have died with the browser: start a fresh one and try once more
+            playwright, self._playwright = self._playwright, None
+            try:
+                await playwright.stop()
+            except Exception:
+                pass
+            self._playwright = await async_playwright().start()
+            return await self._playwright.chromium.launch(headless=True)
+
+    async def _get_browser(self):
+        async with self._launch_lock:
+            if self._browser is not None and self._browser.is_connected():
+                return self._browser
+            if self._launches:
+                metrics.increment("browser.restarts")
+                logger.warning("🌐 Shared browser disconnected; relaunching")
+                self._contexts.clear()
+            browser = await self._launch()
+            browser.on("disconnected", self._on_disconnected)
+            self._browser = browser
+            self._launches += 1
+            metrics.increment("browser.launches")
+            logger.info("🌐 Shared headless browser launched")
+            return browser
+
+    def _on_disconnected(self, browser) -> None:
+        if browser is self._browser:
+            # Contexts died with the browser; the next page() relaunches it
+            self._contexts.clear()
+            self._publish_gauges()
+
+    async def _new_context(self, browser):
+        return await browser.new_context(user_agent=self.user_agent, accept_downloads=True)
+
+    async def _open_page(self, browser, request_id: Optional[str]):
+        """Return ``(page, context)``: a reused idle page of the request's context or a new one."""
+        if request_id is None:
+            context = await self._new_context(browser)
+            return await context.new_page(), context
+        entry = self._contexts.get(request_id)
+        if entry is None or entry["browser"] is not browser:
+            context = await self._new_context(browser)
+            entry = self._contexts.get(request_id)
+            if entry is None or entry["browser"] is not browser:
+                entry = {"browser": browser, "context": context, "idle": []}
+                self._contexts[request_id] = entry
+                self._publish_gauges()
+            else:
+                # Another call for the same request created one meanwhile
+                await self._close_quietly(context)
+        while entry["idle"]:
+            page = entry["idle"].pop()
+            if not page.is_closed():
+                metrics.increment("browser.pages", result="reused")
+                return page, entry["context"]
+        metrics.increment("browser.pages", result="new")
+        return await entry["context"].new_page(), entry["context"]
+
+    @asynccontextmanager
+    async def page(self, request_id: Optional[str] = None) -> AsyncIterator[Any]:
+        """Borrow a page, in ``request_id``'s context or a throwaway one when None."""
+        self._check_loop()
+        async with self._semaphore:
+            for attempt in range(2):
+                browser = await self._get_browser()
+                try:
+                    page, context = await self._open_page(browser, request_id)
+                    break
+                except Exception:
+                    # Crashed between the connection check and opening the page: relaunch once
+                    if attempt or browser.is_connected():
+                        raise
+            reusable = False
+            try:
+                yield page
+                reusable = True
+            finally:
+                await self._return_page(request_id, context, page, reusable)
+
+    def discard(self, page) -> None:
+        """Close ``page`` when it is returned instead of keeping it for reuse.
+
+        Call after an action failed on the page or after running page scripts
+        (``evaluate``), whose effects a later call must not inherit.
+        """
+        self._discarded.add(page)
+
+    async def _return_page(self, request_id: Optional[str], context, page, reusable: bool) -> None:
+        if request_id is None:
+            await self._close_quietly(context)
+            return
+        entry = self._contexts.get(request_id)
+        if (reusable and page not in self._discarded and entry is not None and entry["context"] is context
+                and len(entry["idle"]) < IDLE_PAGES_PER_CONTEXT and not page.is_closed()):
+            try:
+                # Unload the document (scripts, timers, DOM) before the page waits for its next call
+                await page.goto("about:blank")
+            except Exception:
+                pass
+            else:
+                # Re-check: the context may have been released while the page was being reset
+                if self._contexts.get(request_id) is entry and len(entry["idle"]) < IDLE_PAGES_PER_CONTEXT:
+                    entry["idle"].append(page)
+                    return
+        await self._close_quietly(page)
+
+    async def settle(self, page) -> None:
+        """Give client-side rendering until the network goes quiet (capped at ``settle_ms``)."""
+        try:
+            await page.wait_for_load_state("networkidle", timeout=self.settle_ms)
+        except Exception:
+            pass
+
+    @staticmethod
+    async def _close_quietly(closable) -> None:
+        try:
+            await closable.close()
+        except Exception as e:
+            logger.debug(f"Browser close failed: {e}")
+
+    def _close_evicted_context(self, request_id: str, entry: Dict[str, Any]) -> None:
+        """Request finished: close its context in the background (called from a sync release)."""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        if loop is not self._loop:
+            return
+        task = loop.create_task(self._close_quietly(entry["context"]))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+        self._publish_gauges()
+
+    def _publish_gauges(self) -> None:
+        metrics.set_gauge("browser.contexts", len(self._contexts))
+
+    async def close(self) -> None:
+        contexts = list(self._contexts.values())
+        self._contexts.clear()
+        browser, self._browser = self._browser, None
+        playwright, self._playwright = self._playwright, None
+        for entry in contexts:
+            await self._close_quietly(entry["context"])
+        if self._closing:
+            await asyncio.gather(*self._closing, return_exceptions=True)
+        await self._close_browser(browser, playwright)
+
+
+# Global manager instance
+_browser_manager: Optional[BrowserManager] = None
+
+
+def get_browser_manager() -> BrowserManager:
+    """Get or create the worker's browser manager (settings from BROWSER_* env vars)."""
+    global _browser_manager
+    if _browser_manager is None:
+        from .web_fetcher import USER_AGENT
+        _browser_manager = BrowserManager(
+            max_pages=int(os.getenv("BROWSER_MAX_PAGES", "4")),
+            settle_ms=int(os.getenv("BROWSER_SETTLE_MS", "800")),
+            user_agent=os.getenv("USER_AGENT") or USER_AGENT,
+        )
+    return _browser_manager
+
+
+async def close_browser_manager() -> None:
+    """Close the shared browser and its contexts, if it was ever launched."""
+    if _browser_manager is not None:
+        await _browser_manager.close()
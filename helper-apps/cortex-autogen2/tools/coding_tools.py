@@ -1,13 +1,54 @@
 """
 Core Coding Tool for Cortex-AutoGen2
 """
+import atexit
+import os
+import shlex
+import shutil
+import sys
+import tempfile
 from pathlib import Path
+from types import SimpleNamespace
 from typing import Optional
 from autogen_core import CancellationToken
 from autogen_core.code_executor import CodeBlock
 from autogen_ext.code_executors.local import LocalCommandLineCodeExecutor
 from autogen_core.tools import FunctionTool
 
+from .tool_results import spill_if_large
+
+_shim_context: Optional[SimpleNamespace] = None
+
+
+def _work_dir_env_context() -> SimpleNamespace:
+    """Interpreter wrappers that export CORTEX_WORK_DIR into each executed script.
+
+    The executor builds the subprocess environment from ``os.environ``, which is
+    shared by every task in the worker, so the per-task value cannot go there. It
+    does run Python as ``virtual_env_context.env_exe`` and shells from the front of
+    ``virtual_env_context.bin_path``, always with the task's work dir as cwd: these
+    wrappers set CORTEX_WORK_DIR to that cwd (unless an outer wrapper already did)
+    and exec the real interpreter, so the submitted code runs unmodified.
+    """
+    global _shim_context
+    if _shim_context is None:
+        bin_path = tempfile.mkdtemp(prefix="cortex_exec_")
+        atexit.register(shutil.rmtree, bin_path, True)
+        targets = {"python": sys.executable, "bash": shutil.which("bash"), "sh": shutil.which("sh")}
+        for name, target in targets.items():
+            if not target:
+                continue
+            shim = os.path.join(bin_path, name)
+            with open(shim, "w", encoding="utf-8") as f:
+                f.write(
+                    "#!/bin/sh\n"
+                    'if [ -z "$CORTEX_EXEC_SHIM" ]; then export CORTEX_EXEC_SHIM=1 CORTEX_WORK_DIR="$(pwd)"; fi\n'
+                    f'exec {shlex.quote(target)} "$@"\n'
+                )
+            os.chmod(shim, 0o755)
+        _shim_context = SimpleNamespace(bin_path=bin_path, env_exe=os.path.join(bin_path, "python"))
+    return _shim_context
+
 
 async def execute_code(code: str, work_dir: str | None = None, language: str = "python") -> str:
     """
@@ -22,7 +63,10 @@ async def execute_code(code: str, work_dir: str | None = None, language: str = "
         A string containing the execution results.
     """
     # Create executor with work directory
-    executor = LocalCommandLineCodeExecutor(work_dir=Path(work_dir) if work_dir else Path("/tmp/coding"))
+    executor = LocalCommandLineCodeExecutor(
+        work_dir=Path(work_dir) if work_dir else Path("/tmp/coding"),
+        virtual_env_context=_work_dir_env_context() if work_dir else None,
+    )
 
     # Log code execution
     import logging
@@ -35,10 +79,13 @@ async def execute_code(code: str, work_dir: str | None = None, language: str = "
         cancellation_token=CancellationToken(),
     )
 
+    # Large stdout (printed DataFrames, dumps) is kept on disk behind a handle
+    output = spill_if_large(result.output, work_dir, "execute_code")
+
     if result.exit_code == 0:
-        return f"CODE EXECUTION SUCCESSFUL ({language}).\nOutput:\n{result.output}"
+        return f"CODE EXECUTION SUCCESSFUL ({language}).\nOutput:\n{output}"
     else:
-        return f"CODE EXECUTION FAILED ({language}) with exit code {result.exit_code}.\nOutput:\n{result.output}"
+        return f"CODE EXECUTION FAILED ({language}) with exit code {result.exit_code}.\nOutput:\n{output}"
 
 
 # Keep backward compatibility alias
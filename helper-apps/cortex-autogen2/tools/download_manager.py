@@ -0,0 +1,580 @@
+"""
+Shared file downloads for download_file / download_files.
+
+- Downloads stream over one ``aiohttp`` session, at most ``DOWNLOAD_MAX_PARALLEL``
+  at once per worker (batches and concurrent tasks alike).
+- Each finished file is stored once per machine, by SHA-256, under
+  ``DOWNLOAD_CACHE_DIR/blobs`` and copied into the request work dir, so editing
+  the work dir file never touches the cache. A URL index maps each URL to its
+  blob and validators: within ``DOWNLOAD_CACHE_TTL`` seconds the blob is reused
+  without a request, after that it is revalidated with ``If-None-Match`` /
+  ``If-Modified-Since``. Identical content from different URLs shares one blob.
+  A blob whose size or mtime changed since it was stored is dropped rather than
+  served. The cache is trimmed to ``DOWNLOAD_CACHE_MAX_MB``.
+- Interrupted downloads keep their partial file and continue with an HTTP
+  ``Range`` request (guarded by ``If-Range``), both on the in-call retries and
+  on the next call for the same URL. A transfer first renames the shared partial
+  to a name of its own, so two processes sharing the cache never append to the
+  same file; the loser of the rename starts from scratch.
+- Concurrent downloads of the same URL share one transfer, whatever file name
+  or extension each caller asked for; every caller validates the result for its
+  own extension. When all of them want a CSV, the first chunk is sniffed so an
+  HTML error page is rejected before the rest is downloaded; images and ZIPs are
+  checked once complete.
+- Files of one ``download_many`` batch get distinct names: a name already used
+  earlier in the batch gets a ``-1``, ``-2``, ... suffix before its extension.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import shutil
+import time
+import uuid
+import zipfile
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+from urllib.parse import urlparse
+
+import aiohttp
+
+from services import metrics
+from services.work_dir_manager import current_work_dir
+
+from .web_fetcher import USER_AGENT
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+MAX_ATTEMPTS = 3
+# Partial downloads untouched for this long are removed when the cache is trimmed
+PARTIAL_MAX_AGE_SECONDS = 24 * 3600
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.webp', '.svg', '.bmp', '.ico')
+HTML_MARKERS = ('<!DOCTYPE', '<html', '<script', '<HTML', '<SCRIPT')
+
+
+class DownloadError(Exception):
+    """A download that completed but is not what was asked for; the message is shown to the agent."""
+
+
+class _RejectedBody(Exception):
+    """Transfer stopped after its first chunk showed an HTML page; each caller words its own DownloadError."""
+
+    def __init__(self, url: str, head: bytes):
+        super().__init__(f"{url} returned an HTML page")
+        self.head = head
+
+
+@dataclass
+class CachedDownload:
+    url: str
+    sha256: str
+    size: int
+    content_type: Optional[str] = None
+    from_cache: bool = False
+
+
+@dataclass
+class DownloadResult:
+    url: str
+    path: str
+    filename: str
+    size: int
+    from_cache: bool = False
+
+
+def _key(url: str) -> str:
+    return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+
+def _extension(filename: Optional[str], url: str) -> str:
+    return os.path.splitext(filename or os.path.basename(urlparse(url).path))[1].lower()
+
+
+def infer_filename(url: str, content_type: Optional[str]) -> str:
+    """File name from the URL path, else from the content type, else ``downloaded_file``."""
+    filename = os.path.basename(urlparse(url).path)
+    if filename:
+        return filename
+    if content_type:
+        extension = mimetypes.guess_extension(content_type.split(";")[0].strip())
+        if extension:
+            return f"downloaded_file{extension}"
+    return "downloaded_file"
+
+
+def unique_filename(filename: str, taken: Set[str]) -> str:
+    """``filename``, or ``name-1.ext``, ``name-2.ext``, ... if it is already in ``taken``."""
+    stem, extension = os.path.splitext(filename)
+    candidate, counter = filename, 0
+    while candidate in taken:
+        counter += 1
+        candidate = f"{stem}-{counter}{extension}"
+    return candidate
+
+
+def sniff_error(head: bytes, extension: str, filename: str) -> Optional[str]:
+    """Error message when the first bytes show the download is not the expected kind of file."""
+    if extension == '.csv' and head[:512].decode('utf-8', errors='ignore').strip().startswith(HTML_MARKERS):
+        return f"Error downloading CSV: File '{filename}' contains HTML/JavaScript instead of CSV data. The URL may have returned an error page or requires authentication."
+    return None
+
+
+def validate_file(path: str, extension: str, filename: str) -> Optional[str]:
+    """Error message when a complete download is invalid for its extension (tiny image, broken ZIP, HTML CSV)."""
+    if extension in IMAGE_EXTENSIONS:
+        file_size = os.path.getsize(path)
+        if file_size < 1000:  # Images should be at least 1KB
+            return f"Error downloading image: File '{filename}' is too small ({file_size} bytes). The download may have failed or returned an error page instead of image data."
+    if extension == '.csv':
+        try:
+            with open(path, 'rb') as f:
+                return sniff_error(f.read(512), extension, filename)
+        except Exception:
+            return None  # If validation fails, allow file to pass through
+    if extension == '.zip':
+        try:
+            with zipfile.ZipFile(path, 'r') as zip_ref:
+                zip_ref.testzip()
+        except (zipfile.BadZipFile, zipfile.LargeZipFile) as e:
+            return f"Error downloading ZIP: File '{filename}' is not a valid ZIP file. The download may have failed or returned an error page instead of ZIP data: {e}"
+        except Exception:
+            return None
+    return None
+
+
+class DownloadCache:
+    """Content-addressed blobs (``blobs/<sha256>``), a URL index (``urls/<key>.json``) and partials."""
+
+    def __init__(self, directory: str, ttl_seconds: float = 3600.0, max_bytes: int = 2 * 1024 ** 3):
+        self.directory = directory
+        self.ttl = ttl_seconds
+        self.max_bytes = max_bytes
+        self.blob_dir = os.path.join(directory, "blobs")
+        self.url_dir = os.path.join(directory, "urls")
+        self.partial_dir = os.path.join(directory, "partial")
+        self._size: Optional[int] = None
+
+    def blob_path(self, sha256: str) -> str:
+        return os.path.join(self.blob_dir, sha256)
+
+    def partial_paths(self, url: str, owner: Optional[str] = None) -> Tuple[str, str]:
+        """Partial body and its validators (``.json``) for ``url``: the shared pair, or ``owner``'s own."""
+        base = os.path.join(self.partial_dir, _key(url))
+        if owner:
+            base = f"{base}.{owner}"
+        return f"{base}.part", f"{base}.json"
+
+    def claim_partial(self, url: str) -> Tuple[str, str]:
+        """Give the caller a partial of its own, taking over the shared one if it is there.
+
+        The body is renamed first and the rename is atomic, so of several writers
+        (other processes) only one resumes it; the others start an empty file.
+        """
+        os.makedirs(self.partial_dir, exist_ok=True)
+        shared_part, shared_meta = self.partial_paths(url)
+        part_path, meta_path = self.partial_paths(url, f"{os.getpid()}-{uuid.uuid4().hex[:8]}")
+        try:
+            os.rename(shared_part, part_path)
+            os.rename(shared_meta, meta_path)
+        except OSError:
+            pass  # No partial, or another writer took it; a body without validators is not resumed
+        return part_path, meta_path
+
+    def release_partial(self, url: str, part_path: str, meta_path: str) -> None:
+        """Hand an unfinished partial back under the shared name so the next call can resume it."""
+        if not os.path.exists(part_path):
+            return  # Stored or discarded
+        shared_part, shared_meta = self.partial_paths(url)
+        try:
+            # Validators first: a claimer that sees the body finds its validators too
+            os.replace(meta_path, shared_meta)
+            os.replace(part_path, shared_part)
+        except OSError:
+            for path in (part_path, meta_path):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def load(self, url: str) -> Optional[Dict[str, Any]]:
+        """Index entry for ``url`` whose blob is present and unmodified; None otherwise."""
+        path = os.path.join(self.url_dir, f"{_key(url)}.json")
+        try:
+            with open(path, encoding="utf-8") as f:
+                entry = json.load(f)
+            stat = os.stat(self.blob_path(entry["sha256"]))
+        except (OSError, ValueError, KeyError):
+            return None
+        if stat.st_size != entry.get("size") or stat.st_mtime_ns != entry.get("mtime_ns"):
+            # Changed on disk after it was stored: the blob may no longer match its hash
+            logger.info(f"📥 Cached download of {url} was modified; fetching again")
+            self.forget(url, drop_blob=True)
+            return None
+        return entry
+
+    def is_fresh(self, entry: Dict[str, Any]) -> bool:
+        return time.time() - entry.get("fetched_at", 0) < self.ttl
+
+    def store(self, url: str, part_path: str, entry: Dict[str, Any]) -> Dict[str, Any]:
+        """Move a finished partial into the blob store (or drop it if the content is already there)."""
+        os.makedirs(self.blob_dir, exist_ok=True)
+        blob = self.blob_path(entry["sha256"])
+        if os.path.exists(blob):
+            os.remove(part_path)
+            metrics.increment("download.dedup_hits")
+        else:
+            os.replace(part_path, blob)
+            if self._size is None:
+                self._size = self._scan_size()
+            else:
+                self._size += entry["size"]
+        entry["mtime_ns"] = os.stat(blob).st_mtime_ns
+        self.write_entry(url, entry)
+        if self._size is not None and self._size > self.max_bytes:
+            self._trim()
+        return entry
+
+    def write_entry(self, url: str, entry: Dict[str, Any]) -> None:
+        os.makedirs(self.url_dir, exist_ok=True)
+        path = os.path.join(self.url_dir, f"{_key(url)}.json")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+
+    def forget(self, url: str, drop_blob: bool = False) -> None:
+        """Remove ``url`` from the index (and its blob, when it can no longer be trusted)."""
+        path = os.path.join(self.url_dir, f"{_key(url)}.json")
+        try:
+            if drop_blob:
+                with open(path, encoding="utf-8") as f:
+                    os.remove(self.blob_path(json.load(f)["sha256"]))
+            os.remove(path)
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def _scan_size(self) -> int:
+        try:
+            return sum(entry.stat().st_size for entry in os.scandir(self.blob_dir))
+        except OSError:
+            return 0
+
+    def _trim(self) -> None:
+        """Delete the oldest blobs until the cache is under 90% of its cap, plus stale partials.
+
+        Work dir copies are unaffected; their URLs simply miss on the next download.
+        """
+        now = time.time()
+        try:
+            for entry in os.scandir(self.partial_dir):
+                if now - entry.stat().st_mtime > PARTIAL_MAX_AGE_SECONDS:
+                    os.remove(entry.path)
+        except OSError:
+            pass
+        try:
+            blobs = sorted(os.scandir(self.blob_dir), key=lambda e: e.stat().st_mtime)
+        except OSError:
+            return
+        size = sum(e.stat().st_size for e in blobs)
+        for blob in blobs:
+            if size <= self.max_bytes * 0.9:
+                break
+            size -= blob.stat().st_size
+            try:
+                os.remove(blob.path)
+            except OSError:
+                pass
+            metrics.increment("download.cache_evictions")
+        self._size = size
+
+
+class DownloadManager:
+    """Bounded, resumable, cached and coalesced file downloads."""
+
+    def __init__(self, cache: DownloadCache, max_parallel: int = 4, max_per_host: int = 4):
+        self.cache = cache
+        self.max_parallel = max(1, max_parallel)
+        self.max_per_host = max_per_host
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._inflight: Dict[str, asyncio.Future] = {}
+        # url -> extensions of the callers waiting on its transfer
+        self._wanted: Dict[str, List[str]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _check_loop(self) -> None:
+        """Drop the session bound to a previous event loop (e.g. successive asyncio.run calls)."""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._session = None
+            self._semaphore = asyncio.Semaphore(self.max_parallel)
+            self._inflight.clear()
+            self._wanted.clear()
+            self._loop = loop
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_parallel * 2, limit_per_host=self.max_per_host,
+                                             ttl_dns_cache=300)
+            self._session = aiohttp.ClientSession(connector=connector, headers={"User-Agent": USER_AGENT})
+        return self._session
+
+    async def _coalesced(self, key: str, produce: Callable[[], Awaitable[CachedDownload]]) -> CachedDownload:
+        """Run ``produce`` once per key at a time; concurrent callers share the result."""
+        self._check_loop()
+        task = self._inflight.get(key)
+        if task is None:
+            # Own task, so one caller being cancelled does not cancel the transfer for the others
+            task = asyncio.ensure_future(produce())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._fetch_done(key, done))
+        else:
+            metrics.increment("download.requests", result="coalesced")
+        return await asyncio.shield(task)
+
+    def _fetch_done(self, key: str, task: asyncio.Future) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            # Retrieve the exception so a download whose callers all went away is not logged as unhandled
+            task.exception()
+
+    async def download(self, url: str, filename: Optional[str] = None, work_dir: Optional[str] = None) -> DownloadResult:
+        """Download ``url`` into ``work_dir`` (defaults to the task's work dir); raises DownloadError for invalid files."""
+        cached, filename = await self._prepare(url, filename)
+        return await self._place(url, cached, filename, work_dir)
+
+    async def download_many(self, urls: List[str], work_dir: Optional[str] = None) -> List[Any]:
+        """Download several URLs in parallel (bounded by ``max_parallel``); failures are returned as exceptions.
+
+        Names are made unique within the batch in input order, so two URLs ending in
+        ``data.csv`` are saved as ``data.csv`` and ``data-1.csv``.
+        """
+        results: List[Any] = await asyncio.gather(*(self._prepare(url, None) for url in urls), return_exceptions=True)
+        taken: Set[str] = set()
+        placements = {}
+        for index, (url, item) in enumerate(zip(urls, results)):
+            if isinstance(item, BaseException):
+                continue
+            cached, filename = item
+            filename = unique_filename(filename, taken)
+            taken.add(filename)
+            placements[index] = self._place(url, cached, filename, work_dir)
+        placed = await asyncio.gather(*placements.values(), return_exceptions=True)
+        for index, result in zip(placements, placed):
+            results[index] = result
+        return results
+
+    async def _prepare(self, url: str, filename: Optional[str]) -> Tuple[CachedDownload, str]:
+        """Fetch (or reuse) and validate ``url``; returns the cached blob and the file name to save it as."""
+        extension = _extension(filename, url)
+        self._check_loop()
+        wanted = self._wanted.setdefault(url, [])
+        wanted.append(extension)
+        try:
+            cached = await self._coalesced(url, lambda: self._fetch(url))
+        except _RejectedBody as e:
+            raise DownloadError(sniff_error(e.head, extension, filename or infer_filename(url, None)) or str(e))
+        finally:
+            wanted.remove(extension)
+            if not wanted and self._wanted.get(url) is wanted:
+                del self._wanted[url]
+        if not filename:
+            filename = infer_filename(url, cached.content_type)
+            extension = _extension(filename, url)
+        blob = self.cache.blob_path(cached.sha256)
+        error = await asyncio.to_thread(validate_file, blob, extension, filename)
+        if error:
+            # Do not serve the bad response to the agent's retry
+            await asyncio.to_thread(self.cache.forget, url)
+            raise DownloadError(error)
+        return cached, filename
+
+    async def _place(self, url: str, cached: CachedDownload, filename: str, work_dir: Optional[str]) -> DownloadResult:
+        """Copy the blob into the work dir as ``filename``."""
+        work_dir = work_dir or current_work_dir()
+        path = os.path.join(work_dir, filename)
+        await asyncio.to_thread(self._copy, self.cache.blob_path(cached.sha256), path)
+        return DownloadResult(url=url, path=path, filename=filename, size=cached.size, from_cache=cached.from_cache)
+
+    @staticmethod
+    def _copy(blob: str, path: str) -> None:
+        """Copy (never link) so the work dir file has its own inode and edits stay out of the cache."""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.part"
+        shutil.copyfile(blob, tmp_path)
+        # Replaces an existing file or symlink at ``path`` without writing through it
+        os.replace(tmp_path, path)
+
+    async def _fetch(self, url: str) -> CachedDownload:
+        cached = await asyncio.to_thread(self.cache.load, url)
+        if cached is not None and self.cache.is_fresh(cached):
+            metrics.increment("download.requests", result="hit")
+            return CachedDownload(url=url, sha256=cached["sha256"], size=cached["size"],
+                                  content_type=cached.get("content_type"), from_cache=True)
+
+        async with self._semaphore:
+            started = time.monotonic()
+            part = await asyncio.to_thread(self.cache.claim_partial, url)
+            try:
+                for attempt in range(1, MAX_ATTEMPTS + 1):
+                    try:
+                        result = await self._transfer(url, cached, part)
+                        break
+                    except (aiohttp.ClientPayloadError, aiohttp.ServerDisconnectedError, asyncio.TimeoutError) as e:
+                        if attempt == MAX_ATTEMPTS:
+                            raise
+                        metrics.increment("download.retries")
+                        logger.info(f"📥 Download of {url} interrupted ({e!r}); resuming (attempt {attempt + 1})")
+            finally:
+                await asyncio.to_thread(self.cache.release_partial, url, *part)
+            metrics.observe("download.seconds", time.monotonic() - started)
+            return result
+
+    async def _transfer(self, url: str, cached: Optional[Dict[str, Any]], part: Tuple[str, str]) -> CachedDownload:
+        """One request for ``url``, written to this transfer's own partial ``part`` (body, validators)."""
+        part_path, part_meta_path = part
+        offset, part_meta = await asyncio.to_thread(self._partial_state, part_path, part_meta_path)
+
+        headers = {}
+        if cached is not None:
+            if cached.get("etag"):
+                headers["If-None-Match"] = cached["etag"]
+            if cached.get("last_modified"):
+                headers["If-Modified-Since"] = cached["last_modified"]
+        validator = part_meta.get("etag") or part_meta.get("last_modified")
+        if offset and validator:
+            headers["Range"] = f"bytes={offset}-"
+            headers["If-Range"] = validator
+        else:
+            offset = 0
+
+        timeout = aiohttp.ClientTimeout(total=None, sock_connect=30, sock_read=30)
+        async with self._get_session().get(url, headers=headers, timeout=timeout) as resp:
+            if resp.status == 304 and cached is not None:
+                cached["fetched_at"] = time.time()
+                await asyncio.to_thread(self.cache.write_entry, url, cached)
+                metrics.increment("download.requests", result="revalidated")
+                return CachedDownload(url=url, sha256=cached["sha256"], size=cached["size"],
+                                      content_type=cached.get("content_type"), from_cache=True)
+            restart = resp.status == 416 and offset > 0
+            if not restart:
+                resp.raise_for_status()
+                resumed = resp.status == 206 and offset > 0
+                if not resumed:
+                    offset = 0
+                content_type = resp.headers.get("Content-Type")
+                meta = {"etag": resp.headers.get("ETag"), "last_modified": resp.headers.get("Last-Modified")}
+                if resumed:
+                    meta = {k: v or part_meta.get(k) for k, v in meta.items()}
+                digest, size = await self._receive(resp, url, part, offset, meta)
+        if restart:
+            # The partial no longer fits the resource (or is already complete): start over
+            await asyncio.to_thread(self._remove, part_path, part_meta_path)
+            return await self._transfer(url, cached, part)
+
+        metrics.increment("download.requests", result="resumed" if offset else "miss")
+        metrics.increment("download.bytes", size - offset)
+        entry = await asyncio.to_thread(self.cache.store, url, part_path, {
+            "url": url, "sha256": digest.hexdigest(), "size": size, "content_type": content_type,
+            "etag": meta["etag"], "last_modified": meta["last_modified"], "fetched_at": time.time(),
+        })
+        await asyncio.to_thread(self._remove, part_meta_path)
+        return CachedDownload(url=url, sha256=entry["sha256"], size=size, content_type=content_type)
+
+    async def _receive(self, resp: aiohttp.ClientResponse, url: str, part: Tuple[str, str], offset: int,
+                       meta: Dict[str, Any]):
+        """Stream the body into the partial file (appending after ``offset``); returns (sha256 state, size)."""
+        part_path, part_meta_path = part
+        await asyncio.to_thread(self._write_json, part_meta_path, meta)
+        digest = await asyncio.to_thread(self._hash_prefix, part_path, offset)
+        with open(part_path, "ab" if offset else "wb") as f:
+            first = not offset
+            async for chunk in resp.content.iter_chunked(CHUNK_SIZE):
+                if first:
+                    first = False
+                    # Only worth stopping early when every caller waiting on it wants a CSV
+                    wanted = self._wanted.get(url)
+                    if wanted and all(extension == ".csv" for extension in wanted) and sniff_error(chunk, ".csv", ""):
+                        f.close()
+                        await asyncio.to_thread(self._remove, part_path, part_meta_path)
+                        metrics.increment("download.requests", result="rejected")
+                        raise _RejectedBody(url, chunk[:512])
+                digest.update(chunk)
+                await asyncio.to_thread(f.write, chunk)
+            return digest, f.tell()
+
+    @staticmethod
+    def _partial_state(part_path: str, part_meta_path: str) -> Tuple[int, Dict[str, Any]]:
+        try:
+            with open(part_meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+            return os.path.getsize(part_path), meta
+        except (OSError, ValueError):
+            return 0, {}
+
+    @staticmethod
+    def _hash_prefix(path: str, length: int):
+        """SHA-256 state over the first ``length`` bytes already on disk (for resumed downloads)."""
+        digest = hashlib.sha256()
+        if length:
+            with open(path, "rb") as f:
+                remaining = length
+                while remaining:
+                    block = f.read(min(CHUNK_SIZE, remaining))
+                    if not block:
+                        break
+                    digest.update(block)
+                    remaining -= len(block)
+            # Drop anything past the verified prefix before appending
+            with open(path, "r+b") as f:
+                f.truncate(length)
+        return digest
+
+    @staticmethod
+    def _write_json(path: str, data: Dict[str, Any]) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+
+    @staticmethod
+    def _remove(*paths: str) -> None:
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    async def close(self) -> None:
+        session, self._session = self._session, None
+        if session is not None and not session.closed:
+            await session.close()
+
+
+# Global manager instance
+_download_manager: Optional[DownloadManager] = None
+
+
+def get_download_manager() -> DownloadManager:
+    """Get or create the shared download manager (settings from DOWNLOAD_* env vars)."""
+    global _download_manager
+    if _download_manager is None:
+        cache = DownloadCache(
+            os.getenv("DOWNLOAD_CACHE_DIR") or os.path.join(os.getenv("WORK_DIR_ROOT", "/tmp/coding"), ".download_cache"),
+            ttl_seconds=float(os.getenv("DOWNLOAD_CACHE_TTL", "3600")),
+            max_bytes=int(float(os.getenv("DOWNLOAD_CACHE_MAX_MB", "2048")) * 1024 * 1024),
+        )
+        _download_manager = DownloadManager(
+            cache,
+            max_parallel=int(os.getenv("DOWNLOAD_MAX_PARALLEL", "4")),
+        )
+    return _download_manager
+
+
+async def close_download_manager() -> None:
+    """Close the shared session, if it was ever created."""
+    if _download_manager is not None:
+        await _download_manager.close()
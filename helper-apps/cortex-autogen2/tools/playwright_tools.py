@@ -39,29 +39,27 @@ async def _navigate_with_playwright(url: str, actions: Optional[List[Dict[str, A
     """Internal helper using Playwright to render and optionally click and download.
     Returns a dict with keys: saved_html (path), downloaded_files (list), messages, status.
     """
-    from playwright.async_api import async_playwright
+    from services.work_dir_manager import task_id_for_path
+    from .browser_manager import get_browser_manager
 
     messages = []
     downloaded_files = []
     saved_html = None
+    browser = get_browser_manager()
     try:
-        async with async_playwright() as p:
-            browser = await p.chromium.launch(headless=True)
-            context = await browser.new_context()
-            page = await context.new_page()
-            logger.info(f"Playwright launched browser for URL {url}")
+        # Pages come from the worker's shared browser, in this request's own context
+        async with browser.page(task_id_for_path(work_dir)) as page:
+            logger.info(f"Playwright opened page for URL {url}")
             try:
                 from dynamic_agent_loader import helpers
                 append_accomplishment_to_file = helpers.append_accomplishment_to_file
                 append_accomplishment_to_file(work_dir, f"WEB_SEARCH_AGENT: Attempting Playwright render: {url}")
             except Exception:
                 pass
-            # Set a generic UA for compatibility
-            await page.set_extra_http_headers({"User-Agent": os.environ.get('USER_AGENT', 'Mozilla/5.0')})
             # Navigate
             await page.goto(url, wait_until='domcontentloaded', timeout=timeout_s * 1000)
             # Allow some time to render
-            await page.wait_for_timeout(800)
+            await browser.settle(page)
             if actions:
                 for a in actions:
                     try:
@@ -100,6 +98,8 @@ async def _navigate_with_playwright(url: str, actions: Optional[List[Dict[str, A
                             messages.append(f"Waited for {selector}")
                         elif action == 'evaluate':
                             script = a.get('script')
+                            # Scripts can leave state behind: don't hand this page to a later call
+                            browser.discard(page)
                             val = await page.evaluate(script)
                             messages.append(f"Evaluate returned: {val}")
                         else:
@@ -107,6 +107,7 @@ async def _navigate_with_playwright(url: str, actions: Optional[List[Dict[str, A
                             messages.append(f"Skipped unknown action: {a}")
                             logger.info(f"Skipped unknown Playwright action: {a}")
                     except Exception as exc:
+                        browser.discard(page)
                         messages.append(f"Action failure: {a} => {str(exc)}")
 
             # Save HTML
@@ -119,7 +120,6 @@ async def _navigate_with_playwright(url: str, actions: Optional[List[Dict[str, A
             except Exception:
                 pass
             logger.info(f"Playwright saved HTML snapshot at {saved_html}")
-            await browser.close()
             return {
                 "status": "success",
                 "saved_html": saved_html,
@@ -7,6 +7,8 @@ Provides read_file function with FunctionTool export.
 from autogen_core.tools import FunctionTool
 from typing import Optional
 
+from .tool_results import describe_dataframe, describe_json, file_handle, get_spill_threshold, spill_if_large
+
 
 def read_file(file_path: str, work_dir: Optional[str] = None) -> str:
     """
@@ -59,6 +61,10 @@ def read_file(file_path: str, work_dir: Optional[str] = None) -> str:
                 import pandas as pd
                 df = pd.read_excel(resolved_path)
                 output = df.to_string()
+
+                # With a work dir, large tables become a handle (schema + head/tail) instead of 200KB of text
+                if work_dir and len(output) > get_spill_threshold():
+                    return spill_if_large(output, work_dir, "read_file", schema=describe_dataframe(df))
                 
                 # Truncate if too large (check both rows and output size)
                 max_rows = 200
@@ -101,6 +107,10 @@ def read_file(file_path: str, work_dir: Optional[str] = None) -> str:
             
             with open(resolved_path, 'r', encoding='utf-8') as f:
                 data = json_module.load(f)
+
+                # Large files stay on disk: return a handle with the structure and head/tail
+                if work_dir and file_size > get_spill_threshold():
+                    return file_handle(resolved_path, schema=describe_json(data), work_dir=work_dir)
                 
                 # Check if it's a large array first (before stringifying)
                 if isinstance(data, list) and len(data) > max_items:
@@ -136,6 +146,9 @@ def read_file(file_path: str, work_dir: Optional[str] = None) -> str:
                 
                 # For non-arrays or small arrays, check output size
                 output = json_module.dumps(data, indent=2, ensure_ascii=False)
+
+                if work_dir and len(output) > get_spill_threshold():
+                    return spill_if_large(output, work_dir, "read_file", schema=describe_json(data))
                 
                 # Truncate if output is too large
                 if len(output) > max_size:
@@ -161,6 +174,13 @@ def read_file(file_path: str, work_dir: Optional[str] = None) -> str:
             file_size = os.path.getsize(resolved_path)
             max_size = 500 * 1024  # 500KB - reasonable limit for LLM context
             max_lines = 200  # If file has <= 200 lines, return everything
+
+            if work_dir and file_size > get_spill_threshold():
+                schema = None
+                if file_ext in ['.csv', '.tsv']:
+                    with open(resolved_path, 'r', encoding='utf-8', errors='replace') as f:
+                        schema = f"columns: {f.readline().strip()[:1000]}"
+                return file_handle(resolved_path, schema=schema, work_dir=work_dir)
             
             with open(resolved_path, 'r', encoding='utf-8') as f:
                 # First, check if file is small enough to read fully
@@ -22,6 +22,7 @@ import re
 import urllib.parse
 import html as html_lib
 from .google_cse import google_cse_search
+from .web_fetcher import USER_AGENT, get_web_fetcher
 from urllib.parse import urljoin, urlparse
 
 logger = logging.getLogger(__name__)
@@ -36,12 +37,6 @@ logger = logging.getLogger(__name__)
 #     logging.warning("pandas not found. CSV/DataFrame functionality may be limited.")
 #     pd = None
 
-USER_AGENT = (
-    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
-    "AppleWebKit/537.36 (KHTML, like Gecko) "
-    "Chrome/125.0.0.0 Safari/537.36"
-)
-
 
 def _normalize_web_results(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     normalized: List[Dict[str, Any]] = []
@@ -318,130 +313,74 @@ def _save_html_to_workdir(work_dir: str, url: str, html: str) -> str:
     return path
 
 
+def _page_result(final_url: str, html: str, title: Optional[str], max_chars: int, work_dir: Optional[str]) -> Dict[str, Any]:
+    """Structured fetch_webpage result for fetched or rendered HTML."""
+    # Save FULL HTML to file if work_dir provided
+    saved_html_path = None
+    if work_dir:
+        try:
+            saved_html_path = _save_html_to_workdir(work_dir, final_url, html)
+        except Exception as e:
+            logger.warning(f"Failed to save HTML to work_dir: {e}")
+
+    # Title
+    if not title:
+        mt = re.search(r'<title[^>]*>([\s\S]*?)</title>', html, flags=re.I)
+        title = html_lib.unescape(mt.group(1)).strip() if mt else None
+    # Meta description
+    md = re.search(r'<meta[^>]+name=["\']description["\'][^>]+content=["\']([^"\']+)["\']', html, flags=re.I)
+    if not md:
+        md = re.search(r'<meta[^>]+property=["\']og:description["\'][^>]+content=["\']([^"\']+)["\']', html, flags=re.I)
+    meta_desc = html_lib.unescape(md.group(1)).strip() if md else None
+    text = _html_to_text(html, max_chars=max_chars)
+
+    # When work_dir is provided, return minimal JSON (no huge HTML) - guide LLM to use saved file
+    if saved_html_path:
+        return {
+            "url": final_url,
+            "title": title or None,
+            "meta_description": meta_desc,
+            "text": text[:500],  # Very small text preview (<1KB) since we have file path
+            "saved_html": saved_html_path,
+            "note": "Full HTML saved to file. Use saved_html path for pandas.read_html() or file operations."
+        }
+    # No work_dir: return HTML in response (backward compatibility)
+    return {
+        "url": final_url,
+        "title": title or None,
+        "meta_description": meta_desc,
+        "html": html if len(html) <= max_chars else html[:max_chars],  # Truncated for JSON response
+        "text": text,
+    }
+
+
 async def fetch_webpage(url: str, render: bool = False, timeout_s: int = 20, max_chars: int = 200000, work_dir: Optional[str] = None) -> str:
     """
     Fetch a full webpage and return structured JSON with title, html, and extracted text.
     - render=False: simple HTTP fetch (no JS)
     - render=True: try Playwright to render JS (falls back to simple fetch if unavailable)
     - work_dir: If provided, automatically saves FULL HTML to a file (not truncated)
+
+    Fetches go through the shared web fetcher (pooled connections, pooled browser,
+    on-disk HTTP cache), so repeat fetches of the same page are served locally.
     """
     try:
         # Normalize URL
         if not re.match(r'^https?://', url):
             url = 'https://' + url
 
-        headers = {"User-Agent": USER_AGENT}
-        saved_html_path = None
-
-        # Helper: requests-based fetch
-        def fetch_via_requests(target_url: str) -> Dict[str, Any]:
-            r = requests.get(target_url, headers=headers, timeout=timeout_s)
-            r.raise_for_status()
-            html = r.text
-            
-            # Save FULL HTML to file if work_dir provided
-            saved_html_path = None
-            if work_dir:
-                try:
-                    saved_html_path = _save_html_to_workdir(work_dir, target_url, html)
-                except Exception as e:
-                    logger.warning(f"Failed to save HTML to work_dir: {e}")
-            
-            # Title
-            mt = re.search(r'<title[^>]*>([\s\S]*?)</title>', html, flags=re.I)
-            title = html_lib.unescape(mt.group(1)).strip() if mt else None
-            # Meta description
-            md = re.search(r'<meta[^>]+name=["\']description["\'][^>]+content=["\']([^"\']+)["\']', html, flags=re.I)
-            if not md:
-                md = re.search(r'<meta[^>]+property=["\']og:description["\'][^>]+content=["\']([^"\']+)["\']', html, flags=re.I)
-            meta_desc = html_lib.unescape(md.group(1)).strip() if md else None
-            text = _html_to_text(html, max_chars=max_chars)
-            
-            # When work_dir is provided, return minimal JSON (no huge HTML) - guide LLM to use saved file
-            if saved_html_path:
-                result = {
-                    "url": str(r.url or target_url),
-                    "title": title,
-                    "meta_description": meta_desc,
-                    "text": text[:500],  # Very small text preview (<1KB) since we have file path
-                    "saved_html": saved_html_path,
-                    "note": "Full HTML saved to file. Use saved_html path for pandas.read_html() or file operations."
-                }
-            else:
-                # No work_dir: return HTML in response (backward compatibility)
-                result = {
-                    "url": str(r.url or target_url),
-                    "title": title,
-                    "meta_description": meta_desc,
-                    "html": html if len(html) <= max_chars else html[:max_chars],  # Truncated for JSON response
-                    "text": text,
-                }
-            return result
-
-        if not render:
-            data = fetch_via_requests(url)
-            return json.dumps(data, indent=2)
-
-        # Try Playwright render
-        try:
-            from playwright.async_api import async_playwright
-        except Exception:
-            data = fetch_via_requests(url)
-            return json.dumps(data, indent=2)
-
-        try:
-            saved_html_path = None
-            async with async_playwright() as p:
-                browser = await p.chromium.launch(headless=True)
-                context = await browser.new_context()
-                page = await context.new_page()
-                await page.set_extra_http_headers({"User-Agent": USER_AGENT})
-                await page.goto(url, wait_until="domcontentloaded", timeout=timeout_s * 1000)
-                # Give some time for client-side render
-                await page.wait_for_timeout(800)
-                final_url = page.url
-                title = await page.title()
-                html = await page.content()
-                await browser.close()
-
-                # Save FULL HTML to file if work_dir provided
-                if work_dir:
-                    try:
-                        saved_html_path = _save_html_to_workdir(work_dir, final_url, html)
-                    except Exception as e:
-                        logger.warning(f"Failed to save HTML to work_dir: {e}")
-
-                text = _html_to_text(html, max_chars=max_chars)
-                # Meta description from rendered HTML
-                md = re.search(r'<meta[^>]+name=["\']description["\'][^>]+content=["\']([^"\']+)["\']', html, flags=re.I)
-                if not md:
-                    md = re.search(r'<meta[^>]+property=["\']og:description["\'][^>]+content=["\']([^"\']+)["\']', html, flags=re.I)
-                meta_desc = html_lib.unescape(md.group(1)).strip() if md else None
-
-                # When work_dir is provided, return minimal JSON (no huge HTML) - guide LLM to use saved file
-                if saved_html_path:
-                    data = {
-                        "url": final_url,
-                        "title": title or None,
-                        "meta_description": meta_desc,
-                        "text": text[:500],  # Very small text preview (<1KB) since we have file path
-                        "saved_html": saved_html_path,
-                        "note": "Full HTML saved to file. Use saved_html path for pandas.read_html() or file operations."
-                    }
-                else:
-                    # No work_dir: return HTML in response (backward compatibility)
-                    data = {
-                        "url": final_url,
-                        "title": title or None,
-                        "meta_description": meta_desc,
-                        "html": html if len(html) <= max_chars else html[:max_chars],  # Truncated for JSON response
-                        "text": text,
-                    }
-                return json.dumps(data, indent=2)
-        except Exception:
-            # Fallback to non-rendered fetch on any Playwright runtime error
-            data = fetch_via_requests(url)
-            return json.dumps(data, indent=2)
+        fetcher = get_web_fetcher()
+        page = None
+        if render:
+            try:
+                page = await fetcher.render(url, timeout_s=timeout_s)
+            except Exception as e:
+                # Fallback to non-rendered fetch when Playwright is unavailable or fails
+                logger.debug(f"Render failed for {url}, using plain fetch: {e}")
+        if page is None:
+            page = await fetcher.fetch(url, timeout_s=timeout_s)
+        data = _page_result(page.url, page.html, page.title, max_chars, work_dir)
+        return json.dumps(data, indent=2)
     except Exception as exc:
         return json.dumps({"error": f"Fetch failed: {str(exc)}"})
 
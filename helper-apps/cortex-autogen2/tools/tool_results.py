@@ -0,0 +1,208 @@
+"""
+Tool-result layer: large tool outputs go to files, agents get handles.
+
+Tools such as ``execute_code``, ``read_file``, ``fetch_webpage`` and
+``cortex_browser`` can produce hundreds of KB of text. Returned verbatim, that
+text is re-sent on every later LLM call of the conversation. ``spill_if_large``
+writes outputs above ``TOOL_RESULT_SPILL_CHARS`` to the work dir's spill dir
+(``<root>/.tool_spill/<work dir name>``, outside the work dir so file listings,
+summaries and uploads never see them) and returns a compact handle instead:
+
+    [TOOL OUTPUT HANDLE] path, size, optional schema, head and tail preview
+
+The full content stays available through the ``read_tool_output`` paging tool
+(character slices) or directly from code via the file path. The budgeted model
+context (``context/model_context.py``) spills oversized results through the
+same ``spill_text`` helper, so every handle has the same shape and location.
+"""
+import hashlib
+import logging
+import os
+import re
+import shutil
+from typing import Optional
+
+from autogen_core.tools import FunctionTool
+
+from services import metrics
+from services.work_dir_manager import spill_dir_for
+
+logger = logging.getLogger(__name__)
+
+HEAD_CHARS = 1500
+TAIL_CHARS = 800
+DEFAULT_PAGE_CHARS = 8000
+MAX_PAGE_CHARS = 20000
+
+
+def get_spill_threshold() -> int:
+    """Character count above which tool outputs are replaced by a handle."""
+    try:
+        return max(1000, int(os.getenv("TOOL_RESULT_SPILL_CHARS", "8000")))
+    except ValueError:
+        return 8000
+
+
+def describe_dataframe(df) -> str:
+    """Compact schema of a pandas DataFrame: shape plus column dtypes."""
+    columns = ", ".join(f"{name} ({dtype})" for name, dtype in df.dtypes.astype(str).items())
+    return f"{len(df):,} rows x {len(df.columns)} columns: {columns}"
+
+
+def describe_json(data) -> str:
+    """Compact schema of parsed JSON: top-level type, length and keys."""
+    if isinstance(data, list):
+        first = data[0] if data else None
+        keys = f", item keys: {', '.join(list(first)[:30])}" if isinstance(first, dict) else ""
+        return f"array of {len(data):,} items{keys}"
+    if isinstance(data, dict):
+        return f"object with {len(data):,} keys: {', '.join(list(data)[:30])}"
+    return type(data).__name__
+
+
+def _spill_path(work_dir: str, label: str, digest: str) -> str:
+    spill_dir = spill_dir_for(work_dir)
+    os.makedirs(spill_dir, exist_ok=True)
+    safe_label = re.sub(r"[^\w\-]", "_", label or "tool")[:60] or "tool"
+    return os.path.join(spill_dir, f"tool_output_{safe_label}_{digest}.txt")
+
+
+def _write_spill(work_dir: str, text: str, label: str) -> str:
+    digest = hashlib.sha256(text.encode("utf-8", "replace")).hexdigest()[:12]
+    path = _spill_path(work_dir, label, digest)
+    if not os.path.exists(path):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+    return path
+
+
+def _is_inside(path: str, work_dir: str) -> bool:
+    return os.path.realpath(path).startswith(os.path.realpath(work_dir) + os.sep)
+
+
+def format_handle(path: str, size: str, head: str, tail: str = "", schema: Optional[str] = None) -> str:
+    """Handle text shown to the agent in place of the full output."""
+    lines = ["[TOOL OUTPUT HANDLE]", f"path: {path}", f"size: {size}"]
+    if schema:
+        lines.append(f"schema: {schema}")
+    lines.append(f"--- head ({len(head):,} chars) ---")
+    lines.append(head)
+    if tail:
+        lines.append(f"--- tail ({len(tail):,} chars) ---")
+        lines.append(tail)
+    lines.append(
+        "[Use read_tool_output(path, offset, length) to page through the full output, "
+        "or open the file from code.]"
+    )
+    return "\n".join(lines)
+
+
+def spill_text(text: str, work_dir: str, label: str, schema: Optional[str] = None) -> Optional[str]:
+    """Write ``text`` to the spill dir and return its handle, or None if it could not be written."""
+    try:
+        path = _write_spill(work_dir, text, label)
+    except Exception as e:
+        logger.warning(f"Could not spill {label} output ({len(text):,} chars): {e}")
+        return None
+    tail = text[-TAIL_CHARS:] if len(text) > HEAD_CHARS + TAIL_CHARS else ""
+    size = f"{len(text):,} chars, {text.count(chr(10)) + 1:,} lines"
+    logger.info(f"📦 {label} output ({len(text):,} chars) spilled to {path}")
+    return format_handle(path, size, text[:HEAD_CHARS], tail, schema)
+
+
+def spill_if_large(
+    text: str,
+    work_dir: Optional[str],
+    label: str,
+    schema: Optional[str] = None,
+    threshold: Optional[int] = None,
+) -> str:
+    """Return ``text`` unchanged if small (or no work_dir), else a handle to a spilled copy."""
+    limit = threshold or get_spill_threshold()
+    if not work_dir or text is None or len(text) <= limit:
+        return text
+    handle = spill_text(text, work_dir, label, schema)
+    if handle is None:
+        return text
+    metrics.increment("tools.outputs_spilled", tool=label)
+    metrics.increment("tools.output_chars_spilled", len(text) - len(handle), tool=label)
+    return handle
+
+
+def file_handle(path: str, schema: Optional[str] = None, work_dir: Optional[str] = None) -> str:
+    """Handle for a text file (head and tail read from disk).
+
+    Files inside ``work_dir`` are referenced in place; files elsewhere are copied
+    into the spill dir first so ``read_tool_output`` can page through them.
+    """
+    file_size = os.path.getsize(path)
+    if work_dir and not _is_inside(path, work_dir):
+        stat = os.stat(path)
+        key = f"{os.path.realpath(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+        copy_path = _spill_path(work_dir, os.path.basename(path), hashlib.sha256(key.encode()).hexdigest()[:12])
+        if not os.path.exists(copy_path):
+            shutil.copyfile(path, copy_path)
+        path = copy_path
+    with open(path, "rb") as f:
+        head = f.read(HEAD_CHARS).decode("utf-8", "replace")
+        tail = ""
+        if file_size > HEAD_CHARS + TAIL_CHARS:
+            f.seek(file_size - TAIL_CHARS)
+            tail = f.read().decode("utf-8", "replace")
+        else:
+            head += f.read().decode("utf-8", "replace")
+    metrics.increment("tools.file_handles", tool="read_file")
+    return format_handle(path, f"{file_size:,} bytes", head, tail, schema)
+
+
+def read_tool_output(path: str, offset: int = 0, length: int = DEFAULT_PAGE_CHARS, work_dir: Optional[str] = None) -> str:
+    """
+    Read a character slice of a spilled tool output (or any text file in the work dir).
+
+    Args:
+        path: Path from a [TOOL OUTPUT HANDLE]
+        offset: Start character (negative values count from the end)
+        length: Number of characters to return (capped at 20000)
+        work_dir: Work directory the path must be inside of (or inside its spill dir)
+
+    Returns:
+        The requested slice with a header giving its position in the full output
+    """
+    try:
+        resolved = path if os.path.isabs(path) or not work_dir else os.path.join(work_dir, path)
+        resolved = os.path.realpath(resolved)
+        if work_dir and not (_is_inside(resolved, work_dir) or _is_inside(resolved, spill_dir_for(work_dir))):
+            return f"ERROR: {path} is outside the work directory"
+        if not os.path.isfile(resolved):
+            return f"ERROR: Tool output not found: {path}"
+
+        with open(resolved, "r", encoding="utf-8", errors="replace") as f:
+            text = f.read()
+        total = len(text)
+        length = max(1, min(int(length), MAX_PAGE_CHARS))
+        start = max(0, total + offset) if offset < 0 else min(offset, total)
+        end = min(total, start + length)
+        more = f" - next offset {end}" if end < total else " - end of output"
+        return f"[chars {start:,}-{end:,} of {total:,}{more}]\n{text[start:end]}"
+    except Exception as e:
+        return f"ERROR: Failed to read tool output {path}: {str(e)}"
+
+
+def get_read_tool_output_tool(work_dir: Optional[str] = None) -> FunctionTool:
+    """
+    Create a FunctionTool for paging through spilled tool outputs with work_dir bound.
+
+    Args:
+        work_dir: Working directory that spilled outputs live in
+
+    Returns:
+        FunctionTool configured for the specified work directory
+    """
+    def read_tool_output_bound(path: str, offset: int = 0, length: int = DEFAULT_PAGE_CHARS) -> str:
+        """Read a slice of a spilled tool output with work_dir pre-bound."""
+        return read_tool_output(path, offset, length, work_dir)
+
+    return FunctionTool(
+        read_tool_output_bound,
+        description="Read a slice of a large tool output saved to a file. Pass the path from a [TOOL OUTPUT HANDLE], a character offset (negative counts from the end) and a length (max 20000)."
+    )
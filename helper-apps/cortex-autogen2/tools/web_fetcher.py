@@ -0,0 +1,284 @@
+"""
+Shared web fetching for fetch_webpage.
+
+- One ``aiohttp`` session per process with a connection pool capped at
+  ``WEB_FETCH_MAX_CONNECTIONS`` (``WEB_FETCH_MAX_PER_HOST`` per host).
+- An on-disk HTTP cache under ``WEB_FETCH_CACHE_DIR``: responses are served
+  without a request for ``WEB_FETCH_CACHE_TTL`` seconds (or the response's
+  ``max-age``, if shorter), then revalidated with ``If-None-Match`` /
+  ``If-Modified-Since`` so an unchanged page costs one 304. ``no-store``
+  responses are not cached. The cache is trimmed to ``WEB_FETCH_CACHE_MAX_MB``,
+  oldest entries first.
+- Rendering borrows a page (in a throwaway context) from the worker's shared
+  browser (``tools.browser_manager``). Rendered pages are cached for the TTL.
+- Identical fetches in flight at the same time share one request.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import aiohttp
+
+from services import metrics
+
+from .browser_manager import get_browser_manager
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = (
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
+    "AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/125.0.0.0 Safari/537.36"
+)
+
+_MAX_AGE = re.compile(r"max-age=(\d+)")
+
+
+@dataclass
+class FetchedPage:
+    url: str
+    html: str
+    title: Optional[str] = None
+    from_cache: bool = False
+
+
+class HttpCache:
+    """Page cache on disk: ``<key>.json`` holds the metadata and validators, ``<key>.body`` the text."""
+
+    def __init__(self, directory: str, ttl_seconds: float = 900.0, max_bytes: int = 500 * 1024 * 1024):
+        self.directory = directory
+        self.ttl = ttl_seconds
+        self.max_bytes = max_bytes
+        self._size: Optional[int] = None
+
+    def _paths(self, key: str):
+        name = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{name}.json"), os.path.join(self.directory, f"{name}.body")
+
+    def load(self, key: str) -> Optional[Dict[str, Any]]:
+        """Cached entry (metadata plus ``html``), fresh or not; None when missing or unreadable."""
+        meta_path, body_path = self._paths(key)
+        try:
+            with open(meta_path, encoding="utf-8") as f:
+                entry = json.load(f)
+            with open(body_path, encoding="utf-8") as f:
+                entry["html"] = f.read()
+        except (OSError, ValueError):
+            return None
+        return entry
+
+    def is_fresh(self, entry: Dict[str, Any]) -> bool:
+        return time.time() - entry.get("fetched_at", 0) < entry.get("ttl", self.ttl)
+
+    def store(self, key: str, entry: Dict[str, Any]) -> None:
+        meta_path, body_path = self._paths(key)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            body = entry["html"].encode("utf-8")
+            for path, data in ((body_path, body),
+                               (meta_path, json.dumps({k: v for k, v in entry.items() if k != "html"}).encode("utf-8"))):
+                tmp_path = f"{path}.tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+        except OSError as e:
+            logger.debug(f"HTTP cache write failed for {entry.get('url')}: {e}")
+            return
+        if self._size is None:
+            self._size = self._scan_size()
+        else:
+            self._size += len(body)
+        if self._size > self.max_bytes:
+            self._trim()
+
+    def touch(self, key: str, entry: Dict[str, Any]) -> None:
+        """Record a successful revalidation (new fetch time, same body)."""
+        meta_path, _ = self._paths(key)
+        meta = {k: v for k, v in entry.items() if k != "html"}
+        meta["fetched_at"] = time.time()
+        try:
+            tmp_path = f"{meta_path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+            os.replace(tmp_path, meta_path)
+        except OSError as e:
+            logger.debug(f"HTTP cache update failed for {entry.get('url')}: {e}")
+
+    def _scan_size(self) -> int:
+        try:
+            return sum(entry.stat().st_size for entry in os.scandir(self.directory) if entry.name.endswith(".body"))
+        except OSError:
+            return 0
+
+    def _trim(self) -> None:
+        """Delete the least recently written entries until the cache is under 90% of its cap."""
+        try:
+            bodies = sorted((e for e in os.scandir(self.directory) if e.name.endswith(".body")),
+                            key=lambda e: e.stat().st_mtime)
+        except OSError:
+            return
+        size = sum(e.stat().st_size for e in bodies)
+        for body in bodies:
+            if size <= self.max_bytes * 0.9:
+                break
+            size -= body.stat().st_size
+            for path in (body.path, body.path[: -len(".body")] + ".json"):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            metrics.increment("web_fetch.cache_evictions")
+        self._size = size
+
+
+class WebFetcher:
+    """Pooled, cached and coalesced page fetches (plain HTTP or rendered)."""
+
+    def __init__(self, cache: HttpCache, max_connections: int = 64, max_per_host: int = 6):
+        self.cache = cache
+        self.max_connections = max_connections
+        self.max_per_host = max_per_host
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _check_loop(self) -> None:
+        """Drop the session bound to a previous event loop (e.g. successive asyncio.run calls)."""
+        loop = asyncio.get_running_loop()
+        if self._loop is not None and self._loop is not loop:
+            self._session = None
+            self._inflight.clear()
+        self._loop = loop
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_connections, limit_per_host=self.max_per_host,
+                                             ttl_dns_cache=300)
+            self._session = aiohttp.ClientSession(connector=connector, headers={"User-Agent": USER_AGENT})
+        return self._session
+
+    async def _coalesced(self, key: str, produce: Callable[[], Awaitable[FetchedPage]]) -> FetchedPage:
+        """Run ``produce`` once per key at a time; concurrent callers share the result."""
+        self._check_loop()
+        task = self._inflight.get(key)
+        if task is None:
+            # Own task, so one caller being cancelled does not cancel the fetch for the others
+            task = asyncio.ensure_future(produce())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._fetch_done(key, done))
+        else:
+            metrics.increment("web_fetch.requests", result="coalesced")
+        return await asyncio.shield(task)
+
+    def _fetch_done(self, key: str, task: asyncio.Future) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            # Retrieve the exception so a fetch whose callers all went away is not logged as unhandled
+            task.exception()
+
+    async def fetch(self, url: str, timeout_s: int = 20) -> FetchedPage:
+        """GET ``url`` (no JavaScript), served from or revalidated against the HTTP cache."""
+        return await self._coalesced(f"GET {url}", lambda: self._fetch(url, timeout_s))
+
+    async def _fetch(self, url: str, timeout_s: int) -> FetchedPage:
+        started = time.monotonic()
+        key = f"GET {url}"
+        cached = await asyncio.to_thread(self.cache.load, key)
+        if cached is not None and self.cache.is_fresh(cached):
+            metrics.increment("web_fetch.requests", result="hit")
+            return FetchedPage(url=cached["url"], html=cached["html"], from_cache=True)
+
+        headers = {}
+        if cached is not None:
+            if cached.get("etag"):
+                headers["If-None-Match"] = cached["etag"]
+            if cached.get("last_modified"):
+                headers["If-Modified-Since"] = cached["last_modified"]
+        async with self._get_session().get(url, headers=headers,
+                                           timeout=aiohttp.ClientTimeout(total=timeout_s)) as resp:
+            if resp.status == 304 and cached is not None:
+                await asyncio.to_thread(self.cache.touch, key, cached)
+                metrics.increment("web_fetch.requests", result="revalidated")
+                metrics.observe("web_fetch.seconds", time.monotonic() - started)
+                return FetchedPage(url=cached["url"], html=cached["html"], from_cache=True)
+            resp.raise_for_status()
+            html = await resp.text(errors="replace")
+            final_url = str(resp.url)
+            cache_control = resp.headers.get("Cache-Control", "").lower()
+            etag = resp.headers.get("ETag")
+            last_modified = resp.headers.get("Last-Modified")
+
+        metrics.increment("web_fetch.requests", result="miss")
+        metrics.observe("web_fetch.seconds", time.monotonic() - started)
+        if "no-store" not in cache_control:
+            max_age = _MAX_AGE.search(cache_control)
+            ttl = self.cache.ttl
+            if max_age:
+                ttl = min(ttl, int(max_age.group(1)))
+            await asyncio.to_thread(self.cache.store, key, {
+                "url": final_url, "html": html, "etag": etag, "last_modified": last_modified,
+                "fetched_at": time.time(), "ttl": ttl,
+            })
+        return FetchedPage(url=final_url, html=html)
+
+    async def render(self, url: str, timeout_s: int = 20) -> FetchedPage:
+        """Render ``url`` in the shared browser; rendered pages are cached for the TTL."""
+        return await self._coalesced(f"RENDER {url}", lambda: self._render(url, timeout_s))
+
+    async def _render(self, url: str, timeout_s: int) -> FetchedPage:
+        started = time.monotonic()
+        key = f"RENDER {url}"
+        cached = await asyncio.to_thread(self.cache.load, key)
+        if cached is not None and self.cache.is_fresh(cached):
+            metrics.increment("web_fetch.renders", result="hit")
+            return FetchedPage(url=cached["url"], html=cached["html"], title=cached.get("title"), from_cache=True)
+        browser = get_browser_manager()
+        async with browser.page() as tab:
+            await tab.goto(url, wait_until="domcontentloaded", timeout=timeout_s * 1000)
+            await browser.settle(tab)
+            page = FetchedPage(url=tab.url, html=await tab.content(), title=(await tab.title()) or None)
+        metrics.increment("web_fetch.renders", result="miss")
+        metrics.observe("web_fetch.render_seconds", time.monotonic() - started)
+        await asyncio.to_thread(self.cache.store, key, {
+            "url": page.url, "html": page.html, "title": page.title, "fetched_at": time.time(), "ttl": self.cache.ttl,
+        })
+        return page
+
+    async def close(self) -> None:
+        session, self._session = self._session, None
+        if session is not None and not session.closed:
+            await session.close()
+
+
+# Global fetcher instance
+_web_fetcher: Optional[WebFetcher] = None
+
+
+def get_web_fetcher() -> WebFetcher:
+    """Get or create the shared web fetcher (settings from WEB_FETCH_* env vars)."""
+    global _web_fetcher
+    if _web_fetcher is None:
+        cache = HttpCache(
+            os.getenv("WEB_FETCH_CACHE_DIR") or os.path.join(os.getenv("WORK_DIR_ROOT", "/tmp/coding"), ".http_cache"),
+            ttl_seconds=float(os.getenv("WEB_FETCH_CACHE_TTL", "900")),
+            max_bytes=int(float(os.getenv("WEB_FETCH_CACHE_MAX_MB", "500")) * 1024 * 1024),
+        )
+        _web_fetcher = WebFetcher(
+            cache,
+            max_connections=int(os.getenv("WEB_FETCH_MAX_CONNECTIONS", "64")),
+            max_per_host=int(os.getenv("WEB_FETCH_MAX_PER_HOST", "6")),
+        )
+    return _web_fetcher
+
+
+async def close_web_fetcher() -> None:
+    """Close the shared session, if it was ever created."""
+    if _web_fetcher is not None:
+        await _web_fetcher.close()